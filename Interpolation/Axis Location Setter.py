@@ -9,6 +9,7 @@ from Foundation import NSDictionary
 import vanilla
 from GlyphsApp import Glyphs, GSFontMaster, Message
 from mekkablue import mekkaObject, UpdateButton
+from axisMethods import fontAxisModel
 
 
 def axisLocationEntry(axisName, locationValue):
@@ -96,36 +97,35 @@ class AxisLocationSetter(mekkaObject):
 		self.w.externalAxisValue.setPosSize((-fieldWidth - inset, linePos - 1, -inset, 19))
 
 	def update(self, sender=None):
-		self.w.particle.setItems(self.particlesOfCurrentFont())
-		self.w.axisName.setItems(self.axesOfCurrentFont())
+		# one read of the font for both lists:
+		axisModel = self.currentAxisModel(refresh=True)
+		self.w.particle.setItems(self.particlesOfCurrentFont(axisModel=axisModel))
+		self.w.axisName.setItems(self.axesOfCurrentFont(axisModel=axisModel))
 
 	def updateUI(self, sender=None):
 		onOff = self.w.includeInstances.get() or self.w.includeMasters.get()
 		onOff = onOff and bool(self.w.particle.get().strip())
 		self.w.runButton.enable(onOff)
 
-	def particlesOfCurrentFont(self, sender=None):
-		particles = []
+	def currentAxisModel(self, refresh=False):
 		currentFont = Glyphs.font
-		print("CURRENT FONT", currentFont)
 		if currentFont:
-			for i in (currentFont.masters + currentFont.instances):
-				for particle in i.name.split(" "):
-					if particle and particle not in particles:
-						particles.append(particle)
-				if i.name not in particles:
-					particles.append(i.name)
-			particles.sort()
-		print("PARTICLES", particles)
-		return particles
-
-	def axesOfCurrentFont(self, sender=None):
+			return fontAxisModel(currentFont, refresh=refresh)
+		return None
+
+	def particlesOfCurrentFont(self, sender=None, axisModel=None):
+		axisModel = axisModel or self.currentAxisModel()
+		if axisModel:
+			return axisModel.nameParticles()
+		return []
+
+	def axesOfCurrentFont(self, sender=None, axisModel=None):
 		axes = []
-		currentFont = Glyphs.font
-		if currentFont:
-			for a in currentFont.axes:
-				if a.name not in axes:
-					axes.append(a.name)
+		axisModel = axisModel or self.currentAxisModel()
+		if axisModel:
+			for axisName in axisModel.axisNames:
+				if axisName not in axes:
+					axes.append(axisName)
 		return axes
 
 	def setInternalCoordinate(self, thisInstance, thisAxisName, newAxisValue):
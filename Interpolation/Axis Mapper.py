@@ -6,7 +6,7 @@ Extracts, resets and inserts an ‘avar’ axis mapping for the Axis Mappings pa
 """
 
 import vanilla
-from axisMethods import extremeMasterValuesNative, coefficient, valueForCoefficient, masterValueForAxisTag, extremeStyleValuesNative, styleValueForAxisTag
+from axisMethods import extremeMasterValuesNative, coefficient, valueForCoefficient, fontAxisModel
 from Foundation import NSMutableDictionary
 from collections import OrderedDict
 from GlyphsApp import Glyphs, Message
@@ -115,6 +115,8 @@ class AxisMapper(mekkaObject):
 	}
 
 	def __init__(self):
+		self.axisModel, self.axisModelFont = None, None
+
 		# Window 'self.w':
 		windowWidth = 380
 		windowHeight = 160
@@ -184,43 +186,27 @@ class AxisMapper(mekkaObject):
 		self.w.open()
 		self.w.makeKey()
 
-	def AxisListForFrontmostFont(self, sender=None):
+	def currentAxisModel(self, refresh=False):
+		# axes, masters and instances of the frontmost font, only read again if the font changed or refresh is requested:
 		thisFont = Glyphs.font
-		if thisFont:
-			axes = thisFont.axes
-			if axes:
-				return [a.axisTag for a in axes]
+		if thisFont is None:
+			self.axisModel, self.axisModelFont = None, None
+		elif refresh or self.axisModel is None or self.axisModelFont != thisFont:
+			self.axisModel, self.axisModelFont = fontAxisModel(thisFont, refresh=refresh), thisFont
+		return self.axisModel
+
+	def AxisListForFrontmostFont(self, sender=None):
+		axisModel = self.currentAxisModel(refresh=True)
+		if axisModel:
+			return list(axisModel.axisTags)
 		return ()
 
 	def allMasterValuesForAxisTag(self, sender=None, axisTag="wght"):
-		collectedValues = []
-		thisFont = Glyphs.font
-		if thisFont:
-			axes = thisFont.axes
-			if axes:
-				for axis in axes:
-					if axis.axisTag == axisTag:
-						collectedValues = []
-						for master in thisFont.masters:
-							axisLocationParameter = master.customParameters["Axis Location"]
-							axisValue = None
-
-							# prefer axis location parameter
-							if axisLocationParameter:
-								for location in axisLocationParameter:
-									if location.objectForKey_("Axis") == axis.name:
-										axisValue = location.objectForKey_("Location")
-
-							# default to native value if there is no axis location parameter:
-							if axisValue is None:
-								axisValue = masterValueForAxisTag(master, axisTag=axisTag)
-
-							if axisValue is not None:
-								collectedValues.append(float(axisValue))
-
-						return collectedValues
-
-		return collectedValues
+		# prefers Axis Location parameters, defaults to native values:
+		axisModel = self.currentAxisModel()
+		if axisModel:
+			return axisModel.userMasterValuesForAxisTag(axisTag)
+		return []
 
 	def MinimumForCurrentAxis(self, sender=None):
 		currentAxisTag = self.w.axisPicker.get()
@@ -239,10 +225,12 @@ class AxisMapper(mekkaObject):
 		return 100  # fallback value
 
 	def resetMinimum(self, sender=None):
+		self.currentAxisModel(refresh=True)
 		value = self.MinimumForCurrentAxis()
 		self.w.minValue.set(value)
 
 	def resetMaximum(self, sender=None):
+		self.currentAxisModel(refresh=True)
 		value = self.MaximumForCurrentAxis()
 		self.w.maxValue.set(value)
 
@@ -256,9 +244,9 @@ class AxisMapper(mekkaObject):
 		text = ""
 		font = Glyphs.font
 		axisTag = self.w.axisPicker.get()
-		if font and axisTag:
-			nativeMasterMin, nativeMasterMax = extremeMasterValuesNative(font, axisTag=axisTag)
-			nativeStyleMin, nativeStyleMax = extremeStyleValuesNative(font, axisTag=axisTag)
+		axisModel = self.currentAxisModel(refresh=True)
+		if font and axisTag and axisModel:
+			nativeMasterMin, nativeMasterMax = axisModel.extremeMasterValues(axisTag)
 
 			userMasterMin, userMasterMax = float(self.w.minValue.get()), float(self.w.maxValue.get())
 
@@ -267,20 +255,19 @@ class AxisMapper(mekkaObject):
 				userMasterMax: "%i -> %i  # Max" % (userMasterMax, userMasterMax),
 			}
 
-			for style in font.instances:
-				if style.active:
-					nativeValue = styleValueForAxisTag(style, axisTag=axisTag)
+			styleValues = axisModel.styleValuesForAxisTag(axisTag)
+			for styleName, nativeValue, active, weightClass in zip(axisModel.instanceNames, styleValues, axisModel.instanceActive, axisModel.instanceWeightClasses):
+				if active:
 					coeff = coefficient(nativeValue, nativeMasterMin, nativeMasterMax)
 					trueSliderValue = valueForCoefficient(coeff, userMasterMin, userMasterMax)
 					visibleSliderValue = trueSliderValue
 
 					# better guess for weight axis:
 					if axisTag == "wght":
-						weightClass = style.weightClassValue()
 						if userMasterMin <= weightClass <= userMasterMax:
 							visibleSliderValue = weightClass
 
-					mappingDict[visibleSliderValue] = "%i -> %i  # %s" % (visibleSliderValue, trueSliderValue, style.name)
+					mappingDict[visibleSliderValue] = "%i -> %i  # %s" % (visibleSliderValue, trueSliderValue, styleName)
 
 			for mappingValue in sorted(mappingDict.keys()):
 				line = mappingDict[mappingValue]
@@ -304,26 +291,23 @@ class AxisMapper(mekkaObject):
 			text = ""
 			axisTag = self.pref("axisPicker")
 			thisFont = Glyphs.font  # frontmost font
-			if thisFont:
-				mappings = thisFont.customParameters["Axis Mappings"]
-				if mappings:
-					axisMapping = mappings.objectForKey_(axisTag)
-					if axisMapping:
-						minValue = self.prefFloat("minValue")
-						maxValue = self.prefFloat("maxValue")
-						minValueNative, maxValueNative = extremeMasterValuesNative(thisFont, axisTag=axisTag)
-						for nativeUserValue in sorted(axisMapping.allKeys()):
-							nativeTargetValue = axisMapping.objectForKey_(nativeUserValue)
-
-							# user value:
-							coeff = coefficient(nativeUserValue, minValueNative, maxValueNative)
-							userValue = valueForCoefficient(coeff, minValue, maxValue)
-
-							# target value:
-							coeff = coefficient(nativeTargetValue, minValueNative, maxValueNative)
-							targetValue = valueForCoefficient(coeff, minValue, maxValue)
-
-							text += "%g -> %g  # native: %i -> %i\n" % (userValue, targetValue, nativeUserValue, nativeTargetValue)
+			axisModel = self.currentAxisModel(refresh=True)
+			if axisModel:
+				axisMapping = axisModel.axisMappings.get(axisTag)
+				if axisMapping:
+					minValue = self.prefFloat("minValue")
+					maxValue = self.prefFloat("maxValue")
+					minValueNative, maxValueNative = axisModel.extremeMasterValues(axisTag)
+					for nativeUserValue, nativeTargetValue in axisMapping:
+						# user value:
+						coeff = coefficient(nativeUserValue, minValueNative, maxValueNative)
+						userValue = valueForCoefficient(coeff, minValue, maxValue)
+
+						# target value:
+						coeff = coefficient(nativeTargetValue, minValueNative, maxValueNative)
+						targetValue = valueForCoefficient(coeff, minValue, maxValue)
+
+						text += "%g -> %g  # native: %i -> %i\n" % (userValue, targetValue, nativeUserValue, nativeTargetValue)
 			if text:
 				text += "\nBased on "
 				if thisFont.filepath:
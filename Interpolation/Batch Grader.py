@@ -7,6 +7,12 @@ Batch-add graded masters to a multiple-master setup.
 """
 
 import vanilla
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import tempfile
 import time
 import datetime
 from copy import copy
@@ -14,6 +20,8 @@ from Foundation import NSPoint, NSAutoreleasePool
 from AppKit import NSFont
 from GlyphsApp import Glyphs, GSLayer, GSAxis, GSInstance, GSCustomParameter, GSSMOOTH, GSOFFCURVE, Message
 from mekkablue import mekkaObject, UpdateButton
+from mekkablue.Paths.outlineChecks import pythonExecutable
+from interpolationModel import GlyphInterpolationModel, usableWeightsForInstance
 
 
 def biggestSubstringInStrings(strings):
@@ -127,6 +135,122 @@ def updateBraceLayers(font, defaultValue=0, newAxisTag=None, newAxisValue=None):
 			print(f"🦾 Updated {count} brace layer{'' if count == 1 else 's'} for ‘{glyph.name}’")
 
 
+fingerprintsKey = "com.mekkablue.BatchGrader.fingerprints"
+
+
+def layerFingerprint(layer):
+	"""Everything in a source layer that ends up in its graded layer: width, nodes, components, anchors, hints and brace coordinates."""
+	description = [layer.width]
+	if layer.isSpecialLayer and layer.attributes and layer.attributes["coordinates"]:
+		description.append(sorted((str(axisID), value) for axisID, value in dict(layer.attributes["coordinates"]).items()))
+	for path in layer.paths:
+		description.append((path.closed, tuple((node.position.x, node.position.y, node.type, node.connection) for node in path.nodes)))
+	for component in layer.components:
+		smartValues = component.smartComponentValues
+		description.append((
+			component.componentName,
+			tuple(component.transformStruct()),
+			tuple(sorted((str(k), v) for k, v in dict(smartValues).items())) if smartValues else (),
+		))
+	for anchor in layer.anchors:
+		description.append((anchor.name, anchor.position.x, anchor.position.y))
+	for hint in layer.hints:
+		description.append((hint.type, hint.name))
+	return description
+
+
+def glyphFingerprints(font, sourceMasterIDs):
+	"""
+	Hash for every glyph: its master and brace layers in the source masters, its metrics keys,
+	and (recursively) the hashes of the glyphs it uses as components. Changes whenever an edit
+	changes what the glyph interpolates to.
+	"""
+	fingerprints = {}
+
+	def fingerprint(glyph, seenNames):
+		if glyph.name in fingerprints:
+			return fingerprints[glyph.name]
+		seenNames = seenNames | {glyph.name}
+		description = [glyph.leftMetricsKey, glyph.rightMetricsKey, glyph.widthMetricsKey]
+		componentNames = set()
+		for layer in glyph.layers:
+			if layer.associatedMasterId not in sourceMasterIDs:
+				continue
+			if layer.layerId != layer.associatedMasterId and not layer.isSpecialLayer:
+				continue  # backup layer
+			description.append((layer.layerId, layerFingerprint(layer)))
+			componentNames.update(component.componentName for component in layer.components)
+		for componentName in sorted(componentNames):
+			componentGlyph = font.glyphs[componentName]
+			if componentGlyph and componentName not in seenNames:
+				description.append(fingerprint(componentGlyph, seenNames))
+		fingerprints[glyph.name] = hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+		return fingerprints[glyph.name]
+
+	for glyph in font.glyphs:
+		fingerprint(glyph, set())
+	return fingerprints
+
+
+def currentMemory():
+	# resident memory of the app right now, in bytes (ps reports kilobytes):
+	try:
+		output = subprocess.run(("ps", "-o", "rss=", "-p", str(os.getpid())), capture_output=True, text=True).stdout
+		return int(output.strip()) * 1024
+	except (OSError, ValueError):
+		return None
+
+
+def peakMemory():
+	# maximum resident memory of the app since it was launched, including earlier runs (ru_maxrss is in bytes on macOS):
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def memoryString(memory):
+	if memory is None:
+		return "?"
+	return f"{memory / 1024**3:.2f} GB"
+
+
+def glyphVectors(glyph, masterIDs):
+	"""
+	The master layers of a glyph as flat lists of numbers for gradeworker.py: node coordinates (from
+	GlyphInterpolationModel), anchor coordinates sorted by anchor name, and the width. None if the glyph
+	is not a weighted sum of its masters: components, brace layers, corner components, incompatible layers.
+	"""
+	model = GlyphInterpolationModel(glyph, masterIDs, useNumpy=False)
+	if model.problem is not None:
+		return None
+	layers = [glyph.layers[masterID] for masterID in masterIDs]
+	anchorNames = sorted(anchor.name for anchor in layers[0].anchors)
+	vectors = []
+	for masterIndex, layer in enumerate(layers):
+		if layer.components or sorted(anchor.name for anchor in layer.anchors) != anchorNames:
+			return None
+		vector = [value for position in model.coordinates[masterIndex] for value in position]
+		for anchorName in anchorNames:
+			position = layer.anchors[anchorName].position
+			vector.extend((position.x, position.y))
+		vector.append(layer.width)
+		vectors.append(vector)
+	return vectors
+
+
+def applyLayerVector(layer, vector):
+	# counterpart of glyphVectors(), the layer must have the structure of the master layers:
+	values = iter(vector)
+	for path in layer.paths:
+		for node in path.nodes:
+			x = next(values)
+			y = next(values)
+			node.position = NSPoint(x, y)
+	for anchorName in sorted(anchor.name for anchor in layer.anchors):
+		x = next(values)
+		y = next(values)
+		layer.anchors[anchorName].position = NSPoint(x, y)
+	layer.width = next(values)
+
+
 def axisIndexForTag(font, tag="wght"):
 	for i, a in enumerate(font.axes):
 		if a.axisTag == tag:
@@ -219,6 +343,8 @@ class BatchGrader(mekkaObject):
 		"keepCenteredGlyphsCentered": True,
 		"keepCenteredThreshold": 2,
 		"onlyCurrentGlyph": False,
+		"onlyChangedGlyphs": False,
+		"parallelInterpolation": False,
 		"addGradedBraceLayers": False,
 		"temporarilySwitchToDefaultInterpolation": True,
 	}
@@ -226,7 +352,7 @@ class BatchGrader(mekkaObject):
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 390
-		windowHeight = 260
+		windowHeight = 282
 		windowWidthResize = 1000  # user can resize width by this value
 		windowHeightResize = 1000  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -300,8 +426,14 @@ class BatchGrader(mekkaObject):
 		linePos += lineHeight
 
 		tooltipText = "Only apply to the current Glyph"
-		self.w.onlyCurrentGlyph = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Only apply to the current Glyph", value=False, callback=self.SavePreferences, sizeStyle="small")
+		self.w.onlyCurrentGlyph = vanilla.CheckBox((inset + 2, linePos, 200, 20), "Only apply to the current Glyph", value=False, callback=self.SavePreferences, sizeStyle="small")
 		self.w.onlyCurrentGlyph.getNSButton().setToolTip_(tooltipText)
+		self.w.onlyChangedGlyphs = vanilla.CheckBox((inset + 200, linePos, -inset, 20), "Only glyphs changed since last run", value=False, callback=self.SavePreferences, sizeStyle="small")
+		self.w.onlyChangedGlyphs.getNSButton().setToolTip_("Incremental grading: only regrades glyphs whose source layers (or components, or metrics keys) changed since the last run. The script keeps a fingerprint of each glyph in the font’s userData. If the recipe, the settings or the masters changed, all glyphs are regraded.")
+		linePos += lineHeight
+
+		self.w.parallelInterpolation = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Interpolate recipe lines in parallel processes", value=False, callback=self.SavePreferences, sizeStyle="small")
+		self.w.parallelInterpolation.getNSButton().setToolTip_("Exports the master outlines into a snapshot and interpolates all recipe lines at the same time, in worker processes running the Python of Glyphs. Glyphs with components, brace layers or corner components are still interpolated by Glyphs. The graded layers are written into the font one line after another. Timings and memory per line are reported in the Macro Window.")
 		linePos += lineHeight
 
 		linePos += 10
@@ -362,6 +494,7 @@ class BatchGrader(mekkaObject):
 				self.w.keepCenteredGlyphsCentered.get()
 				and self.w.keepCenteredGlyphsCentered.isEnabled()
 			)
+			self.w.onlyChangedGlyphs.enable(not self.w.onlyCurrentGlyph.get())
 
 	def openURL(self, sender=None):
 		URL = None
@@ -461,6 +594,54 @@ class BatchGrader(mekkaObject):
 		font.masters = masters
 		return font
 
+	def pruneFontToGlyphs(self, font, glyphNames):
+		# keep only the glyphs to be graded, and the glyphs they use as components:
+		needGlyphs = set()
+		for glyphName in glyphNames:
+			needGlyph = font.glyphs[glyphName]
+			if not needGlyph:
+				continue
+			needGlyphs.add(glyphName)
+			for master in font.masters:
+				componentNames = needGlyph.layers[master.id].componentNamesTraverseComponents_(True)
+				if componentNames:
+					needGlyphs.update(componentNames)
+		for glyph in list(font.glyphs):
+			if glyph.name not in needGlyphs:
+				font.removeGlyph_(glyph)
+
+	def settingsFingerprint(self, thisFont):
+		# grader settings and master setup, any change means all glyphs need to be regraded:
+		description = [
+			self.pref(prefName) for prefName in (
+				"graderCode",
+				"gradeAxisTag",
+				"grade",
+				"searchFor",
+				"replaceWith",
+				"excludeFromInterpolation",
+				"addSyncMetricCustomParameter",
+				"keepCenteredGlyphsCentered",
+				"keepCenteredThreshold",
+				"addGradedBraceLayers",
+				"temporarilySwitchToDefaultInterpolation",
+			)
+		]
+		description.append([axis.axisTag for axis in thisFont.axes])
+		description.append([(master.id, master.name, list(master.axes)) for master in thisFont.masters])
+		description.append(thisFont.fontType())
+		return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+	def changedGlyphNames(self, thisFont, fingerprints):
+		storedFingerprints = thisFont.userData[fingerprintsKey]
+		if not storedFingerprints or storedFingerprints["settings"] != self.settingsFingerprint(thisFont):
+			print("🔁 No fingerprints from a previous run with the same settings and masters, grading all glyphs.")
+			return None
+		storedGlyphFingerprints = storedFingerprints["glyphs"] or {}
+		changedGlyphNames = [glyph.name for glyph in thisFont.glyphs if storedGlyphFingerprints.get(glyph.name) != fingerprints[glyph.name]]
+		print(f"🔁 {len(changedGlyphNames)} of {len(thisFont.glyphs)} glyphs changed since the last run.")
+		return changedGlyphNames
+
 	def updateGradeAxis(self, thisFont):
 		# add or update Grade axis if necessary:
 		axisName = self.pref("axisName").strip()
@@ -501,7 +682,25 @@ class BatchGrader(mekkaObject):
 		gradeLayer.anchors = gradeLayerCopy.anchors
 		gradeLayer.hints = gradeLayerCopy.hints
 		gradeLayer.roundCoordinates()
+		self.cancelMetricsKeys(baseGlyph, gradeLayer)
 
+	def addGradeLayersFromVector(self, master, vector, gradeMaster, baseGlyph):
+		# like addGradeLayers(), but with the interpolated values from gradeworker.py:
+		baseLayer = baseGlyph.layers[master.id]
+		baseWidth = baseLayer.width
+		baseLayerCopy = baseLayer.copy()
+		gradeLayer = baseGlyph.layers[gradeMaster.id]
+		gradeLayer.shapes = baseLayerCopy.shapes
+		gradeLayer.anchors = baseLayerCopy.anchors
+		gradeLayer.hints = baseLayerCopy.hints
+		applyLayerVector(gradeLayer, vector)
+		straightenBCPs(gradeLayer)
+		if gradeLayer.width != baseWidth:
+			fitSidebearings(gradeLayer, targetWidth=baseWidth, left=0.5)
+		gradeLayer.roundCoordinates()
+		self.cancelMetricsKeys(baseGlyph, gradeLayer)
+
+	def cancelMetricsKeys(self, baseGlyph, gradeLayer):
 		# cancel out glyph metrics keys:
 		if baseGlyph.leftMetricsKey:
 			gradeLayer.leftMetricsKey = f"=={baseGlyph.name}"
@@ -587,33 +786,30 @@ class BatchGrader(mekkaObject):
 			thisFont.masters.append(gradeMaster)
 		return gradeMaster
 
-	def processCodeLine(self, codeLine, thisFont, fontWithoutGrades, grade, gradeAxisIdx, searchFor, replaceWith, keepCenteredGlyphsCentered, keepCenteredThreshold, onlyGlyphName, gradeCount):
-
-		pool = NSAutoreleasePool.alloc().init()
+	def parseCodeLine(self, codeLine, thisFont):
+		# returns the cleaned-up line, the base master, the axes of the weighted instance and the axis tags in the recipe
 		if "#" in codeLine:
 			codeLine = codeLine[: codeLine.find("#")]
 		codeLine = codeLine.strip()
 		if not codeLine:
-			return
+			return None
 
 		masterName, axes = codeLine.split(":")
 		masterName = masterName.strip()
 		master = thisFont.fontMasterForName_(masterName)
 		if not master:
 			print(f"⚠️ No master called ‘{masterName}’")
-			return
+			return None
 
 		if self.shouldExcludeMaster(master):
-			return
+			return None
 
 		weightedAxes = master.axes[:]
 		axisCodes = [a.strip() for a in axes.split(",") if "=" in a]
 		if not axisCodes:
 			print(f"⚠️ Could not parse: {codeLine}\n")
-			return
+			return None
 
-		gradeCount += 1
-		print(f"{gradeCount}. {codeLine}")
 		axesWithInfluence = []
 		for axisCode in axisCodes:
 			if "+=" in axisCode:
@@ -634,42 +830,225 @@ class BatchGrader(mekkaObject):
 			else:
 				weightedAxes[axisIdx] = (weightedAxes[axisIdx] + value * valueFactor)
 
-		subsettedFont = self.subsettedFontKeepAxes(fontWithoutGrades, weightedAxes, relevantAxes=axesWithInfluence)
-		# weighted instance/font: the shapes
+		return codeLine, master, weightedAxes, axesWithInfluence
+
+	def parseGradeLines(self, graderCode, thisFont):
+		# parse the recipe into grade lines, the fonts are staged later:
+		gradeLines = []
+		for codeLine in graderCode.splitlines():
+			parsedLine = self.parseCodeLine(codeLine, thisFont)
+			if not parsedLine:
+				continue
+			codeLine, master, weightedAxes, axesWithInfluence = parsedLine
+			gradeLines.append({
+				"number": len(gradeLines) + 1,
+				"codeLine": codeLine,
+				"master": master,
+				"weightedAxes": weightedAxes,
+				"axesWithInfluence": axesWithInfluence,
+				"subsettedFont": None,
+				"weightedFont": None,
+				"weights": None,
+				"vectors": None,
+			})
+		return gradeLines
+
+	def stageGradeLine(self, gradeLine, fontWithoutGrades, glyphNames=None):
+		# give the line its own subsetted copy of the font to interpolate in:
+		start = time.time()
+		gradeLine["subsettedFont"] = self.subsettedFontKeepAxes(fontWithoutGrades, gradeLine["weightedAxes"], relevantAxes=gradeLine["axesWithInfluence"])
+		if glyphNames is not None:
+			self.pruneFontToGlyphs(gradeLine["subsettedFont"], glyphNames)
+		gradeLine["stagingTime"] = time.time() - start
+
+	def interpolateGradeLine(self, gradeLine):
+		pool = NSAutoreleasePool.alloc().init()
+		start = time.time()
+		print(f"🛠️ Interpolating grade {gradeLine['number']}: {self.masterAxesString(gradeLine['master'])} → {', '.join(str(value) for value in gradeLine['weightedAxes'])}")
+		weightedInstance = GSInstance()
+		weightedInstance.font = gradeLine["subsettedFont"]
+		weightedInstance.name = "###DELETEME###"
+		weightedInstance.axes = gradeLine["weightedAxes"]
+		gradeLine["weightedFont"] = weightedInstance.interpolatedFont
+		gradeLine["subsettedFont"] = None  # not needed anymore, free memory
+		gradeLine["interpolationTime"] = time.time() - start
+		del pool
+
+	def gradeLineWeights(self, gradeLine, mastersOnlyFont):
+		# master weights of the line in its subsetted font, or None if the line is not a weighted sum of masters:
+		subsettedFont = self.subsettedFontKeepAxes(mastersOnlyFont, gradeLine["weightedAxes"], relevantAxes=gradeLine["axesWithInfluence"])
+		masterIDs = [master.id for master in subsettedFont.masters]
 		weightedInstance = GSInstance()
 		weightedInstance.font = subsettedFont
 		weightedInstance.name = "###DELETEME###"
-		weightedInstance.axes = weightedAxes
-		print(f"🛠️ Interpolating grade: {self.masterAxesString(weightedInstance)}")
-		weightedFont = weightedInstance.interpolatedFont
+		weightedInstance.axes = gradeLine["weightedAxes"]
+		weights = usableWeightsForInstance(weightedInstance, masterIDs)
+		if weights is None:
+			return None
+		return {masterID: weight for masterID, weight in zip(masterIDs, weights) if abs(weight) > 0.000001}
+
+	def interpolateGradeLinesInApp(self, gradeLines, fontWithoutGrades):
+		"""Stages and interpolates one line after another, so only one copy of the font is kept at a time. Yields the lines for writing."""
+		for gradeLine in gradeLines:
+			print(f"{gradeLine['number']}. {gradeLine['codeLine']}")
+			gradeLine["memoryBefore"] = currentMemory()
+			self.stageGradeLine(gradeLine, fontWithoutGrades)
+			self.interpolateGradeLine(gradeLine)
+			gradeLine["memoryAfterInterpolation"] = currentMemory()
+			yield gradeLine
+
+	def interpolateGradeLinesInWorkerProcesses(self, gradeLines, fontWithoutGrades, glyphNames, workerCount):
+		"""
+		Like interpolateGradeLinesInApp(), but exports the master outlines and interpolates all lines with gradeworker.py
+		in a process pool. Only glyphs that are not a weighted sum of their masters, and lines that are not a weighted sum
+		of masters, are interpolated by Glyphs, in the app. The Glyphs objects are only touched on the main thread.
+		"""
+		import gradeworker
+		python = pythonExecutable()
+		if not python:
+			print("⚠️ Could not find the Python interpreter of Glyphs, interpolating in the app. Install Python in Window > Plugin Manager > Modules.\n")
+			yield from self.interpolateGradeLinesInApp(gradeLines, fontWithoutGrades)
+			return
+
+		# master weights of every line, in copies of the font without glyphs:
+		start = time.time()
+		mastersOnlyFont = fontWithoutGrades.copy()
+		self.pruneFontToGlyphs(mastersOnlyFont, ())
+		fontMasterIDs = [master.id for master in fontWithoutGrades.masters]
+		snapshotMasterIDs = set()
+		for gradeLine in gradeLines:
+			weights = None
+			if gradeLine["master"].id in fontMasterIDs:
+				weights = self.gradeLineWeights(gradeLine, mastersOnlyFont)
+			gradeLine["weights"] = weights
+			if weights:
+				snapshotMasterIDs.update(weights.keys())
+				snapshotMasterIDs.add(gradeLine["master"].id)  # the shapes of the base master are written into the graded master
+		mastersOnlyFont = None
+		snapshotLines = [gradeLine for gradeLine in gradeLines if gradeLine["weights"]]
+		snapshotMasterIDs = [masterID for masterID in fontMasterIDs if masterID in snapshotMasterIDs]
+
+		# master outlines of all glyphs that are weighted sums of their masters:
+		if glyphNames is None:
+			gradeGlyphNames = [glyph.name for glyph in fontWithoutGrades.glyphs]
+		else:
+			gradeGlyphNames = [glyphName for glyphName in glyphNames if fontWithoutGrades.glyphs[glyphName]]
+		snapshotGlyphs = {}
+		if snapshotLines:
+			for glyphName in gradeGlyphNames:
+				vectors = glyphVectors(fontWithoutGrades.glyphs[glyphName], snapshotMasterIDs)
+				if vectors:
+					snapshotGlyphs[glyphName] = vectors
+		if not snapshotGlyphs:
+			print("⚠️ Nothing to interpolate in worker processes, interpolating in the app.\n")
+			yield from self.interpolateGradeLinesInApp(gradeLines, fontWithoutGrades)
+			return
+		appGlyphNames = [glyphName for glyphName in gradeGlyphNames if glyphName not in snapshotGlyphs]
+
+		snapshotPath = os.path.join(tempfile.gettempdir(), f"BatchGrader-{os.getpid()}.json.gz")
+		gradeworker.writeSnapshot(
+			{
+				"masters": snapshotMasterIDs,
+				"glyphs": snapshotGlyphs,
+				"lines": [{"number": gradeLine["number"], "weights": gradeLine["weights"]} for gradeLine in snapshotLines],
+			},
+			snapshotPath,
+		)
+		print(f"📦 Exported {len(snapshotGlyphs)} glyphs in {len(snapshotMasterIDs)} masters for {len(snapshotLines)} of {len(gradeLines)} recipe lines in {time.time() - start:.1f} s.")
+		if appGlyphNames:
+			print(f"🛠️ {len(appGlyphNames)} glyphs with components, brace layers, corner components or incompatible layers are interpolated in the app.")
+		print(f"⚙️ Interpolating in {workerCount} worker processes...\n")
+
+		# stderr goes into a temporary file, so warnings of the pool processes cannot fill a pipe nobody reads:
+		with tempfile.TemporaryFile(mode="w+") as errorFile:
+			process = subprocess.Popen((python, gradeworker.__file__, snapshotPath, "--workers", str(workerCount)), stdout=subprocess.PIPE, stderr=errorFile, text=True)
+			try:
+				for gradeLine in gradeLines:
+					print(f"{gradeLine['number']}. {gradeLine['codeLine']}")
+					gradeLine["memoryBefore"] = currentMemory()
+					gradeLine["stagingTime"] = 0.0
+					gradeLine["interpolationTime"] = 0.0
+					if not gradeLine["weights"]:
+						print("⚠️ Not a weighted sum of masters, interpolating in the app.")
+						self.stageGradeLine(gradeLine, fontWithoutGrades)
+						self.interpolateGradeLine(gradeLine)
+					else:
+						resultLine = process.stdout.readline()
+						if not resultLine:
+							process.wait()
+							errorFile.seek(0)
+							raise Exception("gradeworker.py failed:\n%s" % errorFile.read())
+						result = json.loads(resultLine)
+						gradeLine["vectors"] = result["glyphs"]
+						workerTime = result["seconds"]
+						if appGlyphNames:
+							self.stageGradeLine(gradeLine, fontWithoutGrades, glyphNames=appGlyphNames)
+							self.interpolateGradeLine(gradeLine)
+						gradeLine["interpolationTime"] += workerTime
+					gradeLine["memoryAfterInterpolation"] = currentMemory()
+					yield gradeLine
+				if process.wait() != 0:
+					errorFile.seek(0)
+					raise Exception("gradeworker.py failed:\n%s" % errorFile.read())
+			finally:
+				# cancelled before the end:
+				if process.poll() is None:
+					process.kill()
+					process.wait()
+				os.remove(snapshotPath)
+
+	def applyGradeLine(self, gradeLine, thisFont, grade, gradeAxisIdx, searchFor, replaceWith, keepCenteredGlyphsCentered, keepCenteredThreshold, glyphNames):
+		# writes the interpolated shapes into the graded master, always on the main thread
+		pool = NSAutoreleasePool.alloc().init()
+		start = time.time()
+		master = gradeLine["master"]
+		weightedFont = gradeLine["weightedFont"]
+		vectors = gradeLine.get("vectors") or {}
+		print(f"✍️ Writing grade layers for ‘{master.name}’")
 
 		# get the graded master
 		gradeMaster = self.gradeMaster(thisFont, master, grade, gradeAxisIdx, searchFor, replaceWith)
 
 		# add interpolated content to new (graded) layer of each glyph:
-		if onlyGlyphName:
-			baseGlyph = thisFont.glyphs[onlyGlyphName]
-			self.addGradeLayers(master, weightedFont, gradeMaster, baseGlyph)
+		if glyphNames is None:
+			baseGlyphs = thisFont.glyphs
 		else:
-			for baseGlyph in thisFont.glyphs:
+			baseGlyphs = [thisFont.glyphs[glyphName] for glyphName in glyphNames if thisFont.glyphs[glyphName]]
+		for baseGlyph in baseGlyphs:
+			vector = vectors.get(baseGlyph.name)
+			if vector is not None:
+				self.addGradeLayersFromVector(master, vector, gradeMaster, baseGlyph)
+			else:
 				self.addGradeLayers(master, weightedFont, gradeMaster, baseGlyph)
 
 		# recenter centered glyphs
 		# (in separate loop so we have all component references up to date from the previous loop)
 		if keepCenteredGlyphsCentered:
 			print("↔️ Recentering centered glyphs...")
-			for baseGlyph in thisFont.glyphs:
-				if onlyGlyphName and baseGlyph.name != onlyGlyphName:
-					continue
+			for baseGlyph in baseGlyphs:
 				baseLayer = baseGlyph.layers[master.id]
 				if abs(baseLayer.LSB - baseLayer.RSB) <= keepCenteredThreshold:
 					gradeLayer = baseGlyph.layers[gradeMaster.id]
 					offCenter = gradeLayer.RSB - gradeLayer.LSB
 					if abs(offCenter) > 1:
 						gradeLayer.applyTransform((1, 0, 0, 1, offCenter // 2, 0))
+		gradeLine["weightedFont"] = None  # not needed anymore, free memory
+		gradeLine["vectors"] = None
+		gradeLine["writingTime"] = time.time() - start
+		gradeLine["memoryAfterWriting"] = currentMemory()
 		print()
 		del pool
 
+	def reportGradeLines(self, gradeLines):
+		print("⏱️ Time per recipe line (staging + interpolation + writing), 📈 memory of the app before → after interpolation → after writing:")
+		for gradeLine in gradeLines:
+			print(
+				f"{gradeLine['number']}. ‘{gradeLine['master'].name}’: "
+				f"{gradeLine['stagingTime']:.1f} + {gradeLine['interpolationTime']:.1f} + {gradeLine['writingTime']:.1f} s, "
+				f"{memoryString(gradeLine['memoryBefore'])} → {memoryString(gradeLine['memoryAfterInterpolation'])} → {memoryString(gradeLine['memoryAfterWriting'])}"
+			)
+		print(f"📈 Process-wide peak memory of the app since launch: {memoryString(peakMemory())}")
+
 	def addGradedBraceLayers(self, thisFont, gradeAxis, grade):
 		if not self.pref("addGradedBraceLayers"):
 			return
@@ -729,14 +1108,21 @@ class BatchGrader(mekkaObject):
 			keepCenteredThreshold = self.prefInt("keepCenteredThreshold")
 			grade = self.prefInt("grade")
 			onlyCurrentGlyph = self.prefBool("onlyCurrentGlyph")
-			onlyGlyphName = None
+			onlyChangedGlyphs = self.prefBool("onlyChangedGlyphs") and not onlyCurrentGlyph
+			glyphNames = None  # all glyphs
 			if onlyCurrentGlyph:
 				layer = thisFont.currentTab.activeLayer()
 				if layer:
-					onlyGlyphName = layer.parent.name
+					glyphNames = [layer.parent.name]
+
+			# fingerprints of the source layers, for incremental grading:
+			fingerprints = None
+			if onlyChangedGlyphs:
+				sourceMasterIDs = set(master.id for master in thisFont.masters if master.axes[gradeAxisIdx] == 0)
+				fingerprints = glyphFingerprints(thisFont, sourceMasterIDs)
+				glyphNames = self.changedGlyphNames(thisFont, fingerprints)
 
 			# parse code and step through masters:
-			gradeCount = 0
 			graderCode = self.pref("graderCode").strip()
 
 			skipAxisIndexes = []
@@ -752,21 +1138,29 @@ class BatchGrader(mekkaObject):
 
 			fontWithoutGrades.kerning = None
 
-			needGlyphs = None
-			if onlyGlyphName and len(fontWithoutGrades.glyphs) > 100:
-				needGlyph = fontWithoutGrades.glyphs[onlyGlyphName]
-				layer = needGlyph.layers[fontWithoutGrades.masters[0].id]
-				needGlyphs = set()
-				componentNames = layer.componentNamesTraverseComponents_(True)
-				if componentNames:
-					needGlyphs.update(componentNames)
-				needGlyphs.add(onlyGlyphName)
-				for glyph in list(fontWithoutGrades.glyphs):
-					if glyph.name not in needGlyphs:
-						fontWithoutGrades.removeGlyph_(glyph)
+			if glyphNames and len(fontWithoutGrades.glyphs) > 100:
+				self.pruneFontToGlyphs(fontWithoutGrades, glyphNames)
 
-			for codeLine in graderCode.splitlines():
-				self.processCodeLine(codeLine, thisFont, fontWithoutGrades, grade, gradeAxisIdx, searchFor, replaceWith, keepCenteredGlyphsCentered, keepCenteredThreshold, onlyGlyphName, gradeCount)
+			if glyphNames is None or glyphNames:
+				gradeLines = self.parseGradeLines(graderCode, thisFont)
+				workerCount = min(len(gradeLines), os.cpu_count() or 1)
+				if self.prefBool("parallelInterpolation") and workerCount > 1:
+					interpolatedGradeLines = self.interpolateGradeLinesInWorkerProcesses(gradeLines, fontWithoutGrades, glyphNames, workerCount)
+				else:
+					interpolatedGradeLines = self.interpolateGradeLinesInApp(gradeLines, fontWithoutGrades)
+				# the graded layers are written on the main thread, one line after another:
+				for gradeLine in interpolatedGradeLines:
+					self.applyGradeLine(gradeLine, thisFont, grade, gradeAxisIdx, searchFor, replaceWith, keepCenteredGlyphsCentered, keepCenteredThreshold, glyphNames)
+				self.reportGradeLines(gradeLines)
+			else:
+				print("✅ Nothing to regrade.\n")
+
+			if fingerprints is not None:
+				# store after grading, so the settings fingerprint includes the graded masters:
+				thisFont.userData[fingerprintsKey] = {
+					"settings": self.settingsFingerprint(thisFont),
+					"glyphs": fingerprints,
+				}
 
 			# add missing axis locations if base master has axis locations:
 			self.addMissingAxisLocations(thisFont, gradeAxis)
@@ -90,6 +90,124 @@ def setBestStartPointForShape_withCompatibleShape_atItalicAngle_compatibleShapeI
 			break
 
 
+def shapeSignature(shape):
+	# what must be equal for two shapes to be interpolation-compatible
+	if isinstance(shape, GSPath):
+		return ("path", len(shape.nodes), shape.direction)
+	elif isinstance(shape, GSComponent):
+		return ("component", shape.componentName)
+	return (shape.__class__.__name__,)
+
+
+def layerShapeFingerprint(layer, nodePositions=False):
+	"""
+	Compact description of the shapes in a layer, read only once per layer:
+	a tuple of shape signatures (kind, node count and direction, or component name),
+	and a list of (x, y) point tuples per shape, relative to the layer bounds and compensated for the italic angle.
+	The points are the bounding box center, or with nodePositions=True, the nodes of each path.
+	"""
+	layerBounds = layer.bounds
+	layerX, layerY = layerBounds.origin.x, layerBounds.origin.y
+	layerWidth, layerHeight = layerBounds.size.width or 1.0, layerBounds.size.height or 1.0
+	italicSlope = math.tan(math.radians(layer.italicAngle))
+
+	def relativePosition(x, y):
+		return ((x - italicSlope * (y - layerY) - layerX) / layerWidth, (y - layerY) / layerHeight)
+
+	signatures, points = [], []
+	for shape in layer.shapes:
+		signatures.append(shapeSignature(shape))
+		if nodePositions and isinstance(shape, GSPath):
+			points.append(tuple(relativePosition(node.x, node.y) for node in shape.nodes))
+		else:
+			bounds = shape.bounds
+			points.append((relativePosition(bounds.origin.x + bounds.size.width / 2, bounds.origin.y + bounds.size.height / 2),))
+	return tuple(signatures), points
+
+
+def travelDistance(points, otherPoints):
+	# summed distance the points cover when interpolating between two compatible shapes
+	return sum(math.hypot(x - otherX, y - otherY) for (x, y), (otherX, otherY) in zip(points, otherPoints))
+
+
+def optimalAssignment(costs):
+	"""
+	Hungarian method (Kuhn-Munkres with potentials, O(n²m)) for a cost matrix with n <= m rows and columns.
+	Returns the column index assigned to each row, so that the sum of costs is minimal.
+	"""
+	rowCount = len(costs)
+	columnCount = len(costs[0]) if costs else 0
+	rowPotentials = [0.0] * (rowCount + 1)
+	columnPotentials = [0.0] * (columnCount + 1)
+	rowForColumn = [0] * (columnCount + 1)  # 1-based, 0 means unassigned
+	for row in range(1, rowCount + 1):
+		rowForColumn[0] = row
+		column = 0
+		minSlack = [float("inf")] * (columnCount + 1)
+		previousColumn = [0] * (columnCount + 1)
+		usedColumns = [False] * (columnCount + 1)
+		while True:
+			usedColumns[column] = True
+			currentRow = rowForColumn[column]
+			delta, nextColumn = float("inf"), 0
+			for j in range(1, columnCount + 1):
+				if not usedColumns[j]:
+					slack = costs[currentRow - 1][j - 1] - rowPotentials[currentRow] - columnPotentials[j]
+					if slack < minSlack[j]:
+						minSlack[j] = slack
+						previousColumn[j] = column
+					if minSlack[j] < delta:
+						delta, nextColumn = minSlack[j], j
+			for j in range(columnCount + 1):
+				if usedColumns[j]:
+					rowPotentials[rowForColumn[j]] += delta
+					columnPotentials[j] -= delta
+				else:
+					minSlack[j] -= delta
+			column = nextColumn
+			if rowForColumn[column] == 0:
+				break
+		# flip the augmenting path:
+		while column:
+			rowForColumn[column] = rowForColumn[previousColumn[column]]
+			column = previousColumn[column]
+
+	columnForRow = [None] * rowCount
+	for j in range(1, columnCount + 1):
+		if rowForColumn[j]:
+			columnForRow[rowForColumn[j] - 1] = j - 1
+	return columnForRow
+
+
+def matchedShapeOrder(referenceFingerprint, otherFingerprint):
+	"""
+	New order for the shapes of another layer, so that each shape ends up at the index of the compatible
+	reference shape it is closest to. Only shapes with the same signature are matched, with the optimal
+	assignment of their travel distances. Unmatched shapes are kept at the end, in their original order.
+	"""
+	referenceSignatures, referencePoints = referenceFingerprint
+	otherSignatures, otherPoints = otherFingerprint
+	matchedIndexes = [None] * len(referenceSignatures)
+	for signature in sorted(set(referenceSignatures), key=repr):
+		rows = [i for i, s in enumerate(referenceSignatures) if s == signature]
+		columns = [j for j, s in enumerate(otherSignatures) if s == signature]
+		if not columns:
+			continue
+		costs = [[travelDistance(referencePoints[i], otherPoints[j]) for j in columns] for i in rows]
+		if len(rows) <= len(columns):
+			for row, column in zip(rows, optimalAssignment(costs)):
+				matchedIndexes[row] = columns[column]
+		else:
+			transposedCosts = [list(costColumn) for costColumn in zip(*costs)]
+			for column, row in zip(columns, optimalAssignment(transposedCosts)):
+				matchedIndexes[rows[row]] = column
+
+	order = [index for index in matchedIndexes if index is not None]
+	matched = set(order)
+	order.extend(index for index in range(len(otherSignatures)) if index not in matched)
+	return order
+
+
 class CompatibilityManager:
 	def __init__(self):
 		self.w = FloatingWindow((400, 90), "Compatibility Manager")
@@ -240,84 +358,21 @@ class CompatibilityManager:
 		italicLayer.applyTransform(myTransform.transformStruct())
 		return italicLayer.bounds
 
-	def relativeNodePositions(self, path, rect, italicAngle=0.0):
-		layer = path.parent
-		# TODO
-		return ()
-
 	def reorderShapesByShortestTravel(self, glyph):
-		layers = [layer for layer in glyph.layers if layer.isMasterLayer or layer.isSpecialLayer]
-		firstLayer = layers[0]
-		firstLayerBounds = self.italicBoundsOfLayer(firstLayer)
-
-		for i, firstShape in enumerate(firstLayer.shapes):
-			firstCenter = self.bboxCenter(firstShape)
-			# firstNodes = self.relativeNodePositions(firstShape, firstLayerBounds, italicAngle=firstLayer.italicAngle)
-			for otherLayer in layers[1:]:
-				smallestDistance = float("inf")
-				matchedIndex = None
-				for j, otherShape in enumerate(otherLayer.shapes[i:]):
-					if self.compatible(firstShape, otherShape):
-						otherCenter = self.bboxCenter(otherShape)
-						currentDistance = self.dist(firstCenter, otherCenter)
-						if currentDistance < smallestDistance:
-							smallestDistance = currentDistance
-							matchedIndex = j
-				if matchedIndex is not None and matchedIndex > 0:
-					otherLayer.shapes.insert(i, otherLayer.shapes.pop(i + j))
+		# match the node positions of paths, so that the nodes move as little as possible
+		self.reorderShapesByMatchingFingerprints(glyph, nodePositions=True)
 
 	def reorderShapesByRelativeCenter(self, glyph):
-		layers = [layer for layer in glyph.layers if layer.isMasterLayer or layer.isSpecialLayer]
-		firstLayer = layers[0]
-		for i, firstShape in enumerate(firstLayer.shapes):
-			firstCenter = self.bboxCenter(firstShape)
-			for otherLayer in layers[1:]:
-				smallestDistance = float("inf")
-				matchedIndex = None
-				for j, otherShape in enumerate(otherLayer.shapes[i:]):
-					if self.compatible(firstShape, otherShape):
-						otherCenter = self.bboxCenter(otherShape)
-						currentDistance = self.dist(firstCenter, otherCenter)
-						if currentDistance < smallestDistance:
-							smallestDistance = currentDistance
-							matchedIndex = j
-				if matchedIndex is not None and matchedIndex > 0:
-					otherLayer.shapes.insert(i, otherLayer.shapes.pop(i + j))
-
-	def bboxCenter(self, shape):
-		bounds = shape.bounds
-		layer = shape.parent
-		glyph = layer.parent
-		italicAngle = layer.italicAngle
-
-		# Calculate the italic offset at the vertical center of the shape
-		italicOffset = math.tan(math.radians(italicAngle)) * (bounds.origin.y + bounds.size.height / 2 - layer.bounds.origin.y)
-
-		# Compensate x for the italic angle
-		xCenter = ((bounds.origin.x + bounds.size.width / 2 - italicOffset) - layer.bounds.origin.x) / layer.bounds.size.width
-		yCenter = (bounds.origin.y + bounds.size.height / 2 - layer.bounds.origin.y) / layer.bounds.size.height
-
-		return (xCenter, yCenter)
+		self.reorderShapesByMatchingFingerprints(glyph, nodePositions=False)
 
-	def compatible(self, shape1, shape2):
-		if shape1.__class__ != shape2.__class__:
-			return False
-
-		if isinstance(shape1, GSPath):
-			if shape1.direction != shape2.direction:
-				return False
-			if len(shape1.nodes) != len(shape2.nodes):
-				return False
-		elif isinstance(shape1, GSComponent):
-			if shape1.componentName != shape2.componentName:
-				return False
-
-		return True
-
-	def dist(self, center1, center2):
-		x1, y1 = center1
-		x2, y2 = center2
-		return math.hypot(x1 - x2, y1 - y2)
+	def reorderShapesByMatchingFingerprints(self, glyph, nodePositions=False):
+		layers = [layer for layer in glyph.layers if layer.isMasterLayer or layer.isSpecialLayer]
+		referenceFingerprint = layerShapeFingerprint(layers[0], nodePositions)
+		for otherLayer in layers[1:]:
+			order = matchedShapeOrder(referenceFingerprint, layerShapeFingerprint(otherLayer, nodePositions))
+			if order != list(range(len(order))):
+				shapes = list(otherLayer.shapes)
+				otherLayer.shapes = [shapes[index] for index in order]
 
 	def checkLayerCompatibility(self, layer):
 		glyph = layer.parent
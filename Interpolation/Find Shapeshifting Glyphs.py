@@ -8,6 +8,9 @@ Finds glyphs that change the number of visible shapes and countershapes while in
 import vanilla
 from GlyphsApp import Glyphs, GSInstance, Message
 from mekkablue import mekkaObject
+from interpolationCache import interpolationCache
+from interpolationModel import GlyphInterpolationModel, designSpaceForFont, DesignSpaceSampler
+from outlineTopology import OutlineTopology
 
 tempMarker = "###DELETEME###"
 
@@ -21,24 +24,12 @@ def instanceIsActive(instance):
 
 def glyphInterpolation(thisGlyphName, thisInstance):
 	"""
-	Yields a layer.
+	Yields a decomposed layer, rounded to the grid if necessary.
 	"""
 	try:
-		# calculate interpolation:
-		# interpolatedFont = thisInstance.interpolatedFont  # too slow still
-		interpolatedFont = thisInstance.pyobjc_instanceMethods.interpolatedFont()
-		interpolatedLayer = interpolatedFont.glyphForName_(thisGlyphName).layers[0]
-
-		# if interpolatedLayer.components:
-		# 	interpolatedLayer.decomposeComponents()
-
-		# round to grid if necessary:
-		if interpolatedLayer.paths:
-			if interpolatedFont.gridLength == 1.0:
-				interpolatedLayer.roundCoordinates()
-			return interpolatedLayer
-		else:
-			return interpolatedLayer
+		# calculate interpolation (shared with other scripts, returns a copy we can modify):
+		thisGlyph = thisInstance.font.glyphs[thisGlyphName]
+		return interpolationCache.interpolatedLayer(thisGlyph, thisInstance, roundToGrid=True, decompose=True)
 
 	except:
 		import traceback
@@ -78,8 +69,8 @@ class FindShapeshiftingGlyphs(mekkaObject):
 		linePos += int(lineHeight * 1.7)
 
 		self.w.text_1 = vanilla.TextBox((inset, linePos + 2, 85, 14), "Count paths in", sizeStyle='small')
-		self.w.checkInstances = vanilla.PopUpButton((inset + 85, linePos, -inset, 17), ("constructed instances midway between masters", "all active instances in font", "all active and inactive instances in font"), callback=self.SavePreferences, sizeStyle='small')
-		self.w.checkInstances.getNSPopUpButton().setToolTip_("Where to count paths (for comparison of path counts). Shapeshifting is most visible in midway interpolations (50%% between masters), so pick that option if you have two masters only, or all masters on a single axis.")
+		self.w.checkInstances = vanilla.PopUpButton((inset + 85, linePos, -inset, 17), ("constructed instances midway between masters", "all active instances in font", "all active and inactive instances in font", "the whole design space (from masters, fast)"), callback=self.SavePreferences, sizeStyle='small')
+		self.w.checkInstances.getNSPopUpButton().setToolTip_("Where to count paths (for comparison of path counts). Shapeshifting is most visible in midway interpolations (50%% between masters), so pick that option if you have two masters only, or all masters on a single axis. The design space option does not interpolate any instances: it compares path directions and overlaps on a grid across the whole design space, computed from the master outlines, and reports where the glyph changes. Glyphs with components, brace or bracket layers, corner components or incompatible masters are checked in midway instances instead.")
 		linePos += lineHeight
 
 		self.w.onlyCheckSelection = vanilla.CheckBox((inset + 2, linePos - 1, -inset, 20), "Limit to selected glyphs (otherwise all glyphs)", value=False, callback=self.SavePreferences, sizeStyle='small')
@@ -162,6 +153,28 @@ class FindShapeshiftingGlyphs(mekkaObject):
 				})
 				self.instances.append(testInstance)
 
+	def designSpaceSampler(self, thisFont, maxLocationCount=289):
+		# grid across the design space, with about maxLocationCount locations (e.g., 17 for one axis, 17×17 for two):
+		try:
+			designSpace = designSpaceForFont(thisFont)
+		except (ImportError, ValueError) as e:
+			print("⚠️ Cannot compute the design space (%s), checking midway instances instead." % e)
+			return None
+		gridCount = min(17, max(2, int(round(maxLocationCount ** (1.0 / max(1, designSpace.axisCount))))))
+		return DesignSpaceSampler(designSpace, [gridCount], refinements=0)
+
+	def shapeshiftsInDesignSpace(self, thisGlyph, masterIDs, sampler, roundToGrid):
+		"""
+		Topology changes of the glyph on the grid of the sampler, see OutlineTopology.shapeshifts().
+		None if Glyphs has to interpolate (and decompose) the glyph for counting its paths.
+		"""
+		model = GlyphInterpolationModel(thisGlyph, masterIDs)
+		if model.problem or model.unsupportedSegmentCount:
+			return None
+		if any(thisGlyph.layers[masterID].components for masterID in masterIDs):
+			return None
+		return OutlineTopology(model).shapeshifts(sampler, roundToGrid=roundToGrid)
+
 	def FindShapeshiftingGlyphsMain(self, sender):
 		try:
 			# query settings:
@@ -175,6 +188,7 @@ class FindShapeshiftingGlyphs(mekkaObject):
 
 			# Clear macro window log:
 			Glyphs.clearLog()
+			interpolationCache.resetStatistics()
 			if not openTab:
 				# brings macro window to front:
 				Glyphs.showMacroWindow()
@@ -213,8 +227,16 @@ class FindShapeshiftingGlyphs(mekkaObject):
 
 				# determine the instances to calculate:
 				self.instances = []
+				sampler = None
+				# 3: grid across the design space, midway instances only for glyphs that cannot be computed from the masters
+				if checkInstances == 3:
+					sampler = self.designSpaceSampler(thisFont)
+					if sampler:
+						print("Sampling %i locations (%s) across the design space.\n" % (sampler.locationCount, "×".join(str(count) for count in sampler.gridShape)))
+					alsoCheckMasters = True
+					self.addHalfWayInstances(thisFont)
 				# 0: constructed midway instances
-				if checkInstances == 0:
+				elif checkInstances == 0:
 					alsoCheckMasters = True
 					self.addHalfWayInstances(thisFont)
 				# 1: all active instances in font
@@ -227,7 +249,10 @@ class FindShapeshiftingGlyphs(mekkaObject):
 				if alsoCheckMasters:
 					self.addMasterInstances(thisFont)
 				# report:
-				print("Calculating %i instance interpolations:" % len(self.instances))
+				if sampler:
+					print("For glyphs that cannot be computed from the masters, calculating %i instance interpolations:" % len(self.instances))
+				else:
+					print("Calculating %i instance interpolations:" % len(self.instances))
 				for i in self.instances:
 					print("\n🅸 %s:" % i.name)
 					for key in i.instanceInterpolations.keys():
@@ -249,14 +274,23 @@ class FindShapeshiftingGlyphs(mekkaObject):
 					# tick the progress bar:
 					self.w.progress.set(oneFontPercentage * fontIndex + int(oneFontPercentage * (float(i) / numOfGlyphs)))
 
+					# compare path directions and overlaps across the design space:
+					if sampler:
+						shapeshifts = self.shapeshiftsInDesignSpace(thisFont.glyphs[thisGlyphName], [master.id for master in thisFont.masters], sampler, roundToGrid=thisFont.gridLength == 1)
+						if shapeshifts is not None:
+							if shapeshifts:
+								print("⚠️ %s:" % thisGlyphName)
+								for change, location in shapeshifts:
+									print("   %s near %s" % (change, sampler.designSpace.describeLocation(location)))
+								affectedGlyphNames.append(thisGlyphName)
+							continue
+
 					# collect number of paths for every instance:
 					pathCounts = []
 					for thisInstance in self.instances:
 						interpolation = glyphInterpolation(thisGlyphName, thisInstance)
 						if interpolation:
-							# only decompose and remove overlap when necessary, should speed things up:
-							if interpolation.components:
-								interpolation.decomposeComponents()
+							# only remove overlap when necessary, should speed things up:
 							if len(interpolation.paths) > 1:
 								interpolation.removeOverlap()
 							countOfCWPaths = len([p for p in interpolation.paths if p.direction == 1])
@@ -309,7 +343,7 @@ class FindShapeshiftingGlyphs(mekkaObject):
 					OKButton="🍻Cheers!",
 				)
 
-			print("%s\nDone." % message)
+			print("%s\n%s\nDone." % (message, interpolationCache.report()))
 
 			self.SavePreferences()
 
@@ -9,6 +9,7 @@ from Foundation import NSDictionary
 import vanilla
 from GlyphsApp import Glyphs, GSInstance, INSTANCETYPESINGLE
 from mekkablue import mekkaObject
+from axisMethods import fontAxisModel
 
 rangemin = 3
 rangemax = 11
@@ -134,6 +135,7 @@ class InstanceMaker(mekkaObject):
 	}
 
 	def __init__(self):
+		self.sampleKey = None  # inputs of the current sample text
 
 		# Window 'self.w':
 		windowWidth = 360
@@ -275,9 +277,9 @@ class InstanceMaker(mekkaObject):
 			try:
 				# GLYPHS 3:
 				if thisFont.axes:
-					weightAxisID = self.weightID(thisFont)
-					if weightAxisID:
-						MasterValues = sorted([m.axisValueValueForId_(weightAxisID) for m in thisFont.masters], key=lambda m: m * factor)
+					axisModel = fontAxisModel(thisFont)
+					weightAxisIndex = axisModel.axisIndex("wght") or 0  # default: first axis
+					MasterValues = sorted(axisModel.masterValuesForAxisTag(axisModel.axisTags[weightAxisIndex]), key=lambda m: m * factor)
 			except:
 				# GLYPHS 2:
 				import traceback
@@ -320,17 +322,22 @@ class InstanceMaker(mekkaObject):
 				numOfInstances = int(self.w.numberOfInstances.getItem())
 				availableInstanceNames = naturalNames[:-numOfInstances + 1]
 				numOfAvailableInstanceNames = len(availableInstanceNames)
-				self.w.firstName.setItems(availableInstanceNames)
+				if tuple(self.w.firstName.getItems()) != availableInstanceNames:
+					self.w.firstName.setItems(availableInstanceNames)
 				if not currentSelectionIndex < len(availableInstanceNames):
-					self.w.firstName.set(numOfAvailableInstanceNames - 1)
-				else:
+					currentSelectionIndex = numOfAvailableInstanceNames - 1
+				if self.w.firstName.get() != currentSelectionIndex:
 					self.w.firstName.set(currentSelectionIndex)
+					# store UI changes in defaults:
+					self.SavePreferences()
 				self.w.firstName.enable(True)
 			else:
 				self.w.firstName.enable(False)
 
-			# store UI changes in defaults:
-			self.SavePreferences()
+			# nothing to do if the sample does not change:
+			sampleKey = tuple(self.pref(key) for key in ("numberOfInstances", "prefix", "master1", "master2", "algorithm", "naturalNames", "firstName", "italicStyle", "shouldRound", "maciej", "maciej_light", "maciej_bold"))
+			if sampleKey == self.sampleKey:
+				return
 
 			if self.pref("shouldRound"):
 				rounding = 0
@@ -365,6 +372,7 @@ class InstanceMaker(mekkaObject):
 					sampleText += "\n\nWill add interpolationWeightY parameters to the respective instances: %s" % (", ".join(maciejList) + ".")
 
 			self.w.sample.text.set(sampleText)
+			self.sampleKey = sampleKey
 		except Exception as e:
 			print(e)
 
@@ -6,10 +6,14 @@ Finds kinks in interpolation space, reports them in the Macro window and opens a
 """
 
 import vanilla
+import re
+from timeit import default_timer as timer
 from Foundation import NSPoint
 from math import hypot
 from GlyphsApp import Glyphs, GSInstance, GSAnnotation, CIRCLE, GSSMOOTH, Message, subtractPoints
-from mekkablue import mekkaObject
+from mekkablue import mekkaObject, reportTimeInNaturalLanguage
+from interpolationCache import interpolationCache
+from interpolationModel import GlyphInterpolationModel, weightsForInstance, designSpaceForFont, DesignSpaceSampler
 
 tempMarker = "###DELETEME###"
 nodeMarker = "⛔️"
@@ -75,6 +79,9 @@ class KinkFinder(mekkaObject):
 		"reportIncompatibilities": 0,
 		"reportIncompatibilities": 0,
 		"reportIncompatibilities": 0,
+		"verifyInterpolation": 0,
+		"sampleGrid": "9×9×5",
+		"refineMaxima": 1,
 	}
 
 	instances = None
@@ -82,7 +89,7 @@ class KinkFinder(mekkaObject):
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 350
-		windowHeight = 265
+		windowHeight = 309
 		windowWidthResize = 100  # user can resize width by this value
 		windowHeightResize = 0  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -109,11 +116,19 @@ class KinkFinder(mekkaObject):
 			"in all current active instances",
 			"in all current active and inactive instances",
 			"in masters instead (not in interpolations)",
+			"anywhere in the design space (grid below)",
 		)
 		self.w.findKinksWhereText = vanilla.TextBox((inset, linePos + 2, 60, 14), "Find kinks", sizeStyle='small', selectable=True)
 		self.w.findKinksWhere = vanilla.PopUpButton((inset + 60, linePos, -inset, 17), self.findKinksWhereOptions, sizeStyle='small', callback=self.SavePreferences)
 		linePos += lineHeight
 
+		self.w.sampleGridText = vanilla.TextBox((inset, linePos + 2, 95, 14), "Design space grid:", sizeStyle='small', selectable=True)
+		self.w.sampleGrid = vanilla.EditText((inset + 95, linePos - 1, 60, 19), "9×9×5", sizeStyle='small', callback=self.SavePreferences)
+		self.w.sampleGrid.getNSTextField().setToolTip_("Number of locations per axis, in the order of the axes, e.g. 9×9×5 for three axes. If there are fewer numbers than axes, the last one is used for the remaining axes. Measured between the master extremes of each axis.")
+		self.w.refineMaxima = vanilla.CheckBox((inset + 165, linePos - 1, -inset, 20), "Refine around maxima", value=True, callback=self.SavePreferences, sizeStyle='small')
+		self.w.refineMaxima.getNSButton().setToolTip_("If checked, will take a closer look around the largest kinks on the grid, with ever smaller steps, and report the largest kink it finds there. Recommended, since kinks can peak between grid locations.")
+		linePos += lineHeight
+
 		# self.w.betweenAdjacentMastersOnly.getNSButton().setToolTip_("If checked, will look for kinks between masters 0+1, 1+2, 1+3, but NOT between 0+2, 1+3 or 0+3. Makes sense if you have only one axis (e.g. weight) and more than two masters in interpolation order (lightest through boldest).")
 
 		self.w.allGlyphs = vanilla.CheckBox((inset + 2, linePos - 1, -inset, 20), "Process all glyphs in font (ignore selection)", value=False, callback=self.SavePreferences, sizeStyle='small')
@@ -128,6 +143,10 @@ class KinkFinder(mekkaObject):
 		self.w.markKinks.getNSButton().setToolTip_("If checked, will mark affected nodes with a warning emoji and the maximum kink distance. Will mark the corresponding node in the first layer if it finds a kink in an instance. Will use an annotation if the node cannot be found (e.g. if the kink happens in a corner component).")
 		linePos += lineHeight
 
+		self.w.verifyInterpolation = vanilla.CheckBox((inset + 2, linePos - 1, -inset, 20), "Compare with interpolations by Glyphs (slow)", value=False, callback=self.SavePreferences, sizeStyle='small')
+		self.w.verifyInterpolation.getNSButton().setToolTip_("Kinks in interpolations are measured on a weighted sum of the master outlines, which is much faster than letting Glyphs interpolate every instance. If checked, will also let Glyphs interpolate every instance, and report where the node coordinates differ. For debugging only.")
+		linePos += lineHeight
+
 		self.w.reportIncompatibilities = vanilla.CheckBox((inset + 2, linePos - 1, 180, 20), "Also report incompatibilities", value=False, callback=self.SavePreferences, sizeStyle='small')
 		self.w.reportIncompatibilities.getNSButton().setToolTip_("If checked, will warn about incompatibilities. Usually you want this off, especially when you have bracket layers.")
 
@@ -156,6 +175,12 @@ class KinkFinder(mekkaObject):
 		# 2: in all current active instances
 		# 3: in all current active and inactive instances
 		# 4: in masters instead (not in interpolations)
+		# 5: anywhere in the design space (grid below)
+
+		sampleDesignSpace = self.pref("findKinksWhere") == 5
+		self.w.sampleGridText.enable(sampleDesignSpace)
+		self.w.sampleGrid.enable(sampleDesignSpace)
+		self.w.refineMaxima.enable(sampleDesignSpace)
 
 		if self.pref("findKinksWhere") == 4:
 			self.w.markKinks.setTitle("Mark kinky nodes")
@@ -171,22 +196,14 @@ class KinkFinder(mekkaObject):
 		# print "node nr.", kinkNode.index, "pos:", kinkNode.position, "handles:", kinkNode.prevNode.type, kinkNode.nextNode.type
 		return orthogonalDistance(kinkNode.position, kinkNode.prevNode.position, kinkNode.nextNode.position)
 
-	def glyphInterpolation(self, thisGlyphName, thisInstance):
+	def glyphInterpolation(self, thisGlyph, thisInstance, roundToGrid=True):
 		"""
-		Yields a layer.
+		Yields a layer (shared with other scripts, do not modify).
 		"""
 		try:
-			# calculate interpolation:
-			if Glyphs.versionNumber >= 3.2:
-				interpolatedFont = thisInstance.interpolatedFontProxy
-			else:
-				interpolatedFont = thisInstance.interpolatedFontProxy()
-			interpolatedLayer = interpolatedFont.glyphs[thisGlyphName].layers[0]
-
-			# round to grid if necessary:
-			if interpolatedLayer.paths:
-				if interpolatedFont.gridLength == 1.0:
-					interpolatedLayer.roundCoordinates()
+			# calculate interpolation, round to grid if necessary:
+			interpolatedLayer = interpolationCache.interpolatedLayer(thisGlyph, thisInstance, roundToGrid=roundToGrid)
+			if interpolatedLayer and interpolatedLayer.paths:
 				return interpolatedLayer
 			else:
 				return None
@@ -208,6 +225,21 @@ class KinkFinder(mekkaObject):
 			instance.setFont_(font)
 		return instance
 
+	def buildInstanceAtLocation(self, name, location, font):
+		instance = GSInstance()
+		if Glyphs.buildNumber > 3198:
+			instance.exports = False
+		else:
+			instance.active = False
+		instance.name = name
+		if Glyphs.versionNumber >= 3:  # GLYPHS 3
+			instance.axes = list(location)
+		else:
+			instance.weightValue, instance.widthValue, instance.customValue = location
+		if font:
+			instance.setFont_(font)
+		return instance
+
 	def buildHalfWayInstances(self, thisFont):
 		# 0: between all masters (false positives with 6+ masters)
 		# 1: between adjacent masters only (single axis, 3+ masters)
@@ -314,12 +346,133 @@ class KinkFinder(mekkaObject):
 		# no node found in paths, kinky node is likely in a corner component:
 		self.addAnnotationAtPosition(layer, position)
 
+	def findKinksInModel(self, thisGlyph, model, weightRows, roundToGrid, maxKink, kinkyGlyphNames):
+		"""Measures all smooth nodes in all instances in one go (see interpolationModel)."""
+		if not model.smoothIndexes:
+			return
+		kinkSizes = model.kinkSizes(weightRows, roundToGrid=roundToGrid)
+		firstMasterCoordinates = model.coordinatesForWeights(([1.0] + [0.0] * (len(model.masterIDs) - 1),), roundToGrid=roundToGrid)[0]
+		for column, flatIndex in enumerate(model.smoothIndexes):
+			pathIndex, nodeIndex = model.pathNodeIndexes[flatIndex]
+			x, y = firstMasterCoordinates[flatIndex]
+			thisNodeMaxKink = 0
+			for row, thisInstance in enumerate(self.instances):
+				thisKink = float(kinkSizes[row][column])
+
+				# kink is found:
+				if thisKink > maxKink:
+					kinkyGlyphNames.append(thisGlyph.name)
+					print(
+						"%s Kink in %s between masters %s, path %i, node %i: %.1f units (%.1f, %.1f)" % (
+							nodeMarker, thisGlyph.name, " and ".join(thisInstance.name.split("-")[:2]),
+							pathIndex, nodeIndex, thisKink, x, y
+						)
+					)
+
+					if self.pref("markKinks"):
+						if thisKink > thisNodeMaxKink:
+							thisNodeMaxKink = thisKink
+						nodeName = "%.1f %s" % (thisNodeMaxKink, nodeMarker)
+						self.markNodeAtPosition(thisGlyph.layers[0], NSPoint(x, y), nodeName)
+
+	def findLargestKinkInDesignSpace(self, thisGlyph, model, sampler, roundToGrid, maxKink, kinkyGlyphNames):
+		"""Reports the largest kink of the glyph on the design space grid. Returns its location, or None if there are no smooth nodes."""
+		result = sampler.largestKink(model, roundToGrid=roundToGrid)
+		if result is None:
+			return None
+		thisKink, location, column = result
+		flatIndex = model.smoothIndexes[column]
+		pathIndex, nodeIndex = model.pathNodeIndexes[flatIndex]
+		x, y = model.coordinatesForWeights(([1.0] + [0.0] * (len(model.masterIDs) - 1),), roundToGrid=roundToGrid)[0][flatIndex]
+		if thisKink > maxKink:
+			kinkyGlyphNames.append(thisGlyph.name)
+			print(
+				"%s Largest kink in %s at %s, path %i, node %i: %.1f units (%.1f, %.1f)" %
+				(nodeMarker, thisGlyph.name, sampler.designSpace.describeLocation(location), pathIndex, nodeIndex, thisKink, x, y)
+			)
+			if self.pref("markKinks"):
+				self.markNodeAtPosition(thisGlyph.layers[0], NSPoint(x, y), "%.1f %s" % (thisKink, nodeMarker))
+		else:
+			print("✅ Largest kink in %s at %s: %.1f units" % (thisGlyph.name, sampler.designSpace.describeLocation(location), thisKink))
+		return location
+
+	def compareModelWithGlyphsInterpolations(self, thisGlyph, model, weightRows, instances, tolerance=0.01):
+		"""Compares the (unrounded) node coordinates of the model with interpolations by Glyphs. Returns the number of comparisons and mismatches."""
+		comparisonCount = mismatchCount = 0
+		for weights, thisInstance in zip(weightRows, instances):
+			interpolatedLayer = self.glyphInterpolation(thisGlyph, thisInstance, roundToGrid=False)
+			if not interpolatedLayer:
+				continue
+			comparisonCount += 1
+			deviation = model.deviationFromLayer(weights, interpolatedLayer)
+			if deviation is None or deviation > tolerance:
+				mismatchCount += 1
+				print(
+					"❓ Interpolation mismatch in %s, %s: %s" % (
+						thisGlyph.name, thisInstance.name.replace(tempMarker, ""),
+						"different paths" if deviation is None else "nodes off by up to %.3f units" % deviation,
+					)
+				)
+		return comparisonCount, mismatchCount
+
+	def findKinksInGlyphsInterpolations(self, thisGlyph, firstInstance, maxKink, kinkyGlyphNames):
+		"""Lets Glyphs interpolate each instance, for glyphs that interpolationModel cannot handle."""
+		firstLayer = self.glyphInterpolation(thisGlyph, firstInstance)
+		if not firstLayer:
+			print("⚠️ Could not determine primary layer of %s, most likely cause: no paths." % thisGlyph.name)
+		else:
+			for pathIndex in range(len(firstLayer.paths)):
+				thisPath = firstLayer.paths[pathIndex]
+				for nodeIndex in range(len(thisPath.nodes)):
+					thisNode = thisPath.nodes[nodeIndex]
+					if thisNode.connection == GSSMOOTH:
+						thisNodeMaxKink = 0
+						for thisInstance in self.instances:
+							kinkLayer = self.glyphInterpolation(thisGlyph, thisInstance)
+							if not kinkLayer:
+								if self.pref("reportIncompatibilities"):
+									print(
+										"⚠️ ERROR: Could not calculate interpolation for: %s (%s)" %
+										(thisGlyph.name, thisInstance.name.replace(tempMarker, ""))
+									)
+							elif not thisGlyph.mastersCompatibleForLayers_((firstLayer, kinkLayer)):
+								if self.pref("reportIncompatibilities"):
+									print(
+										"⚠️ interpolation incompatible for glyph %s: %s (most likely cause: cap or corner components, bracket layers)" %
+										(thisGlyph.name, thisInstance.name.replace(tempMarker, ""))
+									)
+									print(firstLayer, firstLayer.shapes, firstLayer.anchors)
+									print(kinkLayer, kinkLayer.shapes, kinkLayer.anchors)
+							else:
+								kinkNode = kinkLayer.paths[pathIndex].nodes[nodeIndex]
+								thisKink = self.kinkSizeForNode(kinkNode)
+
+								# kink is found:
+								if thisKink > maxKink:
+									kinkyGlyphNames.append(thisGlyph.name)
+									print(
+										"%s Kink in %s between masters %s, path %i, node %i: %.1f units (%.1f, %.1f)" % (
+											nodeMarker, thisGlyph.name, " and ".join(thisInstance.name.split("-")[:2]),
+											pathIndex, nodeIndex, thisKink, thisNode.x, thisNode.y
+										)
+									)
+
+									if self.pref("markKinks"):
+										if thisKink > thisNodeMaxKink:
+											thisNodeMaxKink = thisKink
+										nodeName = "%.1f %s" % (thisNodeMaxKink, nodeMarker)
+										self.markNodeAtPosition(thisGlyph.layers[0], thisNode.position, nodeName)
+
+					elif self.pref("markKinks"):
+						thisNode.name = None
+
 	def KinkFinderMain(self, sender):
 		try:
 			self.SavePreferences()
 
 			# brings macro window to front and clears its log:
 			Glyphs.clearLog()
+			interpolationCache.resetStatistics()
 			if self.pref("bringMacroWindowToFront"):
 				Glyphs.showMacroWindow()
 
@@ -339,7 +492,22 @@ class KinkFinder(mekkaObject):
 
 			# prepare instances:
 			findKinksInMastersInstead = self.pref("findKinksWhere") == 4
-			if not findKinksInMastersInstead:
+			sampleDesignSpace = self.pref("findKinksWhere") == 5
+			masterIDs = [m.id for m in thisFont.masters]
+			roundToGrid = thisFont.gridLength == 1
+			startTime = timer()
+			if sampleDesignSpace:
+				try:
+					designSpace = designSpaceForFont(thisFont)
+				except (ImportError, ValueError) as e:
+					print("⚠️ Cannot compute the design space (%s), checking midway instances instead.\n" % e)
+					sampleDesignSpace = False
+			if sampleDesignSpace:
+				gridCounts = [int(count) for count in re.findall(r"\d+", self.pref("sampleGrid"))]
+				sampler = DesignSpaceSampler(designSpace, gridCounts, refinements=3 if self.pref("refineMaxima") else 0)
+				print("Sampling %i locations (%s) across the design space.\n" % (sampler.locationCount, "×".join(str(count) for count in sampler.gridShape)))
+				firstInstance = None
+			elif not findKinksInMastersInstead:
 				self.buildHalfWayInstances(thisFont)
 
 				# instance for first layer:
@@ -348,8 +516,12 @@ class KinkFinder(mekkaObject):
 				}
 				firstInstanceName = "First Master-%s" % tempMarker
 				firstInstance = self.buildInstance(firstInstanceName, firstInstanceInterpolationDict, thisFont)
+
+				# master weights of the instances, for interpolating with a weighted sum:
+				weightRows = [weightsForInstance(thisInstance, masterIDs) for thisInstance in self.instances]
 			else:
 				firstInstance = None
+			comparedInstances = interpolationMismatches = 0
 
 			skippedGlyphNames = []
 			numOfGlyphs = len(glyphsToProbe)
@@ -390,67 +562,57 @@ class KinkFinder(mekkaObject):
 													if self.pref("markKinks"):
 														kinkNode.name = "%.1f %s" % (thisKink, nodeMarker)
 
-					# TODO find kinks in interpolations (needs rewrite):
+					# find the largest kink anywhere in the design space:
+					elif sampleDesignSpace:
+						if not thisGlyph.layers[0].paths:
+							skippedGlyphNames.append(thisGlyph.name)
+						else:
+							model = GlyphInterpolationModel(thisGlyph, masterIDs)
+							if model.problem:
+								print("⚠️ Cannot sample %s: %s." % (thisGlyph.name, model.problem))
+								skippedGlyphNames.append(thisGlyph.name)
+							else:
+								location = self.findLargestKinkInDesignSpace(thisGlyph, model, sampler, roundToGrid, maxKink, kinkyGlyphNames)
+								if location and self.pref("verifyInterpolation"):
+									locationInstance = self.buildInstanceAtLocation("%s-%s" % (sampler.designSpace.describeLocation(location), tempMarker), location, thisFont)
+									weightRows = [sampler.designSpace.weightsForLocation(location)]
+									comparisonCount, mismatchCount = self.compareModelWithGlyphsInterpolations(thisGlyph, model, weightRows, [locationInstance])
+									comparedInstances += comparisonCount
+									interpolationMismatches += mismatchCount
+
+					# find kinks in interpolations:
 					else:
 						if not thisGlyph.layers[0].paths:
 							skippedGlyphNames.append(thisGlyph.name)
 						else:
-							firstLayer = self.glyphInterpolation(thisGlyph.name, firstInstance)
-							if not firstLayer:
-								print("⚠️ Could not determine primary layer of %s, most likely cause: no paths." % thisGlyph.name)
+							model = GlyphInterpolationModel(thisGlyph, masterIDs)
+							if model.problem:
+								# let Glyphs interpolate (slow):
+								if self.pref("reportIncompatibilities"):
+									print("⚠️ %s: %s, interpolating with Glyphs instead." % (thisGlyph.name, model.problem))
+								self.findKinksInGlyphsInterpolations(thisGlyph, firstInstance, maxKink, kinkyGlyphNames)
 							else:
-								for pathIndex in range(len(firstLayer.paths)):
-									thisPath = firstLayer.paths[pathIndex]
-									for nodeIndex in range(len(thisPath.nodes)):
-										thisNode = thisPath.nodes[nodeIndex]
-										if thisNode.connection == GSSMOOTH:
-											thisNodeMaxKink = 0
-											for thisInstance in self.instances:
-												kinkLayer = self.glyphInterpolation(thisGlyph.name, thisInstance)
-												if not kinkLayer:
-													if self.pref("reportIncompatibilities"):
-														print(
-															"⚠️ ERROR: Could not calculate interpolation for: %s (%s)" %
-															(thisGlyph.name, thisInstance.name.replace(tempMarker, ""))
-														)
-												elif not thisGlyph.mastersCompatibleForLayers_((firstLayer, kinkLayer)):
-													if self.pref("reportIncompatibilities"):
-														print(
-															"⚠️ interpolation incompatible for glyph %s: %s (most likely cause: cap or corner components, bracket layers)" %
-															(thisGlyph.name, thisInstance.name.replace(tempMarker, ""))
-														)
-														print(firstLayer, firstLayer.shapes, firstLayer.anchors)
-														print(kinkLayer, kinkLayer.shapes, kinkLayer.anchors)
-												else:
-													kinkNode = kinkLayer.paths[pathIndex].nodes[nodeIndex]
-													thisKink = self.kinkSizeForNode(kinkNode)
-
-													# kink is found:
-													if thisKink > maxKink:
-														kinkyGlyphNames.append(thisGlyph.name)
-														print(
-															"%s Kink in %s between masters %s, path %i, node %i: %.1f units (%.1f, %.1f)" % (
-																nodeMarker, thisGlyph.name, " and ".join(thisInstance.name.split("-")[:2]),
-																pathIndex, nodeIndex, thisKink, thisNode.x, thisNode.y
-															)
-														)
-
-														if self.pref("markKinks"):
-															if thisKink > thisNodeMaxKink:
-																thisNodeMaxKink = thisKink
-															nodeName = "%.1f %s" % (thisNodeMaxKink, nodeMarker)
-															self.markNodeAtPosition(thisGlyph.layers[0], thisNode.position, nodeName)
-
-										elif self.pref("markKinks"):
-											thisNode.name = None
+								self.findKinksInModel(thisGlyph, model, weightRows, roundToGrid, maxKink, kinkyGlyphNames)
+								if self.pref("verifyInterpolation"):
+									comparisonCount, mismatchCount = self.compareModelWithGlyphsInterpolations(thisGlyph, model, weightRows, self.instances)
+									comparedInstances += comparisonCount
+									interpolationMismatches += mismatchCount
 				else:
 					skippedGlyphNames.append(thisGlyph.name)
 
 			# Progress bar 100%
 			self.w.progress.set(100.0)
 
+			if self.pref("verifyInterpolation") and not findKinksInMastersInstead:
+				print("\nCompared %i interpolations with Glyphs: %i mismatch%s." % (comparedInstances, interpolationMismatches, "" if interpolationMismatches == 1 else "es"))
+
+			if sampleDesignSpace:
+				print("\nSampled the design space of %i glyphs in %s." % (numOfGlyphs, reportTimeInNaturalLanguage(timer() - startTime)))
+
 			if skippedGlyphNames:
 				print("\nSkipped %i glyphs:\n%s" % (len(skippedGlyphNames), ", ".join(skippedGlyphNames)))
+			if interpolationCache.reused or interpolationCache.interpolated:
+				print("\n%s" % interpolationCache.report())
 			uniqueKinkyGlyphNames = set(kinkyGlyphNames)
 
 			if kinkyLayers:
@@ -7,8 +7,11 @@ Goes through all interpolations and finds segments shorter than a user-specified
 
 import vanilla
 from Foundation import NSPoint
-from GlyphsApp import Glyphs, GSAnnotation, TEXT, Message, distance
+from GlyphsApp import Glyphs, GSAnnotation, GSOFFCURVE, TEXT, Message
 from mekkablue import mekkaObject
+from interpolationCache import interpolationCache
+from interpolationModel import GlyphInterpolationModel, usableWeightsForInstance
+from bezierLengths import segmentNodeIndexes, asCubic, cubicLengths, cubicMiddles
 
 tempMarker = "###DELETEME###"
 nodeMarker = "👌🏻"
@@ -18,6 +21,7 @@ class ShortSegmentFinder(mekkaObject):
 	prefDict = {
 		"minSegmentLength": 10.0,
 		"findShortSegmentsInMasters": 0,
+		"fastInterpolations": 0,
 		"allGlyphs": 0,
 		"exportingOnly": 1,
 		"reportIncompatibilities": 0,
@@ -28,7 +32,7 @@ class ShortSegmentFinder(mekkaObject):
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 350
-		windowHeight = 280
+		windowHeight = 302
 		windowWidthResize = 100  # user can resize width by this value
 		windowHeightResize = 0  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -54,6 +58,10 @@ class ShortSegmentFinder(mekkaObject):
 		self.w.findShortSegmentsInMasters.getNSButton().setToolTip_("If checked, will not calculate interpolations, but only measure segments in your master drawings, bracket and brace layers.")
 		linePos += lineHeight
 
+		self.w.fastInterpolations = vanilla.CheckBox((inset + 2, linePos - 1, -inset, 20), "Fast: measure interpolations without removing overlaps", value=False, callback=self.SavePreferences, sizeStyle='small')
+		self.w.fastInterpolations.getNSButton().setToolTip_("If checked, computes the segments of all instances at once from the master coordinates, instead of letting Glyphs interpolate and remove overlaps for every instance. Much faster, but will not find short segments that only appear after removing overlaps. Glyphs with brace or bracket layers, corner components or incompatible masters, and variable instances or instances whose master weights do not add up to 100%, are still interpolated by Glyphs.")
+		linePos += lineHeight
+
 		self.w.allGlyphs = vanilla.CheckBox((inset + 2, linePos - 1, -inset, 20), "Process all glyphs in font (i.e., ignore selection)", value=False, callback=self.SavePreferences, sizeStyle='small')
 		self.w.allGlyphs.getNSButton().setToolTip_("If unchecked, will only process the currently selected glyph(s).")
 		linePos += lineHeight
@@ -93,6 +101,7 @@ class ShortSegmentFinder(mekkaObject):
 		self.updateUI(None)
 
 	def updateUI(self, sender):
+		self.w.fastInterpolations.enable(not self.pref("findShortSegmentsInMasters"))
 		if self.pref("findShortSegmentsInMasters"):
 			self.w.markSegments.setTitle("Mark short segments 👌🏻")
 		else:
@@ -103,92 +112,73 @@ class ShortSegmentFinder(mekkaObject):
 		else:
 			self.w.runButton.setTitle("Find Segments")
 
-	def approxLengthOfSegment(self, segment):
-		try:
-			if len(segment) == 2:
-				if Glyphs.versionNumber >= 3:
-					# Glyphs 3 code
-					p0, p1 = [p for p in segment]
-				else:
-					# Glyphs 2 code
-					p0, p1 = [p.pointValue() for p in segment]
-				return ((p1.x - p0.x)**2 + (p1.y - p0.y)**2)**0.5
-			elif len(segment) == 4:
-				if Glyphs.versionNumber >= 3:
-					# Glyphs 3 code
-					p0, p1, p2, p3 = [p for p in segment]
-				else:
-					# Glyphs 2 code
-					p0, p1, p2, p3 = [p.pointValue() for p in segment]
-				chord = distance(p0, p3)
-				cont_net = distance(p0, p1) + distance(p1, p2) + distance(p2, p3)
-				return (cont_net + chord) * 0.5 * 0.996767352316
-			else:
-				return "Segment has unexpected point constellation (note: TT is not supported):\n    %s" % repr(segment)
-		except Exception as e:  # noqa: F841
-			print("SEGMENT:", segment)
-			try:
-				print("SEGMENT LENGTH:", len(segment))
-			except:
-				pass
-			import traceback
-			print(traceback.format_exc())
-			return "Possible single-node path."
-
-	def bezier(self, p1, p2, p3, p4, t):
-		x1, y1 = p1.x, p1.y
-		x2, y2 = p2.x, p2.y
-		x3, y3 = p3.x, p3.y
-		x4, y4 = p4.x, p4.y
-		x = x1 * (1 - t)**3 + x2 * 3 * t * (1 - t)**2 + x3 * 3 * t**2 * (1 - t) + x4 * t**3
-		y = y1 * (1 - t)**3 + y2 * 3 * t * (1 - t)**2 + y3 * 3 * t**2 * (1 - t) + y4 * t**3
-		return NSPoint(x, y)
-
-	def segmentMiddle(self, segment):
-		if len(segment) == 2:
-			p0, p1 = segment
-			return NSPoint((p0.x + p1.x) * 0.5, (p0.y + p1.y) * 0.5)
-		elif len(segment) == 4:
-			p0, p1, p2, p3 = segment
-			return self.bezier(p0, p1, p2, p3, 0.5)
-		else:
-			print("Segment has unexpected length:\n" + segment)
-			return None
-
-	def segmentsInLayerShorterThan(self, thisLayer, minLength=10.0):
-		shortSegments = []
+	def shortSegmentsInCubics(self, cubicSegments, minLength, lengths=None):
+		# returns (length, middle) of all segments shorter than minLength, measured in one go
+		if lengths is None:
+			lengths = cubicLengths(cubicSegments)
+		shortSegments = [(float(length), segment) for length, segment in zip(lengths, cubicSegments) if length < minLength]
+		middles = cubicMiddles([segment for length, segment in shortSegments])
+		return [(length, NSPoint(x, y)) for (length, segment), (x, y) in zip(shortSegments, middles)]
+
+	def segmentsInLayerShorterThan(self, thisLayer, minLength=10.0, glyphName=None):
+		glyphName = glyphName or thisLayer.parent.name
+		cubicSegments = []
 		for thisPath in thisLayer.paths:
-			nodeCount = len(thisPath.nodes)
+			nodes = thisPath.nodes
+			nodeCount = len(nodes)
 			if not nodeCount > 2:
 				print("⚠️ WARNING: path with only %i point%s in %s (layer: %s). Skipping." % (
 					nodeCount,
 					"" if nodeCount == 1 else "s",
-					thisLayer.parent.name,
+					glyphName,
 					thisLayer.name,
 				))
 			else:
-				for thisSegment in thisPath.segments:
-					segmentLength = self.approxLengthOfSegment(thisSegment)
-					if isinstance(segmentLength, (int, float)):
-						if segmentLength < minLength:
-							shortSegments.append(thisSegment)
-					else:
-						print("😬 ERROR in %s (layer: %s): %s" % (thisLayer.parent.name, thisLayer.name, segmentLength))
-		return shortSegments
+				points = [(node.position.x, node.position.y) for node in nodes]
+				segments, unsupportedCount = segmentNodeIndexes([node.type == GSOFFCURVE for node in nodes], closed=thisPath.closed)
+				if unsupportedCount:
+					print("😬 ERROR in %s (layer: %s): %i segment%s with unexpected point constellation (note: TT is not supported)." % (
+						glyphName,
+						thisLayer.name,
+						unsupportedCount,
+						"" if unsupportedCount == 1 else "s",
+					))
+				cubicSegments.extend([points[index] for index in asCubic(segment)] for segment in segments)
+		return self.shortSegmentsInCubics(cubicSegments, minLength)
+
+	def shortSegmentsInInstances(self, thisGlyph, thisFont, minLength):
+		"""
+		Short segments in all instances at once, computed from the master coordinates
+		(without removing overlaps): one list of (length, middle) per instance.
+		None if Glyphs needs to interpolate the glyph (see GlyphInterpolationModel.problem),
+		and None in place of the list for instances without usable master weights (see usableWeightsForInstance).
+		"""
+		masterIDs = [master.id for master in thisFont.masters]
+		model = GlyphInterpolationModel(thisGlyph, masterIDs)
+		if model.problem or model.unsupportedSegmentCount or not model.segments:
+			return None
+		weightRows = [usableWeightsForInstance(instance, masterIDs) for instance in thisFont.instances]
+		usableIndexes = [index for index, weights in enumerate(weightRows) if weights is not None]
+		if not usableIndexes:
+			return None
+		segmentPoints = model.segmentPoints([weightRows[index] for index in usableIndexes], roundToGrid=thisFont.gridLength == 1)
+		if model.usesNumpy:
+			lengths = cubicLengths(segmentPoints)  # all instances in one call
+		else:
+			lengths = [cubicLengths(instancePoints) for instancePoints in segmentPoints]
+		instanceShortSegments = [None] * len(weightRows)
+		for index, instancePoints, instanceLengths in zip(usableIndexes, segmentPoints, lengths):
+			instanceShortSegments[index] = self.shortSegmentsInCubics(instancePoints, minLength, instanceLengths)
+		return instanceShortSegments
 
-	def glyphInterpolation(self, thisGlyphName, thisInstance):
+	def glyphInterpolation(self, thisGlyph, thisInstance):
 		"""
-		Yields a layer.
+		Yields a layer (a copy that may be modified), rounded to the grid if necessary.
 		"""
 		try:
-			# calculate interpolation:
-			interpolatedFont = thisInstance.pyobjc_instanceMethods.interpolatedFont()
-			interpolatedLayer = interpolatedFont.glyphForName_(thisGlyphName).layers[0]
-
-			# round to grid if necessary:
-			if interpolatedLayer.paths:
-				if interpolatedFont.gridLength == 1.0:
-					interpolatedLayer.roundCoordinates()
+			# calculate interpolation (shared with other scripts):
+			interpolatedLayer = interpolationCache.interpolatedLayer(thisGlyph, thisInstance, roundToGrid=True, copy=True)
+			if interpolatedLayer and interpolatedLayer.paths:
 				return interpolatedLayer
 			else:
 				return None
@@ -229,6 +219,7 @@ class ShortSegmentFinder(mekkaObject):
 
 			# brings macro window to front and clears its log:
 			Glyphs.clearLog()
+			interpolationCache.resetStatistics()
 			if self.pref("bringMacroWindowToFront"):
 				Glyphs.showMacroWindow()
 			# print(">> DEBUG CHECKPOINT 1")###DEBUG-DELETE LATER
@@ -293,21 +284,18 @@ class ShortSegmentFinder(mekkaObject):
 									# mark in canvas if required:
 									if self.pref("markSegments"):
 										# print(">> DEBUG CHECKPOINT 13")###DEBUG-DELETE LATER
-										for shortSegment in shortSegments:
-											# print(">> DEBUG CHECKPOINT 14")###DEBUG-DELETE LATER
-											middleOfSegment = self.segmentMiddle(shortSegment)
-											if not middleOfSegment:
-												print(
-													"⛔️ ERROR in %s, layer '%s'. Could not calculate center of segment:\n  %s" %
-													(thisGlyph.name, currentLayer.name, repr(shortSegment))
-												)
-											else:
-												annotationText = "↙︎%s %.1f" % (nodeMarker, self.approxLengthOfSegment(shortSegment))
-												self.addAnnotationTextAtPosition(currentLayer, middleOfSegment, annotationText)
+										for segmentLength, middleOfSegment in shortSegments:
+											annotationText = "↙︎%s %.1f" % (nodeMarker, segmentLength)
+											self.addAnnotationTextAtPosition(currentLayer, middleOfSegment, annotationText)
 
 					# find segments in interpolations:
 					else:
-						for thisInstance in thisFont.instances:
+						# all instances at once, from the master coordinates:
+						instanceShortSegments = None
+						if self.pref("fastInterpolations"):
+							instanceShortSegments = self.shortSegmentsInInstances(thisGlyph, thisFont, minLength)
+
+						for instanceIndex, thisInstance in enumerate(thisFont.instances):
 							# print(">> DEBUG CHECKPOINT 15")###DEBUG-DELETE LATER
 							# define instance name
 							instanceName = thisInstance.name.strip()
@@ -316,46 +304,42 @@ class ShortSegmentFinder(mekkaObject):
 								# print(">> DEBUG CHECKPOINT 16")###DEBUG-DELETE LATER
 								instanceName = "%s %s" % (familyName, instanceName)
 
-							# interpolate glyph for this instance:
-							interpolatedLayer = self.glyphInterpolation(thisGlyph.name, thisInstance)
-							if not interpolatedLayer:
-								# print(">> DEBUG CHECKPOINT 17")###DEBUG-DELETE LATER
-								if self.pref("reportIncompatibilities"):
-									# print(">> DEBUG CHECKPOINT 18")###DEBUG-DELETE LATER
-									print("⚠️ %s: No paths in '%s'." % (thisGlyph.name, instanceName))
+							if instanceShortSegments is not None and instanceShortSegments[instanceIndex] is not None:
+								shortSegments = instanceShortSegments[instanceIndex]
 							else:
+								# interpolate glyph for this instance:
+								interpolatedLayer = self.glyphInterpolation(thisGlyph, thisInstance)
+								if not interpolatedLayer:
+									# print(">> DEBUG CHECKPOINT 17")###DEBUG-DELETE LATER
+									if self.pref("reportIncompatibilities"):
+										# print(">> DEBUG CHECKPOINT 18")###DEBUG-DELETE LATER
+										print("⚠️ %s: No paths in '%s'." % (thisGlyph.name, instanceName))
+									continue
 								interpolatedLayer.removeOverlap()
 								# print(">> DEBUG CHECKPOINT 19")###DEBUG-DELETE LATER
-								shortSegments = self.segmentsInLayerShorterThan(interpolatedLayer, minLength)
+								shortSegments = self.segmentsInLayerShorterThan(interpolatedLayer, minLength, glyphName=thisGlyph.name)
 								# print(">> DEBUG CHECKPOINT 20")###DEBUG-DELETE LATER
 
-								if shortSegments:
-									# print(">> DEBUG CHECKPOINT 21")###DEBUG-DELETE LATER
-									print(
-										"❌ %i short segment%s in %s, instance '%s'" % (
-											len(shortSegments),
-											"" if len(shortSegments) == 1 else "s",
-											thisGlyph.name,
-											instanceName,
-										)
+							if shortSegments:
+								# print(">> DEBUG CHECKPOINT 21")###DEBUG-DELETE LATER
+								print(
+									"❌ %i short segment%s in %s, instance '%s'" % (
+										len(shortSegments),
+										"" if len(shortSegments) == 1 else "s",
+										thisGlyph.name,
+										instanceName,
 									)
-
-									# collect name:
-									shortSegmentGlyphNames.append(thisGlyph.name)
-									# mark in canvas if required:
-									if self.pref("markSegments"):
-										# print(">> DEBUG CHECKPOINT 22")###DEBUG-DELETE LATER
-										for shortSegment in shortSegments:
-											# print(">> DEBUG CHECKPOINT 23")###DEBUG-DELETE LATER
-											middleOfSegment = self.segmentMiddle(shortSegment)
-											if not middleOfSegment:
-												print(
-													"⛔️ ERROR in %s, layer '%s'. Could not calculate center of segment:\n  %s" %
-													(thisGlyph.name, currentLayer.name, repr(shortSegment))
-												)
-											else:
-												annotationText = "%s %.0f (%s)" % (nodeMarker, self.approxLengthOfSegment(shortSegment), instanceName)
-												self.addAnnotationTextAtPosition(thisGlyph.layers[0], middleOfSegment, annotationText)
+								)
+
+								# collect name:
+								shortSegmentGlyphNames.append(thisGlyph.name)
+								# mark in canvas if required:
+								if self.pref("markSegments"):
+									# print(">> DEBUG CHECKPOINT 22")###DEBUG-DELETE LATER
+									for segmentLength, middleOfSegment in shortSegments:
+										# print(">> DEBUG CHECKPOINT 23")###DEBUG-DELETE LATER
+										annotationText = "%s %.0f (%s)" % (nodeMarker, segmentLength, instanceName)
+										self.addAnnotationTextAtPosition(thisGlyph.layers[0], middleOfSegment, annotationText)
 
 				else:
 					# print(">> DEBUG CHECKPOINT 24")###DEBUG-DELETE LATER
@@ -364,6 +348,8 @@ class ShortSegmentFinder(mekkaObject):
 			# report skipped glyphs:
 			if skippedGlyphNames:
 				print("\nSkipped %i glyphs:\n%s" % (len(skippedGlyphNames), ", ".join(skippedGlyphNames)))
+			if not self.pref("findShortSegmentsInMasters"):
+				print("\n%s" % interpolationCache.report())
 
 			# turn on View > Show Annotations:
 			if self.pref("markSegments"):
@@ -6,9 +6,9 @@ Finds interpolations in which points travel more than they should, i.e., can fin
 """
 
 import vanilla
-from GlyphsApp import Glyphs, GSOFFCURVE, Message, distance
+from GlyphsApp import Glyphs, GSOFFCURVE, Message
 from mekkablue import mekkaObject
-from mekkablue.geometry import angle
+from travelMetrics import LayerStack
 
 
 def setCurrentTabToShowAllInstances(font):
@@ -46,6 +46,8 @@ class TravelTracker(mekkaObject):
 		"allFonts": 0,
 	}
 
+	stackCache = (None, None)  # (glyph, layer stacks)
+
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 290
@@ -147,101 +149,78 @@ class TravelTracker(mekkaObject):
 		)))
 		self.w.thresholdAngle.enable(self.w.segmentRotation.get())
 
-	def maxSegmentRotationForLayers(self, layer, otherLayer):
-		maxSegmentRotation = 0.0
-		maxDeorthogonalization = 0.0
-
-		thresholdAngle = self.prefFloat("thresholdAngle")
-		checkForSegmentRotation = self.prefBool("segmentRotation")
-		checkForOrthogonalToNonOrthogonal = self.prefBool("orthogonalToNonOrthogonal")
-		checkForShortSegments = self.prefBool("ignoreShortSegments")
-		thresholdLength = self.prefFloat("ignoreShortSegmentsThreshold")
-
-		layer.selection = None
-		otherLayer.selection = None
-		for pi, p1 in enumerate(layer.paths):
-			p2 = otherLayer.paths[pi]
-			for ni, n1 in enumerate(p1.nodes):
-				if n1.type == GSOFFCURVE and n1.nextNode.type == GSOFFCURVE or (checkForShortSegments and thresholdLength >= distance(n1.position, n1.nextNode.position)):
-					continue
-					# skip, we are not interested in BCP to BCP rotation
-				n2 = p2.nodes[ni]
-				angle1 = angle(n1, n1.nextNode) % 360
-				angle2 = angle(n2, n2.nextNode) % 360
-				rotation = abs(angle1 - angle2)
-				if rotation > 180:
-					rotation = 180 - rotation
-
-				# update max rotation:
-				if maxSegmentRotation < rotation < 360 - maxSegmentRotation:
-					maxSegmentRotation = rotation
-
-				# orthogonal check:
-				losingOrthogonalAngle = False
-				if checkForOrthogonalToNonOrthogonal:
-					losingOrthogonalAngle = losingOrthogonalAngle or ((angle1 % 90 == 0 and angle2 % 90 != 0) or (angle1 % 90 != 0 and angle2 % 90 == 0))
-					if losingOrthogonalAngle:
-						maxDeorthogonalization = max(maxDeorthogonalization, rotation)
-
-				# select affected nodes if beyond threshold:
-				if (checkForSegmentRotation and rotation > thresholdAngle) or losingOrthogonalAngle:
-					for node in (n1, n1.nextNode):
-						if node not in layer.selection:
-							layer.selection.append(node)
-					for node in (n2, n2.nextNode):
-						if node not in otherLayer.selection:
-							otherLayer.selection.append(node)
-
-		return maxSegmentRotation, maxDeorthogonalization
-
-	def maxNodeTravelRatioForLayers(self, layer, otherLayer, pathNormalization=True, layerNormalization=True):
-		maxTravelRatio = 0.0
-		maxPossibleTravel = 2**0.5
-
-		normalizeShape = self.pref("normalizeShape")
-		normalizeGlyph = self.pref("normalizeGlyph")
-
-		# glyph bounds
-		l1offset = layer.bounds.origin
-		l2offset = otherLayer.bounds.origin
-		l1Width, l1Height = layer.bounds.size
-		l2Width, l2Height = otherLayer.bounds.size
-		layerHasExtension = all((l1Width, l1Height, l2Width, l2Height))
-
-		if not layerHasExtension:
-			return 0.0
-
-		for pi, p1 in enumerate(layer.paths):
-			p2 = otherLayer.paths[pi]
-			p1offset = p1.bounds.origin
-			p2offset = p2.bounds.origin
-			p1Width, p1Height = p1.bounds.size
-			p2Width, p2Height = p2.bounds.size
-			pathHasExtension = all((p1Width, p1Height, p2Width, p2Height))
-
-			for ni, n1 in enumerate(p1.nodes):
-				n2 = p2.nodes[ni]
-
-				# SHAPE NORMALIZATION
-				if pathHasExtension and normalizeShape:  # avoid zero width or zero height
-					n1NormalizedX, n1NormalizedY = (n1.x - p1offset.x) / p1Width, (n1.y - p1offset.y) / p1Height
-					n2NormalizedX, n2NormalizedY = (n2.x - p2offset.x) / p2Width, (n2.y - p2offset.y) / p2Height
-					nodeDistance = distance(
-						(n1NormalizedX, n1NormalizedY),
-						(n2NormalizedX, n2NormalizedY),
-					)
-					maxTravelRatio = max(nodeDistance / maxPossibleTravel, maxTravelRatio)
-
-				# LAYER NORMALIZATION
-				if normalizeGlyph:
-					n1NormalizedX, n1NormalizedY = (n1.x - l1offset.x) / l1Width, (n1.y - l1offset.y) / l1Height
-					n2NormalizedX, n2NormalizedY = (n2.x - l2offset.x) / l2Width, (n2.y - l2offset.y) / l2Height
-					nodeDistance = distance(
-						(n1NormalizedX, n1NormalizedY),
-						(n2NormalizedX, n2NormalizedY),
-					)
-					maxTravelRatio = max(nodeDistance / maxPossibleTravel, maxTravelRatio)
-		return maxTravelRatio
+	def layerStackForLayers(self, layers):
+		"""Reads the nodes and bounds of compatible layers once."""
+		coordinates, layerBounds, pathBounds = [], [], []
+		pathIndexes, nextIndexes, bcpToBcp = [], [], []
+		for layerIndex, layer in enumerate(layers):
+			layerCoordinates, layerPathBounds = [], []
+			for pathIndex, path in enumerate(layer.paths):
+				nodes = path.nodes
+				bounds = path.bounds
+				layerPathBounds.append((bounds.origin.x, bounds.origin.y, bounds.size.width, bounds.size.height))
+				for node in nodes:
+					position = node.position
+					layerCoordinates.append((position.x, position.y))
+				if layerIndex == 0:
+					# path structure and node types are the same in all compatible layers:
+					pathStart, nodeCount = len(pathIndexes), len(nodes)
+					nodeTypes = [node.type for node in nodes]
+					for nodeIndex in range(nodeCount):
+						nextIndex = (nodeIndex + 1) % nodeCount
+						pathIndexes.append(pathIndex)
+						nextIndexes.append(pathStart + nextIndex)
+						bcpToBcp.append(nodeTypes[nodeIndex] == GSOFFCURVE and nodeTypes[nextIndex] == GSOFFCURVE)
+			bounds = layer.bounds
+			layerBounds.append((bounds.origin.x, bounds.origin.y, bounds.size.width, bounds.size.height))
+			coordinates.append(layerCoordinates)
+			pathBounds.append(layerPathBounds)
+		return LayerStack(coordinates, pathIndexes, nextIndexes, bcpToBcp, layerBounds, pathBounds)
+
+	def layerStacksForGlyph(self, glyph):
+		"""
+		Returns (layers, layerStack, layerPairs) for every group of relevant layers with the same path structure,
+		layerPairs being the index pairs of compatible layers. Cached for the last glyph, since all checks use it.
+		"""
+		if self.stackCache[0] is glyph:
+			return self.stackCache[1]
+
+		layerGroups = {}
+		for layer in self.relevantLayersOfGlyph(glyph):
+			pathStructure = tuple(len(path.nodes) for path in layer.paths)
+			layerGroups.setdefault(pathStructure, []).append(layer)
+
+		layerStacks = []
+		for layers in layerGroups.values():
+			numOfLayers = len(layers)
+			if numOfLayers < 2:
+				continue
+			allPairs = [(i, j) for i in range(numOfLayers - 1) for j in range(i + 1, numOfLayers)]
+			if glyph.mastersCompatibleForLayers_(layers):
+				layerPairs = allPairs
+			else:
+				layerPairs = [(i, j) for i, j in allPairs if glyph.mastersCompatibleForLayers_((layers[i], layers[j]))]
+			if layerPairs:
+				layerStacks.append((layers, self.layerStackForLayers(layers), layerPairs))
+
+		self.stackCache = (glyph, layerStacks)
+		return layerStacks
+
+	def selectNodesInLayers(self, layers, layerStack, flaggedNodeIndexes):
+		"""Selects the flagged segments (node and next node) in each layer, and deselects everything in the other layers."""
+		pathStarts = {}
+		for flatIndex, pathIndex in enumerate(layerStack.pathIndexes):
+			pathStarts.setdefault(pathIndex, flatIndex)
+		for layerIndex, layer in enumerate(layers):
+			nodeIndexes = flaggedNodeIndexes.get(layerIndex)
+			if nodeIndexes:
+				selectedIndexes = sorted(set(nodeIndexes) | set(layerStack.nextIndexes[i] for i in nodeIndexes))
+				paths = layer.paths
+				layer.selection = [
+					paths[layerStack.pathIndexes[i]].nodes[i - pathStarts[layerStack.pathIndexes[i]]] for i in selectedIndexes
+				]
+			elif layer.selection:
+				layer.selection = None
 
 	def relevantLayersOfGlyph(self, glyph):
 		relevantLayers = [layer for layer in glyph.layers if (layer.layerId == layer.associatedMasterId or layer.isSpecialLayer) and layer.paths]
@@ -257,29 +236,39 @@ class TravelTracker(mekkaObject):
 	def maxSegmentRotationForGlyph(self, relevantGlyph):
 		maxSegmentRotation = 0.0
 		deorthogonalization = 0.0
-		relevantLayers = self.relevantLayersOfGlyph(relevantGlyph)
-		numOfLayers = len(relevantLayers)
-		for i in range(numOfLayers - 1):
-			firstLayer = relevantLayers[i]
-			for j in range(i + 1, numOfLayers):
-				secondLayer = relevantLayers[j]
-				if relevantGlyph.mastersCompatibleForLayers_((firstLayer, secondLayer)):
-					thisSegmentRotation, thisDeorthogonalization = self.maxSegmentRotationForLayers(firstLayer, secondLayer)
-					maxSegmentRotation = max(maxSegmentRotation, thisSegmentRotation)
-					deorthogonalization = max(deorthogonalization, thisDeorthogonalization)
+
+		thresholdAngle = self.prefFloat("thresholdAngle")
+		checkForSegmentRotation = self.prefBool("segmentRotation")
+		checkForOrthogonalToNonOrthogonal = self.prefBool("orthogonalToNonOrthogonal")
+		checkForShortSegments = self.prefBool("ignoreShortSegments")
+		thresholdLength = self.prefFloat("ignoreShortSegmentsThreshold")
+
+		for layers, layerStack, layerPairs in self.layerStacksForGlyph(relevantGlyph):
+			rotations = layerStack.segmentRotations(
+				layerPairs,
+				thresholdAngle=thresholdAngle if checkForSegmentRotation else None,
+				checkOrthogonals=checkForOrthogonalToNonOrthogonal,
+				minLength=thresholdLength if checkForShortSegments else None,
+			)
+			flaggedNodeIndexes = {}
+			for (i, j), (thisSegmentRotation, thisDeorthogonalization, nodeIndexes) in zip(layerPairs, rotations):
+				maxSegmentRotation = max(maxSegmentRotation, thisSegmentRotation)
+				deorthogonalization = max(deorthogonalization, thisDeorthogonalization)
+				if nodeIndexes:
+					flaggedNodeIndexes.setdefault(i, set()).update(nodeIndexes)
+					flaggedNodeIndexes.setdefault(j, set()).update(nodeIndexes)
+
+			# select affected nodes, only as a final step:
+			self.selectNodesInLayers(layers, layerStack, flaggedNodeIndexes)
 		return maxSegmentRotation, deorthogonalization
 
 	def maxNodeTravelRatioForGlyph(self, relevantGlyph):
 		maxTravelRatio = 0.0
-		relevantLayers = self.relevantLayersOfGlyph(relevantGlyph)
-		numOfLayers = len(relevantLayers)
-		for i in range(numOfLayers - 1):
-			firstLayer = relevantLayers[i]
-			for j in range(i + 1, numOfLayers):
-				secondLayer = relevantLayers[j]
-				if relevantGlyph.mastersCompatibleForLayers_((firstLayer, secondLayer)):
-					thisTravelRatio = self.maxNodeTravelRatioForLayers(firstLayer, secondLayer)
-					maxTravelRatio = max(maxTravelRatio, thisTravelRatio)
+		normalizeShape = self.prefBool("normalizeShape")
+		normalizeGlyph = self.prefBool("normalizeGlyph")
+		for layers, layerStack, layerPairs in self.layerStacksForGlyph(relevantGlyph):
+			travelRatios = layerStack.maxTravelRatios(layerPairs, normalizeShape=normalizeShape, normalizeGlyph=normalizeGlyph)
+			maxTravelRatio = max([maxTravelRatio] + travelRatios)
 		return maxTravelRatio
 
 	def TravelTrackerMain(self, sender):
@@ -288,6 +277,7 @@ class TravelTracker(mekkaObject):
 
 			# update settings to the latest user input:
 			self.SavePreferences()
+			self.stackCache = (None, None)
 
 			verbose = self.prefBool("verbose")
 			includeNonExporting = self.prefBool("includeNonExporting")
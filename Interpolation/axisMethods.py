@@ -57,3 +57,140 @@ def valueForCoefficient(coefficient, low, high):
 	span = high - low
 	number = low + coefficient * span
 	return number
+
+
+def _axisLocations(parameter):
+	# Axis Location parameter → ((axis name, location), ...)
+	locations = []
+	for entry in parameter or ():
+		try:
+			locations.append((entry["Axis"], float(entry["Location"])))
+		except (KeyError, TypeError, ValueError):
+			pass
+	return tuple(locations)
+
+
+def _axisMappings(parameter):
+	# Axis Mappings parameter → ((axis tag, ((user value, native value), ...)), ...)
+	mappings = []
+	if parameter:
+		for axisTag in parameter.allKeys():
+			mapping = parameter.objectForKey_(axisTag)
+			mappings.append((axisTag, tuple(sorted((float(userValue), float(mapping.objectForKey_(userValue))) for userValue in mapping.allKeys()))))
+	return tuple(mappings)
+
+
+def axisConfigurationKey(font):
+	"""Everything FontAxisModel reads from the font, in one pass."""
+	return (
+		tuple((axis.axisTag, axis.name, axis.axisId) for axis in font.axes),
+		tuple((master.id, master.name, tuple(master.axes), _axisLocations(master.customParameters["Axis Location"])) for master in font.masters),
+		tuple((style.name, tuple(style.axes), bool(style.active), style.type, style.weightClassValue(), _axisLocations(style.customParameters["Axis Location"])) for style in font.instances),
+		_axisMappings(font.customParameters["Axis Mappings"]),
+	)
+
+
+def axisConfigurationStamp(font):
+	"""Cheap check for changes of the axis configuration: axes, master IDs, and the axis values of masters and instances."""
+	return (
+		tuple(axis.axisId for axis in font.axes),
+		tuple((master.id, tuple(master.axes)) for master in font.masters),
+		tuple(tuple(style.axes) for style in font.instances),
+	)
+
+
+class FontAxisModel(object):
+	"""
+	Axes, masters, instances and axis mappings of a font as plain Python values.
+	Built once per configuration (see fontAxisModel), so UI callbacks can query
+	it while the user types or drags, without walking the font again.
+	"""
+
+	def __init__(self, font, configurationKey=None):
+		axes, masters, instances, axisMappings = configurationKey or axisConfigurationKey(font)
+		self.axisTags = [tag for tag, name, axisID in axes]
+		self.axisNames = [name for tag, name, axisID in axes]
+		self.axisIDs = [axisID for tag, name, axisID in axes]
+
+		self.masterIDs = [masterID for masterID, name, values, locations in masters]
+		self.masterNames = [name for masterID, name, values, locations in masters]
+		self.masterValues = [values for masterID, name, values, locations in masters]
+		self.masterAxisLocations = [dict(locations) for masterID, name, values, locations in masters]
+
+		self.instanceNames = [name for name, values, active, styleType, weightClass, locations in instances]
+		self.instanceValues = [values for name, values, active, styleType, weightClass, locations in instances]
+		self.instanceActive = [active for name, values, active, styleType, weightClass, locations in instances]
+		self.instanceTypes = [styleType for name, values, active, styleType, weightClass, locations in instances]
+		self.instanceWeightClasses = [weightClass for name, values, active, styleType, weightClass, locations in instances]
+		self.instanceAxisLocations = [dict(locations) for name, values, active, styleType, weightClass, locations in instances]
+
+		self.axisMappings = {axisTag: list(mapping) for axisTag, mapping in axisMappings}
+
+		self._masterValuesForTag = {}
+
+	def axisIndex(self, axisTag):
+		"""Index of the first axis with the tag, None if there is none."""
+		if axisTag in self.axisTags:
+			return self.axisTags.index(axisTag)
+		return None
+
+	def axisIndexForName(self, axisName):
+		if axisName in self.axisNames:
+			return self.axisNames.index(axisName)
+		return None
+
+	def masterValuesForAxisTag(self, axisTag="wght"):
+		"""Native master values on the axis, in master order (empty if the axis does not exist)."""
+		if axisTag not in self._masterValuesForTag:
+			index = self.axisIndex(axisTag)
+			self._masterValuesForTag[axisTag] = [] if index is None else [float(values[index]) for values in self.masterValues]
+		return self._masterValuesForTag[axisTag]
+
+	def styleValuesForAxisTag(self, axisTag="wght"):
+		"""Native instance values on the axis, in instance order."""
+		index = self.axisIndex(axisTag)
+		return [] if index is None else [float(values[index]) for values in self.instanceValues]
+
+	def userMasterValuesForAxisTag(self, axisTag="wght"):
+		"""Master values on the axis as the user sees them: from Axis Location parameters, or native."""
+		index = self.axisIndex(axisTag)
+		if index is None:
+			return []
+		axisName = self.axisNames[index]
+		return [locations.get(axisName, float(values[index])) for values, locations in zip(self.masterValues, self.masterAxisLocations)]
+
+	def extremeMasterValues(self, axisTag="wght"):
+		values = self.masterValuesForAxisTag(axisTag)
+		if not values:
+			return None, None
+		return min(values), max(values)
+
+	def extremeStyleValues(self, axisTag="wght"):
+		values = self.styleValuesForAxisTag(axisTag)
+		if not values:
+			return None, None
+		return min(values), max(values)
+
+	def nameParticles(self):
+		"""Sorted names of all masters and instances, and the words they consist of."""
+		particles = set()
+		for name in self.masterNames + self.instanceNames:
+			particles.update(particle for particle in name.split(" ") if particle)
+			particles.add(name)
+		return sorted(particles)
+
+
+_fontAxisModels = {}  # id(font) → (configuration stamp, FontAxisModel)
+
+
+def fontAxisModel(font, refresh=False):
+	"""
+	FontAxisModel of the font. It is rebuilt if axes, masters or the axis values of masters or instances
+	have changed. Pass refresh=True after changing names, Axis Location or Axis Mappings parameters.
+	"""
+	configurationStamp = axisConfigurationStamp(font)
+	cached = _fontAxisModels.get(id(font))
+	if refresh or cached is None or cached[0] != configurationStamp:
+		cached = (configurationStamp, FontAxisModel(font))
+		_fontAxisModels[id(font)] = cached
+	return cached[1]
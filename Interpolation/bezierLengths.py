@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Arc lengths of many segments at once, for Short Segment Finder. Segments are
+cubic Béziers given as four (x, y) points; straight lines are passed as
+degenerate cubics (start, start, end, end), so lines and curves go through the
+same computation. Lengths are integrated with 8-point Gauss-Legendre
+quadrature (exact for lines, far below a unit off for typical curves).
+
+Pure Python without any app dependency. Uses NumPy if available, then all
+segments of a layer (or of all instances of a glyph) are measured in one
+vectorized call on an array of shape (segments, 4, 2).
+"""
+
+import math
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# (abscissa, weight) on the interval -1…1:
+gaussLegendre = (
+	(-0.9602898564975362, 0.1012285362903771),
+	(-0.7966664774136267, 0.2223810344533744),
+	(-0.5255324099163290, 0.3137066458778869),
+	(-0.1834346424956498, 0.3626837833783617),
+	(0.1834346424956498, 0.3626837833783617),
+	(0.5255324099163290, 0.3137066458778869),
+	(0.7966664774136267, 0.2223810344533744),
+	(0.9602898564975362, 0.1012285362903771),
+)
+
+# the same on the interval 0…1, with the Bernstein factors of the derivative at each t:
+_quadrature = []
+for _abscissa, _weight in gaussLegendre:
+	_t = (_abscissa + 1) / 2
+	_quadrature.append((_weight / 2, 3 * (1 - _t)**2, 6 * _t * (1 - _t), 3 * _t**2))
+
+
+def segmentNodeIndexes(offcurveFlags, closed=True):
+	"""
+	Node indexes of the segments of a path, given as one flag per node (True for off-curve nodes).
+	Returns (segments, unsupportedCount): 4 indexes for curves, 2 for lines, in the order of their
+	end nodes; segments with other numbers of off-curves (e.g., TrueType curves) are only counted.
+	"""
+	segments = []
+	unsupportedCount = 0
+	nodeCount = len(offcurveFlags)
+	for index, isOffcurve in enumerate(offcurveFlags):
+		if isOffcurve:
+			continue
+		offcurveCount = 0
+		while offcurveCount < nodeCount - 1 and offcurveFlags[(index - offcurveCount - 1) % nodeCount]:
+			offcurveCount += 1
+		startIndex = index - offcurveCount - 1
+		if not closed and startIndex < 0:
+			continue  # first node of an open path
+		if offcurveCount == 0:
+			segments.append((startIndex % nodeCount, index))
+		elif offcurveCount == 2:
+			segments.append(((index - 3) % nodeCount, (index - 2) % nodeCount, (index - 1) % nodeCount, index))
+		else:
+			unsupportedCount += 1
+	return segments, unsupportedCount
+
+
+def asCubic(segment):
+	"""Four points for a segment of 2 (line) or 4 (curve) points."""
+	if len(segment) == 2:
+		return (segment[0], segment[0], segment[1], segment[1])
+	return tuple(segment)
+
+
+def cubicLengths(segments, useNumpy=None):
+	"""
+	Arc lengths of cubic segments: a sequence of four (x, y) points per segment, or an array
+	of shape (..., 4, 2). NumPy: array of lengths with the leading shape, otherwise a list.
+	"""
+	if useNumpy is None:
+		useNumpy = numpy is not None
+
+	if useNumpy:
+		points = numpy.asarray(segments, dtype=float)
+		if points.size == 0:
+			return numpy.zeros(points.shape[:-2])
+		firstHandles = points[..., 1, :] - points[..., 0, :]
+		middles = points[..., 2, :] - points[..., 1, :]
+		secondHandles = points[..., 3, :] - points[..., 2, :]
+		lengths = numpy.zeros(points.shape[:-2])
+		for weight, a, b, c in _quadrature:
+			derivatives = a * firstHandles + b * middles + c * secondHandles
+			lengths += weight * numpy.hypot(derivatives[..., 0], derivatives[..., 1])
+		return lengths
+
+	lengths = []
+	for (x0, y0), (x1, y1), (x2, y2), (x3, y3) in segments:
+		length = 0.0
+		for weight, a, b, c in _quadrature:
+			dx = a * (x1 - x0) + b * (x2 - x1) + c * (x3 - x2)
+			dy = a * (y1 - y0) + b * (y2 - y1) + c * (y3 - y2)
+			length += weight * math.hypot(dx, dy)
+		lengths.append(length)
+	return lengths
+
+
+def cubicMiddles(segments):
+	"""Points at t=0.5 of cubic segments, as a list of (x, y)."""
+	return [
+		((x0 + 3 * x1 + 3 * x2 + x3) / 8, (y0 + 3 * y1 + 3 * y2 + y3) / 8)
+		for (x0, y0), (x1, y1), (x2, y2), (x3, y3) in segments
+	]
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Interpolation of recipe lines for Batch Grader, outside of Glyphs.
+
+Batch Grader exports a snapshot of the source masters into a (gzipped) JSON file: for
+every glyph one vector of numbers per master (node and anchor coordinates and
+the width, see glyphVectors() in Batch Grader), plus the master weights of every recipe
+line. This module is then run with the Python of Glyphs, interpolates the lines
+in a process pool (every value of a graded glyph is the weighted sum of its
+master values), and streams the results back in the order of the lines, one
+JSON object per line:
+
+	{"line": 1, "glyphs": {"A": [12.0, 0.0, ...], ...}, "seconds": 0.2}
+
+Pure Python (plus NumPy if available), no app required. Command line:
+
+	python3 gradeworker.py snapshot.json.gz [--workers 8]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+snapshotFormat = 1
+
+
+def loadSnapshot(filePath):
+	opener = gzip.open if filePath.endswith(".gz") else open
+	with opener(filePath, "rt", encoding="utf-8") as snapshotFile:
+		snapshot = json.load(snapshotFile)
+	if snapshot.get("format") != snapshotFormat:
+		raise ValueError("Unsupported snapshot format %s in %s (expected %i)." % (snapshot.get("format"), filePath, snapshotFormat))
+	return snapshot
+
+
+def writeSnapshot(snapshot, filePath):
+	snapshot["format"] = snapshotFormat
+	opener = gzip.open if filePath.endswith(".gz") else open
+	with opener(filePath, "wt", encoding="utf-8") as snapshotFile:
+		json.dump(snapshot, snapshotFile, separators=(",", ":"))
+
+
+def interpolatedVectors(glyphs, masterIDs, weights):
+	"""
+	Weighted sum of the master vectors of every glyph. glyphs: {glyph name: [vector per master]},
+	weights: {master ID: weight}, masters without weight are skipped.
+	"""
+	usedMasters = [(masterIndex, float(weights[masterID])) for masterIndex, masterID in enumerate(masterIDs) if weights.get(masterID)]
+	results = {}
+	for glyphName, masterVectors in glyphs.items():
+		if numpy is not None:
+			vectors = numpy.array([masterVectors[masterIndex] for masterIndex, weight in usedMasters], dtype=float)
+			results[glyphName] = numpy.dot([weight for masterIndex, weight in usedMasters], vectors).tolist()
+		else:
+			vector = [0.0] * len(masterVectors[0])
+			for masterIndex, weight in usedMasters:
+				for i, value in enumerate(masterVectors[masterIndex]):
+					vector[i] += weight * value
+			results[glyphName] = vector
+	return results
+
+
+_snapshot = None
+
+
+def _initWorker(filePath):
+	global _snapshot
+	_snapshot = loadSnapshot(filePath)
+
+
+def _interpolateLineInWorker(lineIndex):
+	start = time.time()
+	line = _snapshot["lines"][lineIndex]
+	glyphs = interpolatedVectors(_snapshot["glyphs"], _snapshot["masters"], line["weights"])
+	return {"line": line["number"], "glyphs": glyphs, "seconds": time.time() - start}
+
+
+def interpolateLines(filePath, workers=None):
+	"""Generator: interpolates all lines of the snapshot in a process pool, and yields the results in the order of the lines."""
+	lineCount = len(loadSnapshot(filePath)["lines"])
+	with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(filePath,)) as executor:
+		for result in executor.map(_interpolateLineInWorker, range(lineCount)):
+			yield result
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description="Interpolate the recipe lines of a snapshot exported by Batch Grader.")
+	parser.add_argument("snapshotFile", help="exported .json or .json.gz snapshot")
+	parser.add_argument("--workers", dest="workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+	options = parser.parse_args(arguments)
+	for result in interpolateLines(options.snapshotFile, workers=options.workers):
+		print(json.dumps(result, separators=(",", ":")), flush=True)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Interpolated glyph layers, cached for the whole app session and shared by the
+interpolation QA scripts (KinkFinder, Find Shapeshifting Glyphs, Short Segment
+Finder). Helper modules stay imported between script runs, so running these
+scripts back to back interpolates each glyph at each location only once, as
+long as the glyph (and the glyphs it uses as components) did not change.
+
+Layers are cached by font, glyph name, location (the master weights of the
+instance), the custom parameters of the instance, and the last change of the
+glyph and its components. The cache holds up to maxLayers layers and evicts
+the least recently used ones first.
+
+Cached layers are shared: interpolatedLayer() only returns the cached layer
+itself if it is used read-only. Ask for roundToGrid, decompose or copy, and you
+get a copy that you can modify (e.g., remove overlaps).
+"""
+
+import time
+from collections import OrderedDict
+from GlyphsApp import Glyphs
+
+
+def locationKey(instance):
+	"""The master weights of an instance, as a hashable, sorted tuple."""
+	return tuple(sorted((masterID, round(float(weight), 6)) for masterID, weight in instance.instanceInterpolations.items() if weight))
+
+
+def parameterKey(instance):
+	"""Custom parameters that may change the interpolation (Disable Masters is already in the weights)."""
+	parameters = []
+	for parameter in instance.customParameters:
+		if parameter.name != "Disable Masters" and getattr(parameter, "active", True):
+			parameters.append((parameter.name, str(parameter.value)))
+	return tuple(parameters)
+
+
+def lastChanges(glyph, font=None, seenNames=None):
+	"""(glyph name, lastChange) of the glyph and of all glyphs it uses as components (recursively)."""
+	font = font or glyph.parent
+	seenNames = seenNames if seenNames is not None else set()
+	seenNames.add(glyph.name)
+	changes = [(glyph.name, getattr(glyph, "lastChange", None))]
+	for layer in glyph.layers:
+		for component in layer.components:
+			if component.componentName not in seenNames:
+				componentGlyph = font.glyphs[component.componentName]
+				if componentGlyph:
+					changes.extend(lastChanges(componentGlyph, font, seenNames))
+	return changes
+
+
+def changeKey(glyph, font=None):
+	"""Last change of the glyph and of all glyphs it uses as components (recursively)."""
+	return tuple((glyphName, str(lastChange)) for glyphName, lastChange in lastChanges(glyph, font))
+
+
+def timestamp(date):
+	"""Seconds since 1970 of a lastChange (datetime or NSDate), None if unknown."""
+	if date is None:
+		return None
+	if hasattr(date, "timestamp"):
+		return date.timestamp()
+	if hasattr(date, "timeIntervalSince1970"):
+		return date.timeIntervalSince1970()
+	return None
+
+
+class InterpolationCache(object):
+	"""LRU cache of interpolated layers (see module docstring), plus the interpolated fonts they come from."""
+
+	def __init__(self, maxLayers=5000, maxFonts=16):
+		self.maxLayers = maxLayers
+		self.maxFonts = maxFonts
+		self.layers = OrderedDict()
+		self.fonts = OrderedDict()  # location key → (interpolated font, {glyph name: change key}, creation time)
+		self.reused = 0
+		self.interpolated = 0
+
+	def clear(self):
+		self.layers.clear()
+		self.fonts.clear()
+
+	def resetStatistics(self):
+		"""Call at the start of a script run, so report() covers only that run."""
+		self.reused = 0
+		self.interpolated = 0
+
+	def _interpolatedFont(self, instance, fontKey, glyphName, glyphChangeKey, latestChange):
+		"""
+		Interpolated font for the location, new if the glyph has changed since it was interpolated in it,
+		or (since the font is a snapshot) if the glyph or its components were changed after the font was built.
+		"""
+		entry = self.fonts.get(fontKey)
+		if entry is not None:
+			interpolatedFont, glyphChangeKeys, creationTime = entry
+			if glyphChangeKeys.get(glyphName, glyphChangeKey) != glyphChangeKey:
+				entry = None
+			elif latestChange is not None and latestChange > creationTime:
+				entry = None
+		if entry is None:
+			creationTime = time.time()
+			if Glyphs.versionNumber >= 3.2:
+				interpolatedFont = instance.interpolatedFontProxy
+			elif Glyphs.versionNumber >= 3:
+				interpolatedFont = instance.interpolatedFontProxy()
+			else:
+				interpolatedFont = instance.pyobjc_instanceMethods.interpolatedFont()
+			entry = (interpolatedFont, {}, creationTime)
+			self.fonts[fontKey] = entry
+			while len(self.fonts) > self.maxFonts:
+				self.fonts.popitem(last=False)
+		self.fonts.move_to_end(fontKey)
+		entry[1][glyphName] = glyphChangeKey
+		return entry[0]
+
+	def interpolatedLayer(self, glyph, instance, roundToGrid=False, decompose=False, copy=False):
+		"""
+		Interpolation of glyph in instance (None if it cannot be interpolated), from the cache if possible.
+		roundToGrid: round coordinates if the grid is 1 unit (returns a copy)
+		decompose: decompose components (returns a copy)
+		copy: return a copy even if neither of the above is needed
+		"""
+		font = instance.font or glyph.parent
+		changes = lastChanges(glyph, font)
+		glyphChangeKey = tuple((glyphName, str(lastChange)) for glyphName, lastChange in changes)
+		fontKey = (id(font), locationKey(instance), parameterKey(instance))
+		layerKey = fontKey + (glyph.name, glyphChangeKey)
+
+		if layerKey in self.layers:
+			self.reused += 1
+			self.layers.move_to_end(layerKey)
+			interpolatedLayer, gridLength = self.layers[layerKey]
+		else:
+			self.interpolated += 1
+			changeTimes = [changeTime for changeTime in (timestamp(lastChange) for glyphName, lastChange in changes) if changeTime is not None]
+			interpolatedFont = self._interpolatedFont(instance, fontKey, glyph.name, glyphChangeKey, max(changeTimes) if changeTimes else None)
+			interpolatedGlyph = interpolatedFont.glyphs[glyph.name]
+			interpolatedLayer = interpolatedGlyph.layers[0] if interpolatedGlyph else None
+			gridLength = interpolatedFont.gridLength
+			self.layers[layerKey] = (interpolatedLayer, gridLength)
+			while len(self.layers) > self.maxLayers:
+				self.layers.popitem(last=False)
+
+		if interpolatedLayer is None or not (roundToGrid or decompose or copy):
+			return interpolatedLayer
+		if decompose and interpolatedLayer.components:
+			layerCopy = interpolatedLayer.copyDecomposedLayer()
+		else:
+			layerCopy = interpolatedLayer.copy()
+		if roundToGrid and gridLength == 1.0:
+			layerCopy.roundCoordinates()
+		return layerCopy
+
+	def report(self):
+		return "Interpolation cache: %i layer%s reused, %i interpolated." % (
+			self.reused,
+			"" if self.reused == 1 else "s",
+			self.interpolated,
+		)
+
+
+interpolationCache = InterpolationCache()
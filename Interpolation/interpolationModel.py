@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Interpolation model for the outlines of one glyph: the node coordinates of all
+masters are read once, and any instance is then a weighted sum of them (with
+the weights of instance.instanceInterpolations), instead of a full interpolation
+through interpolatedFontProxy. Used by KinkFinder and Short Segment Finder. Uses NumPy if available.
+
+Only models what a weighted sum can reproduce: glyphs with brace or bracket
+layers, corner/cap components or incompatible masters are reported as not
+modelable (see GlyphInterpolationModel.problem), and should be interpolated
+by Glyphs instead.
+
+DesignSpace computes master weights for any axis location (like a variable
+font, with fontTools), and DesignSpaceSampler uses them for finding the
+largest kink of a glyph on a grid across the whole design space.
+"""
+
+import itertools
+import math
+from GlyphsApp import Glyphs, GSSMOOTH, GSOFFCURVE, CORNER, CAP
+from bezierLengths import segmentNodeIndexes, asCubic
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from fontTools.varLib.models import VariationModel
+	from fontTools.varLib.errors import VarLibError
+except ImportError:
+	VariationModel = None
+	VarLibError = ValueError
+
+if Glyphs.versionNumber >= 3:
+	from GlyphsApp import BRUSH, SEGMENT, INSTANCETYPESINGLE
+	outlineChangingHintTypes = (CORNER, CAP, BRUSH, SEGMENT)
+else:
+	outlineChangingHintTypes = (CORNER, CAP)
+
+
+def _roundToGrid(value):
+	return math.floor(value + 0.5)
+
+
+def weightsForInstance(instance, masterIDs):
+	"""Master weights of an instance (from instanceInterpolations), in the order of masterIDs."""
+	weights = [0.0] * len(masterIDs)
+	for masterID, weight in instance.instanceInterpolations.items():
+		weights[masterIDs.index(masterID)] = float(weight)
+	return weights
+
+
+def usableWeightsForInstance(instance, masterIDs, tolerance=0.001):
+	"""
+	Like weightsForInstance(), but None if a weighted sum cannot reproduce the instance:
+	variable instances, weights of unknown masters, or weights that do not add up to 1.
+	"""
+	if Glyphs.versionNumber >= 3 and instance.type != INSTANCETYPESINGLE:
+		return None
+	interpolations = instance.instanceInterpolations
+	if not interpolations or any(masterID not in masterIDs for masterID in interpolations.keys()):
+		return None
+	weights = weightsForInstance(instance, masterIDs)
+	if abs(sum(weights) - 1.0) > tolerance:
+		return None
+	return weights
+
+
+class GlyphInterpolationModel(object):
+	"""
+	Snapshot of the (compatible) master outlines of a glyph, flattened into one list
+	of nodes in path order. Node k of every master is node k of every instance.
+	"""
+
+	def __init__(self, glyph, masterIDs, useNumpy=None):
+		if useNumpy is None:
+			useNumpy = numpy is not None
+		self.glyph = glyph
+		self.masterIDs = list(masterIDs)
+		self.usesNumpy = bool(useNumpy)
+		self.problem = self._findProblem(glyph)
+
+		self.pathNodeIndexes = []  # (pathIndex, nodeIndex) for every flat node index
+		self.smoothIndexes = []  # flat indexes of smooth nodes (in the first master)
+		self.prevIndexes = []
+		self.nextIndexes = []
+		self.segments = []  # flat node indexes of every segment (see bezierLengths.segmentNodeIndexes)
+		self.pathsClosed = []
+		self.unsupportedSegmentCount = 0
+		masterCoordinates = []
+		if self.problem is None:
+			for masterIndex, masterID in enumerate(self.masterIDs):
+				coordinates = []
+				for pathIndex, path in enumerate(glyph.layers[masterID].paths):
+					nodes = path.nodes
+					nodeCount = len(nodes)
+					pathStart = len(coordinates)
+					for nodeIndex, node in enumerate(nodes):
+						position = node.position
+						coordinates.append((position.x, position.y))
+						if masterIndex == 0:
+							self.pathNodeIndexes.append((pathIndex, nodeIndex))
+							if node.connection == GSSMOOTH:
+								self.smoothIndexes.append(pathStart + nodeIndex)
+								self.prevIndexes.append(pathStart + (nodeIndex - 1) % nodeCount)
+								self.nextIndexes.append(pathStart + (nodeIndex + 1) % nodeCount)
+					if masterIndex == 0:
+						self.pathsClosed.append(bool(path.closed))
+						segments, unsupportedCount = segmentNodeIndexes([node.type == GSOFFCURVE for node in nodes], closed=path.closed)
+						self.segments.extend(tuple(pathStart + index for index in segment) for segment in segments)
+						self.unsupportedSegmentCount += unsupportedCount
+				masterCoordinates.append(coordinates)
+
+		if self.usesNumpy:
+			self.coordinates = numpy.array(masterCoordinates, dtype=float).reshape((len(masterCoordinates), len(self.pathNodeIndexes), 2))
+		else:
+			self.coordinates = masterCoordinates
+
+	def _findProblem(self, glyph):
+		"""Reason why the glyph cannot be interpolated as a weighted sum of its masters, or None."""
+		masterLayers = []
+		for masterID in self.masterIDs:
+			layer = glyph.layers[masterID]
+			if layer is None:
+				return "missing master layer"
+			masterLayers.append(layer)
+		for layer in glyph.layers:
+			if layer.isSpecialLayer:
+				return "brace or bracket layers"
+		for layer in masterLayers:
+			for hint in layer.hints:
+				if hint.type in outlineChangingHintTypes:
+					return "corner, cap, brush or segment components"
+		if len(masterLayers) > 1 and not glyph.mastersCompatibleForLayers_(masterLayers):
+			return "incompatible masters"
+		structure = [len(path.nodes) for path in masterLayers[0].paths]
+		for layer in masterLayers[1:]:
+			if [len(path.nodes) for path in layer.paths] != structure:
+				return "incompatible paths"
+		return None
+
+	@property
+	def nodeCount(self):
+		return len(self.pathNodeIndexes)
+
+	def coordinatesForWeights(self, weightRows, roundToGrid=False):
+		"""
+		Node coordinates for many instances at once, one row of master weights per instance
+		(see weightsForInstance).
+		NumPy: array of shape (instances, nodes, 2), otherwise nested lists.
+		"""
+		if self.usesNumpy:
+			coordinates = numpy.tensordot(numpy.array(weightRows, dtype=float), self.coordinates, axes=(1, 0))
+			if roundToGrid:
+				coordinates = numpy.floor(coordinates + 0.5)
+			return coordinates
+
+		instanceCoordinates = []
+		for weights in weightRows:
+			usedMasters = [(weight, self.coordinates[masterIndex]) for masterIndex, weight in enumerate(weights) if weight]
+			coordinates = []
+			for nodeIndex in range(self.nodeCount):
+				x = sum(weight * masterCoordinates[nodeIndex][0] for weight, masterCoordinates in usedMasters)
+				y = sum(weight * masterCoordinates[nodeIndex][1] for weight, masterCoordinates in usedMasters)
+				if roundToGrid:
+					x, y = _roundToGrid(x), _roundToGrid(y)
+				coordinates.append((x, y))
+			instanceCoordinates.append(coordinates)
+		return instanceCoordinates
+
+	def segmentPoints(self, weightRows, roundToGrid=False):
+		"""
+		The four points of every segment (lines as degenerate cubics, see bezierLengths.asCubic) in every instance.
+		NumPy: array of shape (instances, segments, 4, 2), otherwise nested lists.
+		"""
+		coordinates = self.coordinatesForWeights(weightRows, roundToGrid=roundToGrid)
+		cubicIndexes = [asCubic(segment) for segment in self.segments]
+		if self.usesNumpy:
+			return coordinates[:, numpy.array(cubicIndexes, dtype=int).reshape((len(cubicIndexes), 4)), :]
+		return [[[instanceCoordinates[index] for index in indexes] for indexes in cubicIndexes] for instanceCoordinates in coordinates]
+
+	def kinkSizes(self, weightRows, roundToGrid=False):
+		"""
+		Kink size (distance of a smooth node from the line between its neighbours)
+		of every smooth node in every instance: rows are instances, columns follow smoothIndexes.
+		"""
+		coordinates = self.coordinatesForWeights(weightRows, roundToGrid=roundToGrid)
+		if self.usesNumpy:
+			pivots = coordinates[:, self.smoothIndexes, :]
+			starts = coordinates[:, self.prevIndexes, :]
+			ends = coordinates[:, self.nextIndexes, :]
+			directions = ends - starts
+			lengths = numpy.hypot(directions[..., 0], directions[..., 1])
+			crossProducts = directions[..., 0] * (pivots[..., 1] - starts[..., 1]) - directions[..., 1] * (pivots[..., 0] - starts[..., 0])
+			with numpy.errstate(divide="ignore", invalid="ignore"):
+				return numpy.where(lengths > 0, numpy.abs(crossProducts) / lengths, 0.0)
+
+		instanceKinks = []
+		for instanceCoordinates in coordinates:
+			kinks = []
+			for smoothIndex, prevIndex, nextIndex in zip(self.smoothIndexes, self.prevIndexes, self.nextIndexes):
+				pivotX, pivotY = instanceCoordinates[smoothIndex]
+				startX, startY = instanceCoordinates[prevIndex]
+				endX, endY = instanceCoordinates[nextIndex]
+				deltaX, deltaY = endX - startX, endY - startY
+				length = math.hypot(deltaX, deltaY)
+				kinks.append(abs(deltaX * (pivotY - startY) - deltaY * (pivotX - startX)) / length if length else 0.0)
+			instanceKinks.append(kinks)
+		return instanceKinks
+
+	def deviationFromLayer(self, weights, layer, roundToGrid=False):
+		"""
+		Largest coordinate difference between the model and an interpolated layer (e.g., from
+		interpolatedFontProxy) for the same weights, for checking the model. None if the paths differ.
+		"""
+		coordinates = self.coordinatesForWeights((weights,), roundToGrid=roundToGrid)[0]
+		layerCoordinates = [(node.position.x, node.position.y) for path in layer.paths for node in path.nodes]
+		if len(layerCoordinates) != self.nodeCount:
+			return None
+		deviation = 0.0
+		for (x, y), (layerX, layerY) in zip(coordinates, layerCoordinates):
+			deviation = max(deviation, abs(x - layerX), abs(y - layerY))
+		return float(deviation)
+
+
+def _maxWithIndex(values):
+	index = max(range(len(values)), key=lambda i: values[i])
+	return float(values[index]), index
+
+
+class DesignSpace(object):
+	"""
+	Master locations (one tuple of axis values per master) and master weights for any
+	location, computed like in a variable font: normalized to the origin master and
+	the axis extremes of the masters, then with a fontTools VariationModel.
+	Raises ImportError without fontTools, and ValueError if fontTools cannot model
+	the masters, e.g., if two of them share a location.
+	"""
+
+	def __init__(self, masterLocations, originIndex=0, axisNames=None):
+		if VariationModel is None:
+			raise ImportError("Sampling the design space requires fontTools.")
+		self.masterLocations = [tuple(float(value) for value in location) for location in masterLocations]
+		self.origin = self.masterLocations[originIndex]
+		axisCount = len(self.origin)
+		self.axisNames = list(axisNames or ["axis%i" % (i + 1) for i in range(axisCount)])
+		self.minimums = [min(location[i] for location in self.masterLocations) for i in range(axisCount)]
+		self.maximums = [max(location[i] for location in self.masterLocations) for i in range(axisCount)]
+
+		for masterIndex, location in enumerate(self.masterLocations):
+			if location in self.masterLocations[:masterIndex]:
+				raise ValueError("masters %i and %i share the location %s" % (self.masterLocations.index(location) + 1, masterIndex + 1, self.describeLocation(location)))
+
+		normalizedMasterLocations = [self.normalizedLocation(location) for location in self.masterLocations]
+		try:
+			self.variationModel = VariationModel(normalizedMasterLocations, axisOrder=self.axisNames)
+		except VarLibError as e:
+			raise ValueError("fontTools cannot model the masters: %s" % e)
+
+		# every delta of the model as a linear combination of the masters,
+		# so the weight of a master is a sum of region scalars:
+		masterCount = len(self.masterLocations)
+		self.deltasPerMaster = []
+		for masterIndex in range(masterCount):
+			unitValues = [1.0 if i == masterIndex else 0.0 for i in range(masterCount)]
+			self.deltasPerMaster.append(self.variationModel.getDeltas(unitValues))
+		self._weights = {}
+
+	@property
+	def axisCount(self):
+		return len(self.origin)
+
+	def normalizedLocation(self, location):
+		normalizedLocation = {}
+		for i, value in enumerate(location):
+			axisName, originValue = self.axisNames[i], self.origin[i]
+			if value > originValue and self.maximums[i] > originValue:
+				normalizedLocation[axisName] = (value - originValue) / (self.maximums[i] - originValue)
+			elif value < originValue and self.minimums[i] < originValue:
+				normalizedLocation[axisName] = (value - originValue) / (originValue - self.minimums[i])
+			else:
+				normalizedLocation[axisName] = 0.0
+		return normalizedLocation
+
+	def weightsForLocation(self, location):
+		"""Master weights (in the order of the masters) for a location in design coordinates."""
+		location = tuple(location)
+		if location not in self._weights:
+			scalars = self.variationModel.getScalars(self.normalizedLocation(location))
+			self._weights[location] = [sum(scalar * delta for scalar, delta in zip(scalars, deltas)) for deltas in self.deltasPerMaster]
+		return self._weights[location]
+
+	def describeLocation(self, location):
+		return ", ".join("%s %g" % (axisName, round(value, 1)) for axisName, value in zip(self.axisNames, location))
+
+
+def designSpaceForFont(font):
+	"""DesignSpace of the masters of a font, with the Variable Font Origin (or the first master) as origin."""
+	masters = list(font.masters)
+	if Glyphs.versionNumber >= 3:
+		axisNames = [axis.name for axis in font.axes]
+		masterLocations = [list(master.axes) for master in masters]
+	else:
+		axisNames = ["Weight", "Width", "Custom"]
+		masterLocations = [[master.weightValue, master.widthValue, master.customValue] for master in masters]
+	originIndex = 0
+	originParameter = font.customParameters["Variable Font Origin"]
+	if originParameter:
+		for i, master in enumerate(masters):
+			if originParameter in (master.id, master.name):
+				originIndex = i
+	return DesignSpace(masterLocations, originIndex=originIndex, axisNames=axisNames)
+
+
+class DesignSpaceSampler(object):
+	"""
+	Finds the largest kink of a glyph anywhere in a design space: measures all smooth
+	nodes on a grid (gridCounts locations per axis, e.g. 9×9×5), then optionally
+	refines around the largest local maxima of the grid, halving the grid step
+	in every refinement, and moving towards the largest kink.
+	"""
+
+	def __init__(self, designSpace, gridCounts, refinements=3, refinedMaxima=3):
+		self.designSpace = designSpace
+		self.refinements = refinements
+		self.refinedMaxima = refinedMaxima
+
+		# grid counts for all axes (repeat the last one), one location for axes without variation:
+		gridCounts = list(gridCounts) or [2]
+		gridCounts += [gridCounts[-1]] * (designSpace.axisCount - len(gridCounts))
+		self.axisValues = []
+		self.steps = []
+		for i in range(designSpace.axisCount):
+			count, minimum, maximum = max(1, int(gridCounts[i])), designSpace.minimums[i], designSpace.maximums[i]
+			if count == 1 or minimum == maximum:
+				self.axisValues.append([designSpace.origin[i]])
+				self.steps.append(0.0)
+			else:
+				step = (maximum - minimum) / (count - 1)
+				self.axisValues.append([minimum + j * step for j in range(count)])
+				self.steps.append(step)
+		self.gridShape = [len(values) for values in self.axisValues]
+		self.gridIndexes = list(itertools.product(*[range(count) for count in self.gridShape]))
+		self.gridLocations = [tuple(self.axisValues[axis][j] for axis, j in enumerate(gridIndex)) for gridIndex in self.gridIndexes]
+		self.gridWeights = [designSpace.weightsForLocation(location) for location in self.gridLocations]
+		self.neighbourOffsets = [offset for offset in itertools.product((-1, 0, 1), repeat=designSpace.axisCount) if any(offset)]
+
+	@property
+	def locationCount(self):
+		return len(self.gridLocations)
+
+	def _largestKinks(self, model, weightRows, roundToGrid):
+		"""Largest kink and its smooth node column for every row of weights."""
+		kinkSizes = model.kinkSizes(weightRows, roundToGrid=roundToGrid)
+		if model.usesNumpy:
+			columns = kinkSizes.argmax(axis=1)
+			return [(float(kinkSizes[row, column]), int(column)) for row, column in enumerate(columns)]
+		return [_maxWithIndex(row) for row in kinkSizes]
+
+	def _localMaxima(self, largestKinks):
+		"""Indexes of grid locations with a kink at least as large as at all neighbouring locations, largest first."""
+		gridPositions = dict((gridIndex, i) for i, gridIndex in enumerate(self.gridIndexes))
+		localMaxima = []
+		for i, gridIndex in enumerate(self.gridIndexes):
+			kinkSize = largestKinks[i][0]
+			if kinkSize <= 0.0:
+				continue
+			for offset in self.neighbourOffsets:
+				neighbour = gridPositions.get(tuple(j + k for j, k in zip(gridIndex, offset)))
+				if neighbour is not None and largestKinks[neighbour][0] > kinkSize:
+					break
+			else:
+				localMaxima.append(i)
+		localMaxima.sort(key=lambda i: -largestKinks[i][0])
+		return localMaxima
+
+	def _refine(self, model, location, kinkSize, column, roundToGrid):
+		designSpace = self.designSpace
+		steps = list(self.steps)
+		for refinement in range(self.refinements):
+			steps = [step / 2.0 for step in steps]
+			candidates = []
+			for offset in itertools.product((-1, 0, 1), repeat=designSpace.axisCount):
+				candidate = tuple(
+					min(designSpace.maximums[axis], max(designSpace.minimums[axis], value + offset[axis] * steps[axis])) for axis, value in enumerate(location)
+				)
+				if candidate != location and candidate not in candidates:
+					candidates.append(candidate)
+			if not candidates:
+				break
+			candidateKinks = self._largestKinks(model, [designSpace.weightsForLocation(candidate) for candidate in candidates], roundToGrid)
+			for candidate, (candidateKinkSize, candidateColumn) in zip(candidates, candidateKinks):
+				if candidateKinkSize > kinkSize:
+					location, kinkSize, column = candidate, candidateKinkSize, candidateColumn
+		return location, kinkSize, column
+
+	def largestKink(self, model, roundToGrid=False):
+		"""
+		(kinkSize, location, smoothColumn) of the largest kink of a GlyphInterpolationModel in the
+		design space, smoothColumn being an index of model.smoothIndexes. None if there are no smooth nodes.
+		"""
+		if not model.smoothIndexes:
+			return None
+		largestKinks = self._largestKinks(model, self.gridWeights, roundToGrid)
+		kinkSize, gridPosition = max((kinkSize, i) for i, (kinkSize, column) in enumerate(largestKinks))
+		result = (self.gridLocations[gridPosition], kinkSize, largestKinks[gridPosition][1])
+		if self.refinements and kinkSize > 0.0:
+			for i in self._localMaxima(largestKinks)[:self.refinedMaxima]:
+				refinedResult = self._refine(model, self.gridLocations[i], largestKinks[i][0], largestKinks[i][1], roundToGrid)
+				if refinedResult[1] > result[1]:
+					result = refinedResult
+		location, kinkSize, column = result
+		return kinkSize, location, column
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Outline topology of a glyph across the design space, for Find Shapeshifting
+Glyphs: the direction (sign of the area) of every closed path, and which paths
+overlap (cross or contain) each other, or cross themselves. Computed on the
+segments flattened at fixed t values, so every polygon vertex is a fixed linear
+combination of the nodes of a GlyphInterpolationModel, and the topology at many
+locations comes straight from the master coordinates, without any interpolated
+instances.
+
+A glyph shapeshifts where its topology differs between neighbouring locations
+of a DesignSpaceSampler grid; the midpoint between the two is reported as the
+approximate location of the change. Uses NumPy if the model does.
+"""
+
+from bezierLengths import asCubic
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+maxChunkSize = 2000000  # array elements compared in one operation
+boundaryTolerance = 0.5  # points closer to the outline of another path do not count as inside it
+
+
+def _bernstein(t):
+	return ((1 - t)**3, 3 * t * (1 - t)**2, 3 * t**2 * (1 - t), t**3)
+
+
+def _orientation(p, q, r):
+	return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+
+def _orientations(p, q, r):
+	# the same for NumPy arrays of points
+	return (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+
+
+def _edgesCross(a, b, c, d):
+	"""True if edge a-b crosses edge c-d (touching does not count)."""
+	return _orientation(a, b, c) * _orientation(a, b, d) < 0 and _orientation(c, d, a) * _orientation(c, d, b) < 0
+
+
+def _isInside(point, edges):
+	"""Even-odd test of a point against the edges of a polygon, False on (or next to) the outline."""
+	x, y = point
+	inside = False
+	for (x1, y1), (x2, y2) in edges:
+		if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+			inside = not inside
+		dx, dy = x2 - x1, y2 - y1
+		t = min(1.0, max(0.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy))) if dx or dy else 0.0
+		if (x - x1 - t * dx)**2 + (y - y1 - t * dy)**2 <= boundaryTolerance**2:
+			return False
+	return inside
+
+
+def _boundsOverlap(bounds, otherBounds):
+	return bounds[0] <= otherBounds[2] and otherBounds[0] <= bounds[2] and bounds[1] <= otherBounds[3] and otherBounds[1] <= bounds[3]
+
+
+def _chunks(count, elementsPerItem):
+	chunkSize = max(1, maxChunkSize // max(1, elementsPerItem))
+	for chunkStart in range(0, count, chunkSize):
+		yield slice(chunkStart, chunkStart + chunkSize)
+
+
+class OutlineTopology(object):
+	"""
+	Topology of the closed paths of a GlyphInterpolationModel at many locations at once.
+	Each cubic segment is flattened into flatteningSteps edges.
+	"""
+
+	def __init__(self, model, flatteningSteps=4):
+		self.model = model
+		self.pathIndexes = []  # model path index of every polygon
+		self.segmentIndexes = []  # cubic node indexes (see bezierLengths.asCubic) of all segments of closed paths
+		self.segmentPolygons = []  # polygon index of every segment
+		for segment in model.segments:
+			pathIndex = model.pathNodeIndexes[segment[-1]][0]
+			if not model.pathsClosed[pathIndex]:
+				continue
+			if pathIndex not in self.pathIndexes:
+				self.pathIndexes.append(pathIndex)
+			self.segmentIndexes.append(asCubic(segment))
+			self.segmentPolygons.append(len(self.pathIndexes) - 1)
+		# factors for the flattened points at t = 0, 1/steps … 1 (shared by neighbouring edges):
+		self.flatteningFactors = [_bernstein(step / flatteningSteps) for step in range(flatteningSteps + 1)]
+
+	@property
+	def polygonCount(self):
+		return len(self.pathIndexes)
+
+	def signatures(self, weightRows, roundToGrid=False):
+		"""
+		Topology at every row of master weights, as a hashable signature:
+		(direction of every polygon (1, -1 or 0), sorted pairs of polygon indexes that overlap,
+		with (i, i) for polygons crossing themselves).
+		"""
+		if not self.segmentIndexes:
+			return [((), ())] * len(weightRows)
+		coordinates = self.model.coordinatesForWeights(weightRows, roundToGrid=roundToGrid)
+		if self.model.usesNumpy:
+			return self._numpySignatures(coordinates)
+		return [self._signature(locationCoordinates) for locationCoordinates in coordinates]
+
+	def _numpySignatures(self, coordinates):
+		locationCount, segmentCount, polygonCount = len(coordinates), len(self.segmentIndexes), self.polygonCount
+		controlPoints = coordinates[:, numpy.array(self.segmentIndexes, dtype=int), :]  # locations × segments × 4 × 2
+		points = numpy.einsum("tk,lskc->lstc", numpy.array(self.flatteningFactors), controlPoints)
+		starts, ends = points[:, :, :-1, :], points[:, :, 1:, :]  # locations × segments × steps × 2
+		segmentPolygons = numpy.array(self.segmentPolygons, dtype=int)
+		membership = numpy.zeros((segmentCount, polygonCount))
+		membership[numpy.arange(segmentCount), segmentPolygons] = 1.0
+
+		# directions:
+		segmentAreas = (starts[..., 0] * ends[..., 1] - ends[..., 0] * starts[..., 1]).sum(axis=2)
+		directions = numpy.sign(segmentAreas.dot(membership)).astype(int)  # locations × polygons
+
+		# segment pairs with overlapping control point boxes at any location:
+		segmentMinimums, segmentMaximums = controlPoints.min(axis=2), controlPoints.max(axis=2)
+		candidates = numpy.zeros((segmentCount, segmentCount), dtype=bool)
+		for chunk in _chunks(locationCount, segmentCount * segmentCount):
+			minimums, maximums = segmentMinimums[chunk], segmentMaximums[chunk]
+			candidates |= (
+				(minimums[:, :, None, 0] <= maximums[:, None, :, 0]) & (minimums[:, None, :, 0] <= maximums[:, :, None, 0])
+				& (minimums[:, :, None, 1] <= maximums[:, None, :, 1]) & (minimums[:, None, :, 1] <= maximums[:, :, None, 1])
+			).any(axis=0)
+		firstSegments, secondSegments = numpy.nonzero(numpy.triu(candidates))
+
+		# crossing edges of candidate segment pairs, collected per polygon pair:
+		polygonPairs = numpy.sort(numpy.stack((segmentPolygons[firstSegments], segmentPolygons[secondSegments]), axis=1), axis=1)
+		uniquePairs, pairGroups = numpy.unique(polygonPairs, axis=0, return_inverse=True)
+		overlapping = numpy.zeros((locationCount, len(uniquePairs)), dtype=bool)
+		stepCount = starts.shape[2]
+		for chunk in _chunks(len(firstSegments), locationCount * stepCount * stepCount):
+			first, second = firstSegments[chunk], secondSegments[chunk]
+			a, b = starts[:, first, :, None, :], ends[:, first, :, None, :]
+			c, d = starts[:, second, None, :, :], ends[:, second, None, :, :]
+			crosses = ((_orientations(a, b, c) * _orientations(a, b, d) < 0) & (_orientations(c, d, a) * _orientations(c, d, b) < 0)).any(axis=(2, 3))
+			groupMembership = numpy.zeros((len(first), len(uniquePairs)))
+			groupMembership[numpy.arange(len(first)), numpy.asarray(pairGroups).reshape(-1)[chunk]] = 1.0
+			overlapping |= crosses.astype(float).dot(groupMembership) > 0
+
+		# containment (and overlaps along shared edges) of different polygons with overlapping boxes:
+		vertices = points[:, :, :-1, :]
+		for pairIndex, (i, j) in enumerate(uniquePairs):
+			if i == j:
+				continue
+			for polygon, otherPolygon in ((i, j), (j, i)):
+				polygonPoints = vertices[:, segmentPolygons == polygon].reshape((locationCount, -1, 2))
+				otherStarts = starts[:, segmentPolygons == otherPolygon].reshape((locationCount, -1, 2))
+				otherEnds = ends[:, segmentPolygons == otherPolygon].reshape((locationCount, -1, 2))
+				remaining = numpy.flatnonzero(~overlapping[:, pairIndex])
+				for chunk in _chunks(len(remaining), polygonPoints.shape[1] * otherStarts.shape[1]):
+					locations = remaining[chunk]
+					x, y = polygonPoints[locations, :, None, 0], polygonPoints[locations, :, None, 1]
+					x1, y1 = otherStarts[locations, None, :, 0], otherStarts[locations, None, :, 1]
+					x2, y2 = otherEnds[locations, None, :, 0], otherEnds[locations, None, :, 1]
+					straddling = (y1 > y) != (y2 > y)
+					dx, dy = x2 - x1, y2 - y1
+					with numpy.errstate(divide="ignore", invalid="ignore"):
+						rayCrossings = straddling & (x < dx * (y - y1) / dy + x1)
+						t = numpy.clip(numpy.nan_to_num(((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)), 0.0, 1.0)
+					onOutline = ((x - x1 - t * dx)**2 + (y - y1 - t * dy)**2 <= boundaryTolerance**2).any(axis=2)
+					inside = ((rayCrossings.sum(axis=2) % 2 == 1) & ~onOutline).any(axis=1)
+					overlapping[locations, pairIndex] |= inside
+
+		signatures = []
+		for location in range(locationCount):
+			pairs = tuple((int(i), int(j)) for (i, j), isOverlapping in zip(uniquePairs, overlapping[location]) if isOverlapping)
+			signatures.append((tuple(int(direction) for direction in directions[location]), pairs))
+		return signatures
+
+	def _signature(self, locationCoordinates):
+		# pure Python version of _numpySignatures() for one location
+		polygonEdges = [[] for i in range(self.polygonCount)]
+		segmentEdges, segmentBounds = [], []
+		for cubicIndexes, polygon in zip(self.segmentIndexes, self.segmentPolygons):
+			controlPoints = [locationCoordinates[index] for index in cubicIndexes]
+			points = [
+				(sum(factor * x for factor, (x, y) in zip(factors, controlPoints)), sum(factor * y for factor, (x, y) in zip(factors, controlPoints)))
+				for factors in self.flatteningFactors
+			]
+			edges = list(zip(points[:-1], points[1:]))
+			segmentEdges.append(edges)
+			polygonEdges[polygon].extend(edges)
+			segmentBounds.append((min(x for x, y in controlPoints), min(y for x, y in controlPoints), max(x for x, y in controlPoints), max(y for x, y in controlPoints)))
+
+		directions = []
+		for edges in polygonEdges:
+			area = sum(start[0] * end[1] - end[0] * start[1] for start, end in edges)
+			directions.append((area > 0) - (area < 0))
+
+		overlappingPairs = set()
+		segmentCount = len(self.segmentIndexes)
+		for first in range(segmentCount):
+			for second in range(first, segmentCount):
+				pair = tuple(sorted((self.segmentPolygons[first], self.segmentPolygons[second])))
+				if pair in overlappingPairs or not _boundsOverlap(segmentBounds[first], segmentBounds[second]):
+					continue
+				if any(_edgesCross(a, b, c, d) for a, b in segmentEdges[first] for c, d in segmentEdges[second]):
+					overlappingPairs.add(pair)
+
+		polygonBounds = []
+		for edges in polygonEdges:
+			xs, ys = [start[0] for start, end in edges], [start[1] for start, end in edges]
+			polygonBounds.append((min(xs), min(ys), max(xs), max(ys)))
+		for i in range(self.polygonCount):
+			for j in range(i + 1, self.polygonCount):
+				if (i, j) in overlappingPairs or not _boundsOverlap(polygonBounds[i], polygonBounds[j]):
+					continue
+				for polygon, otherPolygon in ((i, j), (j, i)):
+					if any(_isInside(start, polygonEdges[otherPolygon]) for start, end in polygonEdges[polygon]):
+						overlappingPairs.add((i, j))
+						break
+		return tuple(directions), tuple(sorted(overlappingPairs))
+
+	def describeChanges(self, signature, otherSignature):
+		"""What differs between two signatures, as a list of short descriptions (path numbers start at 1)."""
+		changes = []
+		directions, overlappingPairs = signature
+		otherDirections, otherOverlappingPairs = otherSignature
+		for i, (direction, otherDirection) in enumerate(zip(directions, otherDirections)):
+			if direction != otherDirection:
+				changes.append("path %i changes direction" % (self.pathIndexes[i] + 1))
+		for i, j in sorted(set(overlappingPairs) ^ set(otherOverlappingPairs)):
+			if i == j:
+				changes.append("path %i starts or stops crossing itself" % (self.pathIndexes[i] + 1))
+			else:
+				changes.append("paths %i and %i start or stop overlapping" % (self.pathIndexes[i] + 1, self.pathIndexes[j] + 1))
+		return changes
+
+	def shapeshifts(self, sampler, roundToGrid=False):
+		"""
+		Topology changes on the grid of a DesignSpaceSampler, as a sorted list of (description, location),
+		location being the midpoint between the first two neighbouring grid locations that differ.
+		Empty if the topology is the same everywhere.
+		"""
+		signatures = self.signatures(sampler.gridWeights, roundToGrid=roundToGrid)
+		if len(set(signatures)) < 2:
+			return []
+		gridPositions = dict((gridIndex, i) for i, gridIndex in enumerate(sampler.gridIndexes))
+		changeLocations = {}
+		for i, gridIndex in enumerate(sampler.gridIndexes):
+			for axis in range(len(gridIndex)):
+				j = gridPositions.get(gridIndex[:axis] + (gridIndex[axis] + 1,) + gridIndex[axis + 1:])
+				if j is None or signatures[i] == signatures[j]:
+					continue
+				location = tuple((value + otherValue) / 2 for value, otherValue in zip(sampler.gridLocations[i], sampler.gridLocations[j]))
+				for change in self.describeChanges(signatures[i], signatures[j]):
+					changeLocations.setdefault(change, location)
+		return sorted(changeLocations.items())
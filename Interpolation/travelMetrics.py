@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Pairwise layer metrics for Travel Tracker: node travel, segment rotation and
+segments going unorthogonal, measured between every pair of compatible layers
+of a glyph. The nodes of each layer are read once into a stack of
+(layers × nodes × 2) coordinates; all layer pairs are then compared in batched
+array operations instead of one bridged node read per node and pair.
+
+Pure Python without any app dependency (layers come in as plain coordinates).
+Uses NumPy if available.
+"""
+
+import math
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+maxPossibleTravel = 2**0.5  # diagonal of a normalized bounding box
+
+
+def _normalized(coordinates, origins, sizes):
+	"""Node coordinates relative to a box per node, NaN where the box has no width or height."""
+	normalized = []
+	for (x, y), (originX, originY), (width, height) in zip(coordinates, origins, sizes):
+		if width and height:
+			normalized.append(((x - originX) / width, (y - originY) / height))
+		else:
+			normalized.append((float("nan"), float("nan")))
+	return normalized
+
+
+class LayerStack(object):
+	"""
+	Nodes of compatible layers of one glyph, in the same flat order (path by path) for every layer.
+
+	coordinates: one list of (x, y) per layer
+	pathIndexes: path index of every node
+	nextIndexes: flat index of the next node in the same path
+	bcpToBcp: True for nodes where both the node and its next node are off-curve
+	layerBounds: (x, y, width, height) per layer
+	pathBounds: one list of (x, y, width, height) per path, per layer
+	"""
+
+	def __init__(self, coordinates, pathIndexes, nextIndexes, bcpToBcp, layerBounds, pathBounds, useNumpy=None):
+		if useNumpy is None:
+			useNumpy = numpy is not None
+		self.usesNumpy = bool(useNumpy)
+		self.layerCount = len(coordinates)
+		self.nodeCount = len(pathIndexes)
+		self.pathIndexes = list(pathIndexes)
+		self.nextIndexes = list(nextIndexes)
+		self.bcpToBcp = list(bcpToBcp)
+
+		# everything that only depends on one layer is computed once per layer:
+		segmentAngles, segmentLengths, shapeNormalized, glyphNormalized = [], [], [], []
+		self.layerHasExtension = []
+		for layerIndex, layerCoordinates in enumerate(coordinates):
+			angles, lengths = [], []
+			for nodeIndex, (x, y) in enumerate(layerCoordinates):
+				nextX, nextY = layerCoordinates[self.nextIndexes[nodeIndex]]
+				angles.append(math.degrees(math.atan2(nextY - y, nextX - x)) % 360)
+				lengths.append(math.hypot(nextX - x, nextY - y))
+			segmentAngles.append(angles)
+			segmentLengths.append(lengths)
+
+			x, y, width, height = layerBounds[layerIndex]
+			self.layerHasExtension.append(bool(width and height))
+			glyphNormalized.append(_normalized(layerCoordinates, [(x, y)] * self.nodeCount, [(width, height)] * self.nodeCount))
+			nodePathBounds = [pathBounds[layerIndex][pathIndex] for pathIndex in self.pathIndexes]
+			shapeNormalized.append(_normalized(layerCoordinates, [bounds[:2] for bounds in nodePathBounds], [bounds[2:] for bounds in nodePathBounds]))
+
+		if self.usesNumpy:
+			shape = (self.layerCount, self.nodeCount)
+			self.segmentAngles = numpy.array(segmentAngles, dtype=float).reshape(shape)
+			self.segmentLengths = numpy.array(segmentLengths, dtype=float).reshape(shape)
+			self.glyphNormalized = numpy.array(glyphNormalized, dtype=float).reshape(shape + (2,))
+			self.shapeNormalized = numpy.array(shapeNormalized, dtype=float).reshape(shape + (2,))
+			self.bcpToBcp = numpy.array(self.bcpToBcp, dtype=bool)
+		else:
+			self.segmentAngles = segmentAngles
+			self.segmentLengths = segmentLengths
+			self.glyphNormalized = glyphNormalized
+			self.shapeNormalized = shapeNormalized
+
+	def maxTravelRatios(self, layerPairs, normalizeShape=True, normalizeGlyph=True):
+		"""
+		Largest node travel for every pair of layer indexes, as a share of the
+		bounding box diagonal of the path (normalizeShape) and/or of the glyph (normalizeGlyph).
+		Pairs where one of the layers has no width or no height get 0.0.
+		"""
+		if not layerPairs or not self.nodeCount:
+			return [0.0] * len(layerPairs)
+
+		if self.usesNumpy:
+			first, second = numpy.array(layerPairs, dtype=int).T
+			ratios = numpy.zeros(len(layerPairs))
+			with numpy.errstate(invalid="ignore"):
+				for doIt, normalized in ((normalizeShape, self.shapeNormalized), (normalizeGlyph, self.glyphNormalized)):
+					if doIt:
+						travel = numpy.hypot(*numpy.moveaxis(normalized[first] - normalized[second], -1, 0)) / maxPossibleTravel
+						ratios = numpy.maximum(ratios, numpy.where(numpy.isnan(travel), 0.0, travel).max(axis=1))
+			hasExtension = numpy.array(self.layerHasExtension, dtype=bool)
+			return [float(ratio) for ratio in numpy.where(hasExtension[first] & hasExtension[second], ratios, 0.0)]
+
+		ratios = []
+		for first, second in layerPairs:
+			ratio = 0.0
+			if self.layerHasExtension[first] and self.layerHasExtension[second]:
+				for doIt, normalized in ((normalizeShape, self.shapeNormalized), (normalizeGlyph, self.glyphNormalized)):
+					if doIt:
+						for (x1, y1), (x2, y2) in zip(normalized[first], normalized[second]):
+							travel = math.hypot(x1 - x2, y1 - y2) / maxPossibleTravel
+							if travel > ratio:  # False for NaN
+								ratio = travel
+			ratios.append(ratio)
+		return ratios
+
+	def segmentRotations(self, layerPairs, thresholdAngle=None, checkOrthogonals=False, minLength=None):
+		"""
+		Compares the angles of all segments (node to next node, without BCP-to-BCP connections,
+		and without segments up to minLength units in the first layer of a pair).
+		Returns one (maxRotation, maxDeorthogonalization, flaggedNodeIndexes) per pair, where
+		maxDeorthogonalization is the largest rotation of a segment that is orthogonal in only one
+		of the layers (if checkOrthogonals), and flaggedNodeIndexes are the segment start nodes
+		rotating more than thresholdAngle (if not None) or going unorthogonal.
+		"""
+		if not layerPairs or not self.nodeCount:
+			return [(0.0, 0.0, []) for pair in layerPairs]
+
+		if self.usesNumpy:
+			first, second = numpy.array(layerPairs, dtype=int).T
+			firstAngles, secondAngles = self.segmentAngles[first], self.segmentAngles[second]
+			rotations = numpy.abs(firstAngles - secondAngles)
+			rotations = numpy.where(rotations > 180, 360 - rotations, rotations)
+			relevant = numpy.broadcast_to(~self.bcpToBcp, rotations.shape)
+			if minLength is not None:
+				relevant = relevant & (self.segmentLengths[first] > minLength)
+			rotations = numpy.where(relevant, rotations, 0.0)
+			flagged = numpy.zeros(rotations.shape, dtype=bool)
+			if thresholdAngle is not None:
+				flagged |= rotations > thresholdAngle
+			if checkOrthogonals:
+				deorthogonalizing = relevant & ((firstAngles % 90 == 0) != (secondAngles % 90 == 0))
+				deorthogonalizations = numpy.where(deorthogonalizing, rotations, 0.0).max(axis=1)
+				flagged |= deorthogonalizing
+			else:
+				deorthogonalizations = numpy.zeros(len(layerPairs))
+			return [
+				(float(maxRotation), float(deorthogonalization), numpy.flatnonzero(flaggedRow).tolist())
+				for maxRotation, deorthogonalization, flaggedRow in zip(rotations.max(axis=1), deorthogonalizations, flagged)
+			]
+
+		results = []
+		for first, second in layerPairs:
+			maxRotation = maxDeorthogonalization = 0.0
+			flaggedNodeIndexes = []
+			for nodeIndex in range(self.nodeCount):
+				if self.bcpToBcp[nodeIndex] or (minLength is not None and self.segmentLengths[first][nodeIndex] <= minLength):
+					continue
+				firstAngle, secondAngle = self.segmentAngles[first][nodeIndex], self.segmentAngles[second][nodeIndex]
+				rotation = abs(firstAngle - secondAngle)
+				if rotation > 180:
+					rotation = 360 - rotation
+				maxRotation = max(maxRotation, rotation)
+				deorthogonalizing = checkOrthogonals and (firstAngle % 90 == 0) != (secondAngle % 90 == 0)
+				if deorthogonalizing:
+					maxDeorthogonalization = max(maxDeorthogonalization, rotation)
+				if deorthogonalizing or (thresholdAngle is not None and rotation > thresholdAngle):
+					flaggedNodeIndexes.append(nodeIndex)
+			results.append((maxRotation, maxDeorthogonalization, flaggedNodeIndexes))
+		return results
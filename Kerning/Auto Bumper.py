@@ -8,7 +8,9 @@ Specify a minimum distance, left and right glyphs, and Auto Bumper will add the
 import vanilla
 from mekkablue import mekkaObject, reportTimeInNaturalLanguage
 from timeit import default_timer as timer
-from kernanalysis import intervalList, minDistanceBetweenTwoLayers, sortedIntervalsFromString, stringToListOfGlyphsForFont, effectiveKerning, distanceFromEntry
+from kernanalysis import intervalList, layerCache, sortedIntervalsFromString, stringToListOfGlyphsForFont, glyphSetIndex, KerningTable, kerningDirection, distanceFromEntry
+from kernprofiles import minDistanceBetweenProfiles
+from kerndistances import DistanceStore
 from AppKit import NSColor
 from GlyphsApp import Glyphs, Message
 
@@ -77,6 +79,9 @@ class Bumper(mekkaObject):
 		"reuseCurrentTab": 1,
 		"avoidZeroKerning": 1,
 		"suffix": "",
+		"useDistanceStore": 1,
+		"verifyDistanceStore": 0,
+		"allMasters": 0,
 
 		"kernStrings": defaultStrings,
 	}
@@ -86,7 +91,7 @@ class Bumper(mekkaObject):
 
 		# Window 'self.w':
 		windowWidth = 500
-		windowHeight = 365
+		windowHeight = 413
 		windowWidthResize = 500  # user can resize width by this value
 		windowHeightResize = 500  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -173,6 +178,16 @@ class Bumper(mekkaObject):
 		self.w.reportInMacroWindow.getNSButton().setToolTip_("Outputs a detailed report in the Macro Window, and opens it.")
 		linePos += lineHeight
 
+		self.w.useDistanceStore = vanilla.CheckBox((inset + 5, linePos, tabStop - inset, smallCheckboxHeight), "Remember distances between runs", value=True, sizeStyle='small', callback=self.SavePreferences)
+		self.w.useDistanceStore.getNSButton().setToolTip_("If enabled, measured distances are stored in ~/Library/Caches/mekkablue/KernDistances.sqlite, keyed by the outlines of both glyphs, the master, the speed and the ignored height intervals. Later runs only measure pairs where a glyph has changed. Kerning is not part of the stored distance, so it can change freely.")
+		self.w.verifyDistanceStore = vanilla.CheckBox((inset + tabStop, linePos, -inset, smallCheckboxHeight), "Verify 2% of them", value=False, sizeStyle='small', callback=self.SavePreferences)
+		self.w.verifyDistanceStore.getNSButton().setToolTip_("If enabled, measures a random 2% of the remembered distances again, and reports (and replaces) stale entries in the Macro Window.")
+		linePos += lineHeight
+
+		self.w.allMasters = vanilla.CheckBox((inset + 5, linePos, -inset, smallCheckboxHeight), "Process all masters (applies all kerning at the end)", value=False, sizeStyle='small', callback=self.SavePreferences)
+		self.w.allMasters.getNSButton().setToolTip_("If enabled, bumps the kerning in all masters of the font, not just the current one. The new kerning of all masters is added in one batch at the end, and the Macro Window shows how long each master took. Distances entered as glyph names are measured per master.")
+		linePos += lineHeight
+
 		self.w.openNewTabWithKernPairs = vanilla.CheckBox((inset + 5, linePos, tabStop - inset, smallCheckboxHeight), "Open Edit tab with new kern pairs", value=False, sizeStyle='small', callback=self.SavePreferences)
 		self.w.openNewTabWithKernPairs.getNSButton().setToolTip_("If kern pairs were added, opens them in a new Edit tab, for inspection.")
 		self.w.reuseCurrentTab = vanilla.CheckBox((inset + tabStop, linePos, -inset, 20), "Reuse current tab", value=True, callback=self.SavePreferences, sizeStyle='small')
@@ -259,7 +274,7 @@ class Bumper(mekkaObject):
 				intervalIndex = 0
 			self.w.text_speedExplanation.set("Measuring every %i units." % intervalList[intervalIndex])
 
-	def addMissingKerning(self, thisFont, thisMasterID, leftSide, rightSide, minMaxDistance, distanceBetweenShapes, existingKerning=0):
+	def addMissingKerning(self, kerningTable, leftSide, rightSide, minMaxDistance, distanceBetweenShapes, existingKerning=0):
 		# query user settings:
 		shouldReportInMacroWindow = self.pref("reportInMacroWindow")
 		shouldKeepExistingKerning = self.prefBool("keepExistingKerning")
@@ -288,11 +303,119 @@ class Bumper(mekkaObject):
 					print("- %s %s: keeps existing %i (instead of new %i)." % (leftSide, rightSide, existingKerning, newKernValue))
 				return False  # do not increase kern count
 			else:
-				thisFont.setKerningForPair(thisMasterID, leftSide, rightSide, newKernValue)
+				kerningTable.setKerningForPair(leftSide, rightSide, newKernValue)
 				if shouldReportInMacroWindow:
 					print("- %s %s: %i" % (leftSide, rightSide, newKernValue))
 				return True  # increase kern count
 
+	def bumpMaster(self, thisFont, thisMasterID, firstGlyphList, secondGlyphList, step, progressRange=(0, 100)):
+		"""
+		Measures all pairs in one master. New kerning is only recorded in the returned KerningTable
+		(apply it with applyPendingEdits()). Returns (kerningTable, kernCount, tabLines).
+		"""
+		shouldReportInMacroWindow = self.pref("reportInMacroWindow")
+		resetExceptionsForGroups = self.prefBool("resetExceptionsForGroups")
+		leftIsGroups = self.prefBool("leftIsGroups")
+		rightIsGroups = self.prefBool("rightIsGroups")
+		ignoreIntervals = sortedIntervalsFromString(self.pref("ignoreIntervals"), font=thisFont, mID=thisMasterID)
+		minDistance = distanceFromEntry(self.pref("minDistance"), thisFont, thisMasterID)
+		maxDistance = distanceFromEntry(self.pref("maxDistance"), thisFont, thisMasterID)
+		if shouldReportInMacroWindow:
+			if minDistance is not None:
+				print("Minimum Distance: %i" % minDistance)
+			if maxDistance is not None:
+				print("Maximum Distance: %i" % maxDistance)
+
+		# effective kerning of all pairs, looked up in a flat table (kept in sync while kerning):
+		kerningTable = KerningTable(thisFont, thisMasterID, kerningDirection(thisFont), deferred=True)
+		if shouldReportInMacroWindow:
+			print("%s\n" % kerningTable.validationReport([g.name for g in firstGlyphList], [g.name for g in secondGlyphList]))
+
+		# sample the edges of all right glyphs once (reused from previous runs if unchanged):
+		distanceStore = None
+		if self.pref("useDistanceStore"):
+			distanceStore = DistanceStore(thisMasterID, step, ignoreIntervals, verifyRate=0.02 if self.pref("verifyDistanceStore") else 0.0)
+		rightProfiles = {}
+		for rightGlyph in secondGlyphList:
+			rightProfiles[rightGlyph.name] = layerCache.profile(rightGlyph.layers[thisMasterID], step)
+
+		tabLines = []
+		kernCount = 0
+		numOfGlyphs = len(firstGlyphList)
+		progressStart, progressEnd = progressRange
+		for index in range(numOfGlyphs):
+			# update progress bar:
+			self.w.bar.set(progressStart + (progressEnd - progressStart) * index / numOfGlyphs)
+			# determine left glyph:
+			leftGlyph = firstGlyphList[index]
+			leftProfile = layerCache.profile(leftGlyph.layers[thisMasterID], step)
+			leftGroup = leftGlyph.rightKerningGroup
+			if leftIsGroups:
+				if leftGroup:
+					leftSide = "@MMK_L_%s" % leftGroup
+				else:
+					print("⚠️ Left glyph %s has no kerning group. Cannot apply group kerning." % leftGlyph.name)
+					leftSide = None
+			else:
+				leftSide = leftGlyph.name
+
+			# only continue if we could establish a left side:
+			tabString = ""
+			if leftSide:
+				# cycle through right glyphs:
+				for rightGlyph in secondGlyphList:
+					rightGroup = rightGlyph.leftKerningGroup
+					if rightIsGroups:
+						if rightGroup:
+							rightSide = "@MMK_R_%s" % rightGroup
+						else:
+							print("⚠️ Right glyph %s has no kerning group. Cannot apply group kerning." % rightGlyph.name)
+							rightSide = None
+					else:
+						rightSide = rightGlyph.name
+
+					# only continue if we could establish a right side:
+					if rightSide:
+						if resetExceptionsForGroups:
+							if leftIsGroups and kerningTable.hasPair(leftGlyph.name, rightSide):
+								kerningTable.removeKerningForPair(leftGlyph.name, rightSide)
+							if rightIsGroups and kerningTable.hasPair(leftSide, rightGlyph.name):
+								kerningTable.removeKerningForPair(leftSide, rightGlyph.name)
+							if (leftIsGroups and rightIsGroups) and kerningTable.hasPair(leftGlyph.name, rightGlyph.name):
+								kerningTable.removeKerningForPair(leftGlyph.name, rightGlyph.name)
+
+						kerning = kerningTable.value(leftGlyph.name, rightGlyph.name)
+						if distanceStore:
+							distanceBetweenShapes = distanceStore.minDistance(leftProfile, rightProfiles[rightGlyph.name], kerning=kerning)
+						else:
+							distanceBetweenShapes = minDistanceBetweenProfiles(
+								leftProfile, rightProfiles[rightGlyph.name], kerning=kerning, ignoreIntervals=ignoreIntervals
+							)
+
+						# positive kerning (if desired):
+						if minDistance and (distanceBetweenShapes is not None) and (distanceBetweenShapes < minDistance):
+							if self.addMissingKerning(kerningTable, leftSide, rightSide, minDistance, distanceBetweenShapes, existingKerning=kerning):
+								kernCount += 1
+								tabString += "/%s/%s  " % (leftGlyph.name, rightGlyph.name)
+
+						# negative kerning (if desired):
+						if maxDistance and (distanceBetweenShapes is not None) and (distanceBetweenShapes > maxDistance):
+							if self.addMissingKerning(kerningTable, leftSide, rightSide, maxDistance, distanceBetweenShapes, existingKerning=kerning):
+								kernCount += 1
+								tabString += "/%s/%s  " % (leftGlyph.name, rightGlyph.name)
+					else:
+						print("No right side.")
+
+			tabString = tabString.strip()
+			if tabString:
+				tabLines.append(tabString)
+
+		if distanceStore:
+			distanceStore.close()
+			if shouldReportInMacroWindow:
+				print(distanceStore.report())
+		return kerningTable, kernCount, tabLines
+
 	def BumperMain(self, sender):
 		try:
 			# save prefs
@@ -301,14 +424,15 @@ class Bumper(mekkaObject):
 			# query frontmost fontmaster:
 			thisFont = Glyphs.font
 			thisMaster = thisFont.selectedFontMaster
-			thisMasterID = thisMaster.id
 
 			# start reporting to macro window:
 			shouldReportInMacroWindow = self.pref("reportInMacroWindow")
 			if shouldReportInMacroWindow:
 				Glyphs.clearLog()
-				print("Auto Bumper Report for %s, master %s:\n" % (thisFont.familyName, thisMaster.name))
-			self.w.status.set(f"Bumping in ‘{thisMaster.name}’")
+				if self.pref("allMasters"):
+					print("Auto Bumper Report for %s, all masters:\n" % thisFont.familyName)
+				else:
+					print("Auto Bumper Report for %s, master %s:\n" % (thisFont.familyName, thisMaster.name))
 
 			# reset progress bar:
 			self.w.bar.set(0)
@@ -319,14 +443,11 @@ class Bumper(mekkaObject):
 
 			# query user input:
 			step = intervalList[self.pref("speedPopup")]
-			ignoreIntervals = sortedIntervalsFromString(self.pref("ignoreIntervals"), font=thisFont, mID=thisMasterID)
 			shouldExcludeNonExporting = self.prefBool("excludeNonExporting")
-			resetExceptionsForGroups = self.prefBool("resetExceptionsForGroups")
-			leftIsGroups = self.prefBool("leftIsGroups")
-			rightIsGroups = self.prefBool("rightIsGroups")
-
-			minDistance = distanceFromEntry(self.pref("minDistance"), thisFont, thisMasterID)
-			maxDistance = distanceFromEntry(self.pref("maxDistance"), thisFont, thisMasterID)
+			if self.pref("allMasters"):
+				masters = thisFont.masters
+			else:
+				masters = (thisMaster,)
 
 			roundFactor = self.pref("roundFactor")
 			try:
@@ -355,12 +476,14 @@ class Bumper(mekkaObject):
 				self.SavePreferences()
 			else:
 				# find list of glyph names:
+				glyphIndex = glyphSetIndex(thisFont)
 				firstGlyphList = stringToListOfGlyphsForFont(
 					self.pref("leftGlyphs"),
 					thisFont,
 					report=shouldReportInMacroWindow,
 					excludeNonExporting=shouldExcludeNonExporting,
 					suffix=suffix,
+					glyphIndex=glyphIndex,
 				)
 				secondGlyphList = stringToListOfGlyphsForFont(
 					self.pref("rightGlyphs"),
@@ -368,15 +491,12 @@ class Bumper(mekkaObject):
 					report=shouldReportInMacroWindow,
 					excludeNonExporting=shouldExcludeNonExporting,
 					suffix=suffix,
+					glyphIndex=glyphIndex,
 				)
 
 				# report key values for kerning:
 				if shouldReportInMacroWindow:
 					print()
-					if minDistance is not None:
-						print("Minimum Distance: %i" % minDistance)
-					if maxDistance is not None:
-						print("Maximum Distance: %i" % maxDistance)
 					if roundFactor is not None:
 						print("Rounding: %i" % roundFactor)
 
@@ -386,84 +506,51 @@ class Bumper(mekkaObject):
 
 				# CREATE KERNING DATA:
 
-				tabString = ""
+				# measure one master after the other, and collect the new kerning without changing the font yet:
+				layerCache.resetStatistics()
+				kerningTables = []
+				masterReports = []
+				tabLines = []
 				kernCount = 0
-				numOfGlyphs = len(firstGlyphList)
-				for index in range(numOfGlyphs):
-					# update progress bar:
-					self.w.bar.set(int(100 * (float(index) / numOfGlyphs)))
-					# determine left glyph:
-					leftGlyph = firstGlyphList[index]
-					leftLayer = leftGlyph.layers[thisMasterID]
-					leftGroup = leftGlyph.rightKerningGroup
-					if leftIsGroups:
-						if leftGroup:
-							leftSide = "@MMK_L_%s" % leftGroup
-						else:
-							print("⚠️ Left glyph %s has no kerning group. Cannot apply group kerning." % leftGlyph.name)
-							leftSide = None
-					else:
-						leftSide = leftGlyph.name
-
-					# only continue if we could establish a left side:
-					if leftSide:
-						# cycle through right glyphs:
-						for rightGlyph in secondGlyphList:
-							rightLayer = rightGlyph.layers[thisMasterID]
-							rightGroup = rightGlyph.leftKerningGroup
-							if rightIsGroups:
-								if rightGroup:
-									rightSide = "@MMK_R_%s" % rightGroup
-								else:
-									print("⚠️ Right glyph %s has no kerning group. Cannot apply group kerning." % rightGlyph.name)
-									rightSide = None
-							else:
-								rightSide = rightGlyph.name
-
-							# only continue if we could establish a right side:
-							if rightSide:
-								if resetExceptionsForGroups:
-									if leftIsGroups and thisFont.kerningForPair(thisMasterID, leftGlyph.name, rightSide) is not None:
-										thisFont.removeKerningForPair(thisMasterID, leftGlyph.name, rightSide)
-									if rightIsGroups and thisFont.kerningForPair(thisMasterID, leftSide, rightGlyph.name) is not None:
-										thisFont.removeKerningForPair(thisMasterID, leftSide, rightGlyph.name)
-									if (leftIsGroups and rightIsGroups) and thisFont.kerningForPair(thisMasterID, leftGlyph.name, rightGlyph.name) is not None:
-										thisFont.removeKerningForPair(thisMasterID, leftGlyph.name, rightGlyph.name)
-
-								kerning = effectiveKerning(leftGlyph.name, rightGlyph.name, thisFont, thisMasterID)
-								distanceBetweenShapes = minDistanceBetweenTwoLayers(
-									leftLayer, rightLayer, interval=step, kerning=kerning, report=False, ignoreIntervals=ignoreIntervals
-								)
-
-								# positive kerning (if desired):
-								if minDistance and (distanceBetweenShapes is not None) and (distanceBetweenShapes < minDistance):
-									if self.addMissingKerning(thisFont, thisMasterID, leftSide, rightSide, minDistance, distanceBetweenShapes, existingKerning=kerning):
-										kernCount += 1
-										tabString += "/%s/%s  " % (leftGlyph.name, rightGlyph.name)
-
-								# negative kerning (if desired):
-								if maxDistance and (distanceBetweenShapes is not None) and (distanceBetweenShapes > maxDistance):
-									if self.addMissingKerning(thisFont, thisMasterID, leftSide, rightSide, maxDistance, distanceBetweenShapes, existingKerning=kerning):
-										kernCount += 1
-										tabString += "/%s/%s  " % (leftGlyph.name, rightGlyph.name)
-							else:
-								print("No right side.")
-
-					tabString = tabString.strip()
-					tabString += "\n"
-
-				# FINISH UP AND REPORT:
+				for masterIndex, master in enumerate(masters):
+					masterStart = timer()
+					self.w.status.set(f"Bumping in ‘{master.name}’")
+					if shouldReportInMacroWindow and len(masters) > 1:
+						print("\nⓂ️ Master %s:" % master.name)
+					kerningTable, masterKernCount, masterTabLines = self.bumpMaster(
+						thisFont,
+						master.id,
+						firstGlyphList,
+						secondGlyphList,
+						step,
+						progressRange=(100 * masterIndex / len(masters), 100 * (masterIndex + 1) / len(masters)),
+					)
+					kerningTables.append(kerningTable)
+					kernCount += masterKernCount
+					for tabLine in masterTabLines:
+						if tabLine not in tabLines:
+							tabLines.append(tabLine)
+					masterReports.append(f"⏱ {master.name}: {masterKernCount} kern pair{'s' if masterKernCount != 1 else ''} in {reportTimeInNaturalLanguage(timer() - masterStart)}")
+
+				# apply all new kerning in one go:
+				thisFont.disableUpdateInterface()
+				try:
+					for kerningTable in kerningTables:
+						kerningTable.applyPendingEdits()
+				finally:
+					thisFont.enableUpdateInterface()
+
+				if len(masters) > 1:
+					print("\nAuto Bumper timing per master:")
+					print("\n".join(masterReports))
+
+				tabString = "\n".join(tabLines)
 
 				# update progress bar:
 				self.w.bar.set(100)
 				# take time:
 				timereport = reportTimeInNaturalLanguage(timer() - start)
 
-				# clean up the tab string:
-				tabString = tabString.strip()
-				while "\n\n" in tabString:
-					tabString = tabString.replace("\n\n", "\n")
-
 				# Report number of new kern pairs:
 				if kernCount:
 					report = f'Added {kernCount} kern pair{"s" if kernCount != 1 else ""} in {timereport}.'
@@ -491,6 +578,7 @@ class Bumper(mekkaObject):
 				if shouldReportInMacroWindow:
 					print()
 					print(report)
+					print(layerCache.report())
 
 		except Exception as e:
 			# brings macro window to front and reports error:
@@ -8,7 +8,8 @@ Like Auto Bumper, but with the bounding box of a group of glyphs, and the kernin
 import vanilla
 import math
 from Foundation import NSRect, NSUnionRect, NSIsEmptyRect, NSInsetRect, NSStringFromRect, NSAffineTransform, NSAffineTransformStruct
-from kernanalysis import stringToListOfGlyphsForFont, minDistanceBetweenTwoLayers
+from kernanalysis import stringToListOfGlyphsForFont, layerCache, layerProfile
+from kernprofiles import minDistanceBetweenProfiles
 from GlyphsApp import Glyphs, GSFeature, GSLayer, GSPath, Message
 from mekkablue import mekkaObject
 
@@ -61,6 +62,15 @@ def createOTFeature(featureName="calt", featureCode="# empty feature code", targ
 
 
 def straightenedLayer(layer):
+	"""Decomposed and (for italics) unslanted copy of layer, cached until the layer changes. Do not modify it."""
+	return layerCache.get(layer, ("straightened", layer.italicAngle), _straightenedCopy)
+
+
+def straightenedProfile(layer, step=2):
+	return layerCache.get(layer, ("straightenedProfile", layer.italicAngle, step), lambda layer: layerProfile(straightenedLayer(layer), step))
+
+
+def _straightenedCopy(layer):
 	disposableLayer = layer.copyDecomposedLayer()
 	if layer.italicAngle != 0:
 		skewStruct = NSAffineTransformStruct()
@@ -245,6 +255,7 @@ class BBoxBumperKerning(mekkaObject):
 			# clear macro window log:
 			Glyphs.clearLog()
 			print("BBox Bumper Report")
+			layerCache.resetStatistics()
 
 			# update settings to the latest user input:
 			self.SavePreferences()
@@ -337,17 +348,14 @@ class BBoxBumperKerning(mekkaObject):
 						bboxLayer.LSB = smallestLSB - bboxBubbleExtension
 						bboxLayer.RSB = smallestRSB - bboxBubbleExtension
 						bboxKey = "@%s" % otClassName
+						bboxProfile = layerProfile(bboxLayer, 2)
 
 						print("  📐 Measuring distances with %i other glyphs..." % len(otherGlyphs))
 						for otherGlyph in otherGlyphs:
-							otherLayerStraightened = straightenedLayer(otherGlyph.layers[thisMaster.id])
+							otherProfile = straightenedProfile(otherGlyph.layers[thisMaster.id])
 							if otherGlyphsOnLeftSide:
 								otherKey = None
-								dist = minDistanceBetweenTwoLayers(
-									otherLayerStraightened,
-									bboxLayer,
-									interval=2,
-								)
+								dist = minDistanceBetweenProfiles(otherProfile, bboxProfile)
 								if otherGlyph.rightKerningGroup:
 									otherKey = "@MMK_L_%s" % otherGlyph.rightKerningGroup
 								elif allowKerningExceptions:
@@ -357,11 +365,7 @@ class BBoxBumperKerning(mekkaObject):
 
 							if otherGlyphsOnRightSide:
 								otherKey = None
-								dist = minDistanceBetweenTwoLayers(
-									bboxLayer,
-									otherLayerStraightened,
-									interval=2,
-								)
+								dist = minDistanceBetweenProfiles(bboxProfile, otherProfile)
 								if otherGlyph.leftKerningGroup:
 									otherKey = "@MMK_R_%s" % otherGlyph.leftKerningGroup
 								elif allowKerningExceptions:
@@ -389,6 +393,7 @@ class BBoxBumperKerning(mekkaObject):
 						prefix="# Automatic Code",
 					)
 					print("🏗 %s" % featureStatus)
+					print("🗃️ %s" % layerCache.report())
 					print("🫱🏾‍🫲🏻 Recompiling features...")
 					thisFont.compileFeatures()
 
@@ -2,15 +2,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import division, print_function, unicode_literals
 __doc__ = """
-Opens a new tab with kerning combos that have large gaps in the current fontmaster.
+Opens a new tab with kerning combos that have large gaps in the current fontmaster. Hold down Cmd+Opt to cancel a long run: the gaps found so far are kept, and the next run with the same settings resumes where it stopped.
 """
 
 import vanilla
 from timeit import default_timer as timer
-from Foundation import NSNotFound
 from GlyphsApp import Glyphs, Message
-from mekkablue import mekkaObject, caseDict
-from kernanalysis import distanceFromEntry
+from mekkablue import mekkaObject
+from kernanalysis import distanceFromEntry, layerCache, KerningTable, ScanSession, glyphSetIndex
+from kernprofiles import PairPruner
+from kerndistances import DistanceStore
 
 
 intervalList = (1, 3, 5, 10, 20)
@@ -40,12 +41,14 @@ class GapFinder(mekkaObject):
 		"excludeNonExporting": 1,
 		"reportGapsInMacroWindow": 0,
 		"reuseCurrentTab": 1,
+		"useDistanceStore": 1,
+		"verifyDistanceStore": 0,
 	}
 
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 410
-		windowHeight = 260
+		windowHeight = 282
 		windowWidthResize = 800  # user can resize width by this value
 		windowHeightResize = 0  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -91,6 +94,12 @@ class GapFinder(mekkaObject):
 		self.w.excludeNonExporting = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Exclude non-exporting glyphs", value=True, sizeStyle='small', callback=self.SavePreferences)
 		linePos += lineHeight
 
+		self.w.useDistanceStore = vanilla.CheckBox((inset + 2, linePos, 230, 20), "Remember distances between runs", value=True, sizeStyle='small', callback=self.SavePreferences)
+		self.w.useDistanceStore.getNSButton().setToolTip_("If enabled, measured distances are stored in ~/Library/Caches/mekkablue/KernDistances.sqlite, keyed by the outlines of both glyphs, the master, and the speed. Later runs only measure pairs where a glyph has changed.")
+		self.w.verifyDistanceStore = vanilla.CheckBox((inset + 240, linePos, -inset, 20), "Verify 2% of them", value=False, sizeStyle='small', callback=self.SavePreferences)
+		self.w.verifyDistanceStore.getNSButton().setToolTip_("If enabled, measures a random 2% of the remembered distances again, and reports (and replaces) stale entries in the Macro Window.")
+		linePos += lineHeight
+
 		self.w.reportGapsInMacroWindow = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Also report in Macro Window (slower)", value=False, sizeStyle='small', callback=self.SavePreferences)
 		self.w.reuseCurrentTab = vanilla.CheckBox((inset + 240, linePos, -inset, 20), "Reuse current tab", value=True, callback=self.SavePreferences, sizeStyle='small')
 		self.w.reuseCurrentTab.getNSButton().setToolTip_("If enabled, will not open a new tab with newly added kern pairs, but reuse the current Edit tab. Will open an Edit tab if none is open.")
@@ -106,6 +115,7 @@ class GapFinder(mekkaObject):
 
 		# Run Button:
 		self.w.runButton = vanilla.Button((-90 - inset, -20 - inset, -inset, -inset), "Open Tab", callback=self.GapFinderMain)
+		self.w.runButton.getNSButton().setToolTip_("Hold down ⌘⌥ to cancel. Gaps found so far will be shown, and the next run with the same settings resumes where it stopped. Results are also streamed into an NDJSON report file next to the font.")
 		self.w.setDefaultButton(self.w.runButton)
 
 		# Load Settings:
@@ -133,46 +143,14 @@ class GapFinder(mekkaObject):
 			offset = glyphName.find(".")
 			return glyphName[:offset]
 
-	def effectiveKerning(self, leftGlyphName, rightGlyphName, thisFont, thisFontMasterID):
-		leftLayer = thisFont.glyphs[leftGlyphName].layers[thisFontMasterID]
-		rightLayer = thisFont.glyphs[rightGlyphName].layers[thisFontMasterID]
-		if Glyphs.versionNumber >= 3:
-			effectiveKerning = leftLayer.nextKerningForLayer_direction_(
-				rightLayer,
-				0  # LTR
-			)
-		else:
-			effectiveKerning = leftLayer.rightKerningForLayer_(rightLayer)
-		if effectiveKerning < NSNotFound:
-			return effectiveKerning
-		else:
-			return 0.0
-
-	def listOfNamesForCategories(self, thisFont, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting):
-		nameList = []
-		for thisGlyph in thisFont.glyphs:
-			thisScript = thisGlyph.script
-			glyphName = thisGlyph.name
-			nameIsOK = True
-
-			if excludedGlyphNameParts:
-				for thisNamePart in excludedGlyphNameParts:
-					nameIsOK = nameIsOK and thisNamePart not in glyphName
-
-			if nameIsOK and (thisGlyph.export or not excludeNonExporting):
-				if thisScript is None or thisScript == requiredScript:
-					if thisGlyph.category == requiredCategory:
-						if requiredSubCategory:
-							if Glyphs.versionNumber >= 3 and requiredSubCategory in caseDict:
-								requiredCase = caseDict[requiredSubCategory]
-								if thisGlyph.case == requiredCase:
-									nameList.append(glyphName)
-							else:
-								if thisGlyph.subCategory == requiredSubCategory:
-									nameList.append(glyphName)
-						else:
-							nameList.append(glyphName)
-		return nameList
+	def listOfNamesForCategories(self, glyphIndex, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting):
+		return glyphIndex.glyphNamesForCategory(
+			requiredCategory,
+			requiredSubCategory,
+			script=requiredScript,
+			excludeNonExporting=excludeNonExporting,
+			excludedNameParts=excludedGlyphNameParts,
+		)
 
 	def splitString(self, string, delimiter=":", Maximum=2):
 		# split string into a list:
@@ -191,43 +169,31 @@ class GapFinder(mekkaObject):
 
 		return returnList
 
-	def measureLayerAtHeightFromLeftOrRight(self, thisLayer, height, leftSide=True):
-		try:
-			if leftSide:
-				measurement = thisLayer.lsbAtHeight_(height)
-			else:
-				measurement = thisLayer.rsbAtHeight_(height)
-			if measurement < NSNotFound:
-				return measurement
-			else:
-				return None
-		except:
-			return None
-
-	def minDistanceBetweenTwoLayers(self, leftLayer, rightLayer, interval=5.0, kerning=0.0, report=False):
-		# correction = leftLayer.RSB+rightLayer.LSB
-		topY = min(leftLayer.bounds.origin.y + leftLayer.bounds.size.height, rightLayer.bounds.origin.y + rightLayer.bounds.size.height)
-		bottomY = max(leftLayer.bounds.origin.y, rightLayer.bounds.origin.y)
-		distance = topY - bottomY
-		minDist = None
-		for i in range(int(distance // interval)):
-			height = bottomY + i * interval
-			left = self.measureLayerAtHeightFromLeftOrRight(leftLayer, height, leftSide=False)
-			right = self.measureLayerAtHeightFromLeftOrRight(rightLayer, height, leftSide=True)
-			try:  # avoid gaps like in i or j
-				total = left + right + kerning  # +correction
-				if minDist is None or minDist > total:
-					minDist = total
-			except:
-				pass
-		return minDist
-
 	def queryPrefs(self):
 		script = self.pref("popupScript")
 		firstCategory, firstSubCategory = self.splitString(self.w.popupLeftCat.getItems()[self.pref("popupLeftCat")])
 		secondCategory, secondSubCategory = self.splitString(self.w.popupRightCat.getItems()[self.pref("popupRightCat")])
 		return script, firstCategory, firstSubCategory, secondCategory, secondSubCategory
 
+	def gapRows(self, thisFont, thisFontMasterID, firstList, secondList, step, maxDistance, kerningTable, pruner):
+		"""Generator: measures all pairs, and yields (leftGlyphName, [(rightGlyphName, distance), ...]) as soon as a left glyph is finished."""
+		# sample the edges of all right glyphs once (reused from previous runs if unchanged):
+		rightProfiles = {}
+		for secondGlyphName in secondList:
+			rightProfiles[secondGlyphName] = layerCache.profile(thisFont.glyphs[secondGlyphName].layers[thisFontMasterID], step)
+
+		for firstGlyphName in firstList:
+			leftProfile = layerCache.profile(thisFont.glyphs[firstGlyphName].layers[thisFontMasterID], step)
+
+			# cycle through right glyphs:
+			gaps = []
+			for secondGlyphName in secondList:
+				kerning = kerningTable.value(firstGlyphName, secondGlyphName)
+				distanceBetweenShapes = pruner.fartherThan(leftProfile, rightProfiles[secondGlyphName], kerning, maxDistance)
+				if distanceBetweenShapes is not None:
+					gaps.append((secondGlyphName, distanceBetweenShapes))
+			yield firstGlyphName, gaps
+
 	def GapFinderMain(self, sender):
 		try:
 			# update settings to the latest user input:
@@ -260,8 +226,9 @@ class GapFinder(mekkaObject):
 			self.SavePreferences()
 
 			# get list of glyph names:
-			firstList = self.listOfNamesForCategories(thisFont, firstCategory, firstSubCategory, script, excludedGlyphNameParts, excludeNonExporting)
-			secondList = self.listOfNamesForCategories(thisFont, secondCategory, secondSubCategory, script, excludedGlyphNameParts, excludeNonExporting)
+			glyphIndex = glyphSetIndex(thisFont)
+			firstList = self.listOfNamesForCategories(glyphIndex, firstCategory, firstSubCategory, script, excludedGlyphNameParts, excludeNonExporting)
+			secondList = self.listOfNamesForCategories(glyphIndex, secondCategory, secondSubCategory, script, excludedGlyphNameParts, excludeNonExporting)
 
 			if not firstList or not secondList:
 				Message(
@@ -274,31 +241,45 @@ class GapFinder(mekkaObject):
 					OKButton=None,
 				)
 
+			# effective LTR kerning of all pairs, looked up in a flat table:
+			kerningTable = KerningTable(thisFont, thisFontMasterID)
+
 			if self.pref("reportGapsInMacroWindow"):
 				print(f"Maximum Distance: {maxDistance}\n")
 				print("Left glyphs:\n%s\n" % ", ".join(firstList))
 				print("Right glyphs:\n%s\n" % ", ".join(secondList))
+				print("%s\n" % kerningTable.validationReport(firstList, secondList))
+
+			layerCache.resetStatistics()
+			settings = {
+				"step": step,
+				"maxDistance": maxDistance,
+				"kerning": kerningTable.fingerprint(),
+			}
+			session = ScanSession("GapFinder", thisFont, thisFontMasterID, settings, firstList, secondList, verbose=self.prefBool("reportGapsInMacroWindow"))
+			gapsByLeftGlyph = session.resume()
+			session.start()
+
+			# stream the results, hold down Cmd+Opt to stop and keep what has been found so far:
+			distanceStore = None
+			if self.pref("useDistanceStore"):
+				distanceStore = DistanceStore(thisFontMasterID, step, verifyRate=0.02 if self.pref("verifyDistanceStore") else 0.0)
+			pruner = PairPruner(step, distanceStore=distanceStore)
+			for firstGlyphName, gaps in self.gapRows(thisFont, thisFontMasterID, session.remainingLeftNames(), secondList, step, maxDistance, kerningTable, pruner):
+				gapsByLeftGlyph[firstGlyphName] = gaps
+				self.w.bar.set(int(100 * len(gapsByLeftGlyph) / len(firstList)))
+				if not session.addRow(firstGlyphName, gaps):
+					break
+			isComplete = session.finish()
+			if distanceStore:
+				distanceStore.close()
 
 			tabString = "\n"
 			gapCount = 0
-			numOfGlyphs = len(firstList)
-			for index in range(numOfGlyphs):
-				# update progress bar:
-				self.w.bar.set(int(100 * (float(index) / numOfGlyphs)))
-				# determine left glyph:
-				firstGlyphName = firstList[index]
-				leftLayer = thisFont.glyphs[firstGlyphName].layers[thisFontMasterID]
-
-				# cycle through right glyphs:
-				for secondGlyphName in secondList:
-					rightLayer = thisFont.glyphs[secondGlyphName].layers[thisFontMasterID]
-					kerning = self.effectiveKerning(firstGlyphName, secondGlyphName, thisFont, thisFontMasterID)
-					distanceBetweenShapes = self.minDistanceBetweenTwoLayers(leftLayer, rightLayer, interval=step, kerning=kerning, report=False)
-					if distanceBetweenShapes is not None and distanceBetweenShapes > maxDistance:
-						gapCount += 1
-						tabString += f"/{firstGlyphName}/{secondGlyphName}/space"
-						if self.pref("reportGapsInMacroWindow"):
-							print("- %s %s: %i" % (firstGlyphName, secondGlyphName, distanceBetweenShapes))
+			for firstGlyphName in firstList:
+				for secondGlyphName, distanceBetweenShapes in gapsByLeftGlyph.get(firstGlyphName, ()):
+					gapCount += 1
+					tabString += f"/{firstGlyphName}/{secondGlyphName}/space"
 				tabString += "\n"
 
 			# clean up the tab string:
@@ -328,6 +309,8 @@ class GapFinder(mekkaObject):
 					# disable reporters (avoid slowdown)
 					Glyphs.defaults["visibleReporters"] = None
 				report = f'{gapCount} kerning gaps have been found. Time elapsed: {timereport}.'
+				if not isComplete:
+					report = f'Cancelled. {report}'
 				if self.pref("reuseCurrentTab") and thisFont.currentTab:
 					thisFont.currentTab.text = tabString
 				else:
@@ -335,6 +318,8 @@ class GapFinder(mekkaObject):
 			# or report that nothing was found:
 			else:
 				report = 'No gaps found. Time elapsed: %s. Congrats!' % timereport
+				if not isComplete:
+					report = 'Cancelled. No gaps found so far. Time elapsed: %s.' % timereport
 
 			# Notification:
 			notificationTitle = f"GapFinder: {thisFont.familyName} ({thisFontMaster.name})"
@@ -343,6 +328,10 @@ class GapFinder(mekkaObject):
 			# Report in Macro Window:
 			if self.pref("reportGapsInMacroWindow"):
 				print(report)
+				print(pruner.report())
+				if distanceStore:
+					print(distanceStore.report())
+				print(layerCache.report())
 				Glyphs.showMacroWindow()
 
 		except Exception as e:
@@ -2,15 +2,22 @@
 # -*- coding: utf-8 -*-
 from __future__ import division, print_function, unicode_literals
 __doc__ = """
-Opens a new tab with Kerning Combos that crash in the current fontmaster.
+Opens a new tab with Kerning Combos that crash in the current fontmaster. Hold down Cmd+Opt to cancel a long run: the crashes found so far are kept, and the next run with the same settings resumes where it stopped.
 """
 
 import vanilla
+import json
+import os
+import subprocess
+import tempfile
 from timeit import default_timer as timer
 from Foundation import NSNotFound
-from kernanalysis import intervalList, categoryList, sortedIntervalsFromString, effectiveKerning, minDistanceBetweenTwoLayers, distanceFromEntry
+from kernanalysis import intervalList, categoryList, sortedIntervalsFromString, KerningTable, kerningDirection, layerCache, distanceFromEntry, exportMasterForScan, ScanSession, glyphSetIndex
+from kernprofiles import PairPruner
+from kerndistances import DistanceStore
 from GlyphsApp import Glyphs, Message
-from mekkablue import mekkaObject, caseDict, UpdateButton
+from mekkablue import mekkaObject, UpdateButton
+from mekkablue.Paths.outlineChecks import pythonExecutable
 
 
 class KernCrasher(mekkaObject):
@@ -30,12 +37,15 @@ class KernCrasher(mekkaObject):
 		"limitRightSuffixes": "",
 		"limitLeftSuffixes": "",
 		"directionSensitive": "",
+		"useWorkerProcesses": 0,
+		"useDistanceStore": 1,
+		"verifyDistanceStore": 0,
 	}
 
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 410
-		windowHeight = 355
+		windowHeight = 399
 		windowWidthResize = 800  # user can resize width by this value
 		windowHeightResize = 0  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -133,6 +143,16 @@ class KernCrasher(mekkaObject):
 		self.w.directionSensitive.getNSButton().setToolTip_("If enabled, will determine writing direction based on settings in current tab. If disabled, LTR will be used")
 		linePos += lineHeight
 
+		self.w.useWorkerProcesses = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Measure in parallel processes outside of Glyphs", value=False, sizeStyle='small', callback=self.SavePreferences)
+		self.w.useWorkerProcesses.getNSButton().setToolTip_("If enabled, exports outlines and kerning of the current master into a temporary scan file, and measures the pairs with kernworker.py on all processor cores, in worker processes of the Python that Glyphs runs on. Curves are approximated with straight lines, so distances may differ from the in-app measurement by a fraction of a unit.")
+		linePos += lineHeight
+
+		self.w.useDistanceStore = vanilla.CheckBox((inset + 2, linePos, 230, 20), "Remember distances between runs", value=True, sizeStyle='small', callback=self.SavePreferences)
+		self.w.useDistanceStore.getNSButton().setToolTip_("If enabled, measured distances are stored in ~/Library/Caches/mekkablue/KernDistances.sqlite, keyed by the outlines of both glyphs, the master, the speed and the ignored height intervals. Later runs only measure pairs where a glyph has changed. Not used for parallel processes.")
+		self.w.verifyDistanceStore = vanilla.CheckBox((inset + 240, linePos, -inset, 20), "Verify 2% of them", value=False, sizeStyle='small', callback=self.SavePreferences)
+		self.w.verifyDistanceStore.getNSButton().setToolTip_("If enabled, measures a random 2% of the remembered distances again, and reports (and replaces) stale entries in the Macro Window.")
+		linePos += lineHeight
+
 		self.w.reportCrashesInMacroWindow = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Verbose report in Macro Window", value=False, sizeStyle='small', callback=self.SavePreferences)
 		self.w.reportCrashesInMacroWindow.getNSButton().setToolTip_("Will output a detailed report of the kern crashing in Window > Macro Panel. Will slow down the script a bit. Usually not necessary, but can be useful for checking if a certain pairing has been taken care of or not.")
 		self.w.reuseCurrentTab = vanilla.CheckBox((inset + 200, linePos, -inset, 20), "Reuse current tab", value=True, callback=self.SavePreferences, sizeStyle='small')
@@ -149,6 +169,7 @@ class KernCrasher(mekkaObject):
 
 		# Run Button:
 		self.w.runButton = vanilla.Button((-100 - inset, -20 - inset, -inset, -inset), "Open Tab", callback=self.KernCrasherMain)
+		self.w.runButton.getNSButton().setToolTip_("Hold down ⌘⌥ to cancel. Crashes found so far will be shown, and the next run with the same settings resumes where it stopped. Results are also streamed into an NDJSON report file next to the font.")
 		self.w.setDefaultButton(self.w.runButton)
 
 		# Load Settings:
@@ -180,40 +201,16 @@ class KernCrasher(mekkaObject):
 			offset = glyphName.find(".")
 			return glyphName[:offset]
 
-	def listOfNamesForCategories(self, thisFont, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, mustContain):
-		nameList = []
-		for thisGlyph in thisFont.glyphs:
-			thisScript = thisGlyph.script
-			glyphName = thisGlyph.name
-			nameIsOK = True
-
-			if nameIsOK and excludedGlyphNameParts:
-				for thisNamePart in excludedGlyphNameParts:
-					nameIsOK = nameIsOK and not (thisNamePart in glyphName)
-
-			if nameIsOK and mustContain:
-				nameIsOK = False
-				for thisNamePart in mustContain:
-					if thisNamePart in glyphName:
-						nameIsOK = True
-
-			if nameIsOK and (thisGlyph.export or not excludeNonExporting):
-				if thisScript is None or thisScript == requiredScript:
-					if thisGlyph.category == requiredCategory:
-						if requiredSubCategory:
-							if Glyphs.versionNumber >= 3 and requiredSubCategory in caseDict:
-								requiredCase = caseDict[requiredSubCategory]
-								if thisGlyph.case == requiredCase:
-									if (not pathGlyphsOnly) or thisGlyph.layers[0].paths:
-										nameList.append(glyphName)
-							else:
-								if thisGlyph.subCategory == requiredSubCategory or (requiredSubCategory == "Other" and thisGlyph.subCategory is None):
-									if (not pathGlyphsOnly) or thisGlyph.layers[0].paths:
-										nameList.append(glyphName)
-						else:
-							if (not pathGlyphsOnly) or thisGlyph.layers[0].paths:
-								nameList.append(glyphName)
-		return nameList
+	def listOfNamesForCategories(self, glyphIndex, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, mustContain):
+		return glyphIndex.glyphNamesForCategory(
+			requiredCategory,
+			requiredSubCategory,
+			script=requiredScript,
+			excludeNonExporting=excludeNonExporting,
+			excludedNameParts=excludedGlyphNameParts,
+			mustContain=mustContain,
+			pathGlyphsOnly=pathGlyphsOnly,
+		)
 
 	def masterSwitch(self, sender=None):
 		if sender is self.w.nextButton:
@@ -256,6 +253,53 @@ class KernCrasher(mekkaObject):
 		secondCategory, secondSubCategory = self.splitString(self.w.popupRightCat.getItems()[self.pref("popupRightCat")])
 		return script, firstCategory, firstSubCategory, secondCategory, secondSubCategory
 
+	def crashRowsInApp(self, thisFont, thisFontMasterID, firstList, secondList, step, minDistance, ignoreIntervals, kerningTable, pruner):
+		"""Generator: measures all pairs, and yields (leftGlyphName, [(rightGlyphName, distance), ...]) as soon as a left glyph is finished."""
+		# sample the edges of all right glyphs once (reused from previous runs if unchanged):
+		rightProfiles = {}
+		for secondGlyphName in secondList:
+			rightProfiles[secondGlyphName] = layerCache.profile(thisFont.glyphs[secondGlyphName].layers[thisFontMasterID], step)
+
+		for firstGlyphName in firstList:
+			leftProfile = layerCache.profile(thisFont.glyphs[firstGlyphName].layers[thisFontMasterID], step)
+
+			# cycle through right glyphs:
+			crashes = []
+			for secondGlyphName in secondList:
+				kerning = kerningTable.value(firstGlyphName, secondGlyphName)
+				distanceBetweenShapes = pruner.closerThan(leftProfile, rightProfiles[secondGlyphName], kerning, minDistance)
+				if distanceBetweenShapes is not None:
+					crashes.append((secondGlyphName, distanceBetweenShapes))
+			yield firstGlyphName, crashes
+
+	def crashRowsFromWorkerProcesses(self, thisFont, thisFontMasterID, firstList, secondList, step, minDistance, ignoreIntervals, kerningTable, summary):
+		"""Like crashRowsInApp(), but exports the master and measures with kernworker.py in a process pool. Fills summary with the worker statistics."""
+		import kernworker
+		python = pythonExecutable()
+		if not python:
+			raise Exception("Could not find the Python interpreter of Glyphs. Install Python in Window > Plugin Manager > Modules, or disable parallel processes.")
+		scanPath = os.path.join(tempfile.gettempdir(), "KernCrasher-%s.json.gz" % thisFontMasterID)
+		exportMasterForScan(scanPath, thisFont, thisFontMasterID, firstList, secondList, step, minDistance, ignoreIntervals, kerningTable)
+
+		# stderr goes into a temporary file, so warnings of the pool processes cannot fill a pipe nobody reads:
+		with tempfile.TemporaryFile(mode="w+") as errorFile:
+			process = subprocess.Popen((python, kernworker.__file__, scanPath), stdout=subprocess.PIPE, stderr=errorFile, text=True)
+			try:
+				for line in process.stdout:
+					result = json.loads(line)
+					if "summary" in result:
+						summary.update(result["summary"])
+					else:
+						yield result["left"], [(rightName, distance) for leftName, rightName, distance in result["crashes"]]
+				if process.wait() != 0:
+					errorFile.seek(0)
+					raise Exception("kernworker.py failed:\n%s" % errorFile.read())
+			finally:
+				# cancelled before the end:
+				if process.poll() is None:
+					process.kill()
+					process.wait()
+
 	def KernCrasherMain(self, sender):
 		try:
 			# update settings to the latest user input:
@@ -299,11 +343,12 @@ class KernCrasher(mekkaObject):
 			self.SavePreferences()
 
 			# get list of glyph names:
+			glyphIndex = glyphSetIndex(thisFont)
 			firstList = self.listOfNamesForCategories(
-				thisFont, firstCategory, firstSubCategory, script, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, limitLeftSuffixes
+				glyphIndex, firstCategory, firstSubCategory, script, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, limitLeftSuffixes
 			)
 			secondList = self.listOfNamesForCategories(
-				thisFont, secondCategory, secondSubCategory, script, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, limitRightSuffixes
+				glyphIndex, secondCategory, secondSubCategory, script, excludedGlyphNameParts, excludeNonExporting, pathGlyphsOnly, limitRightSuffixes
 			)
 
 			directionSensitive = False
@@ -321,33 +366,64 @@ class KernCrasher(mekkaObject):
 					OKButton=None,
 				)
 
+			# effective kerning of all pairs, looked up in a flat table:
+			kerningTable = KerningTable(thisFont, thisFontMasterID, kerningDirection(thisFont, directionSensitive))
+
 			if self.pref("reportCrashesInMacroWindow"):
 				print("Minimum Distance: %i\n" % minDistance)
 				print("Left glyphs:\n%s\n" % ", ".join(firstList))
 				print("Right glyphs:\n%s\n" % ", ".join(secondList))
+				print("%s\n" % kerningTable.validationReport(firstList, secondList))
+
+			layerCache.resetStatistics()
+			settings = {
+				"step": step,
+				"minDistance": minDistance,
+				"ignoreIntervals": ignoreIntervals,
+				"kerning": kerningTable.fingerprint(),
+				"useWorkerProcesses": self.prefBool("useWorkerProcesses"),
+			}
+			session = ScanSession("KernCrasher", thisFont, thisFontMasterID, settings, firstList, secondList, verbose=self.prefBool("reportCrashesInMacroWindow"))
+			crashesByLeftGlyph = session.resume()
+			session.start()
+			remainingList = session.remainingLeftNames()
+			if self.pref("useWorkerProcesses"):
+				summary = {}
+				crashRows = self.crashRowsFromWorkerProcesses(thisFont, thisFontMasterID, remainingList, secondList, step, minDistance, ignoreIntervals, kerningTable, summary)
+			else:
+				distanceStore = None
+				if self.pref("useDistanceStore"):
+					distanceStore = DistanceStore(thisFontMasterID, step, ignoreIntervals, verifyRate=0.02 if self.pref("verifyDistanceStore") else 0.0)
+				pruner = PairPruner(step, ignoreIntervals=ignoreIntervals, distanceStore=distanceStore)
+				crashRows = self.crashRowsInApp(thisFont, thisFontMasterID, remainingList, secondList, step, minDistance, ignoreIntervals, kerningTable, pruner)
+
+			# stream the results, hold down Cmd+Opt to stop and keep what has been found so far:
+			for firstGlyphName, crashes in crashRows:
+				crashesByLeftGlyph[firstGlyphName] = crashes
+				self.w.bar.set(int(100 * len(crashesByLeftGlyph) / len(firstList)))
+				if not session.addRow(firstGlyphName, crashes):
+					crashRows.close()
+					break
+			isComplete = session.finish()
+
+			if self.pref("useWorkerProcesses"):
+				pruningReport = "Pruning: %i pairs, %i ruled out by bounds and extreme sidebearings, %i by coarse profiles, measured in parallel processes." % (
+					summary.get("pairs", 0),
+					summary.get("discardedByBounds", 0),
+					summary.get("discardedByCoarseProfiles", 0),
+				)
+			else:
+				pruningReport = pruner.report()
+				if distanceStore:
+					distanceStore.close()
+					pruningReport += "\n" + distanceStore.report()
 
 			tabString = "\n"
 			crashCount = 0
-			numOfGlyphs = len(firstList)
-			for index in range(numOfGlyphs):
-				# update progress bar:
-				self.w.bar.set(int(100 * (float(index) / numOfGlyphs)))
-				# determine left glyph:
-				firstGlyphName = firstList[index]
-				leftLayer = thisFont.glyphs[firstGlyphName].layers[thisFontMasterID].copyDecomposedLayer()
-				leftLayer.decomposeSmartOutlines()
-
-				# cycle through right glyphs:
-				for secondGlyphName in secondList:
-					rightLayer = thisFont.glyphs[secondGlyphName].layers[thisFontMasterID].copyDecomposedLayer()
-					rightLayer.decomposeSmartOutlines()
-					kerning = effectiveKerning(firstGlyphName, secondGlyphName, thisFont, thisFontMasterID, directionSensitive)
-					distanceBetweenShapes = minDistanceBetweenTwoLayers(leftLayer, rightLayer, interval=step, kerning=kerning, report=False, ignoreIntervals=ignoreIntervals)
-					if distanceBetweenShapes is not None and distanceBetweenShapes < minDistance:
-						crashCount += 1
-						tabString += "/%s/%s/space" % (firstGlyphName, secondGlyphName)
-						if self.pref("reportCrashesInMacroWindow"):
-							print("- %s %s: %i" % (firstGlyphName, secondGlyphName, distanceBetweenShapes))
+			for firstGlyphName in firstList:
+				for secondGlyphName, distanceBetweenShapes in crashesByLeftGlyph.get(firstGlyphName, ()):
+					crashCount += 1
+					tabString += "/%s/%s/space" % (firstGlyphName, secondGlyphName)
 				tabString += "\n"
 
 			# clean up the tab string:
@@ -377,6 +453,8 @@ class KernCrasher(mekkaObject):
 					# disable reporters (avoid slowdown)
 					Glyphs.defaults["visibleReporters"] = None
 				report = f'{crashCount} kerning crashes have been found. Time elapsed: {timereport}.'
+				if not isComplete:
+					report = f'Cancelled. {report}'
 				if self.pref("reuseCurrentTab") and thisFont.currentTab:
 					thisFont.currentTab.text = tabString
 				else:
@@ -384,6 +462,8 @@ class KernCrasher(mekkaObject):
 			# or report that nothing was found:
 			else:
 				report = 'No collisions found. Time elapsed: %s. Congrats!' % timereport
+				if not isComplete:
+					report = 'Cancelled. No collisions found so far. Time elapsed: %s.' % timereport
 
 			# Notification:
 			# notificationTitle = "KernCrasher: %s (%s)" % (thisFont.familyName, thisFontMaster.name)
@@ -392,6 +472,8 @@ class KernCrasher(mekkaObject):
 			# Report in Macro Window:
 			if self.pref("reportCrashesInMacroWindow"):
 				print(report)
+				print(pruningReport)
+				print(layerCache.report())
 				Glyphs.showMacroWindow()
 
 		except Exception as e:
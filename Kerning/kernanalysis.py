@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
-from AppKit import NSPoint, NSNotFound
-from mekkablue import caseDict
+from AppKit import NSPoint, NSNotFound, NSEvent, NSEventModifierFlagCommand, NSEventModifierFlagOption
+from mekkablue import caseDict, reportTimeInNaturalLanguage
 from GlyphsApp import Glyphs, GSPath, GSNode, GSLINE
-import math
+from kernprofiles import sampleProfile, minDistanceBetweenProfiles
+from kernpolygons import bubble, distanceBetweenConvexPolygons
+from kernworker import writeScanFile
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from timeit import default_timer as timer
 
 if Glyphs.versionNumber >= 3.0:
-	from GlyphsApp import LTR
+	from GlyphsApp import LTR, RTL
 
 intervalList = (1, 3, 5, 10, 20)
 categoryList = (
@@ -25,7 +35,7 @@ categoryList = (
 )
 
 
-def stringToListOfGlyphsForFont(string, Font, report=True, excludeNonExporting=True, suffix=""):
+def stringToListOfGlyphsForFont(string, Font, report=True, excludeNonExporting=True, suffix="", glyphIndex=None):
 	# parse string into parseList:
 	parseList = []
 	waitForSeparator = False
@@ -60,6 +70,7 @@ def stringToListOfGlyphsForFont(string, Font, report=True, excludeNonExporting=T
 
 	# go through parseList and find corresponding glyph in Font:
 	glyphList = []
+	index = glyphIndex or glyphSetIndex(Font)
 	for parsedName in parseList:
 
 		if parsedName.startswith("@"):
@@ -69,13 +80,11 @@ def stringToListOfGlyphsForFont(string, Font, report=True, excludeNonExporting=T
 			else:
 				category, subcategory = parsedName[1:], None
 			# TODO parse
-			categoryGlyphs = listOfNamesForCategories(
-				Font,
+			categoryGlyphs = index.glyphsForCategory(
 				category,
 				subcategory,  # OK
-				"latin",  # requiredScript,  # need to implement still
-				None,  # excludedGlyphNameParts,  # need to implement still
-				excludeNonExporting,  # OK
+				script="latin",  # requiredScript,  # need to implement still
+				excludeNonExporting=excludeNonExporting,  # OK
 				suffix=suffix,
 			)
 			if categoryGlyphs:
@@ -91,11 +100,9 @@ def stringToListOfGlyphsForFont(string, Font, report=True, excludeNonExporting=T
 
 			# actual single character:
 			if not glyph and len(parsedName) == 1:
-				unicodeForName = "%04X" % ord(parsedName)
-				glyphInfo = Glyphs.glyphInfoForUnicode(unicodeForName)
-				if glyphInfo:
-					glyphName = "%s%s" % (glyphInfo.name, suffix)
-					glyph = Font.glyphs[glyphName]
+				glyphName = index.glyphNameForCharacter(parsedName)
+				if glyphName:
+					glyph = Font.glyphs["%s%s" % (glyphName, suffix)]
 
 			# check if glyph exists, exports, and collect in glyphList:
 			if glyph:
@@ -117,16 +124,24 @@ def nameUntilFirstPeriod(glyphName):
 		return glyphName[:offset]
 
 
+def kerningDirection(thisFont, directionSensitive=True):
+	if Glyphs.versionNumber < 3:
+		return None
+	direction = LTR
+	if directionSensitive:
+		if thisFont.currentTab:
+			direction = thisFont.currentTab.direction
+		else:  # no tab open
+			direction = Glyphs.userInterfaceLayoutDirection()
+	return direction
+
+
 def effectiveKerning(leftGlyphName, rightGlyphName, thisFont, thisFontMasterID, directionSensitive=True):
+	# for many pairs, use a KerningTable instead
 	leftLayer = thisFont.glyphs[leftGlyphName].layers[thisFontMasterID]
 	rightLayer = thisFont.glyphs[rightGlyphName].layers[thisFontMasterID]
 	if Glyphs.versionNumber >= 3:
-		direction = LTR
-		if directionSensitive:
-			if thisFont.currentTab:
-				direction = thisFont.currentTab.direction
-			else:  # no tab open
-				direction = Glyphs.userInterfaceLayoutDirection()
+		direction = kerningDirection(thisFont, directionSensitive)
 		effectiveKerning = leftLayer.nextKerningForLayer_direction_(rightLayer, direction)
 	else:
 		effectiveKerning = leftLayer.rightKerningForLayer_(rightLayer)
@@ -135,6 +150,152 @@ def effectiveKerning(leftGlyphName, rightGlyphName, thisFont, thisFontMasterID,
 	else:
 		return 0.0
 
+
+class KerningTable(object):
+	"""
+	Flat lookup table for the effective kerning of one master in one direction,
+	built once from font.kerning (or font.kerningRTL). Returns the same values as
+	effectiveKerning(), but with a few dict lookups per pair instead of bridge calls.
+	Precedence: glyph-glyph exception, glyph-group, group-glyph, group-group.
+	Pairs are in reading order: in RTL, the first glyph is on the right.
+	Keep it in sync with setKerningForPair()/removeKerningForPair() if you change
+	the kerning while using the table, or build a new one.
+	With deferred=True, these only update the table and collect the changes,
+	until applyPendingEdits() writes them into the font in one go.
+	Like the font methods, they always edit LTR kerning: an RTL table keeps its
+	values, and only remembers the edits for hasPair().
+	"""
+
+	def __init__(self, thisFont, thisFontMasterID, direction=None, deferred=False):
+		self.font = thisFont
+		self.deferred = deferred
+		self.pendingEdits = []
+		self.ltrEdits = {}  # (first key, second key): value, or None if removed, only needed in RTL
+		self.masterID = thisFontMasterID
+		self.direction = LTR if direction is None and Glyphs.versionNumber >= 3 else direction
+		self.isRTL = Glyphs.versionNumber >= 3 and direction == RTL
+		if self.isRTL:
+			masterKerning = thisFont.kerningRTL.get(thisFontMasterID, None)
+		else:
+			masterKerning = thisFont.kerning.get(thisFontMasterID, None)
+		self.pairs = {}
+		if masterKerning:
+			for firstKey, secondKerning in masterKerning.items():
+				for secondKey, value in secondKerning.items():
+					self.pairs[(str(firstKey), str(secondKey))] = float(value)
+		self.glyphKeys = {}
+
+	def _keys(self, glyphName):
+		# (exception key, group key as first glyph, group key as second glyph)
+		if glyphName not in self.glyphKeys:
+			glyph = self.font.glyphs[glyphName]
+			exceptionKey = glyph.id if Glyphs.versionNumber >= 3 else glyph.name
+			if self.isRTL:
+				firstGroup, secondGroup = glyph.leftKerningGroup, glyph.rightKerningGroup
+			else:
+				firstGroup, secondGroup = glyph.rightKerningGroup, glyph.leftKerningGroup
+			self.glyphKeys[glyphName] = (
+				exceptionKey,
+				"@MMK_%s_%s" % ("R" if self.isRTL else "L", firstGroup) if firstGroup else None,
+				"@MMK_%s_%s" % ("L" if self.isRTL else "R", secondGroup) if secondGroup else None,
+			)
+		return self.glyphKeys[glyphName]
+
+	def value(self, firstGlyphName, secondGlyphName):
+		"""Effective kerning of the pair, 0.0 if there is none."""
+		firstKey, firstGroupKey, _ = self._keys(firstGlyphName)
+		secondKey, _, secondGroupKey = self._keys(secondGlyphName)
+		pairs = self.pairs
+		for pair in ((firstKey, secondKey), (firstKey, secondGroupKey), (firstGroupKey, secondKey), (firstGroupKey, secondGroupKey)):
+			if pair in pairs:
+				return pairs[pair]
+		return 0.0
+
+	def fingerprint(self):
+		"""Hash of all kerning pairs in the table, changes whenever the kerning changes."""
+		return hashlib.sha1(repr(sorted(self.pairs.items())).encode("utf-8")).hexdigest()
+
+	def _key(self, side):
+		if side.startswith("@"):
+			return side
+		return self._keys(side)[0]
+
+	def hasPair(self, firstSide, secondSide):
+		"""Like font.kerningForPair() is not None (LTR kerning), but includes deferred changes."""
+		pair = (self._key(firstSide), self._key(secondSide))
+		if self.isRTL:
+			if pair in self.ltrEdits:
+				return self.ltrEdits[pair] is not None
+			return self.font.kerningForPair(self.masterID, firstSide, secondSide) is not None
+		return pair in self.pairs
+
+	def setKerningForPair(self, firstSide, secondSide, value):
+		"""Like font.setKerningForPair() (which sets LTR kerning), and keeps the table in sync. Sides are glyph names or group keys like @MMK_L_A."""
+		if self.deferred:
+			self.pendingEdits.append((firstSide, secondSide, value))
+		else:
+			self.font.setKerningForPair(self.masterID, firstSide, secondSide, value)
+		pair = (self._key(firstSide), self._key(secondSide))
+		if self.isRTL:
+			self.ltrEdits[pair] = float(value)
+		else:
+			self.pairs[pair] = float(value)
+
+	def removeKerningForPair(self, firstSide, secondSide):
+		if self.deferred:
+			self.pendingEdits.append((firstSide, secondSide, None))
+		else:
+			self.font.removeKerningForPair(self.masterID, firstSide, secondSide)
+		pair = (self._key(firstSide), self._key(secondSide))
+		if self.isRTL:
+			self.ltrEdits[pair] = None
+		else:
+			self.pairs.pop(pair, None)
+
+	def applyPendingEdits(self):
+		"""Writes the deferred changes into the font, in the order they were made. Wrap in disableUpdateInterface() for speed."""
+		for firstSide, secondSide, value in self.pendingEdits:
+			if value is None:
+				self.font.removeKerningForPair(self.masterID, firstSide, secondSide)
+			else:
+				self.font.setKerningForPair(self.masterID, firstSide, secondSide, value)
+		self.pendingEdits = []
+
+	def validate(self, firstGlyphNames, secondGlyphNames, sampleSize=100):
+		"""
+		Compares a random sample of pairs with the kerning the app reports
+		(nextKerningForLayer_direction_). Returns a list of mismatches as
+		(firstGlyphName, secondGlyphName, tableValue, appValue) tuples.
+		"""
+		mismatches = []
+		if not firstGlyphNames or not secondGlyphNames:
+			return mismatches
+		for i in range(sampleSize):
+			firstGlyphName, secondGlyphName = random.choice(firstGlyphNames), random.choice(secondGlyphNames)
+			tableValue = self.value(firstGlyphName, secondGlyphName)
+			firstLayer = self.font.glyphs[firstGlyphName].layers[self.masterID]
+			secondLayer = self.font.glyphs[secondGlyphName].layers[self.masterID]
+			if Glyphs.versionNumber >= 3:
+				appValue = firstLayer.nextKerningForLayer_direction_(secondLayer, self.direction)
+			else:
+				appValue = firstLayer.rightKerningForLayer_(secondLayer)
+			if appValue >= NSNotFound:
+				appValue = 0.0
+			if abs(appValue - tableValue) > 0.001:
+				mismatches.append((firstGlyphName, secondGlyphName, tableValue, appValue))
+		return mismatches
+
+	def validationReport(self, firstGlyphNames, secondGlyphNames, sampleSize=100):
+		mismatches = self.validate(firstGlyphNames, secondGlyphNames, sampleSize=sampleSize)
+		if not mismatches:
+			return "Kerning table: %i random pairs match the app." % sampleSize
+		return "⚠️ Kerning table: %i of %i random pairs differ from the app:\n%s" % (
+			len(mismatches),
+			sampleSize,
+			"\n".join("   %s %s: table %i, app %i" % mismatch for mismatch in mismatches),
+		)
+
+
 # older version:
 # def effectiveKerning(leftGlyphName, rightGlyphName, thisFont, thisFontMasterID):
 # leftLayer = thisFont.glyphs[leftGlyphName].layers[thisFontMasterID]
@@ -151,35 +312,140 @@ def effectiveKerning(leftGlyphName, rightGlyphName, thisFont, thisFontMasterID,
 #  # 	return 0.0
 
 
-def listOfNamesForCategories(thisFont, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting, suffix=""):
-	nameList = []
-	for thisGlyph in thisFont.glyphs:
-		thisScript = thisGlyph.script
-		glyphName = thisGlyph.name
-		nameIsOK = True
-
-		if suffix:
-			nameIsOK = glyphName.endswith(suffix)
-
-		if nameIsOK and excludedGlyphNameParts:
-			for thisNamePart in excludedGlyphNameParts:
-				nameIsOK = nameIsOK and thisNamePart not in glyphName
-
-		if nameIsOK and (thisGlyph.export or not excludeNonExporting):
-			if thisScript is None or thisScript == requiredScript:
-				if thisGlyph.category == requiredCategory:
-					if Glyphs.versionNumber >= 3:
-						# GLYPHS 3
-						if requiredSubCategory is None or thisGlyph.subCategory == requiredSubCategory or (
-							requiredSubCategory in caseDict.keys() and thisGlyph.case == caseDict[requiredSubCategory]
-						):
-							nameList.append(glyphName)
-					else:
-						# GLYPHS 2
-						if requiredSubCategory is None or thisGlyph.subCategory == requiredSubCategory:
-							nameList.append(glyphName)
+class GlyphSetIndex(object):
+	"""
+	Index of all glyphs of a font by category, subcategory and case, and by
+	character, built in one pass over the font. Expanding a category then only
+	touches the glyphs of that category, not the whole font. Get it with
+	glyphSetIndex(font) once per run and keep it for all lookups of the run:
+	it is rebuilt when any indexed glyph property has changed.
+	"""
+
+	def __init__(self, thisFont):
+		self.font = thisFont
+		self.signature = self.fontSignature(thisFont)
+		self.glyphs = []
+		self.byCategory = {}
+		self.bySubCategory = {}
+		self.byCase = {}
+		self.nameForCharacter = {}
+		self.hasPaths = {}
+		for index, glyph in enumerate(thisFont.glyphs):
+			category, subCategory = glyph.category, glyph.subCategory
+			case = glyph.case if Glyphs.versionNumber >= 3 else None
+			self.glyphs.append((glyph, glyph.name, glyph.script, glyph.export))
+			self.byCategory.setdefault(category, []).append(index)
+			self.bySubCategory.setdefault((category, subCategory), []).append(index)
+			self.byCase.setdefault((category, case), []).append(index)
+			unicodeValues = glyph.unicodes if Glyphs.versionNumber >= 3 else (glyph.unicode,)
+			for unicodeValue in unicodeValues or ():
+				if not unicodeValue:
+					continue
+				character = chr(int(unicodeValue, 16))
+				if character not in self.nameForCharacter:
+					self.nameForCharacter[character] = glyph.name
+
+	@staticmethod
+	def fontSignature(thisFont):
+		# every glyph property the index depends on
+		if Glyphs.versionNumber >= 3:
+			return tuple(
+				(glyph.name, glyph.category, glyph.subCategory, glyph.case, glyph.script, tuple(glyph.unicodes or ()), glyph.export)
+				for glyph in thisFont.glyphs
+			)
+		return tuple((glyph.name, glyph.category, glyph.subCategory, glyph.script, glyph.unicode, glyph.export) for glyph in thisFont.glyphs)
+
+	def _entriesForCategory(self, category, subCategory, script, excludeNonExporting, excludedNameParts, mustContain, suffix, pathGlyphsOnly):
+		if subCategory is None:
+			indexes = self.byCategory.get(category, ())
+		else:
+			indexes = set(self.bySubCategory.get((category, subCategory), ()))
+			if subCategory in caseDict:
+				indexes.update(self.byCase.get((category, caseDict[subCategory]), ()))
+			if subCategory == "Other":
+				indexes.update(self.bySubCategory.get((category, None), ()))
+			indexes = sorted(indexes)
+
+		for index in indexes:
+			glyph, glyphName, glyphScript, glyphExport = self.glyphs[index]
+			if excludeNonExporting and not glyphExport:
+				continue
+			if glyphScript is not None and glyphScript != script:
+				continue
+			if suffix and not glyphName.endswith(suffix):
+				continue
+			if excludedNameParts and any(namePart in glyphName for namePart in excludedNameParts):
+				continue
+			if mustContain and not any(namePart in glyphName for namePart in mustContain):
+				continue
+			if pathGlyphsOnly:
+				if glyphName not in self.hasPaths:
+					self.hasPaths[glyphName] = bool(glyph.layers[0].paths)
+				if not self.hasPaths[glyphName]:
+					continue
+			yield glyph, glyphName
+
+	def glyphsForCategory(self, category, subCategory=None, script=None, excludeNonExporting=True, excludedNameParts=None, mustContain=None, suffix="", pathGlyphsOnly=False):
+		"""
+		Glyphs of the category in font order. subCategory also matches the case in Glyphs 3
+		(e.g., Uppercase), and Other matches glyphs without subcategory. Only glyphs of the
+		script and glyphs without script are included, so script=None keeps only the latter.
+		Name filters: excludedNameParts, mustContain (any), suffix.
+		"""
+		return [glyph for glyph, glyphName in self._entriesForCategory(category, subCategory, script, excludeNonExporting, excludedNameParts, mustContain, suffix, pathGlyphsOnly)]
+
+	def glyphNamesForCategory(self, category, subCategory=None, script=None, excludeNonExporting=True, excludedNameParts=None, mustContain=None, suffix="", pathGlyphsOnly=False):
+		"""Like glyphsForCategory(), but returns the glyph names."""
+		return [glyphName for glyph, glyphName in self._entriesForCategory(category, subCategory, script, excludeNonExporting, excludedNameParts, mustContain, suffix, pathGlyphsOnly)]
+
+	def glyphNameForCharacter(self, character):
+		"""Name of the glyph for the character: the one encoded in the font, or else the default name from the glyph info."""
+		if character in self.nameForCharacter:
+			return self.nameForCharacter[character]
+		return _defaultGlyphNameForCharacter(character)
+
+
+_glyphInfoNames = {}
+
+
+def _defaultGlyphNameForCharacter(character):
+	if character not in _glyphInfoNames:
+		glyphInfo = Glyphs.glyphInfoForUnicode("%04X" % ord(character))
+		_glyphInfoNames[character] = glyphInfo.name if glyphInfo else None
+	return _glyphInfoNames[character]
+
+
+_glyphSetIndexes = OrderedDict()
+
+
+def glyphSetIndex(thisFont):
+	"""
+	The GlyphSetIndex of the font, shared by all scripts, rebuilt only if the glyph set has changed.
+	Checking that takes one pass over the font, so call it once per run and pass the index on.
+	"""
+	key = id(thisFont)
+	index = _glyphSetIndexes.get(key)
+	if index is None or index.font is not thisFont or index.signature != GlyphSetIndex.fontSignature(thisFont):
+		index = GlyphSetIndex(thisFont)
+		_glyphSetIndexes[key] = index
+		while len(_glyphSetIndexes) > 4:
+			_glyphSetIndexes.popitem(last=False)
+	else:
+		# paths may have been drawn or deleted since the last run:
+		index.hasPaths = {}
+	_glyphSetIndexes.move_to_end(key)
+	return index
+
 
-	return [thisFont.glyphs[n] for n in nameList]
+def listOfNamesForCategories(thisFont, requiredCategory, requiredSubCategory, requiredScript, excludedGlyphNameParts, excludeNonExporting, suffix=""):
+	return glyphSetIndex(thisFont).glyphsForCategory(
+		requiredCategory,
+		requiredSubCategory,
+		script=requiredScript,
+		excludeNonExporting=excludeNonExporting,
+		excludedNameParts=excludedGlyphNameParts,
+		suffix=suffix,
+	)
 
 
 def splitString(string, delimiter=":", minimum=2):
@@ -222,26 +488,374 @@ def isHeightInIntervals(height, ignoreIntervals):
 	return False
 
 
-def minDistanceBetweenTwoLayers(leftLayer, rightLayer, interval=5.0, kerning=0.0, report=False, ignoreIntervals=[]):
-	# correction = leftLayer.RSB+rightLayer.LSB
+def layerBounds(layer):
 	if Glyphs.versionNumber >= 3.2:
-		leftBounds, rightBounds = leftLayer.fastBounds(), rightLayer.fastBounds()
-	else:
-		leftBounds, rightBounds = leftLayer.bounds, rightLayer.bounds
+		return layer.fastBounds()
+	return layer.bounds
+
+
+def layerProfile(layer, step=5.0, bottom=None, top=None, leftSide=True, rightSide=True):
+	"""
+	Samples the LSB and RSB of a layer once per height (multiples of step)
+	into a LayerProfile, optionally limited to heights between bottom and top.
+	Measure decomposed layers, just like minDistanceBetweenTwoLayers().
+	"""
+	bounds = layerBounds(layer)
+	layerBottom = bounds.origin.y
+	layerTop = bounds.origin.y + bounds.size.height
+	bottom = layerBottom if bottom is None else max(bottom, layerBottom)
+	top = layerTop if top is None else min(top, layerTop)
+	return sampleProfile(
+		(lambda height: measureLayerAtHeightFromLeftOrRight(layer, height, leftSide=True)) if leftSide else None,
+		(lambda height: measureLayerAtHeightFromLeftOrRight(layer, height, leftSide=False)) if rightSide else None,
+		bottom,
+		top,
+		step,
+	)
+
+
+def minDistanceBetweenTwoLayers(leftLayer, rightLayer, interval=5.0, kerning=0.0, report=False, ignoreIntervals=[]):
+	# for many pairs, sample each layer once with layerProfile() and use minDistanceBetweenProfiles() instead
+	leftBounds, rightBounds = layerBounds(leftLayer), layerBounds(rightLayer)
 	topY = min(leftBounds.origin.y + leftBounds.size.height, rightBounds.origin.y + rightBounds.size.height)
 	bottomY = max(leftBounds.origin.y, rightBounds.origin.y)
-	distance = topY - bottomY
-	minDist = None
-	for i in range(int(distance / interval)):
-		height = bottomY + i * interval
-		if not isHeightInIntervals(height, ignoreIntervals) or not ignoreIntervals:
-			left = leftLayer.rsbAtHeight_(height)
-			right = rightLayer.lsbAtHeight_(height)
-			if left < NSNotFound and right < NSNotFound:  # avoid gaps like in i or j
-				total = left + right + kerning  # +correction
-				if minDist is None or minDist > total:
-					minDist = total
-	return minDist
+	leftProfile = layerProfile(leftLayer, interval, bottomY, topY, leftSide=False)
+	rightProfile = layerProfile(rightLayer, interval, bottomY, topY, rightSide=False)
+	return minDistanceBetweenProfiles(leftProfile, rightProfile, kerning=kerning, ignoreIntervals=ignoreIntervals)
+
+
+def decomposedCopy(layer):
+	decomposedLayer = layer.copyDecomposedLayer()
+	decomposedLayer.decomposeSmartOutlines()
+	return decomposedLayer
+
+
+def _componentBaseLayer(component, layer):
+	try:
+		return component.componentLayer
+	except:
+		baseGlyph = component.component
+		if baseGlyph:
+			return baseGlyph.layers[layer.associatedMasterId]
+	return None
+
+
+def layerFingerprint(layer):
+	"""
+	Outline hash of a layer: width, nodes, corner/cap hints, and components
+	(including the outlines of their base glyphs). Changes whenever an edit
+	changes what the decomposed layer looks like. Stable between sessions.
+	"""
+	description = [layer.width]
+	for path in layer.paths:
+		description.append((path.closed, tuple((node.position.x, node.position.y, node.type) for node in path.nodes)))
+	for hint in layer.hints:
+		description.append((hint.type, hint.name))
+	for component in layer.components:
+		smartValues = component.smartComponentValues
+		description.append((
+			component.componentName,
+			tuple(component.transformStruct()),
+			tuple(sorted((str(k), v) for k, v in dict(smartValues).items())) if smartValues else (),
+		))
+		baseLayer = _componentBaseLayer(component, layer)
+		if baseLayer:
+			description.append(layerFingerprint(baseLayer))
+	return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+
+class LayerCache(object):
+	"""
+	Size-bounded (LRU) cache for data derived from layers: decomposed copies,
+	bounds and sidebearing profiles. Shared by KernCrasher, GapFinder, Auto Bumper
+	and BBox Bumper, and kept between runs since Glyphs keeps imported modules in
+	memory. Entries are keyed by glyph name and layer ID, and are discarded as soon
+	as the layer fingerprint changes, i.e., after the user edits the glyph.
+	Look up once per glyph, not once per pair: each lookup hashes the outline.
+	"""
+
+	def __init__(self, maxSize=2000):
+		self.maxSize = maxSize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def _derivedItems(self, layer):
+		key = (layer.parent.name, layer.layerId)
+		fingerprint = layerFingerprint(layer)
+		entry = self.entries.get(key)
+		if entry is None or entry[0] != fingerprint:
+			entry = (fingerprint, {"fingerprint": fingerprint})
+			self.entries[key] = entry
+			while len(self.entries) > self.maxSize:
+				self.entries.popitem(last=False)
+		self.entries.move_to_end(key)
+		return entry[1]
+
+	def _lookup(self, items, kind, builder, layer):
+		if kind in items:
+			self.hits += 1
+		else:
+			self.misses += 1
+			items[kind] = builder(layer)
+		return items[kind]
+
+	def get(self, layer, kind, builder):
+		"""Returns builder(layer), computed only once as long as the layer is unchanged. kind must be hashable and describe what builder returns."""
+		return self._lookup(self._derivedItems(layer), kind, builder, layer)
+
+	def decomposedLayer(self, layer):
+		"""Decomposed copy of layer (components and smart outlines). Do not modify it."""
+		return self.get(layer, "decomposed", decomposedCopy)
+
+	def bounds(self, layer):
+		items = self._derivedItems(layer)
+		decomposedLayer = self._lookup(items, "decomposed", decomposedCopy, layer)
+		return self._lookup(items, "bounds", lambda layer: layerBounds(decomposedLayer), layer)
+
+	def profile(self, layer, step=5.0):
+		"""Sidebearing profile of the decomposed layer, with the layer fingerprint attached (for kerndistances.DistanceStore)."""
+		items = self._derivedItems(layer)
+		decomposedLayer = self._lookup(items, "decomposed", decomposedCopy, layer)
+		return self._lookup(items, ("profile", step), lambda layer: self._fingerprintedProfile(decomposedLayer, step, items["fingerprint"]), layer)
+
+	def _fingerprintedProfile(self, decomposedLayer, step, fingerprint):
+		profile = layerProfile(decomposedLayer, step)
+		profile.fingerprint = fingerprint
+		return profile
+
+	def clear(self):
+		self.entries.clear()
+		self.resetStatistics()
+
+	def resetStatistics(self):
+		self.hits = 0
+		self.misses = 0
+
+	def report(self):
+		lookups = self.hits + self.misses
+		return "Layer cache: %i hit%s, %i miss%s (%i%% reused), %i layer%s cached." % (
+			self.hits,
+			"" if self.hits == 1 else "s",
+			self.misses,
+			"" if self.misses == 1 else "es",
+			100 * self.hits / lookups if lookups else 0,
+			len(self.entries),
+			"" if len(self.entries) == 1 else "s",
+		)
+
+
+layerCache = LayerCache()
+
+
+def flattenedContours(layer, curveSegments=16):
+	"""
+	Outlines of a (decomposed) layer as polygons, with curves approximated by
+	curveSegments straight lines each: [[x0, y0, x1, y1, ...], ...]
+	"""
+	contours = []
+	for path in layer.paths:
+		nodes = list(path.nodes)
+		onCurveIndexes = [i for i, node in enumerate(nodes) if node.type != "offcurve"]
+		if not onCurveIndexes:
+			continue
+		# start at an on-curve node:
+		start = onCurveIndexes[-1]
+		nodes = nodes[start:] + nodes[:start]
+		previous = (nodes[0].position.x, nodes[0].position.y)
+		coordinates = [previous]
+		handles = []
+		for node in nodes[1:] + nodes[:1]:
+			point = (node.position.x, node.position.y)
+			if node.type == "offcurve":
+				handles.append(point)
+				continue
+			if node.type == "curve" and len(handles) == 2:
+				(x0, y0), (x1, y1), (x2, y2), (x3, y3) = previous, handles[0], handles[1], point
+				for i in range(1, curveSegments):
+					t = i / curveSegments
+					mt = 1.0 - t
+					coordinates.append((
+						mt**3 * x0 + 3 * mt**2 * t * x1 + 3 * mt * t**2 * x2 + t**3 * x3,
+						mt**3 * y0 + 3 * mt**2 * t * y1 + 3 * mt * t**2 * y2 + t**3 * y3,
+					))
+			else:
+				# lines, and a rough approximation of TrueType curves:
+				coordinates.extend(handles)
+			coordinates.append(point)
+			handles = []
+			previous = point
+		contours.append([round(value, 2) for coordinate in coordinates[:-1] for value in coordinate])
+	return contours
+
+
+def exportMasterForScan(filePath, thisFont, thisFontMasterID, leftNames, rightNames, step, minDistance, ignoreIntervals=(), kerningTable=None):
+	"""
+	Writes geometry and kerning of the given glyphs in one master into a scan file
+	for kernworker.py, which finds crashing pairs outside of the app.
+	"""
+	if kerningTable is None:
+		kerningTable = KerningTable(thisFont, thisFontMasterID, kerningDirection(thisFont))
+	glyphs = {}
+	for glyphName in set(leftNames) | set(rightNames):
+		layer = layerCache.decomposedLayer(thisFont.glyphs[glyphName].layers[thisFontMasterID])
+		glyphs[glyphName] = {
+			"width": layer.width,
+			"contours": flattenedContours(layer),
+		}
+
+	kerning = {}
+	for leftName in leftNames:
+		for rightName in rightNames:
+			value = kerningTable.value(leftName, rightName)
+			if value:
+				kerning.setdefault(leftName, {})[rightName] = value
+
+	scan = {
+		"family": thisFont.familyName,
+		"master": thisFont.masters[thisFontMasterID].name,
+		"step": step,
+		"minDistance": minDistance,
+		"ignoreIntervals": [list(interval) for interval in ignoreIntervals],
+		"glyphs": glyphs,
+		"left": list(leftNames),
+		"right": list(rightNames),
+		"kerning": kerning,
+	}
+	writeScanFile(scan, filePath)
+	return filePath
+
+
+def cancelKeysPressed():
+	"""True while the user holds down Command and Option, which cancels long scans."""
+	keysPressed = NSEvent.modifierFlags()
+	cancelKeys = NSEventModifierFlagCommand | NSEventModifierFlagOption
+	return keysPressed & cancelKeys == cancelKeys
+
+
+class ScanSession(object):
+	"""
+	Streams the results of a long pair scan (KernCrasher, GapFinder) while it runs:
+	- every hit goes into an NDJSON report file right away, and into the Macro Window if verbose,
+	- progress with pairs per second and ETA is printed every progressInterval seconds,
+	- a checkpoint is saved after each left glyph, so a cancelled run can resume.
+	Files are stored next to the font file (or in the temp folder for unsaved fonts).
+	The checkpoint is only reused if settings, glyphs, outlines and kerning are unchanged.
+	"""
+
+	def __init__(self, scriptName, thisFont, thisFontMasterID, settings, leftNames, rightNames, verbose=False, progressInterval=5.0):
+		self.scriptName = scriptName
+		self.leftNames = leftNames
+		self.rightNames = rightNames
+		self.verbose = verbose
+		self.progressInterval = progressInterval
+		self.rows = {}
+		self.pairCount = 0
+		self.hitCount = 0
+		self.cancelled = False
+
+		if thisFont.filepath:
+			directory = os.path.dirname(thisFont.filepath)
+			fileName = os.path.splitext(os.path.basename(thisFont.filepath))[0]
+		else:
+			directory = tempfile.gettempdir()
+			fileName = thisFont.familyName
+		fileName = "%s %s %s" % (fileName, scriptName, thisFontMasterID)
+		self.reportPath = os.path.join(directory, fileName + ".ndjson")
+		self.checkpointPath = os.path.join(directory, fileName + ".checkpoint.json")
+
+		# anything that changes the results invalidates the checkpoint:
+		self.settingsKey = hashlib.sha1(repr((
+			sorted(settings.items()),
+			list(leftNames),
+			list(rightNames),
+			[layerFingerprint(thisFont.glyphs[name].layers[thisFontMasterID]) for name in sorted(set(leftNames) | set(rightNames))],
+		)).encode("utf-8")).hexdigest()
+		self.settings = settings
+
+	def resume(self):
+		"""Loads the finished rows of an interrupted run with the same settings. Returns them as {leftName: [(rightName, distance), ...]}."""
+		try:
+			with open(self.checkpointPath, "r", encoding="utf-8") as checkpointFile:
+				checkpoint = json.load(checkpointFile)
+		except (OSError, ValueError):
+			return {}
+		if checkpoint.get("settingsKey") != self.settingsKey:
+			return {}
+		self.rows = {leftName: [tuple(hit) for hit in hits] for leftName, hits in checkpoint["rows"].items()}
+		self.pairCount = len(self.rows) * len(self.rightNames)
+		self.hitCount = sum(len(hits) for hits in self.rows.values())
+		return dict(self.rows)
+
+	def start(self):
+		self.startTime = timer()
+		self.lastProgress = self.startTime
+		self.resumedPairCount = self.pairCount
+		isResumed = bool(self.rows)
+		with open(self.reportPath, "a" if isResumed else "w", encoding="utf-8") as reportFile:
+			reportFile.write(json.dumps({
+				"scan": self.scriptName,
+				"resumed": isResumed,
+				"settings": self.settings,
+				"started": time.strftime("%Y-%m-%d %H:%M:%S"),
+			}) + "\n")
+		if isResumed:
+			print("⏯ Resuming %s: %i of %i left glyphs already done (%i hits)." % (self.scriptName, len(self.rows), len(self.leftNames), self.hitCount))
+		print("📄 Report file: %s" % self.reportPath)
+
+	def remainingLeftNames(self):
+		return [name for name in self.leftNames if name not in self.rows]
+
+	def addRow(self, leftName, hits):
+		"""Call after each left glyph with its hits [(rightName, distance), ...]. Returns False if the user wants to cancel."""
+		self.rows[leftName] = list(hits)
+		self.pairCount += len(self.rightNames)
+		self.hitCount += len(hits)
+		if hits:
+			with open(self.reportPath, "a", encoding="utf-8") as reportFile:
+				for rightName, distance in hits:
+					reportFile.write(json.dumps({"left": leftName, "right": rightName, "distance": distance}) + "\n")
+		if self.verbose:
+			for rightName, distance in hits:
+				print("- %s %s: %i" % (leftName, rightName, distance))
+		with open(self.checkpointPath, "w", encoding="utf-8") as checkpointFile:
+			json.dump({"settingsKey": self.settingsKey, "rows": self.rows}, checkpointFile)
+
+		now = timer()
+		if now - self.lastProgress >= self.progressInterval:
+			self.lastProgress = now
+			print(self.progressReport())
+
+		if cancelKeysPressed():
+			self.cancelled = True
+		return not self.cancelled
+
+	def progressReport(self):
+		totalPairs = len(self.leftNames) * len(self.rightNames)
+		elapsed = max(timer() - self.startTime, 0.001)
+		pairsPerSecond = (self.pairCount - self.resumedPairCount) / elapsed
+		eta = (totalPairs - self.pairCount) / pairsPerSecond if pairsPerSecond else 0.0
+		return "⏱ %i of %i left glyphs, %i of %i pairs, %i pairs/s, %i hits, ETA %s." % (
+			len(self.rows),
+			len(self.leftNames),
+			self.pairCount,
+			totalPairs,
+			pairsPerSecond,
+			self.hitCount,
+			reportTimeInNaturalLanguage(eta),
+		)
+
+	def finish(self):
+		"""Closes the report. Keeps the checkpoint if the run was cancelled, so it can resume."""
+		completed = len(self.rows) == len(self.leftNames)
+		with open(self.reportPath, "a", encoding="utf-8") as reportFile:
+			reportFile.write(json.dumps({"finished": completed, "pairs": self.pairCount, "hits": self.hitCount}) + "\n")
+		if completed:
+			if os.path.exists(self.checkpointPath):
+				os.remove(self.checkpointPath)
+		else:
+			print("⏸ %s cancelled after %i of %i left glyphs. Run again with the same settings to resume." % (self.scriptName, len(self.rows), len(self.leftNames)))
+		return completed
 
 
 def sortedIntervalsFromString(intervals="", font=None, mID=None):
@@ -316,116 +930,38 @@ def distanceFromEntry(entry, font, masterID, default=0.0):
 	return distance
 
 
+def _outlinePoints(layer):
+	# on-curve and off-curve points, the curves never leave the hull of their handles:
+	return [(node.x, node.y) for path in layer.paths for node in path.nodes]
+
+
+def bubbleCoordinatesForLayer(layer, offset=10.0):
+	"""
+	Convex polygon (list of (x, y), counter-clockwise) around the decomposed outlines
+	of the layer, grown by offset. Computed only once as long as the layer is unchanged.
+	"""
+	return layerCache.get(layer, ("bubble", offset), lambda layer: tuple(bubble(_outlinePoints(layerCache.decomposedLayer(layer)), offset=offset)))
+
+
 def bubbleForLayer(layer, offset=10.0):
-	def boxIsInsideBox(smallBox, bigBox):
-		if bigBox.size.width * bigBox.size.height == 0.0:
-			return False
-		if smallBox.size.width > bigBox.size.width:
-			return False
-		if smallBox.size.height > bigBox.size.height:
-			return False
-		if smallBox.origin.x < bigBox.origin.x:
-			return False
-		if smallBox.origin.y < bigBox.origin.y:
-			return False
-		if smallBox.origin.x + smallBox.size.width > bigBox.origin.x + bigBox.size.width:
-			return False
-		if smallBox.origin.y + smallBox.size.height > bigBox.origin.y + bigBox.size.height:
-			return False
-		return True
-	
-	# just keep the relevant paths:
-	workLayer = layer.copyDecomposedLayer()
-	workLayer.removeOverlap()
-	collectedPoints = []
-	for path in workLayer.paths:
-		if boxIsInsideBox(path.bounds, workLayer.bounds):
-			continue
-		collectedPoints.extend([(p.x, p.y) for p in path.nodes])
-	
-	bubbleCoordinates = bubble(collectedPoints, offset=offset)
 	bubblePath = GSPath()
-	for coord in bubbleCoordinates:
+	for coord in bubbleCoordinatesForLayer(layer, offset=offset):
 		newNode = GSNode()
 		newNode.position = NSPoint(*coord)
 		newNode.type = GSLINE
 		bubblePath.nodes.append(newNode)
-	
+
 	bubblePath.closed = True
 	return bubblePath
 
 
-def bubble(points, offset=0.0):
+def bubbleDistanceBetweenTwoLayers(leftLayer, rightLayer, kerning=0.0, offset=0.0):
 	"""
-	Creates a counter-clockwise winding polygon with only left angles around a list of NSPoints.
-	:param points: List of NSPoints (each NSPoint is represented as a tuple of (x, y)).
-	:param offset: Padding distance, default is 0.0.
-	:return: List of NSPoints representing the outer polygon.
+	Smallest distance in any direction between the bubbles of two layers set next to each other
+	(with kerning), 0.0 if they touch. Quick lower bound for the distance between the outlines.
 	"""
-	offset *= -1
-	
-	if len(points) < 3:
-		return points
-
-	# Calculate convex hull using Gift Wrapping algorithm
-	hull = []
-	leftMost = min(points, key=lambda p: p[0])
-	pointOnHull = leftMost
-
-	while True:
-		hull.append(pointOnHull)
-		nextPoint = points[0]
-		for candidate in points[1:]:
-			# Check if candidate forms a left turn
-			if nextPoint == pointOnHull or _calculateCrossProduct(pointOnHull, nextPoint, candidate) < 0:
-				nextPoint = candidate
-		if nextPoint == leftMost:
-			break
-		pointOnHull = nextPoint
-
-	# Create offset points
-	offsetPoints = []
-	
-	# Process each edge of the hull
-	for i in range(len(hull)):
-		p1 = hull[i]
-		p2 = hull[(i + 1) % len(hull)]
-		
-		# Calculate direction and normal vectors
-		deltaX = p2[0] - p1[0]
-		deltaY = p2[1] - p1[1]
-		length = (deltaX * deltaX + deltaY * deltaY) ** 0.5
-		
-		# Normalize and create perpendicular vector
-		normalX = -deltaY / length
-		normalY = deltaX / length
-		
-		# Create offset points
-		offsetPoints.append((
-			p1[0] + normalX * offset,
-			p1[1] + normalY * offset
-		))
-		offsetPoints.append((
-			p2[0] + normalX * offset,
-			p2[1] + normalY * offset
-		))
-
-	# Remove duplicates and sort counter-clockwise
-	offsetPoints = list(set(offsetPoints))
-	center = _calculateCenter(offsetPoints)
-	offsetPoints.sort(key=lambda p: _calculateAngle(p, center))
-	return offsetPoints
-
-
-def _calculateCrossProduct(o, a, b):
-	return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
-
-
-def _calculateCenter(points):
-	x = sum(p[0] for p in points) / len(points)
-	y = sum(p[1] for p in points) / len(points)
-	return (x, y)
-
-
-def _calculateAngle(p, center):
-	return math.atan2(p[1] - center[1], p[0] - center[0])
+	leftBubble = bubbleCoordinatesForLayer(leftLayer, offset=offset)
+	rightBubble = bubbleCoordinatesForLayer(rightLayer, offset=offset)
+	if not leftBubble or not rightBubble:
+		return None
+	return distanceBetweenConvexPolygons(leftBubble, rightBubble, shiftX=leftLayer.width + kerning)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for the bubble geometry in kernpolygons, on dense synthetic outlines
+(like 2,000-node CJK or decorative glyphs). Compares the former gift-wrapping bubble
+with the monotone-chain bubble, and brute-force polygon distances with PolygonPair.
+Pure Python, runs outside of Glyphs:
+
+	python3 kernbenchmark.py [--nodes 2000] [--repeat 5]
+"""
+
+import argparse
+import math
+import random
+import sys
+from timeit import default_timer as timer
+
+from kernpolygons import bubble, PolygonPair
+
+
+def denseOutline(nodeCount, width=1000.0, height=1000.0, seed=0):
+	"""Points of a wobbly outer contour plus many small inner contours, nodeCount in total."""
+	randomGenerator = random.Random(seed)
+	outerCount = nodeCount // 2
+	points = []
+	for i in range(outerCount):
+		angle = 2 * math.pi * i / outerCount
+		radius = 0.5 * (0.8 + 0.2 * math.sin(7 * angle) + 0.05 * randomGenerator.random())
+		points.append((width * (0.5 + radius * math.cos(angle)), height * (0.5 + radius * math.sin(angle))))
+	while len(points) < nodeCount:
+		centerX, centerY = width * randomGenerator.uniform(0.2, 0.8), height * randomGenerator.uniform(0.2, 0.8)
+		for i in range(8):
+			angle = 2 * math.pi * i / 8
+			points.append((centerX + 20 * math.cos(angle), centerY + 20 * math.sin(angle)))
+	return points[:nodeCount]
+
+
+def legacyBubble(points, offset=0.0):
+	"""The former kernanalysis.bubble(): gift wrapping, offset edges, deduplicated and sorted by angle."""
+	offset *= -1
+	if len(points) < 3:
+		return points
+	hull = []
+	leftMost = min(points, key=lambda p: p[0])
+	pointOnHull = leftMost
+	while True:
+		hull.append(pointOnHull)
+		nextPoint = points[0]
+		for candidate in points[1:]:
+			cross = (nextPoint[0] - pointOnHull[0]) * (candidate[1] - pointOnHull[1]) - (nextPoint[1] - pointOnHull[1]) * (candidate[0] - pointOnHull[0])
+			if nextPoint == pointOnHull or cross < 0:
+				nextPoint = candidate
+		if nextPoint == leftMost:
+			break
+		pointOnHull = nextPoint
+	offsetPoints = []
+	for i in range(len(hull)):
+		p1 = hull[i]
+		p2 = hull[(i + 1) % len(hull)]
+		deltaX = p2[0] - p1[0]
+		deltaY = p2[1] - p1[1]
+		length = (deltaX * deltaX + deltaY * deltaY) ** 0.5
+		normalX = -deltaY / length
+		normalY = deltaX / length
+		offsetPoints.append((p1[0] + normalX * offset, p1[1] + normalY * offset))
+		offsetPoints.append((p2[0] + normalX * offset, p2[1] + normalY * offset))
+	offsetPoints = list(set(offsetPoints))
+	centerX = sum(p[0] for p in offsetPoints) / len(offsetPoints)
+	centerY = sum(p[1] for p in offsetPoints) / len(offsetPoints)
+	offsetPoints.sort(key=lambda p: math.atan2(p[1] - centerY, p[0] - centerX))
+	return offsetPoints
+
+
+def _distanceToSegment(point, start, end):
+	deltaX, deltaY = end[0] - start[0], end[1] - start[1]
+	lengthSquared = deltaX * deltaX + deltaY * deltaY
+	t = 0.0 if lengthSquared == 0 else max(0.0, min(1.0, ((point[0] - start[0]) * deltaX + (point[1] - start[1]) * deltaY) / lengthSquared))
+	return math.hypot(point[0] - start[0] - t * deltaX, point[1] - start[1] - t * deltaY)
+
+
+def bruteForceDistance(polygonA, polygonB, shiftX=0.0):
+	"""Every vertex against every edge, in both directions (assumes the polygons do not overlap)."""
+	polygonB = [(x + shiftX, y) for x, y in polygonB]
+	distance = None
+	for polygon, otherPolygon in ((polygonA, polygonB), (polygonB, polygonA)):
+		for point in polygon:
+			for i in range(len(otherPolygon)):
+				segmentDistance = _distanceToSegment(point, otherPolygon[i], otherPolygon[(i + 1) % len(otherPolygon)])
+				if distance is None or segmentDistance < distance:
+					distance = segmentDistance
+	return distance
+
+
+def bestTime(function, repeat):
+	times = []
+	for i in range(repeat):
+		start = timer()
+		result = function()
+		times.append(timer() - start)
+	return min(times), result
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description="Compare the former and the current bubble geometry of kernanalysis on dense outlines.")
+	parser.add_argument("--nodes", dest="nodes", type=int, default=2000, help="nodes per synthetic glyph (default: 2000)")
+	parser.add_argument("--repeat", dest="repeat", type=int, default=5, help="runs per measurement, the best one counts (default: 5)")
+	parser.add_argument("--offset", dest="offset", type=float, default=10.0, help="bubble offset (default: 10)")
+	options = parser.parse_args(arguments)
+
+	leftPoints = denseOutline(options.nodes, seed=1)
+	rightPoints = denseOutline(options.nodes, seed=2)
+	print("Bubble benchmark: %i nodes per glyph, offset %s, best of %i runs.\n" % (options.nodes, options.offset, options.repeat))
+
+	legacySeconds, legacyResult = bestTime(lambda: legacyBubble(leftPoints, options.offset), options.repeat)
+	newSeconds, leftBubble = bestTime(lambda: bubble(leftPoints, options.offset), options.repeat)
+	print("Bubble:    gift wrapping %8.2f ms (%i points), monotone chain %8.2f ms (%i points), %.1f× faster" % (
+		1000 * legacySeconds, len(legacyResult), 1000 * newSeconds, len(leftBubble), legacySeconds / newSeconds
+	))
+
+	rightBubble = bubble(rightPoints, options.offset)
+	shiftX = 1100.0
+	bruteSeconds, bruteResult = bestTime(lambda: bruteForceDistance(leftBubble, rightBubble, shiftX), options.repeat)
+	pairSeconds, polygonPair = bestTime(lambda: PolygonPair(leftBubble, rightBubble), options.repeat)
+	querySeconds, queryResult = bestTime(lambda: polygonPair.distance(shiftX), options.repeat)
+	print("Distance:  brute force   %8.2f ms, PolygonPair setup %.2f ms + query %.3f ms, %.1f× faster (%.3f vs. %.3f units)" % (
+		1000 * bruteSeconds, 1000 * pairSeconds, 1000 * querySeconds, bruteSeconds / (pairSeconds + querySeconds), bruteResult, queryResult
+	))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
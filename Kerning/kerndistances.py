@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent store of pair distances measured by KernCrasher, GapFinder and Auto Bumper.
+
+Distances are stored without kerning, keyed by the outline fingerprints of both
+glyphs (see kernanalysis.layerFingerprint), the master ID, the measuring step and
+the ignored height intervals. So a later run only measures the pairs where one of
+the glyphs has changed, while changed kerning is simply added to the stored value.
+The file is capped at maxEntries pairs, least recently used pairs are evicted first.
+"""
+
+import math
+import os
+import random
+import sqlite3
+import time
+
+from kernprofiles import minDistanceBetweenProfiles
+
+storeFormat = 1
+defaultStorePath = "~/Library/Caches/mekkablue/KernDistances.sqlite"
+
+
+class DistanceStore(object):
+	"""
+	Looks up pair distances in an SQLite file, and measures (and stores) only missing pairs.
+	Pairs are expected row by row (all right glyphs for one left glyph, then the next
+	left glyph), which is how all kerning scripts scan: stored distances are loaded once
+	per left glyph, and new ones are written once per left glyph.
+	With verifyRate > 0, that share of stored distances is measured again, to detect
+	stale entries (which are then replaced). Call close() at the end of a run.
+	"""
+
+	def __init__(self, masterID, step, ignoreIntervals=None, filePath=None, maxEntries=200000, verifyRate=0.0):
+		self.filePath = os.path.expanduser(filePath or defaultStorePath)
+		self.maxEntries = maxEntries
+		self.verifyRate = verifyRate
+		self.ignoreIntervals = tuple((float(loEnd), float(hiEnd)) for loEnd, hiEnd in ignoreIntervals or ())
+		self.context = "%i|%s|%r|%r" % (storeFormat, masterID, float(step), self.ignoreIntervals)
+
+		self.reused = 0
+		self.measured = 0
+		self.verified = 0
+		self.stale = 0
+
+		self._leftHash = None
+		self._row = {}
+		self._newDistances = []
+		self._usedRightHashes = []
+
+		directory = os.path.dirname(self.filePath)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+		self.connection = sqlite3.connect(self.filePath)
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS distances (context TEXT, leftHash TEXT, rightHash TEXT, distance REAL, lastUsed REAL, UNIQUE (context, leftHash, rightHash))"
+		)
+		self.connection.execute("CREATE INDEX IF NOT EXISTS distancesByAge ON distances (lastUsed)")
+
+	def _measure(self, leftProfile, rightProfile):
+		self.measured += 1
+		return minDistanceBetweenProfiles(leftProfile, rightProfile, ignoreIntervals=self.ignoreIntervals)
+
+	def _startRow(self, leftHash):
+		self.flush()
+		self._leftHash = leftHash
+		self._row = dict(self.connection.execute(
+			"SELECT rightHash, distance FROM distances WHERE context = ? AND leftHash = ?",
+			(self.context, leftHash),
+		))
+
+	def minDistance(self, leftProfile, rightProfile, kerning=0.0):
+		"""Same as kernprofiles.minDistanceBetweenProfiles() (with the ignore intervals of the store), but measured only once per pair of outlines."""
+		leftHash = getattr(leftProfile, "fingerprint", None)
+		rightHash = getattr(rightProfile, "fingerprint", None)
+		if leftHash is None or rightHash is None:
+			# cannot identify the outlines:
+			distance = self._measure(leftProfile, rightProfile)
+		else:
+			if leftHash != self._leftHash:
+				self._startRow(leftHash)
+			if rightHash in self._row:
+				self.reused += 1
+				distance = self._row[rightHash]
+				self._usedRightHashes.append(rightHash)
+				if self.verifyRate and random.random() < self.verifyRate:
+					self.verified += 1
+					measuredDistance = self._measure(leftProfile, rightProfile)
+					if (measuredDistance is None) != (distance is None) or (distance is not None and not math.isclose(distance, measuredDistance, abs_tol=0.001)):
+						self.stale += 1
+						distance = measuredDistance
+						self._row[rightHash] = distance
+						self._newDistances.append((rightHash, distance))
+			else:
+				distance = self._measure(leftProfile, rightProfile)
+				self._row[rightHash] = distance
+				self._newDistances.append((rightHash, distance))
+		if distance is None:
+			return None
+		return distance + kerning
+
+	def flush(self):
+		"""Writes new distances and use times of the current left glyph."""
+		if self._leftHash is None:
+			return
+		now = time.time()
+		with self.connection:
+			self.connection.executemany(
+				"INSERT OR REPLACE INTO distances (context, leftHash, rightHash, distance, lastUsed) VALUES (?, ?, ?, ?, ?)",
+				[(self.context, self._leftHash, rightHash, distance, now) for rightHash, distance in self._newDistances],
+			)
+			self.connection.executemany(
+				"UPDATE distances SET lastUsed = ? WHERE context = ? AND leftHash = ? AND rightHash = ?",
+				[(now, self.context, self._leftHash, rightHash) for rightHash in self._usedRightHashes],
+			)
+		self._newDistances = []
+		self._usedRightHashes = []
+
+	def evict(self):
+		"""Deletes the least recently used pairs beyond maxEntries. Returns the number of deleted pairs."""
+		count = self.connection.execute("SELECT COUNT(*) FROM distances").fetchone()[0]
+		excess = count - self.maxEntries
+		if excess <= 0:
+			return 0
+		with self.connection:
+			self.connection.execute("DELETE FROM distances WHERE rowid IN (SELECT rowid FROM distances ORDER BY lastUsed LIMIT ?)", (excess,))
+		return excess
+
+	def close(self):
+		self.flush()
+		self._leftHash = None
+		self.evict()
+		self.connection.close()
+
+	def clear(self):
+		"""Forgets all stored distances, for all masters and settings."""
+		with self.connection:
+			self.connection.execute("DELETE FROM distances")
+		self._leftHash = None
+		self._row = {}
+		self._newDistances = []
+		self._usedRightHashes = []
+
+	def report(self):
+		report = "Distance store: %i pair%s reused, %i measured" % (
+			self.reused,
+			"" if self.reused == 1 else "s",
+			self.measured - self.verified,
+		)
+		if self.verifyRate:
+			report += ", %i verified (%i stale and replaced)" % (self.verified, self.stale)
+		return report + "."
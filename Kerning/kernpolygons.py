@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Convex polygon geometry for bubbles around glyph outlines (see kernanalysis.bubbleForLayer).
+Pure Python, points are (x, y) tuples, polygons wind counter-clockwise.
+"""
+
+import math
+
+
+def _crossProduct(o, a, b):
+	return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convexHull(points):
+	"""
+	Convex hull of the points (Andrew’s monotone chain, O(n log n)), counter-clockwise,
+	starting with the bottom-left point, without duplicate or collinear points.
+	"""
+	points = sorted(set((float(x), float(y)) for x, y in points))
+	if len(points) < 3:
+		return points
+
+	lowerHull = []
+	for point in points:
+		while len(lowerHull) >= 2 and _crossProduct(lowerHull[-2], lowerHull[-1], point) <= 0:
+			lowerHull.pop()
+		lowerHull.append(point)
+
+	upperHull = []
+	for point in reversed(points):
+		while len(upperHull) >= 2 and _crossProduct(upperHull[-2], upperHull[-1], point) <= 0:
+			upperHull.pop()
+		upperHull.append(point)
+
+	# the last point of each chain is the first point of the other one:
+	return lowerHull[:-1] + upperHull[:-1]
+
+
+def offsetConvexPolygon(polygon, offset, maxArcAngle=30.0):
+	"""
+	Grows a convex counter-clockwise polygon by offset in all directions: edges are moved
+	outward, corners are rounded with arc points at most maxArcAngle degrees apart.
+	Returns the polygon itself if offset is not positive.
+	"""
+	if offset <= 0.0 or not polygon:
+		return list(polygon)
+	if len(polygon) == 1:
+		# a single point becomes a circle:
+		x, y = polygon[0]
+		segmentCount = int(math.ceil(360.0 / maxArcAngle))
+		return [(x + offset * math.cos(2 * math.pi * i / segmentCount), y + offset * math.sin(2 * math.pi * i / segmentCount)) for i in range(segmentCount)]
+
+	# angles of the outward normals (right side of counter-clockwise edges):
+	normalAngles = []
+	for i, point in enumerate(polygon):
+		nextPoint = polygon[(i + 1) % len(polygon)]
+		normalAngles.append(math.atan2(-(nextPoint[0] - point[0]), nextPoint[1] - point[1]))
+
+	maxArcRadians = math.radians(maxArcAngle)
+	offsetPoints = []
+	for i, (x, y) in enumerate(polygon):
+		# arc around the corner, from the normal of the incoming edge to the normal of the outgoing edge:
+		startAngle = normalAngles[i - 1]
+		turnAngle = (normalAngles[i] - startAngle) % (2 * math.pi)
+		segmentCount = max(1, int(math.ceil(turnAngle / maxArcRadians)))
+		for j in range(segmentCount + 1):
+			angle = startAngle + turnAngle * j / segmentCount
+			offsetPoints.append((x + offset * math.cos(angle), y + offset * math.sin(angle)))
+	return offsetPoints
+
+
+def bubble(points, offset=0.0):
+	"""
+	Creates a counter-clockwise winding polygon with only left angles around a list of points.
+	:param points: List of points, each represented as a tuple of (x, y).
+	:param offset: Padding distance (rounded at the corners), default is 0.0.
+	:return: List of points representing the outer polygon.
+	"""
+	if len(points) < 3:
+		return list(points)
+	return offsetConvexPolygon(convexHull(points), offset)
+
+
+def _bottomIndex(polygon):
+	return min(range(len(polygon)), key=lambda i: (polygon[i][1], polygon[i][0]))
+
+
+def minkowskiSum(polygonA, polygonB):
+	"""Minkowski sum of two convex counter-clockwise polygons, in O(n+m) by merging their edges by angle."""
+	if len(polygonA) == 1 or len(polygonB) == 1:
+		(x, y), polygon = (polygonA[0], polygonB) if len(polygonA) == 1 else (polygonB[0], polygonA)
+		return [(x + pointX, y + pointY) for pointX, pointY in polygon]
+	startA, startB = _bottomIndex(polygonA), _bottomIndex(polygonB)
+	polygonA = polygonA[startA:] + polygonA[:startA]
+	polygonB = polygonB[startB:] + polygonB[:startB]
+	countA, countB = len(polygonA), len(polygonB)
+	i = j = 0
+	polygon = []
+	while i < countA or j < countB:
+		pointA, pointB = polygonA[i % countA], polygonB[j % countB]
+		polygon.append((pointA[0] + pointB[0], pointA[1] + pointB[1]))
+		nextA, nextB = polygonA[(i + 1) % countA], polygonB[(j + 1) % countB]
+		cross = (nextA[0] - pointA[0]) * (nextB[1] - pointB[1]) - (nextA[1] - pointA[1]) * (nextB[0] - pointB[0])
+		if j >= countB or (i < countA and cross > 0):
+			i += 1
+		elif i >= countA or cross < 0:
+			j += 1
+		else:
+			# parallel edges:
+			i += 1
+			j += 1
+	return polygon
+
+
+def distanceFromPointToConvexPolygon(point, polygon):
+	"""Euclidean distance of point to a convex counter-clockwise polygon, 0.0 if it is inside or on the border."""
+	x, y = point
+	isInside = len(polygon) >= 3
+	minDistance = None
+	for i, (x1, y1) in enumerate(polygon):
+		x2, y2 = polygon[(i + 1) % len(polygon)]
+		deltaX, deltaY = x2 - x1, y2 - y1
+		if deltaX * (y - y1) - deltaY * (x - x1) < 0:
+			isInside = False
+		# distance to the edge:
+		lengthSquared = deltaX * deltaX + deltaY * deltaY
+		t = 0.0 if lengthSquared == 0 else max(0.0, min(1.0, ((x - x1) * deltaX + (y - y1) * deltaY) / lengthSquared))
+		distance = math.hypot(x - x1 - t * deltaX, y - y1 - t * deltaY)
+		if minDistance is None or distance < minDistance:
+			minDistance = distance
+	if isInside:
+		return 0.0
+	return minDistance
+
+
+class PolygonPair(object):
+	"""
+	Distance between two convex counter-clockwise polygons (e.g., bubbles), for many
+	horizontal positions of the second one: the Minkowski difference is computed once,
+	then each query is a point-to-polygon distance in O(n+m).
+	"""
+
+	def __init__(self, polygonA, polygonB):
+		self.difference = minkowskiSum(polygonA, [(-x, -y) for x, y in polygonB])
+
+	def distance(self, shiftX=0.0):
+		"""Smallest distance between polygonA and polygonB moved by shiftX, 0.0 if they touch or overlap."""
+		return distanceFromPointToConvexPolygon((shiftX, 0.0), self.difference)
+
+
+def distanceBetweenConvexPolygons(polygonA, polygonB, shiftX=0.0):
+	"""Smallest distance between two convex counter-clockwise polygons, with polygonB moved by shiftX. 0.0 if they touch or overlap."""
+	return PolygonPair(polygonA, polygonB).distance(shiftX)
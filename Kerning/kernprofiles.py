@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Sidebearing profiles: the left and right contour of a layer, sampled once on
+a height grid shared by all layers (sample k sits at height k*step).
+Measuring the distance between two glyphs then becomes a single array
+operation on two profiles instead of two bridge calls per height and pair.
+
+Pure Python without any app dependency, so profiles can also be built from
+plain coordinate lists (e.g., outside of Glyphs). Uses NumPy if available.
+"""
+
+import math
+from functools import lru_cache
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def gridRange(bottom, top, step):
+	"""
+	Returns (firstIndex, lastIndex) of the grid samples k with bottom <= k*step < top.
+	lastIndex is exclusive, like in range().
+	"""
+	firstIndex = int(math.ceil(bottom / step))
+	lastIndex = int(math.ceil(top / step))
+	return firstIndex, max(firstIndex, lastIndex)
+
+
+def _isGap(value):
+	return value is None or value != value  # None or NaN
+
+
+class LayerProfile(object):
+	"""
+	Left and right sidebearings of a layer, measured at the grid heights
+	firstIndex*step, (firstIndex+1)*step, ... A gap (NSNotFound in the app,
+	e.g., between the dot and the stem of an i) is stored as None, or as NaN
+	in NumPy arrays.
+	"""
+
+	def __init__(self, step, firstIndex, left, right, useNumpy=None):
+		if len(left) != len(right):
+			raise ValueError("Left and right profile must have the same length (%i vs. %i)." % (len(left), len(right)))
+		if useNumpy is None:
+			useNumpy = numpy is not None
+		self.step = step
+		self.firstIndex = firstIndex
+		self.lastIndex = firstIndex + len(left)
+		self.usesNumpy = bool(useNumpy)
+		if self.usesNumpy:
+			self.left = numpy.array([numpy.nan if _isGap(v) else v for v in left], dtype=float)
+			self.right = numpy.array([numpy.nan if _isGap(v) else v for v in right], dtype=float)
+		else:
+			self.left = tuple(None if _isGap(v) else v for v in left)
+			self.right = tuple(None if _isGap(v) else v for v in right)
+		# extreme sidebearings, None if there is nothing to measure:
+		self.minLeft = _minimum(self.left)
+		self.minRight = _minimum(self.right)
+		self._coarseProfiles = {}
+		# outline fingerprint of the measured layer, set by the layer cache:
+		self.fingerprint = None
+
+	def __len__(self):
+		return self.lastIndex - self.firstIndex
+
+	def __repr__(self):
+		return "<LayerProfile step %s, heights %s to %s, %i samples>" % (self.step, self.firstIndex * self.step, (self.lastIndex - 1) * self.step, len(self))
+
+	def heights(self):
+		return [k * self.step for k in range(self.firstIndex, self.lastIndex)]
+
+	def overlaps(self, other):
+		return max(self.firstIndex, other.firstIndex) < min(self.lastIndex, other.lastIndex)
+
+	def pooled(self, factor):
+		"""
+		Coarse profile with step*factor: every coarse sample is the smallest of the
+		fine samples it covers. Distances measured on it are a lower bound for the
+		distance measured on the fine profile.
+		"""
+		key = ("pooled", factor)
+		if key not in self._coarseProfiles:
+			firstIndex = self.firstIndex // factor
+			lastIndex = -(-self.lastIndex // factor)
+			left, right = [], []
+			for j in range(firstIndex, lastIndex):
+				start = max(0, j * factor - self.firstIndex)
+				end = min(len(self), (j + 1) * factor - self.firstIndex)
+				left.append(_minimum(self.left[start:end]))
+				right.append(_minimum(self.right[start:end]))
+			self._coarseProfiles[key] = LayerProfile(self.step * factor, firstIndex, left, right, useNumpy=self.usesNumpy)
+		return self._coarseProfiles[key]
+
+	def subsampled(self, factor):
+		"""
+		Coarse profile with step*factor, made of every factor-th fine sample on the grid.
+		Its samples are a subset of the fine ones, so distances measured on it are an
+		upper bound for the distance measured on the fine profile.
+		"""
+		key = ("subsampled", factor)
+		if key not in self._coarseProfiles:
+			firstIndex = -(-self.firstIndex // factor)
+			lastIndex = max(firstIndex, -(-self.lastIndex // factor))
+			fineIndexes = [j * factor - self.firstIndex for j in range(firstIndex, lastIndex)]
+			left = [self.left[i] for i in fineIndexes]
+			right = [self.right[i] for i in fineIndexes]
+			self._coarseProfiles[key] = LayerProfile(self.step * factor, firstIndex, left, right, useNumpy=self.usesNumpy)
+		return self._coarseProfiles[key]
+
+
+def _minimum(values):
+	if numpy is not None and isinstance(values, numpy.ndarray):
+		values = values[~numpy.isnan(values)]
+		return float(values.min()) if values.size else None
+	values = [v for v in values if not _isGap(v)]
+	return min(values) if values else None
+
+
+def sampleProfile(measureLeft, measureRight, bottom, top, step, useNumpy=None):
+	"""
+	Builds a LayerProfile by calling measureLeft(height) and measureRight(height)
+	once per grid height between bottom and top. The functions return the LSB or
+	RSB at that height, or None for a gap. Pass None instead of a function to skip
+	a side (it will be stored as all gaps).
+	"""
+	firstIndex, lastIndex = gridRange(bottom, top, step)
+	left, right = [], []
+	for k in range(firstIndex, lastIndex):
+		height = k * step
+		left.append(measureLeft(height) if measureLeft else None)
+		right.append(measureRight(height) if measureRight else None)
+	return LayerProfile(step, firstIndex, left, right, useNumpy=useNumpy)
+
+
+def profileFromContours(contours, width, step, useNumpy=None):
+	"""
+	Builds a LayerProfile from plain coordinates, no app required.
+	contours: list of closed polygons, each a list of (x, y) tuples
+	(curves need to be flattened before).
+	width: advance width of the glyph, needed for the RSB.
+	Returns None if there are no points at all.
+	"""
+	ys = [point[1] for contour in contours for point in contour]
+	if not ys:
+		return None
+	firstIndex, lastIndex = gridRange(min(ys), max(ys), step)
+	count = lastIndex - firstIndex
+	minX = [None] * count
+	maxX = [None] * count
+
+	def addIntersection(k, x):
+		i = k - firstIndex
+		if minX[i] is None or x < minX[i]:
+			minX[i] = x
+		if maxX[i] is None or x > maxX[i]:
+			maxX[i] = x
+
+	for contour in contours:
+		for i in range(len(contour)):
+			x0, y0 = contour[i - 1]
+			x1, y1 = contour[i]
+			if y0 == y1:
+				# horizontal edge, only counts if it sits exactly on a grid height:
+				k = y0 / step
+				if k == int(k) and firstIndex <= k < lastIndex:
+					addIntersection(int(k), x0)
+					addIntersection(int(k), x1)
+				continue
+			yLow, yHigh = min(y0, y1), max(y0, y1)
+			kLow = max(firstIndex, int(math.ceil(yLow / step)))
+			kHigh = min(lastIndex, int(math.ceil(yHigh / step)))  # half-open: vertices are not counted twice
+			slope = (x1 - x0) / (y1 - y0)
+			for k in range(kLow, kHigh):
+				addIntersection(k, x0 + (k * step - y0) * slope)
+
+	left = minX
+	right = [None if x is None else width - x for x in maxX]
+	return LayerProfile(step, firstIndex, left, right, useNumpy=useNumpy)
+
+
+@lru_cache(maxsize=64)
+def _ignoredIndexRanges(step, ignoreIntervals):
+	"""Turns height intervals (inclusive) into half-open ranges of grid indexes."""
+	indexRanges = []
+	for loEnd, hiEnd in ignoreIntervals:
+		indexRanges.append((int(math.ceil(loEnd / step)), int(math.floor(hiEnd / step)) + 1))
+	return tuple(indexRanges)
+
+
+def minDistanceBetweenProfiles(leftProfile, rightProfile, kerning=0.0, ignoreIntervals=None):
+	"""
+	Smallest horizontal distance between the right edge of leftProfile and the
+	left edge of rightProfile (plus kerning), measured on the heights both have in
+	common, skipping gaps and heights inside ignoreIntervals. None if there is no
+	height where both sides can be measured.
+	"""
+	if leftProfile is None or rightProfile is None:
+		return None
+	step = leftProfile.step
+	if rightProfile.step != step:
+		raise ValueError("Cannot compare profiles with different steps (%s vs. %s)." % (step, rightProfile.step))
+
+	firstIndex = max(leftProfile.firstIndex, rightProfile.firstIndex)
+	lastIndex = min(leftProfile.lastIndex, rightProfile.lastIndex)
+	if lastIndex <= firstIndex:
+		return None
+
+	rightEdge = leftProfile.right[firstIndex - leftProfile.firstIndex:lastIndex - leftProfile.firstIndex]
+	leftEdge = rightProfile.left[firstIndex - rightProfile.firstIndex:lastIndex - rightProfile.firstIndex]
+	ignoredRanges = _ignoredIndexRanges(step, tuple(tuple(i) for i in ignoreIntervals)) if ignoreIntervals else ()
+
+	if leftProfile.usesNumpy and rightProfile.usesNumpy:
+		totals = rightEdge + leftEdge
+		if ignoredRanges:
+			keep = numpy.ones(len(totals), dtype=bool)
+			for ignoreStart, ignoreEnd in ignoredRanges:
+				keep[max(0, ignoreStart - firstIndex):max(0, ignoreEnd - firstIndex)] = False
+			totals = totals[keep]
+		totals = totals[~numpy.isnan(totals)]
+		if not totals.size:
+			return None
+		return float(totals.min()) + kerning
+
+	minTotal = None
+	for i, (rightValue, leftValue) in enumerate(zip(rightEdge, leftEdge)):
+		if _isGap(rightValue) or _isGap(leftValue):
+			continue  # avoid gaps like in i or j
+		if ignoredRanges:
+			k = firstIndex + i
+			if any(ignoreStart <= k < ignoreEnd for ignoreStart, ignoreEnd in ignoredRanges):
+				continue
+		total = rightValue + leftValue
+		if minTotal is None or total < minTotal:
+			minTotal = total
+	if minTotal is None:
+		return None
+	return minTotal + kerning
+
+
+class PairPruner(object):
+	"""
+	Two-stage filter in front of minDistanceBetweenProfiles(), for scanning many pairs:
+	1. bounds and extreme sidebearings, 2. coarse profiles (coarseStep units apart).
+	Pairs are only measured at full resolution if the cheap stages cannot decide.
+	Only rules out pairs that the full measurement would reject as well, so the
+	results are identical to measuring every pair. Counts what each stage discarded.
+	Full measurements go through distanceStore (see kerndistances) if there is one.
+	"""
+
+	def __init__(self, step, ignoreIntervals=None, coarseStep=40, distanceStore=None):
+		self.step = step
+		self.factor = max(2, int(coarseStep // step))
+		self.ignoreIntervals = ignoreIntervals
+		self.distanceStore = distanceStore
+		self.pairCount = 0
+		self.discardedByBounds = 0
+		self.discardedByCoarseProfiles = 0
+
+	def _measure(self, leftProfile, rightProfile, kerning):
+		if self.distanceStore is not None:
+			return self.distanceStore.minDistance(leftProfile, rightProfile, kerning)
+		return minDistanceBetweenProfiles(leftProfile, rightProfile, kerning=kerning, ignoreIntervals=self.ignoreIntervals)
+
+	def closerThan(self, leftProfile, rightProfile, kerning, threshold):
+		"""Distance between the two profiles if it is smaller than threshold, otherwise None."""
+		self.pairCount += 1
+		if (
+			leftProfile is None or rightProfile is None or not leftProfile.overlaps(rightProfile) or leftProfile.minRight is None or rightProfile.minLeft is None
+			or leftProfile.minRight + rightProfile.minLeft + kerning >= threshold
+		):
+			self.discardedByBounds += 1
+			return None
+		lowerBound = minDistanceBetweenProfiles(leftProfile.pooled(self.factor), rightProfile.pooled(self.factor), kerning=kerning)
+		if lowerBound is None or lowerBound >= threshold:
+			self.discardedByCoarseProfiles += 1
+			return None
+		distance = self._measure(leftProfile, rightProfile, kerning)
+		if distance is not None and distance < threshold:
+			return distance
+		return None
+
+	def fartherThan(self, leftProfile, rightProfile, kerning, threshold):
+		"""Distance between the two profiles if it is larger than threshold, otherwise None."""
+		self.pairCount += 1
+		if (
+			leftProfile is None or rightProfile is None or not leftProfile.overlaps(rightProfile) or leftProfile.minRight is None or rightProfile.minLeft is None
+		):
+			self.discardedByBounds += 1
+			return None
+		upperBound = minDistanceBetweenProfiles(leftProfile.subsampled(self.factor), rightProfile.subsampled(self.factor), kerning=kerning, ignoreIntervals=self.ignoreIntervals)
+		if upperBound is not None and upperBound <= threshold:
+			self.discardedByCoarseProfiles += 1
+			return None
+		distance = self._measure(leftProfile, rightProfile, kerning)
+		if distance is not None and distance > threshold:
+			return distance
+		return None
+
+	def report(self):
+		measured = self.pairCount - self.discardedByBounds - self.discardedByCoarseProfiles
+		return "Pruning: %i pairs, %i ruled out by bounds and extreme sidebearings, %i by coarse profiles (step %s), %i measured at full resolution." % (
+			self.pairCount,
+			self.discardedByBounds,
+			self.discardedByCoarseProfiles,
+			self.factor * self.step,
+			measured,
+		)
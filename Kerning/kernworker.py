@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Batch collision scan on exported layer geometry, outside of Glyphs.
+
+KernCrasher exports the outlines and kerning of a master into a scan file
+(see kernanalysis.exportMasterForScan), then runs this module with a regular
+Python 3, which measures all left×right pairs in a process pool and streams
+the results back, one JSON object per line:
+
+	{"row": 3, "left": "A", "crashes": [["A", "V", -12.0], ...]}   (one per left glyph)
+	{"summary": {"pairs": 12345, "crashes": 67, ...}}               (at the end)
+
+Pure Python (plus NumPy if available), no app required, so the same scan can
+run in CI. Command line:
+
+	python3 kernworker.py scanfile.json [--workers 8] [--min-distance 10] [--fail-on-crash]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from kernprofiles import PairPruner, profileFromContours
+
+scanFormat = 1
+
+
+def loadScanFile(filePath):
+	opener = gzip.open if filePath.endswith(".gz") else open
+	with opener(filePath, "rt", encoding="utf-8") as scanFile:
+		scan = json.load(scanFile)
+	if scan.get("format") != scanFormat:
+		raise ValueError("Unsupported scan file format %s in %s (expected %i)." % (scan.get("format"), filePath, scanFormat))
+	return scan
+
+
+def writeScanFile(scan, filePath):
+	scan["format"] = scanFormat
+	opener = gzip.open if filePath.endswith(".gz") else open
+	with opener(filePath, "wt", encoding="utf-8") as scanFile:
+		json.dump(scan, scanFile, separators=(",", ":"))
+
+
+def contoursFromFlatLists(flatContours):
+	"""[[x0, y0, x1, y1, ...], ...] → [[(x0, y0), (x1, y1), ...], ...]"""
+	return [list(zip(flatContour[0::2], flatContour[1::2])) for flatContour in flatContours]
+
+
+class ScanJob(object):
+	"""The geometry, kerning and settings of one exported master, with profiles built on demand."""
+
+	def __init__(self, scan, minDistance=None, step=None):
+		self.scan = scan
+		self.step = step or scan["step"]
+		self.minDistance = scan["minDistance"] if minDistance is None else minDistance
+		self.ignoreIntervals = [tuple(interval) for interval in scan.get("ignoreIntervals", ())]
+		self.kerning = scan.get("kerning", {})
+		self.profiles = {}
+
+	def profile(self, glyphName):
+		if glyphName not in self.profiles:
+			glyphInfo = self.scan["glyphs"][glyphName]
+			self.profiles[glyphName] = profileFromContours(contoursFromFlatLists(glyphInfo["contours"]), glyphInfo["width"], self.step)
+		return self.profiles[glyphName]
+
+	def scanRow(self, leftName):
+		"""Returns the crashes of leftName with all right glyphs, and the pruner that measured them."""
+		pruner = PairPruner(self.step, ignoreIntervals=self.ignoreIntervals)
+		leftProfile = self.profile(leftName)
+		leftKerning = self.kerning.get(leftName, {})
+		crashes = []
+		for rightName in self.scan["right"]:
+			distance = pruner.closerThan(leftProfile, self.profile(rightName), leftKerning.get(rightName, 0.0), self.minDistance)
+			if distance is not None:
+				crashes.append((leftName, rightName, distance))
+		return crashes, pruner
+
+
+_job = None
+
+
+def _initWorker(filePath, minDistance, step):
+	global _job
+	_job = ScanJob(loadScanFile(filePath), minDistance=minDistance, step=step)
+
+
+def _scanRowInWorker(row):
+	leftName = _job.scan["left"][row]
+	crashes, pruner = _job.scanRow(leftName)
+	return row, leftName, crashes, (pruner.pairCount, pruner.discardedByBounds, pruner.discardedByCoarseProfiles)
+
+
+def scanRows(filePath, workers=None, minDistance=None, step=None):
+	"""
+	Generator: measures all pairs of the scan file in a process pool, and yields
+	(row, leftName, crashes, pruningCounts) as soon as a left glyph is finished,
+	i.e., not necessarily in the order of the left glyphs.
+	"""
+	rowCount = len(loadScanFile(filePath)["left"])
+	with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(filePath, minDistance, step)) as executor:
+		futures = [executor.submit(_scanRowInWorker, row) for row in range(rowCount)]
+		for future in as_completed(futures):
+			yield future.result()
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description="Find crashing kern pairs in a scan file exported by KernCrasher.")
+	parser.add_argument("scanFile", help="exported .json (or .json.gz) scan file")
+	parser.add_argument("--workers", dest="workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+	parser.add_argument("--min-distance", dest="minDistance", type=float, default=None, help="override the minimum distance stored in the scan file")
+	parser.add_argument("--step", dest="step", type=float, default=None, help="override the measuring interval stored in the scan file")
+	parser.add_argument("--fail-on-crash", dest="failOnCrash", action="store_true", help="exit with status 1 if there are crashes (for CI)")
+	options = parser.parse_args(arguments)
+
+	pairCount = discardedByBounds = discardedByCoarseProfiles = crashCount = 0
+	for row, leftName, crashes, pruningCounts in scanRows(options.scanFile, workers=options.workers, minDistance=options.minDistance, step=options.step):
+		pairCount += pruningCounts[0]
+		discardedByBounds += pruningCounts[1]
+		discardedByCoarseProfiles += pruningCounts[2]
+		crashCount += len(crashes)
+		print(json.dumps({"row": row, "left": leftName, "crashes": crashes}), flush=True)
+
+	print(json.dumps({
+		"summary": {
+			"pairs": pairCount,
+			"crashes": crashCount,
+			"discardedByBounds": discardedByBounds,
+			"discardedByCoarseProfiles": discardedByCoarseProfiles,
+		}
+	}), flush=True)
+	return 1 if (options.failOnCrash and crashCount) else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,33 @@
+# MenuTitle: Export Outline Geometry
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, unicode_literals
+__doc__ = """
+Writes the paths of all master and special layers of all open fonts into a geometry file next to each font file (.outlines.json), for running the Path Problem Finder checks without Glyphs, e.g. in CI: python3 outlineChecks.py --help
+"""
+
+import os
+import json
+from GlyphsApp import Glyphs
+from outlineChecks import fontGeometry
+
+Glyphs.clearLog()  # clears log in Macro window
+print("Export Outline Geometry Report:\n")
+
+for thisFont in Glyphs.fonts:
+	if not thisFont.filepath:
+		print(f"⚠️ {thisFont.familyName}: font file has not been saved yet, skipping.")
+		continue
+	geometryPath = os.path.splitext(thisFont.filepath)[0] + ".outlines.json"
+	try:
+		with open(geometryPath, "w", encoding="utf-8") as geometryFile:
+			json.dump(fontGeometry(thisFont), geometryFile)
+		print(f"✅ {thisFont.familyName}: {geometryPath}")
+	except Exception as e:
+		Glyphs.showMacroWindow()
+		print(f"\n⚠️ Script Error for {thisFont.familyName}:\n")
+		import traceback
+		print(traceback.format_exc())
+		print()
+		raise e
+
+print("\nDone.")
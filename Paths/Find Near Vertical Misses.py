@@ -6,13 +6,55 @@ Finds nodes that are close but not exactly on vertical metrics.
 """
 
 import vanilla
+from bisect import bisect_left, bisect_right
 from GlyphsApp import Glyphs, GSAnnotation, TEXT, GSOFFCURVE, GSUppercase, GSLowercase, GSSmallcaps, Message
 from mekkablue import mekkaObject
 
+# metrics in the order they are checked (the first one a node is close to decides),
+# with the glyph types they are ignored for:
+metricChecks = (
+	("descender", ()),
+	("baseline", ()),
+	("xHeight", ("Uppercase", "Smallcaps")),
+	("smallCapHeight", ()),  # only for smallcaps, see metricTable()
+	("shoulderHeight", ("Lowercase", "Uppercase", "Smallcaps")),
+	("capHeight", ("Lowercase", "Smallcaps")),
+	("ascender", ("Uppercase", "Smallcaps")),
+)
+smallcapSuffixes = ("sc", "smcp", "c2sc")
+
+
+def metricHeight(master, metricName):
+	"""Height of a vertical metric in a master, None if the master does not have it."""
+	if metricName == "baseline":
+		return 0.0
+	if metricName in ("smallCapHeight", "shoulderHeight"):
+		height = master.customParameters[metricName]
+		return float(height) if height else None
+	return getattr(master, metricName)
+
+
+def nearMetric(y, table, deviance):
+	"""
+	The metric height y is close to (up to deviance) but not exactly on, or None.
+	table: (heights, check orders), sorted by height. Binary search for the heights
+	around y, of which the metric checked first wins.
+	"""
+	heights, orders = table
+	start = bisect_left(heights, y - deviance - 1.0)
+	end = bisect_right(heights, y + deviance + 1.0)
+	nearHeight, nearOrder = None, None
+	for height, order in zip(heights[start:end], orders[start:end]):
+		if y != height and height - deviance <= y <= height + deviance:
+			if nearOrder is None or order < nearOrder:
+				nearHeight, nearOrder = height, order
+	return nearHeight
+
 
 class FindNearVerticalMisses(mekkaObject):
 	marker = "❌"
 	heightsToCheck = []
+	metricTables = {}
 
 	prefDict = {
 		"deviance": "1",
@@ -174,92 +216,71 @@ class FindNearVerticalMisses(mekkaObject):
 		# disable Reuse Tab button if Open Tab is off:
 		self.w.reuseTab.enable(self.w.openTab.get())
 
-	def isNodeSlightlyOff(self, nodePosition, master, deviance, prevY, nextY, glyphType=None, glyphSuffix=None):
-		y = nodePosition.y
+	def metricTable(self, master, glyphType=None, isSmallcap=False):
+		"""Sorted heights (and check orders) of the metrics to check for a master and glyph type, built once per run."""
+		key = (master.id, glyphType, isSmallcap)
+		if key not in self.metricTables:
+			orderForHeight = {}
+			for order, (metricName, ignoredGlyphTypes) in enumerate(metricChecks):
+				if metricName not in self.heightsToCheck or glyphType in ignoredGlyphTypes:
+					continue
+				if metricName == "smallCapHeight" and not (isSmallcap or glyphType == "Smallcaps"):
+					continue
+				height = metricHeight(master, metricName)
+				if height is not None and height not in orderForHeight:
+					orderForHeight[height] = order
+			heights = sorted(orderForHeight)
+			self.metricTables[key] = (heights, [orderForHeight[height] for height in heights])
+		return self.metricTables[key]
+
+	def isNodeSlightlyOff(self, y, table, deviance, prevY, nextY):
+		height = nearMetric(y, table, deviance)
+		if height is None:
+			return False
 		prevAndNextDontCount = prevY is None or nextY is None
+		# prev or next node exactly on metric line does not count as off:
+		return prevAndNextDontCount or (prevY != height and nextY != height)
+
+	def pathNearMisses(self, positions, isOncurve, closed, table, deviance, tolerateIfExtremum=True, tolerateIfNextNodeIsOn=True, includeHandles=False):
+		"""
+		Checks the nodes of a path, given as (x, y) positions and on-curve flags.
+		Returns (node index, is off) for every node that counts, skipping tolerated extrema.
+		"""
+		nodeCount = len(positions)
+		results = []
+		for i, (x, y) in enumerate(positions):
+			if not (isOncurve[i] or includeHandles):
+				results.append((i, False))
+				continue
+			hasPrev = closed or i > 0
+			hasNext = closed or i < nodeCount - 1
+			prevIndex, nextIndex = (i - 1) % nodeCount, (i + 1) % nodeCount
+
+			if tolerateIfExtremum and hasPrev and hasNext and not isOncurve[prevIndex] and not isOncurve[nextIndex]:
+				(prevX, prevY), (nextX, nextY) = positions[prevIndex], positions[nextIndex]
+				vertical = x == prevX == nextX
+				linedUp = (y - prevY) * (nextY - y) > 0.0
+				if vertical and linedUp:
+					continue
 
-		if self.pref("whereToCheck.descender"):
-			if y != master.descender:
-				if master.descender - deviance <= y <= master.descender + deviance:
-					if prevAndNextDontCount or (prevY != master.descender and nextY != master.descender):
-						return True
-					else:
-						# prev or next node or exactly on metric line, so do not count as off:
-						return False
-
-		if self.pref("whereToCheck.baseline"):
-			if y != 0.0:
-				if 0.0 - deviance <= y <= 0.0 + deviance:
-					if prevAndNextDontCount or (prevY != 0.0 and nextY != 0.0):
-						return True
-					else:
-						# prev or next node or exactly on metric line, so do not count as off:
-						return False
-
-		if self.pref("whereToCheck.xHeight"):
-			if glyphType is None or glyphType not in ("Uppercase", "Smallcaps"):
-				if y != master.xHeight:
-					if master.xHeight - deviance <= y <= master.xHeight + deviance:
-						if prevAndNextDontCount or (prevY != master.xHeight and nextY != master.xHeight):
-							return True
-						else:
-							# prev or next node or exactly on metric line, so do not count as off:
-							return False
-
-		if self.pref("whereToCheck.smallCapHeight"):
-			suffixIsSC = False
-			if glyphSuffix:
-				suffixes = glyphSuffix.split(".")  # could be multiple suffixes
-				for suffix in ("sc", "smcp", "c2sc"):
-					if suffix in suffixes:
-						suffixIsSC = True
-
-			if suffixIsSC or glyphType == "Smallcaps":  # is smallcap
-				smallCapHeight = master.customParameters["smallCapHeight"]
-				if smallCapHeight:
-					smallCapHeight = float(smallCapHeight)
-					if y != smallCapHeight:
-						if smallCapHeight - deviance <= y <= smallCapHeight + deviance:
-							if prevAndNextDontCount or (prevY != smallCapHeight and nextY != smallCapHeight):
-								return True
-							else:
-								# prev or next node or exactly on metric line, so do not count as off:
-								return False
-
-		if self.pref("whereToCheck.shoulderHeight"):
-			if glyphType is None or glyphType not in ("Lowercase", "Uppercase", "Smallcaps"):
-				shoulderHeight = master.customParameters["shoulderHeight"]
-				if shoulderHeight:
-					shoulderHeight = float(shoulderHeight)
-					if y != shoulderHeight:
-						if shoulderHeight - deviance <= y <= shoulderHeight + deviance:
-							if prevAndNextDontCount or (prevY != shoulderHeight and nextY != shoulderHeight):
-								return True
-							else:
-								# prev or next node or exactly on metric line, so do not count as off:
-								return False
-
-		if self.pref("whereToCheck.capHeight"):
-			if glyphType is None or glyphType not in ("Lowercase", "Smallcaps"):
-				if y != master.capHeight:
-					if master.capHeight - deviance <= y <= master.capHeight + deviance:
-						if prevAndNextDontCount or (prevY != master.capHeight and nextY != master.capHeight):
-							return True
-						else:
-							# prev or next node or exactly on metric line, so do not count as off:
-							return False
-
-		if self.pref("whereToCheck.ascender"):
-			if glyphType is None or glyphType not in ("Uppercase", "Smallcaps"):
-				if y != master.ascender:
-					if master.ascender - deviance <= y <= master.ascender + deviance:
-						if prevAndNextDontCount or (prevY != master.ascender and nextY != master.ascender):
-							return True
-						else:
-							# prev or next node or exactly on metric line, so do not count as off:
-							return False
-
-		return False
+			previousY, nextY = None, None
+			if tolerateIfNextNodeIsOn:
+				# determine previous and next oncurve point:
+				for step in range(1, nodeCount + 1):
+					if not closed and i - step < 0:
+						break
+					if isOncurve[(i - step) % nodeCount]:
+						previousY = positions[(i - step) % nodeCount][1]
+						break
+				for step in range(1, nodeCount + 1):
+					if not closed and i + step >= nodeCount:
+						break
+					if isOncurve[(i + step) % nodeCount]:
+						nextY = positions[(i + step) % nodeCount][1]
+						break
+
+			results.append((i, self.isNodeSlightlyOff(y, table, deviance, previousY, nextY)))
+		return results
 
 	def doubleCheckNodeName(self, thisNode):
 		if thisNode.name == self.marker:
@@ -296,6 +317,15 @@ class FindNearVerticalMisses(mekkaObject):
 
 			includeComposites = self.pref("includeComposites")
 			includeNonExporting = self.pref("includeNonExporting")
+			tolerateIfExtremum = self.prefBool("tolerateIfExtremum")
+			tolerateIfNextNodeIsOn = self.prefBool("tolerateIfNextNodeIsOn")
+			includeHandles = self.prefBool("includeHandles")
+			removeOverlap = self.prefBool("removeOverlap")
+			markNodes = self.prefBool("markNodes")
+
+			# metric tables are built per master and glyph type, from the current settings:
+			self.heightsToCheck = [metricName for metricName, ignoredGlyphTypes in metricChecks if self.prefBool(f"whereToCheck.{metricName}")]
+			self.metricTables = {}
 
 			deviance = self.prefFloat("deviance")
 			excludeString = self.pref("exclude").strip()
@@ -322,10 +352,19 @@ class FindNearVerticalMisses(mekkaObject):
 					continue
 
 				self.w.status.set(f"🔠 {thisGlyph.name}")
-				suffix = None
-				if "." in thisGlyph.name:
-					offset = thisGlyph.name.find(".")
-					suffix = thisGlyph.name[offset:]
+				suffixes = thisGlyph.name.split(".")[1:]  # could be multiple suffixes
+				isSmallcap = any(suffix in suffixes for suffix in smallcapSuffixes)
+				glyphType = None
+				if Glyphs.versionNumber >= 3:
+					# GLYPHS 3
+					if thisGlyph.case == GSUppercase:
+						glyphType = "Uppercase"
+					elif thisGlyph.case == GSLowercase:
+						glyphType = "Lowercase"
+					elif thisGlyph.case == GSSmallcaps:
+						glyphType = "Smallcaps"
+				else:
+					glyphType = thisGlyph.subCategory
 
 				for thisLayer in thisGlyph.layers:
 					# get rid of debris from previous iterations:
@@ -334,90 +373,60 @@ class FindNearVerticalMisses(mekkaObject):
 					layerShouldBeChecked = len(thisLayer.paths) > 0 or includeComposites
 
 					if layerCounts and layerShouldBeChecked:
+						table = self.metricTable(thisLayer.master, glyphType, isSmallcap)
 
 						# overlap removal if requested:
-						if self.pref("removeOverlap"):
+						if removeOverlap:
 							checkLayer = thisLayer.copyDecomposedLayer()
 							checkLayer.removeOverlap()
 						else:
 							checkLayer = thisLayer
 
-						# step through nodes:
+						# step through nodes, read each node once:
 						for thisPath in checkLayer.paths:
-							for thisNode in thisPath.nodes:
-								nodeIsOncurve = thisNode.type != GSOFFCURVE
-								if nodeIsOncurve or self.pref("includeHandles"):
-
-									if self.pref("tolerateIfExtremum"):
-										if thisNode.prevNode:
-											if thisNode.prevNode.type == GSOFFCURVE and thisNode.nextNode.type == GSOFFCURVE:
-												vertical = thisNode.x == thisNode.prevNode.x == thisNode.nextNode.x
-												linedUp = (thisNode.y - thisNode.prevNode.y) * (thisNode.nextNode.y - thisNode.y) > 0.0
-												if vertical and linedUp:
-													continue
-										else:
-											print(f"⚠️ Potential open path in {thisGlyph.name}")
-
-									if self.pref("tolerateIfNextNodeIsOn"):
-										# determine previous oncurve point
-										previousOnCurve = thisNode.prevNode
-										if previousOnCurve:
-											while previousOnCurve.type == GSOFFCURVE:
-												previousOnCurve = previousOnCurve.prevNode
-											previousY = previousOnCurve.y
-											# determine next oncurve point
-											nextOnCurve = thisNode.nextNode
-											while nextOnCurve.type == GSOFFCURVE:
-												nextOnCurve = nextOnCurve.nextNode
-											nextY = nextOnCurve.y
-										else:
-											print(f"⚠️ Potential open path in {thisGlyph.name}")
-									else:
-										previousY = None
-										nextY = None
-
-									glyphType = None
-									if Glyphs.versionNumber >= 3:
-										# GLYPHS 3
-										if thisGlyph.case == GSUppercase:
-											glyphType = "Uppercase"
-										elif thisGlyph.case == GSLowercase:
-											glyphType = "Lowercase"
-										elif thisGlyph.case == GSSmallcaps:
-											glyphType = "Smallcaps"
-									else:
-										glyphType = thisGlyph.subCategory
-									if self.isNodeSlightlyOff(thisNode.position, thisLayer.master, deviance, previousY, nextY, glyphType, suffix):
-										# collect layer:
-										if thisLayer not in affectedLayers:
-											affectedLayers.append(thisLayer)
-										thisNode.selected = True
-
-										# report:
-										print("%s /%s ‘%s’: %.1f %.1f" % (
-											self.marker,
-											thisGlyph.name,
-											thisLayer.name,
-											thisNode.x,
-											thisNode.y,
-										))
-
-										# node name:
-										if self.pref("markNodes"):
-											if self.pref("removeOverlap"):
-												self.addAnnotation(thisLayer, thisNode.position, self.marker)
-											else:
-												thisNode.name = self.marker
+							nodes = list(thisPath.nodes)
+							positions, isOncurve = [], []
+							for thisNode in nodes:
+								position = thisNode.position
+								positions.append((position.x, position.y))
+								isOncurve.append(thisNode.type != GSOFFCURVE)
+							closed = thisPath.closed
+							if not closed and (tolerateIfExtremum or tolerateIfNextNodeIsOn):
+								print(f"⚠️ Potential open path in {thisGlyph.name}")
+
+							nearMisses = self.pathNearMisses(positions, isOncurve, closed, table, deviance, tolerateIfExtremum, tolerateIfNextNodeIsOn, includeHandles)
+							for nodeIndex, isOff in nearMisses:
+								thisNode = nodes[nodeIndex]
+								if isOff:
+									# collect layer:
+									if thisLayer not in affectedLayers:
+										affectedLayers.append(thisLayer)
+									thisNode.selected = True
+
+									# report:
+									x, y = positions[nodeIndex]
+									print("%s /%s ‘%s’: %.1f %.1f" % (
+										self.marker,
+										thisGlyph.name,
+										thisLayer.name,
+										x,
+										y,
+									))
+
+									# node name:
+									if markNodes:
+										if removeOverlap:
+											self.addAnnotation(thisLayer, thisNode.position, self.marker)
 										else:
-											self.doubleCheckNodeName(thisNode)
+											thisNode.name = self.marker
 									else:
 										self.doubleCheckNodeName(thisNode)
 								else:
 									self.doubleCheckNodeName(thisNode)
 
 			# make sure View options are on:
-			if self.pref("markNodes"):
-				if self.pref("removeOverlap"):
+			if markNodes:
+				if removeOverlap:
 					Glyphs.defaults["showAnnotations"] = 1
 				else:
 					Glyphs.defaults["showNodeNames"] = 1
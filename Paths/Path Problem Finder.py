@@ -6,163 +6,10 @@ Finds all kinds of potential problems in outlines, and opens a new tab with affe
 """
 
 import vanilla
-import math
 from timeit import default_timer as timer
-from AppKit import NSPoint
-from GlyphsApp import Glyphs, GSPath, GSControlLayer, GSShapeTypePath, GSLINE, GSCURVE, CURVE, GSOFFCURVE, QCURVE, Message, distance
+from GlyphsApp import Glyphs, GSControlLayer, Message
 from mekkablue import mekkaObject, reportTimeInNaturalLanguage
-
-
-canHaveOpenOutlines = (
-	"_cap",
-	"_corner",
-	"_line",
-	"_segment",
-)
-
-
-def hasStrayPoints(thisLayer):
-	for p in thisLayer.paths:
-		if len(p.nodes) == 1:
-			return True
-	return False
-
-
-def hasDecimalCoordinates(thisLayer):
-	for p in thisLayer.paths:
-		for n in p.nodes:
-			for coord in (n.x, n.y):
-				if coord % 1.0 != 0.0:
-					return True
-	return False
-
-
-def hasQuadraticCurves(thisLayer):
-	for p in thisLayer.paths:
-		for n in p.nodes:
-			if n.type is QCURVE:
-				return True
-	return False
-
-
-def hasOffcurveAsStartPoint(Layer):
-	for p in Layer.paths:
-		scenario1 = p.nodes[0].type == GSOFFCURVE and p.nodes[1].type != GSOFFCURVE
-		scenario2 = p.nodes[0].type == CURVE and p.nodes[-1].type == GSOFFCURVE
-		if scenario1 or scenario2:
-			return True
-	return False
-
-
-def hasShallowCurveSegment(thisLayer, minSize):
-	for thisPath in thisLayer.paths:
-		for thisNode in thisPath.nodes:
-			if thisNode.type == CURVE:
-				thisSegment = (
-					thisNode.prevNode.prevNode.prevNode,
-					thisNode.prevNode.prevNode,
-					thisNode.prevNode,
-					thisNode,
-				)
-				xCoords = [p.x for p in thisSegment]
-				yCoords = [p.y for p in thisSegment]
-				xDist = abs(min(xCoords) - max(xCoords))
-				yDist = abs(min(yCoords) - max(yCoords))
-				if xDist < minSize or yDist < minSize:
-					for affectedNode in thisSegment:
-						thisLayer.selection.append(affectedNode)
-					return True
-	return False
-
-
-def hasZeroHandles(thisLayer):
-	for thisPath in thisLayer.paths:
-		numberOfNodes = len(thisPath.nodes)
-		for i in range(numberOfNodes - 1):
-			thisNode = thisPath.nodes[i]
-			if thisNode.type == GSOFFCURVE:
-				prevNodeIndex = (i - 1) % numberOfNodes
-				nextNodeIndex = (i + 1) % numberOfNodes
-				prevNode = thisPath.nodes[prevNodeIndex]
-				nextNode = thisPath.nodes[nextNodeIndex]
-				if thisNode.position == prevNode.position or thisNode.position == nextNode.position:
-					return True
-	return False
-
-
-def hasTwoPointOutlines(thisLayer):
-	for thisPath in thisLayer.paths:
-		onCurveNodes = [n for n in thisPath.nodes if n.type != GSOFFCURVE]
-		if len(onCurveNodes) < 3:
-			return True
-	return False
-
-
-def hasOpenPaths(thisLayer):
-	for thisPath in thisLayer.paths:
-		if not thisPath.closed:
-			return True
-	return False
-
-
-def hasBadOutlineOrder(thisLayer):
-	firstPath = None
-	if Glyphs.versionNumber >= 3:
-		# GLYPHS 3
-		if thisLayer.shapes:
-			for thisShape in thisLayer.shapes:
-				if isinstance(thisShape, GSPath):
-					firstPath = thisShape
-					break
-	else:
-		# GLYPHS 2
-		if thisLayer.paths:
-			firstPath = thisLayer.paths[0]
-
-	if firstPath and firstPath.direction != -1 and len(thisLayer.paths) > 1:
-		return True
-	else:
-		return False
-
-
-def hasAlmostOrthogonalLines(thisLayer, threshold=3.0, minLength=50, minLengthCheck=False):
-	for thisPath in thisLayer.paths:
-		for i, thisNode in enumerate(thisPath.nodes):
-			if thisNode.type == GSLINE:
-				prevNodeIndex = (i - 1) % len(thisPath.nodes)
-				prevNode = thisPath.nodes[prevNodeIndex]
-				if minLengthCheck:
-					length = distance(thisNode.position, prevNode.position)
-					if length < minLength:
-						continue
-				xDiff = abs(thisNode.x - prevNode.x)
-				yDiff = abs(thisNode.y - prevNode.y)
-				if (0.1 < xDiff and xDiff < threshold) or (0.1 < yDiff and threshold > yDiff):
-					return True
-	return False
-
-
-def hasShortSegment(thisLayer, threshold=8.0):
-	for thisPath in thisLayer.paths:
-		for thisSegment in thisPath.segments:
-			if thisSegment.length() < threshold:
-				return True
-	return False
-
-
-def hasShallowCurve(thisLayer, threshold=5.0):
-	for thisPath in thisLayer.paths:
-		for i, thisNode in enumerate(thisPath.nodes):
-			if thisNode.type == GSCURVE:
-				pointA = thisNode.position
-				pointB = thisPath.nodes[(i - 1) % len(thisPath.nodes)].position
-				pointC = thisPath.nodes[(i - 2) % len(thisPath.nodes)].position
-				pointD = thisPath.nodes[(i - 3) % len(thisPath.nodes)].position
-				for handle in (pointC, pointD):
-					dist, vect = distanceAndRelativePosition(pointA, pointB, handle)
-					if 0.0 < vect < 1.0 and dist < threshold:
-						return True
-	return False
+from outlineChecks import CheckPool, ResultCache, WorkUnit, batchLayerCount, canHaveOpenOutlines, checkParameters, checkReports, describeLocations, layerPaths, outlineFingerprint
 
 
 def hasBadPathDirections(thisLayer):
@@ -176,185 +23,6 @@ def hasBadPathDirections(thisLayer):
 	return False
 
 
-def hasShallowCurveBBox(thisLayer, threshold=10.0):
-	for thisPath in thisLayer.paths:
-		for i, thisNode in enumerate(thisPath.nodes):
-			if thisNode.type == GSCURVE:
-				pointA = thisNode.position
-				pointD = thisPath.nodes[(i - 3) % len(thisPath.nodes)].position
-				if abs(pointA.x - pointD.x) < threshold or abs(pointA.y - pointD.y) < threshold:
-					minX, maxX = sorted((pointA.x, pointD.x))
-					minY, maxY = sorted((pointA.y, pointD.y))
-					pointB = thisPath.nodes[(i - 1) % len(thisPath.nodes)].position
-					pointC = thisPath.nodes[(i - 2) % len(thisPath.nodes)].position
-					horizontallyWithin = minX - 1 < min(pointB.x, pointC.x) and maxX + 1 > max(pointB.x, pointC.x)
-					verticallyWithin = minY - 1 < min(pointB.y, pointC.y) and maxY + 1 > max(pointB.y, pointC.y)
-					if horizontallyWithin and verticallyWithin:
-						return True
-	return False
-
-
-def angleBetweenPoints(firstPoint, secondPoint):
-	"""
-	Returns the angle (in degrees) of the straight line between firstPoint and secondPoint,
-	0 degrees being the second point to the right of first point.
-	firstPoint, secondPoint: must be NSPoint or GSNode
-	"""
-	xDiff = secondPoint.x - firstPoint.x
-	yDiff = secondPoint.y - firstPoint.y
-	return math.degrees(math.atan2(yDiff, xDiff))
-
-
-def hasAngledHandles(thisLayer, threshold=8):
-	for thisPath in thisLayer.paths:
-		for i, handle in enumerate(thisPath.nodes):
-			if handle.type == GSOFFCURVE:
-				onCurveNodeIndex = (i - 1) % len(thisPath.nodes)
-				onCurveNode = thisPath.nodes[onCurveNodeIndex]
-				if onCurveNode.type == GSOFFCURVE:
-					onCurveNodeIndex = (i + 1) % len(thisPath.nodes)
-					onCurveNode = thisPath.nodes[onCurveNodeIndex]
-				handleIsOrthogonal = handle.x == onCurveNode.x or handle.y == onCurveNode.y
-				if not handleIsOrthogonal:
-					angle = math.fabs(math.fmod(angleBetweenPoints(handle.position, onCurveNode.position), 90.0))
-					if angle < threshold or angle > (90 - threshold):
-						return True
-	return False
-
-
-def hasShortHandles(thisLayer, threshold=10.0):
-	for thisPath in thisLayer.paths:
-		for i, handle in enumerate(thisPath.nodes):
-			if handle.type == GSOFFCURVE:
-				onCurveNodeIndex = (i - 1) % len(thisPath.nodes)
-				onCurveNode = thisPath.nodes[onCurveNodeIndex]
-				if onCurveNode.type == GSOFFCURVE:
-					onCurveNodeIndex = (i + 1) % len(thisPath.nodes)
-					onCurveNode = thisPath.nodes[onCurveNodeIndex]
-				if 0.0 < distance(handle.position, onCurveNode.position) < threshold:
-					return True
-	return False
-
-
-def hasEmptyPaths(thisLayer):
-	for thisShape in thisLayer.shapes:
-		if thisShape.shapeType == GSShapeTypePath and len(thisShape.nodes) == 0:
-			return True
-	return False
-
-
-def intersect(pointA, pointB, pointC, pointD):
-	"""
-	Returns an NSPoint of the intersection AB with CD,
-	or None if there is no intersection.
-	pointA, pointB: NSPoints or GSNodes representing the first line AB,
-	pointC, pointD: NSPoints or GSNodes representing the second line CD.
-	"""
-	xA, yA = pointA.x, pointA.y
-	xB, yB = pointB.x, pointB.y
-	xC, yC = pointC.x, pointC.y
-	xD, yD = pointD.x, pointD.y
-
-	try:
-		slopeAB = (float(yB) - float(yA)) / (float(xB) - float(xA))
-	except:
-		slopeAB = None  # division by zero if vertical
-
-	try:
-		slopeCD = (float(yD) - float(yC)) / (float(xD) - float(xC))
-	except:
-		slopeCD = None  # division by zero if vertical
-
-	if slopeAB == slopeCD:  # parallel, no intersection
-		return None
-	elif slopeAB is None:  # first line is vertical
-		x = xA
-		y = slopeCD * (x - xC) + yC
-	elif slopeCD is None:  # second line is vertical
-		x = xC
-		y = slopeAB * (x - xA) + yA
-	else:  # both lines have different angles other than vertical
-		x = (slopeAB * xA - yA - slopeCD * xC + yC) / (slopeAB - slopeCD)
-		y = slopeAB * (x - xA) + yA
-	return NSPoint(x, y)
-
-
-def hasLargeHandles(thisLayer):
-	for thisPath in thisLayer.paths:
-		for i, thisNode in enumerate(thisPath.nodes):
-			if thisNode.type == GSCURVE:
-				pointA = thisNode.position
-				pointB = thisPath.nodes[(i - 1) % len(thisPath.nodes)].position
-				pointC = thisPath.nodes[(i - 2) % len(thisPath.nodes)].position
-				pointD = thisPath.nodes[(i - 3) % len(thisPath.nodes)].position
-				intersection = intersect(pointA, pointB, pointC, pointD)
-				if intersection:
-					firstHandleTooLong = distance(pointA, pointB) > distance(pointA, intersection)
-					secondHandleTooLong = distance(pointD, pointC) > distance(pointD, intersection)
-					if firstHandleTooLong or secondHandleTooLong:
-						return True
-	return False
-
-
-def hasOutwardHandles(thisLayer):
-	for thisPath in thisLayer.paths:
-		for i, thisNode in enumerate(thisPath.nodes):
-			if thisNode.type == GSCURVE:
-				pointA = thisNode.position
-				pointB = thisPath.nodes[(i - 1) % len(thisPath.nodes)].position
-				pointC = thisPath.nodes[(i - 2) % len(thisPath.nodes)].position
-				pointD = thisPath.nodes[(i - 3) % len(thisPath.nodes)].position
-				if isOutside(pointA, pointD, pointB) or isOutside(pointA, pointD, pointC):
-					return True
-	return False
-
-
-def hasCuspingHandles(thisLayer):
-	for thisPath in thisLayer.paths:
-		for n in thisPath.nodes:
-			if n.type == GSOFFCURVE and n.nextNode.type == GSOFFCURVE:
-				distAC = distance(n.prevNode.position, n.nextNode.position)
-				distAB = distance(n.prevNode.position, n.position)
-				distBD = distance(n.position, n.nextNode.nextNode.position)
-				distCD = distance(n.nextNode.position, n.nextNode.nextNode.position)
-				if distAC < distAB and distBD < distCD:
-					thisLayer.selection = (n, n.nextNode)
-					return True
-
-
-def isOutside(p1, p2, p3):
-	"""
-	Returns True if p3 is outside p1-p2.
-	"""
-	deviation, nx = distanceAndRelativePosition(p1, p2, p3)
-	if nx < 0.0 or nx > 1.0:
-		return True
-	return False
-
-
-def distanceAndRelativePosition(p1, p2, p3):
-	"""
-	Returns:
-	1. distance from p3 to nearest point of p1-p2
-	2. relative position (0...1) of p3 between p1 & p2
-	"""
-	x1, y1 = p1.x, p1.y
-	x2, y2 = p2.x, p2.y
-	x3, y3 = p3.x, p3.y
-
-	dx = x2 - x1
-	dy = y2 - y1
-	d2 = dx * dx + dy * dy
-	try:
-		nx = ((x3 - x1) * dx + (y3 - y1) * dy) / d2
-	except:
-		# division by zero
-		nx = 0.0
-
-	deviation = distance(p3, NSPoint(dx * nx + x1, dy * nx + y1))
-	return deviation, nx
-
-
 class PathProblemFinder(mekkaObject):
 	title = "Path Problem Finder"
 	prefDict = {
@@ -389,6 +57,8 @@ class PathProblemFinder(mekkaObject):
 		"includeAllGlyphs": 1,
 		"includeAllFonts": 0,
 		"includeNonExporting": 0,
+		"parallel": 1,
+		"reuseResults": 1,
 		"reuseTab": 1,
 		"verbose": 0,
 		"exclude": "notdef, apple, .ornm, .00",
@@ -397,7 +67,7 @@ class PathProblemFinder(mekkaObject):
 	def __init__(self):
 		# Window 'self.w':
 		windowWidth = 285
-		windowHeight = 526
+		windowHeight = 548
 		windowWidthResize = 400  # user can resize width by this value
 		windowHeightResize = 0  # user can resize height by this value
 		self.w = vanilla.FloatingWindow(
@@ -530,8 +200,10 @@ class PathProblemFinder(mekkaObject):
 		self.w.includeAllFonts.getNSButton().setToolTip_("If enabled, will go through ALL open fonts. Attention: can take quite some time.")
 		linePos += lineHeight
 
-		self.w.includeNonExporting = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Include non-exporting glyphs", value=True, callback=self.SavePreferences, sizeStyle='small')
+		self.w.includeNonExporting = vanilla.CheckBox((inset + 2, linePos, secondColumn, 20), "Incl. non-exporting", value=True, callback=self.SavePreferences, sizeStyle='small')
 		self.w.includeNonExporting.getNSButton().setToolTip_("If disabled, will ignore glyphs that are set to not export.")
+		self.w.parallel = vanilla.CheckBox((secondColumn, linePos, -inset, 20), "Use all CPU cores", value=True, callback=self.SavePreferences, sizeStyle='small')
+		self.w.parallel.getNSButton().setToolTip_("If enabled, the outline checks run in separate Python processes, one per processor core, while the script keeps reading glyphs. Speeds up checking many glyphs and fonts. Falls back to checking in Glyphs if no separate Python can be started.")
 		linePos += lineHeight
 
 		self.w.excludeText = vanilla.TextBox((inset, linePos + 2, 90, 14), "Exclude glyphs", sizeStyle="small", selectable=True)
@@ -539,6 +211,10 @@ class PathProblemFinder(mekkaObject):
 		self.w.exclude.getNSTextField().setToolTip_("Glyphs containing any of these (comma-separated) name particles will be skipped.")
 		linePos += lineHeight
 
+		self.w.reuseResults = vanilla.CheckBox((inset + 2, linePos, -inset, 20), "Reuse results of unchanged layers", value=True, callback=self.SavePreferences, sizeStyle='small')
+		self.w.reuseResults.getNSButton().setToolTip_("If enabled, keeps the results of every layer in a .pathproblems.json file next to the font file, and in the next run only checks layers whose outlines changed since. Changing the checks or their values checks all layers again. Only for saved fonts.")
+		linePos += lineHeight
+
 		self.w.reuseTab = vanilla.CheckBox((inset + 2, linePos, secondColumn, 20), "Reuse existing tab", value=True, callback=self.SavePreferences, sizeStyle='small')
 		self.w.reuseTab.getNSButton().setToolTip_("If enabled, will only open a new tab if none is open. Recommended.")
 		self.w.verbose = vanilla.CheckBox((secondColumn, linePos, -inset, 20), "Verbose (slow)", value=False, callback=self.SavePreferences, sizeStyle="small")
@@ -564,7 +240,7 @@ class PathProblemFinder(mekkaObject):
 
 	def updateUI(self, sender=None):
 		if sender in (self.w.checkALL, self.w.checkNONE, self.w.checkDEFAULT):
-			excludedCheckSettings = ("includeAllGlyphs", "includeNonExporting", "reuseTab")
+			excludedCheckSettings = ("includeAllGlyphs", "includeNonExporting", "reuseTab", "parallel", "reuseResults")
 			checkSettings = [
 				k for k in self.prefDict.keys() if k not in excludedCheckSettings and (not k.endswith("Threshold") and not k.endswith("Angle") or sender == self.w.checkDEFAULT)
 			]
@@ -599,6 +275,34 @@ class PathProblemFinder(mekkaObject):
 		)
 		self.w.runButton.enable(anyOptionIsOn)
 
+	def enabledChecks(self):
+		# {check name: parameter} of the enabled checks, for OutlineBatch.run():
+		minLength = self.prefFloat("almostOrthogonalLinesMinLength") if self.prefBool("almostOrthogonalLinesMinLengthCheck") else None
+		parameters = {
+			"shortHandles": self.prefFloat("shortHandlesThreshold"),
+			"angledHandles": self.prefFloat("angledHandlesAngle"),
+			"shallowCurveBBox": self.prefFloat("shallowCurveBBoxThreshold"),
+			"shallowCurve": self.prefFloat("shallowCurveThreshold"),
+			"almostOrthogonalLines": (self.prefFloat("almostOrthogonalLinesThreshold"), minLength),
+			"shortSegment": self.prefFloat("shortSegmentThreshold"),
+		}
+		return dict((checkName, parameters.get(checkName)) for checkName in checkParameters if self.prefBool(checkName))
+
+	def reportBatch(self, results, batchLayers, testLayersForCheck, verbose=False):
+		for checkName, reportTitle, verboseTitle in checkReports:
+			for layerIndex, locations in sorted(results.get(checkName, {}).items()):
+				thisLayer = batchLayers[layerIndex]
+				thisGlyph = thisLayer.parent
+				if checkName == "openPaths" and any(nameStart in thisGlyph.name for nameStart in canHaveOpenOutlines):
+					continue
+				testLayersForCheck[checkName].append(thisLayer)
+				if checkName == "cuspingHandles":
+					# select the cusping handles:
+					thisLayer.selection = [thisLayer.paths[pathIndex].nodes[nodeIndex] for pathIndex, nodeIndex in locations]
+				if verbose:
+					locationReport = f": {describeLocations(locations)}" if locations else ""
+					print(f"  ❌ {verboseTitle} in {thisGlyph.name}, layer {thisLayer.name}{locationReport}")
+
 	def PathProblemFinderMain(self, sender):
 		# clear macro window log:
 		Glyphs.clearLog()
@@ -610,36 +314,13 @@ class PathProblemFinder(mekkaObject):
 		self.SavePreferences()
 
 		# Query user settings:
-		zeroHandles = self.pref("zeroHandles")
-		outwardHandles = self.pref("outwardHandles")
-		cuspingHandles = self.pref("cuspingHandles")
-		largeHandles = self.pref("largeHandles")
-		offcurveAsStartPoint = self.pref("offcurveAsStartPoint")
-		shortHandles = self.pref("shortHandles")
-		shortHandlesThreshold = self.pref("shortHandlesThreshold")
-		angledHandles = self.pref("angledHandles")
-		angledHandlesAngle = float(self.pref("angledHandlesAngle"))
-		shallowCurveBBox = self.pref("shallowCurveBBox")
-		shallowCurveBBoxThreshold = self.pref("shallowCurveBBoxThreshold")
-		shallowCurve = self.pref("shallowCurve")
-		shallowCurveThreshold = self.pref("shallowCurveThreshold")
-		almostOrthogonalLines = self.pref("almostOrthogonalLines")
-		almostOrthogonalLinesThreshold = self.pref("almostOrthogonalLinesThreshold")
-		almostOrthogonalLinesMinLengthCheck = self.pref("almostOrthogonalLinesMinLengthCheck")
-		almostOrthogonalLinesMinLength = self.pref("almostOrthogonalLinesMinLength")
-		shortSegment = self.pref("shortSegment")
-		shortSegmentThreshold = self.pref("shortSegmentThreshold")
-		badOutlineOrder = self.pref("badOutlineOrder")
+		checks = self.enabledChecks()
 		badPathDirections = self.pref("badPathDirections")
-		strayPoints = self.pref("strayPoints")
-		twoPointOutlines = self.pref("twoPointOutlines")
-		openPaths = self.pref("openPaths")
-		emptyPaths = self.pref("emptyPaths")
-		quadraticCurves = self.pref("quadraticCurves")
-		decimalCoordinates = self.pref("decimalCoordinates")
 		includeAllGlyphs = self.pref("includeAllGlyphs")
 		includeAllFonts = self.pref("includeAllFonts")
 		includeNonExporting = self.pref("includeNonExporting")
+		parallel = self.prefBool("parallel")
+		reuseResults = self.prefBool("reuseResults")
 		reuseTab = self.pref("reuseTab")
 		verbose = self.pref("verbose")
 		exclude = str(self.pref("exclude")).strip()
@@ -672,16 +353,18 @@ class PathProblemFinder(mekkaObject):
 		if not includeAllFonts:
 			theseFonts = (Glyphs.font, )
 
+		# read all fonts first, while worker processes check the batches already read:
+		pool = CheckPool(checks, workerCount=None if parallel else 1)
+		fontJobs = []  # (font, glyph count, result cache, [(work unit, its layers, their fingerprints), ...])
 		for fontIndex, thisFont in enumerate(theseFonts):
 			try:
 				thisFont.disableUpdateInterface()  # suppresses UI updates in Font View
 
-				print(f"\n🪐 {self.title} Report for {thisFont.familyName}")
-				if thisFont.filepath:
-					print(thisFont.filepath)
-				else:
-					print("⚠️ The font file has not been saved yet.")
-				print()
+				# results of unchanged layers from the last run with the same settings:
+				resultCache = None
+				if reuseResults and thisFont.filepath:
+					cacheSettings = dict(checks, badPathDirections=None) if badPathDirections else checks
+					resultCache = ResultCache.forFontFile(thisFont.filepath, cacheSettings)
 
 				# determine the glyphs to work through:
 				if includeAllGlyphs or includeAllFonts:
@@ -690,73 +373,12 @@ class PathProblemFinder(mekkaObject):
 					glyphs = [layer.parent for layer in thisFont.selectedLayers]
 
 				glyphCount = len(glyphs)
-				print(f"Processing {glyphCount} glyphs:")
-
-				allTestLayers = []
-				allTestReports = []
-
-				layersWithZeroHandles = []
-				allTestLayers.append(layersWithZeroHandles)
-				allTestReports.append("Zero Handles")
-				layersWithOutwardHandles = []
-				allTestLayers.append(layersWithOutwardHandles)
-				allTestReports.append("Outward Handles")
-				layersWithCuspingHandles = []
-				allTestLayers.append(layersWithCuspingHandles)
-				allTestReports.append("Cusping Handles")
-				layersWithLargeHandles = []
-				allTestLayers.append(layersWithLargeHandles)
-				allTestReports.append("Large Handles")
-				layersWithShortHandles = []
-				allTestLayers.append(layersWithShortHandles)
-				allTestReports.append("Short Handles")
-				layersWithAngledHandles = []
-				allTestLayers.append(layersWithAngledHandles)
-				allTestReports.append("Angled Handles")
-				layersWithShallowCurve = []
-				allTestLayers.append(layersWithShallowCurve)
-				allTestReports.append("Shallow Curve")
-				layersWithShallowCurveBBox = []
-				allTestLayers.append(layersWithShallowCurveBBox)
-				allTestReports.append("Small Curve BBox")
-				layersWithAlmostOrthogonalLines = []
-				allTestLayers.append(layersWithAlmostOrthogonalLines)
-				allTestReports.append("Almost Orthogonal Lines")
-				layersWithshortSegments = []
-				allTestLayers.append(layersWithshortSegments)
-				allTestReports.append("Short Line Segments")
-				layersWithBadOutlineOrder = []
-				allTestLayers.append(layersWithBadOutlineOrder)
-				allTestReports.append("Bad Outline Order")
-				layersWithBadPathDirections = []
-				allTestLayers.append(layersWithBadPathDirections)
-				allTestReports.append("Bad Path Orientation")
-				layersWithOffcurveAsStartpoint = []
-				allTestLayers.append(layersWithOffcurveAsStartpoint)
-				allTestReports.append("Off-curve as start point")
-				layersWithStrayPoints = []
-				allTestLayers.append(layersWithStrayPoints)
-				allTestReports.append("Stray Points")
-				layersWithTwoPointOutlines = []
-				allTestLayers.append(layersWithTwoPointOutlines)
-				allTestReports.append("Two-Point Outlines")
-				layersWithOpenPaths = []
-				allTestLayers.append(layersWithOpenPaths)
-				allTestReports.append("Open Paths")
-				layersWithQuadraticCurves = []
-				allTestLayers.append(layersWithQuadraticCurves)
-				allTestReports.append("Quadratic Curves")
-				layersWithDecimalCoordinates = []
-				allTestLayers.append(layersWithDecimalCoordinates)
-				allTestReports.append("Decimal Coordinates")
-				layersWithEmptyPaths = []
-				allTestLayers.append(layersWithEmptyPaths)
-				allTestReports.append("Empty Paths")
-
 				progressSteps = glyphCount / 10
 				progressCounter = 0
 				stepsPerFont = 100 / len(theseFonts)
 				firstStepPerFont = stepsPerFont * fontIndex
+				workUnits = []
+				unit, unitLayers, fingerprints = WorkUnit(), [], []
 				for i, thisGlyph in enumerate(glyphs):
 					# status update:
 					if progressCounter > progressSteps:
@@ -766,143 +388,97 @@ class PathProblemFinder(mekkaObject):
 					self.w.status.set(f"{fontIndex}. {thisGlyph.name}...")
 					# print(f"{i + 1}. {thisGlyph.name}")
 
-					# step through layers
+					# read layers into the work unit (unless unchanged), hand it to the pool when full:
 					for thisLayer in thisGlyph.layers:
 						if thisLayer.isMasterLayer or thisLayer.isSpecialLayer:
-
-							if zeroHandles and hasZeroHandles(thisLayer):
-								layersWithZeroHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Zero handle(s) on layer: {thisLayer.name}")
-
-							if outwardHandles and hasOutwardHandles(thisLayer):
-								layersWithOutwardHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Outward handle(s) on layer: {thisLayer.name}")
-
-							if cuspingHandles and hasCuspingHandles(thisLayer):
-								layersWithCuspingHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Cusping handle(s) on layer: {thisLayer.name}")
-
-							if largeHandles and hasLargeHandles(thisLayer):
-								layersWithLargeHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Large handle(s) on layer: {thisLayer.name}")
-
-							if offcurveAsStartPoint and hasOffcurveAsStartPoint(thisLayer):
-								layersWithOffcurveAsStartpoint.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Off-curve as start point on layer: {thisLayer.name}")
-
-							if shortHandles and hasShortHandles(thisLayer, threshold=float(shortHandlesThreshold)):
-								layersWithShortHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Short handle(s) on layer: {thisLayer.name}")
-
-							if angledHandles and hasAngledHandles(thisLayer, angledHandlesAngle):
-								layersWithAngledHandles.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Angled handle(s) on layer: {thisLayer.name}")
-
-							if shallowCurve and hasShallowCurve(thisLayer, threshold=float(shallowCurveThreshold)):
-								layersWithShallowCurve.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Shallow curve(s) on layer: {thisLayer.name}")
-
-							if shallowCurveBBox and hasShallowCurveBBox(thisLayer, threshold=float(shallowCurveBBoxThreshold)):
-								layersWithShallowCurveBBox.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Shallow curve bbox(es) on layer: {thisLayer.name}")
-
-							if almostOrthogonalLines and hasAlmostOrthogonalLines(thisLayer, threshold=float(almostOrthogonalLinesThreshold), minLength=float(almostOrthogonalLinesMinLength), minLengthCheck=almostOrthogonalLinesMinLengthCheck):
-								layersWithAlmostOrthogonalLines.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Almost orthogonal line(s) on layer: {thisLayer.name}")
-
-							if shortSegment and hasShortSegment(thisLayer, threshold=float(shortSegmentThreshold)):
-								layersWithshortSegments.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Short line(s) on layer: {thisLayer.name}")
-
-							if badOutlineOrder and hasBadOutlineOrder(thisLayer):
-								layersWithBadOutlineOrder.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Bad outline order(s) on layer: {thisLayer.name}")
-
+							paths = layerPaths(thisLayer)
+							unitLayers.append(thisLayer)
+							fingerprint = None
+							if resultCache:
+								fingerprint = outlineFingerprint(paths)
+								cachedResults = resultCache.lookup(thisGlyph.name, thisLayer.layerId, fingerprint)
+								if cachedResults is not None:
+									unit.addCachedResults(cachedResults)
+									fingerprints.append(fingerprint)
+									continue
+							fingerprints.append(fingerprint)
+							layerIndex = unit.addPaths(paths)
 							if badPathDirections and hasBadPathDirections(thisLayer):
-								layersWithBadPathDirections.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Bad path direction(s) on layer: {thisLayer.name}")
-
-							if strayPoints and hasStrayPoints(thisLayer):
-								layersWithStrayPoints.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Stray points on layer: {thisLayer.name}")
-
-							if twoPointOutlines and hasTwoPointOutlines(thisLayer):
-								layersWithTwoPointOutlines.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Two-point outline(s) on layer: {thisLayer.name}")
-
-							if openPaths:
-								shouldProcess = True
-								for nameStart in canHaveOpenOutlines:
-									if nameStart in thisGlyph.name:
-										shouldProcess = False
-								if shouldProcess and hasOpenPaths(thisLayer):
-									layersWithOpenPaths.append(thisLayer)
-									if verbose:
-										print(f"  ❌ Open path(s) on layer: {thisLayer.name}")
-
-							if decimalCoordinates and hasDecimalCoordinates(thisLayer):
-								layersWithDecimalCoordinates.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Decimal coordinates in layer: {thisLayer.name}")
-
-							if quadraticCurves and hasQuadraticCurves(thisLayer):
-								layersWithQuadraticCurves.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Quadratic curves in layer: {thisLayer.name}")
-
-							if emptyPaths and hasEmptyPaths(thisLayer):
-								layersWithEmptyPaths.append(thisLayer)
-								if verbose:
-									print(f"  ❌ Empty paths in layer: {thisLayer.name}")
-
-				anyIssueFound = any(allTestLayers)
-				countOfLayers = 0
-				if anyIssueFound:
-					countOfFontsWithIssues += 1
-					tab = thisFont.currentTab
-					if not tab or not reuseTab:
-						# opens new Edit tab:
-						tab = thisFont.newTab()
-					tab.direction = 0  # force LTR
-					layers = []
-
-					currentMaster = thisFont.masters[tab.masterIndex]
-					masterID = currentMaster.id
-
-					# collect reports:
-					for affectedLayers, reportTitle in zip(allTestLayers, allTestReports):
-						countOfLayers += self.reportInTabAndMacroWindow(affectedLayers, reportTitle, layers, thisFont, masterID)
-
-					tab.layers = layers
-
-				totalLayerCount += countOfLayers
-				totalGlyphCount += glyphCount
+								unit.addResult(layerIndex, "badPathDirections", [])
+					if unit.layerCount >= batchLayerCount or i == glyphCount - 1:
+						unit.submit(pool)
+						workUnits.append((unit, unitLayers, fingerprints))
+						unit, unitLayers, fingerprints = WorkUnit(), [], []
+				fontJobs.append((thisFont, glyphCount, resultCache, workUnits))
 
 			except Exception as e:
-				Glyphs.showMacroWindow()
-				print(f"\n⚠️ Error in script:{e} \n")
-				import traceback
-				print(traceback.format_exc())
-				print(thisFont)
-				print()
+				self.reportError(e, thisFont)
 			finally:
 				thisFont.enableUpdateInterface()  # re-enables UI updates in Font View
 
+		# report the results in the order of the fonts and glyphs:
+		self.w.status.set("Collecting results...")
+		try:
+			for thisFont, glyphCount, resultCache, workUnits in fontJobs:
+				try:
+					thisFont.disableUpdateInterface()  # suppresses UI updates in Font View
+
+					print(f"\n🪐 {self.title} Report for {thisFont.familyName}")
+					if thisFont.filepath:
+						print(thisFont.filepath)
+					else:
+						print("⚠️ The font file has not been saved yet.")
+					print()
+					print(f"Processing {glyphCount} glyphs:")
+
+					allTestLayers = [[] for checkName, reportTitle, verboseTitle in checkReports]
+					allTestReports = [reportTitle for checkName, reportTitle, verboseTitle in checkReports]
+					testLayersForCheck = dict((checkName, layerList) for (checkName, reportTitle, verboseTitle), layerList in zip(checkReports, allTestLayers))
+					for unit, unitLayers, fingerprints in workUnits:
+						self.reportBatch(unit.results(), unitLayers, testLayersForCheck, verbose)
+						if resultCache:
+							for layerIndex, layerResults in unit.checkedLayerResults().items():
+								if layerIndex not in unit.cachedIndexes:
+									thisLayer = unitLayers[layerIndex]
+									resultCache.store(thisLayer.parent.name, thisLayer.layerId, fingerprints[layerIndex], layerResults)
+
+					if resultCache:
+						resultCache.save(g.name for g in thisFont.glyphs)
+						print(f"🔁 {resultCache.report()}")
+
+					anyIssueFound = any(allTestLayers)
+					countOfLayers = 0
+					if anyIssueFound:
+						countOfFontsWithIssues += 1
+						tab = thisFont.currentTab
+						if not tab or not reuseTab:
+							# opens new Edit tab:
+							tab = thisFont.newTab()
+						tab.direction = 0  # force LTR
+						layers = []
+
+						currentMaster = thisFont.masters[tab.masterIndex]
+						masterID = currentMaster.id
+
+						# collect reports:
+						for affectedLayers, reportTitle in zip(allTestLayers, allTestReports):
+							countOfLayers += self.reportInTabAndMacroWindow(affectedLayers, reportTitle, layers, thisFont, masterID)
+
+						tab.layers = layers
+
+					totalLayerCount += countOfLayers
+					totalGlyphCount += glyphCount
+
+				except Exception as e:
+					self.reportError(e, thisFont)
+				finally:
+					thisFont.enableUpdateInterface()  # re-enables UI updates in Font View
+		finally:
+			pool.close()
+
+		if pool.fallbackCount:
+			print(f"\n⚠️ {pool.fallbackCount} batch(es) checked in Glyphs, because a worker process failed.")
+
 		# take time:
 		end = timer()
 		timereport = reportTimeInNaturalLanguage(end - start)
@@ -937,6 +513,14 @@ class PathProblemFinder(mekkaObject):
 					OKButton=None,
 				)
 
+	def reportError(self, e, font):
+		Glyphs.showMacroWindow()
+		print(f"\n⚠️ Error in script:{e} \n")
+		import traceback
+		print(traceback.format_exc())
+		print(font)
+		print()
+
 	def reportInTabAndMacroWindow(self, layerList, title, layers, font, masterID):
 		if layerList and font:
 			# report in Tab:
@@ -957,7 +541,7 @@ class PathProblemFinder(mekkaObject):
 				layers.append(GSControlLayer.newline())
 
 			# report in Macro Window:
-			glyphNames = "/" + "/".join(set([layer.parent.name for layer in layerList]))
+			glyphNames = "/" + "/".join(dict.fromkeys(layer.parent.name for layer in layerList))
 			print(f"\n🔠 {title}:\n{glyphNames}")
 
 		return len(layerList)
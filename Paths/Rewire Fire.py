@@ -5,26 +5,25 @@ __doc__ = """
 Finds, selects and marks duplicate coordinates. Two nodes on the same position typically can be rewired with Reconnect Nodes.
 """
 
+import math
 import vanilla
-from Foundation import NSPoint, NSIntersectsRect
-from GlyphsApp import Glyphs, GSAnnotation, GSOFFCURVE, CIRCLE, Message, distance
+from Foundation import NSIntersectsRect
+from GlyphsApp import Glyphs, GSAnnotation, GSOFFCURVE, CIRCLE, Message
 from mekkablue import mekkaObject
 
+onLineThreshold = 2.01**0.5
 
-def isOnLine(p1, p2, p3, threshold=2.01**0.5):
+
+def isOnLine(x1, y1, x2, y2, x3, y3, threshold=onLineThreshold):
 	"""
-	Returns True if p3 is on and within p1-p2.
+	Returns True if point 3 is on and within line 1-2.
 	And not off more than threshold.
 	"""
-	x1, y1 = p1.x, p1.y
-	x2, y2 = p2.x, p2.y
-	x3, y3 = p3.x, p3.y
-
 	dx = x2 - x1
 	dy = y2 - y1
 	d2 = dx**2 + dy**2
 	nx = ((x3 - x1) * dx + (y3 - y1) * dy) / d2
-	offset = distance(p3, NSPoint(dx * nx + x1, dy * nx + y1))
+	offset = math.hypot(x3 - (dx * nx + x1), y3 - (dy * nx + y1))
 	if offset < threshold:
 		if 0.0 < nx < 1.0:
 			return True
@@ -32,6 +31,109 @@ def isOnLine(p1, p2, p3, threshold=2.01**0.5):
 	return False
 
 
+def readClosedPaths(layer):
+	"""
+	Closed paths of a layer, read once: a list of (path, nodes, positions, on-curve flags)
+	per path, with positions as (x, y) tuples.
+	"""
+	closedPaths = []
+	for path in layer.paths:
+		if path.closed:
+			nodes = list(path.nodes)
+			positions = []
+			for node in nodes:
+				position = node.position
+				positions.append((position.x, position.y))
+			closedPaths.append((path, nodes, positions, [node.type != GSOFFCURVE for node in nodes]))
+	return closedPaths
+
+
+def duplicatePositions(closedPaths, tolerateZeroSegments=False):
+	"""
+	Finds on-curves on the same position as an earlier on-curve (in a hashed set of positions).
+	Returns (duplicates, firsts): (path index, node index) of the duplicates, and of the first
+	on-curve at each position.
+	"""
+	seenPositions = set()
+	duplicates, firsts = [], []
+	for pathIndex, (path, nodes, positions, isOncurve) in enumerate(closedPaths):
+		nodeCount = len(positions)
+		for nodeIndex, position in enumerate(positions):
+			if not isOncurve[nodeIndex]:
+				continue
+			if position in seenPositions:
+				if not tolerateZeroSegments or position not in (positions[(nodeIndex + 1) % nodeCount], positions[nodeIndex - 1]):
+					duplicates.append((pathIndex, nodeIndex))
+			else:
+				seenPositions.add(position)
+				firsts.append((pathIndex, nodeIndex))
+	return duplicates, firsts
+
+
+class PointGrid(object):
+	"""Uniform grid of points, for finding the points near a line segment without testing all of them."""
+
+	def __init__(self, points, minCellSize=1.0):
+		# points: (x, y, item) tuples
+		self.points = points
+		self.cells = {}
+		if not points:
+			self.cellSize = minCellSize
+			return
+		xs = [x for x, y, item in points]
+		ys = [y for x, y, item in points]
+		averageSpacing = ((max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1) / len(points))**0.5
+		self.cellSize = max(minCellSize, 2 * averageSpacing)
+		for x, y, item in points:
+			self.cells.setdefault((math.floor(x / self.cellSize), math.floor(y / self.cellSize)), []).append((x, y, item))
+
+	def pointsInRect(self, minX, minY, maxX, maxY):
+		"""Points in the cells touching the rectangle (some may lie outside of it)."""
+		left, bottom = math.floor(minX / self.cellSize), math.floor(minY / self.cellSize)
+		right, top = math.floor(maxX / self.cellSize), math.floor(maxY / self.cellSize)
+		if (right - left + 1) * (top - bottom + 1) > len(self.cells):
+			return self.points
+		points = []
+		for cellX in range(left, right + 1):
+			for cellY in range(bottom, top + 1):
+				points.extend(self.cells.get((cellX, cellY), ()))
+		return points
+
+
+def positionsOnLines(closedPaths, pathsOverlap, threshold=onLineThreshold):
+	"""
+	Finds on-curves within threshold of a line segment (between two other on-curves) in a path whose
+	bounds overlap their own path. pathsOverlap(i, j) tells if the bounds of paths i and j intersect.
+	Returns (path index, node index) of the on-curves, once per line segment they are on, in the
+	order of the line segments.
+	"""
+	points = [
+		(x, y, (pathIndex, nodeIndex))
+		for pathIndex, (path, nodes, positions, isOncurve) in enumerate(closedPaths)
+		for nodeIndex, (x, y) in enumerate(positions)
+		if isOncurve[nodeIndex]
+	]
+	grid = PointGrid(points, minCellSize=2 * threshold)
+	onLines = []
+	for pathIndex, (path, nodes, positions, isOncurve) in enumerate(closedPaths):
+		nodeCount = len(positions)
+		for index1 in range(nodeCount):
+			index2 = (index1 + 1) % nodeCount
+			if not (isOncurve[index1] and isOncurve[index2]):
+				continue
+			(x1, y1), (x2, y2) = positions[index1], positions[index2]
+			# make sure it is not a zero-length segment:
+			if (x1, y1) == (x2, y2):
+				continue
+			ownNodes = ((pathIndex, index1), (pathIndex, index2))
+			candidates = grid.pointsInRect(min(x1, x2) - threshold, min(y1, y2) - threshold, max(x1, x2) + threshold, max(y1, y2) + threshold)
+			onLines.extend(sorted(
+				item for x3, y3, item in candidates
+				if item not in ownNodes and isOnLine(x1, y1, x2, y2, x3, y3, threshold) and pathsOverlap(pathIndex, item[0])
+			))
+	return onLines
+
+
 class RewireFire(mekkaObject):
 	prefDict = {
 		"setFireToNode": 1,
@@ -132,90 +234,66 @@ class RewireFire(mekkaObject):
 		circle.width = width
 		layer.annotations.append(circle)
 
-	def findNodesOnLines(self, layer, dynamiteForOnSegment=True, shouldSelect=True, verbose=False):
-		affectedNodes = []
-
-		# find line segments:
-		for p in layer.paths:
-			if p.closed:
-				firstPathBounds = p.bounds
-				for n1 in p.nodes:
-					n2 = n1.nextNode
-					if n2 and n1.type != GSOFFCURVE and n2.type != GSOFFCURVE:
-						p1 = n1.position
-						p2 = n2.position
-
-						# make sure it is not a zero-lenth segment:
-						if p1 != p2:
-
-							# find other nodes that are exactly on the line segment:
-							for pp in layer.paths:
-								secondPathBounds = pp.bounds
-								if pp.closed and NSIntersectsRect(firstPathBounds, secondPathBounds):
-									for n3 in pp.nodes:
-										if n3 != n1 and n3 != n2 and n3.type != GSOFFCURVE:
-											p3 = n3.position
-											# find projection with threshold:
-											if isOnLine(p1, p2, p3):
-												affectedNodes.append(n3)
-
-		if affectedNodes:
-			thisGlyph = layer.parent
-			if verbose:
-				print()
-				print(f"🔠 {thisGlyph.name}, layer ‘{layer.name}’: {len(affectedNodes)} nodes on line segments")
-				for node in affectedNodes:
-					print(f"   {self.onSegmentMarker} x {node.x}, y {node.y}")
-
-			for n3 in affectedNodes:
-				if dynamiteForOnSegment:
-					n3.name = self.onSegmentMarker
-				if shouldSelect:
-					layer.selection.append(n3)
-			return True
-		else:
-			return False
-
-	def findDuplicates(self, thisLayer, setFireToNode=True, markWithCircle=False, shouldSelect=True, tolerateZeroSegments=False, verbose=False):
-		allCoordinates = []
-		duplicateCoordinates = []
-		for thisPath in thisLayer.paths:
-			if not thisPath.closed:
-				continue
-			for thisNode in thisPath.nodes:
-				if thisNode.type == GSOFFCURVE:
-					continue
-				if thisNode.position in allCoordinates:
-					if not tolerateZeroSegments or thisNode.position not in (thisNode.nextNode.position, thisNode.prevNode.position):
-						# select node:
-						if shouldSelect and thisNode not in thisLayer.selection:
-							thisLayer.selection.append(thisNode)
-						duplicateCoordinates.append(thisNode.position)
-						if setFireToNode:
-							thisNode.name = self.duplicateMarker
-				else:
-					allCoordinates.append(thisNode.position)
-					if thisNode.name == self.duplicateMarker:
-						thisNode.name = None
-
-		if duplicateCoordinates:
-			thisGlyph = thisLayer.parent
-			if verbose:
-				print()
-				print(f"🔠 {thisGlyph.name}, layer ‘{thisLayer.name}’: {len(duplicateCoordinates)} duplicates")
-				for dupe in duplicateCoordinates:
-					print(f"   {self.duplicateMarker} x {dupe.x}, y {dupe.y}")
-
-			# if markWithCircle:
-			# 	coords = set([(p.x,p.y) for p in duplicateCoordinates])
-			# 	for dupeCoord in coords:
-			# 		x,y = dupeCoord
-			# 		self.circleInLayerAtPosition(thisLayer, NSPoint(x,y))
-
-			return True
-
-		else:
-			return False
+	def findNodesOnLines(self, layer, closedPaths, dynamiteForOnSegment=True, verbose=False):
+		"""Marks on-curves on top of line segments, returns them (in a list without duplicates)."""
+		pathBounds = {}
+		overlaps = {}
+
+		def pathsOverlap(firstIndex, secondIndex):
+			# only asked for paths with a node near a line segment of the other:
+			if (firstIndex, secondIndex) not in overlaps:
+				for pathIndex in (firstIndex, secondIndex):
+					if pathIndex not in pathBounds:
+						pathBounds[pathIndex] = closedPaths[pathIndex][0].bounds
+				overlaps[(firstIndex, secondIndex)] = NSIntersectsRect(pathBounds[firstIndex], pathBounds[secondIndex])
+			return overlaps[(firstIndex, secondIndex)]
+
+		nodeLocations = positionsOnLines(closedPaths, pathsOverlap)
+		if not nodeLocations:
+			return []
+
+		if verbose:
+			print()
+			print(f"🔠 {layer.parent.name}, layer ‘{layer.name}’: {len(nodeLocations)} nodes on line segments")
+			for pathIndex, nodeIndex in nodeLocations:
+				x, y = closedPaths[pathIndex][2][nodeIndex]
+				print(f"   {self.onSegmentMarker} x {x}, y {y}")
+
+		affectedNodes = [closedPaths[pathIndex][1][nodeIndex] for pathIndex, nodeIndex in dict.fromkeys(nodeLocations)]
+		if dynamiteForOnSegment:
+			for node in affectedNodes:
+				node.name = self.onSegmentMarker
+		return affectedNodes
+
+	def findDuplicates(self, thisLayer, closedPaths, setFireToNode=True, markWithCircle=False, tolerateZeroSegments=False, verbose=False):
+		"""Marks on-curves on the position of an earlier on-curve, returns them."""
+		duplicates, firsts = duplicatePositions(closedPaths, tolerateZeroSegments=tolerateZeroSegments)
+		for pathIndex, nodeIndex in firsts:
+			thisNode = closedPaths[pathIndex][1][nodeIndex]
+			if thisNode.name == self.duplicateMarker:
+				thisNode.name = None
+		if not duplicates:
+			return []
+
+		duplicateNodes = [closedPaths[pathIndex][1][nodeIndex] for pathIndex, nodeIndex in duplicates]
+		if setFireToNode:
+			for thisNode in duplicateNodes:
+				thisNode.name = self.duplicateMarker
+
+		if verbose:
+			print()
+			print(f"🔠 {thisLayer.parent.name}, layer ‘{thisLayer.name}’: {len(duplicates)} duplicates")
+			for pathIndex, nodeIndex in duplicates:
+				x, y = closedPaths[pathIndex][2][nodeIndex]
+				print(f"   {self.duplicateMarker} x {x}, y {y}")
+
+		# if markWithCircle:
+		# 	coords = set([(p.x,p.y) for p in duplicateCoordinates])
+		# 	for dupeCoord in coords:
+		# 		x,y = dupeCoord
+		# 		self.circleInLayerAtPosition(thisLayer, NSPoint(x,y))
+
+		return duplicateNodes
 
 	def RewireFireMain(self, sender):
 		try:
@@ -265,19 +343,24 @@ class RewireFire(mekkaObject):
 					if thisGlyph.export or includeNonExporting:
 						for thisLayer in thisGlyph.layers:
 							if thisLayer.isMasterLayer or thisLayer.isSpecialLayer:
-								# reset selection if necessary:
+								closedPaths = readClosedPaths(thisLayer)
+								affectedNodes = []
+
+								# mark duplicate nodes:
+								if setFireToNode:
+									affectedNodes.extend(self.findDuplicates(thisLayer, closedPaths, tolerateZeroSegments=tolerateZeroSegments, verbose=verbose))
+
+								# mark nodes on line segments:
+								if dynamiteForOnSegment:
+									affectedNodes.extend(self.findNodesOnLines(thisLayer, closedPaths, verbose=verbose))
+
+								# select them (or reset selection) in one go:
 								if shouldSelect:
-									thisLayer.selection = None
+									thisLayer.selection = list(dict.fromkeys(affectedNodes))
 
-								# mark and select duplicate nodes:
-								if setFireToNode and self.findDuplicates(thisLayer, shouldSelect=shouldSelect, tolerateZeroSegments=tolerateZeroSegments, verbose=verbose):
+								if affectedNodes:
 									affectedLayers.append(thisLayer)
 
-								# mark and select nodes on line segments:
-								if dynamiteForOnSegment and self.findNodesOnLines(thisLayer, shouldSelect=shouldSelect, verbose=verbose):
-									if thisLayer not in affectedLayers:
-										affectedLayers.append(thisLayer)
-
 				if affectedLayers:
 					# opens new Edit tab:
 					if thisFont.currentTab and self.pref("reuseTab"):
@@ -0,0 +1,939 @@
+# -*- coding: utf-8 -*-
+"""
+Check engine for Path Problem Finder. Layers are read once into an OutlineBatch:
+node coordinates, node types, path offsets and closed flags of many layers in
+flat lists. All enabled checks then run over all nodes, segments and paths of
+the batch at once (as NumPy array operations if available, otherwise in one
+loop per path), instead of walking the paths and nodes of every layer again
+for every check.
+
+Every check reports where it fails: a list of (path index, node index) per
+layer, with node index None for problems of a whole path.
+
+Batches can be checked in parallel by a CheckPool of worker processes. Each
+worker runs this module with --worker, so it needs no Glyphs app. The same
+module runs the checks headless (e.g., in CI on Linux) on geometry files
+exported with Paths > Export Outline Geometry:
+
+	python3 outlineChecks.py --check zeroHandles --check shortHandles=12 MyFont.outlines.json
+
+The command exits with status 1 if any problems are found, see --help.
+
+A ResultCache keeps the results of every layer in a file next to the font
+file, keyed by an outline fingerprint, so repeat runs only check the layers
+that changed since (see WorkUnit).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+	from GlyphsApp import GSLINE, GSCURVE, GSOFFCURVE, QCURVE
+except ImportError:
+	# headless, outside of Glyphs (node types as written in geometry files):
+	GSLINE, GSCURVE, GSOFFCURVE, QCURVE = "line", "curve", "offcurve", "qcurve"
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+LINE, CURVE, OFFCURVE, QUADRATIC = 0, 1, 2, 3  # node type codes
+typeCodes = {
+	GSLINE: LINE,
+	GSCURVE: CURVE,
+	GSOFFCURVE: OFFCURVE,
+	QCURVE: QUADRATIC,
+}
+typeNames = dict((typeCode, typeName) for typeName, typeCode in typeCodes.items())
+
+# check name: parameter (see OutlineBatch.run)
+checkParameters = {
+	"zeroHandles": None,
+	"outwardHandles": None,
+	"cuspingHandles": None,
+	"largeHandles": None,
+	"offcurveAsStartPoint": None,
+	"shortHandles": "threshold",
+	"angledHandles": "maximum angle",
+	"shallowCurveBBox": "threshold",
+	"shallowCurve": "threshold",
+	"almostOrthogonalLines": "(threshold, minimum length or None)",
+	"shortSegment": "threshold",
+	"badOutlineOrder": None,
+	"strayPoints": None,
+	"twoPointOutlines": None,
+	"openPaths": None,
+	"emptyPaths": None,
+	"quadraticCurves": None,
+	"decimalCoordinates": None,
+}
+
+# glyphs that are supposed to have open paths (not reported by openPaths):
+canHaveOpenOutlines = (
+	"_cap",
+	"_corner",
+	"_line",
+	"_segment",
+)
+
+# (check name, report title, verbose title), in the order of the report
+# (badPathDirections needs Glyphs and is not an OutlineBatch check):
+checkReports = (
+	("zeroHandles", "Zero Handles", "Zero handle(s)"),
+	("outwardHandles", "Outward Handles", "Outward handle(s)"),
+	("cuspingHandles", "Cusping Handles", "Cusping handle(s)"),
+	("largeHandles", "Large Handles", "Large handle(s)"),
+	("shortHandles", "Short Handles", "Short handle(s)"),
+	("angledHandles", "Angled Handles", "Angled handle(s)"),
+	("shallowCurve", "Shallow Curve", "Shallow curve(s)"),
+	("shallowCurveBBox", "Small Curve BBox", "Shallow curve bbox(es)"),
+	("almostOrthogonalLines", "Almost Orthogonal Lines", "Almost orthogonal line(s)"),
+	("shortSegment", "Short Line Segments", "Short segment(s)"),
+	("badOutlineOrder", "Bad Outline Order", "Bad outline order"),
+	("badPathDirections", "Bad Path Orientation", "Bad path direction(s)"),
+	("offcurveAsStartPoint", "Off-curve as start point", "Off-curve as start point"),
+	("strayPoints", "Stray Points", "Stray points"),
+	("twoPointOutlines", "Two-Point Outlines", "Two-point outline(s)"),
+	("openPaths", "Open Paths", "Open path(s)"),
+	("quadraticCurves", "Quadratic Curves", "Quadratic curves"),
+	("decimalCoordinates", "Decimal Coordinates", "Decimal coordinates"),
+	("emptyPaths", "Empty Paths", "Empty paths"),
+)
+
+# parameters of the checks that are on by default in Path Problem Finder, and of the others:
+defaultChecks = ("zeroHandles", "offcurveAsStartPoint", "angledHandles", "almostOrthogonalLines", "badOutlineOrder", "strayPoints", "emptyPaths")
+defaultParameters = {
+	"shortHandles": 12.0,
+	"angledHandles": 8.0,
+	"shallowCurveBBox": 5.0,
+	"shallowCurve": 10.0,
+	"almostOrthogonalLines": (3.0, None),
+	"shortSegment": 8.0,
+}
+
+batchLayerCount = 2000  # layers per OutlineBatch (and per work unit of a CheckPool)
+resultCacheFormat = 1  # increase when check results change, invalidates all ResultCache files
+
+# (abscissa, weight) of 8-point Gauss-Legendre quadrature on 0…1, for curve segment lengths:
+_quadrature = [
+	((abscissa + 1) / 2, weight / 2) for abscissa, weight in (
+		(-0.9602898564975362, 0.1012285362903771),
+		(-0.7966664774136267, 0.2223810344533744),
+		(-0.5255324099163290, 0.3137066458778869),
+		(-0.1834346424956498, 0.3626837833783617),
+		(0.1834346424956498, 0.3626837833783617),
+		(0.5255324099163290, 0.3137066458778869),
+		(0.7966664774136267, 0.2223810344533744),
+		(0.9602898564975362, 0.1012285362903771),
+	)
+]
+
+
+def cubicLength(x0, y0, x1, y1, x2, y2, x3, y3):
+	length = 0.0
+	for t, weight in _quadrature:
+		a, b, c = 3 * (1 - t)**2, 6 * t * (1 - t), 3 * t**2
+		length += weight * math.hypot(a * (x1 - x0) + b * (x2 - x1) + c * (x3 - x2), a * (y1 - y0) + b * (y2 - y1) + c * (y3 - y2))
+	return length
+
+
+def cubicAreaCorrection(x0, y0, x1, y1, x2, y2, x3, y3):
+	"""Area between a cubic segment and its control polygon (works element-wise on arrays too)."""
+	x1, y1, x2, y2, x3, y3 = x1 - x0, y1 - y0, x2 - x0, y2 - y0, x3 - x0, y3 - y0
+	curveArea = -(x1 * (-y2 - y3) + x2 * (y1 - 2 * y3) + x3 * (y1 + 2 * y2)) * 0.15
+	polygonArea = (x1 * y2 - x2 * y1 + x2 * y3 - x3 * y2) * 0.5
+	return curveArea - polygonArea
+
+
+def relativePosition(x1, y1, x2, y2, x3, y3):
+	"""
+	Relative position of point 3 along line 1-2 (0 where 1 and 2 coincide), and its distance
+	from that position (works element-wise on arrays too).
+	"""
+	dx, dy = x2 - x1, y2 - y1
+	squaredLength = dx * dx + dy * dy
+	if numpy is not None and isinstance(squaredLength, numpy.ndarray):
+		position = numpy.divide((x3 - x1) * dx + (y3 - y1) * dy, squaredLength, out=numpy.zeros_like(squaredLength), where=squaredLength != 0)
+		return position, numpy.hypot(x3 - x1 - dx * position, y3 - y1 - dy * position)
+	position = ((x3 - x1) * dx + (y3 - y1) * dy) / squaredLength if squaredLength else 0.0
+	return position, math.hypot(x3 - x1 - dx * position, y3 - y1 - dy * position)
+
+
+def describeLocations(locations):
+	"""Problem locations as text, with path and node numbers counting from 1."""
+	descriptions = []
+	for pathIndex, nodeIndex in locations:
+		if nodeIndex is None:
+			descriptions.append(f"path {pathIndex + 1}")
+		else:
+			descriptions.append(f"path {pathIndex + 1} node {nodeIndex + 1}")
+	return ", ".join(descriptions)
+
+
+def layerPaths(layer):
+	"""Paths of a GSLayer as a list of (closed, [(x, y, type code), ...]) per path, see OutlineBatch.addPaths()."""
+	paths = []
+	for path in layer.paths:
+		nodes = []
+		for node in path.nodes:
+			position = node.position
+			nodes.append((position.x, position.y, typeCodes.get(node.type, LINE)))
+		paths.append((bool(path.closed), nodes))
+	return paths
+
+
+class OutlineBatch(object):
+	"""
+	Paths of many layers in flat lists, path by path, layer by layer:
+	xs, ys, types: coordinates and type code of every node
+	pathStarts, pathLengths, pathClosed, pathLayers: first node index, node count, closed flag and layer index of every path
+	layerPathStarts, layerPathCounts: first path index and path count of every layer
+	"""
+
+	def __init__(self, useNumpy=None):
+		if useNumpy is None:
+			useNumpy = numpy is not None
+		self.usesNumpy = bool(useNumpy)
+		self.xs, self.ys, self.types = [], [], []
+		self.pathStarts, self.pathLengths, self.pathClosed, self.pathLayers = [], [], [], []
+		self.layerPathStarts, self.layerPathCounts = [], []
+
+	@property
+	def layerCount(self):
+		return len(self.layerPathStarts)
+
+	@classmethod
+	def fromGeometry(cls, geometry, useNumpy=None):
+		"""Batch from the flat lists of geometry()."""
+		batch = cls(useNumpy)
+		for key in batch.geometry():
+			setattr(batch, key, list(geometry[key]))
+		return batch
+
+	def geometry(self):
+		"""The flat lists of the batch, as a dict of plain lists (to pass to worker processes)."""
+		return dict(
+			(key, getattr(self, key))
+			for key in ("xs", "ys", "types", "pathStarts", "pathLengths", "pathClosed", "pathLayers", "layerPathStarts", "layerPathCounts")
+		)
+
+	def addLayer(self, layer):
+		"""Reads the paths of a GSLayer, returns its layer index in the batch."""
+		return self.addPaths(layerPaths(layer))
+
+	def addPaths(self, paths):
+		"""Adds a layer as a list of (closed, [(x, y, type code), ...]) per path, returns its layer index."""
+		layerIndex = self.layerCount
+		self.layerPathStarts.append(len(self.pathStarts))
+		self.layerPathCounts.append(len(paths))
+		for closed, nodes in paths:
+			self.pathStarts.append(len(self.xs))
+			self.pathLengths.append(len(nodes))
+			self.pathClosed.append(closed)
+			self.pathLayers.append(layerIndex)
+			for x, y, typeCode in nodes:
+				self.xs.append(float(x))
+				self.ys.append(float(y))
+				self.types.append(typeCode)
+		return layerIndex
+
+	def run(self, checks):
+		"""
+		Runs the checks, given as {check name: parameter} (see checkParameters; None for checks without a parameter).
+		Returns {check name: {layer index: [(path index, node index), ...]}} with the layers that fail each check,
+		path and node indexes counting within the layer (node index None for problems of the whole path).
+		"""
+		unknownChecks = set(checks) - set(checkParameters)
+		if unknownChecks:
+			raise ValueError("Unknown outline checks: %s" % ", ".join(sorted(unknownChecks)))
+		if self.usesNumpy:
+			flaggedNodes, flaggedPaths = self._numpyChecks(checks)
+		else:
+			flaggedNodes, flaggedPaths = self._pythonChecks(checks)
+
+		# flat indexes → (layer index, path index, node index):
+		pathOfNode = []
+		for pathIndex, pathLength in enumerate(self.pathLengths):
+			pathOfNode.extend([pathIndex] * pathLength)
+		results = {}
+		for checkName in checks:
+			layerLocations = {}
+			for nodeIndex in sorted(set(flaggedNodes.get(checkName, ()))):
+				pathIndex = pathOfNode[nodeIndex]
+				layerIndex = self.pathLayers[pathIndex]
+				location = (pathIndex - self.layerPathStarts[layerIndex], nodeIndex - self.pathStarts[pathIndex])
+				layerLocations.setdefault(layerIndex, []).append(location)
+			for pathIndex in sorted(set(flaggedPaths.get(checkName, ()))):
+				layerIndex = self.pathLayers[pathIndex]
+				layerLocations.setdefault(layerIndex, []).append((pathIndex - self.layerPathStarts[layerIndex], None))
+			results[checkName] = layerLocations
+		return results
+
+	def _badOutlineOrderPaths(self, pathAreas):
+		# first paths of layers with more than one path, if not counterclockwise (direction -1 in Glyphs):
+		return [
+			pathStart for pathStart, pathCount in zip(self.layerPathStarts, self.layerPathCounts)
+			if pathCount > 1 and not pathAreas[pathStart] > 0
+		]
+
+	def _numpyChecks(self, checks):
+		flaggedNodes, flaggedPaths = {}, {}
+		x, y = numpy.array(self.xs, dtype=float), numpy.array(self.ys, dtype=float)
+		types = numpy.array(self.types, dtype=numpy.int8)
+		pathStarts, pathLengths = numpy.array(self.pathStarts, dtype=int), numpy.array(self.pathLengths, dtype=int)
+		pathClosed = numpy.array(self.pathClosed, dtype=bool)
+
+		# neighbours within the path (wrapping around):
+		nodePaths = numpy.repeat(numpy.arange(len(pathStarts)), pathLengths)
+		starts, lengths = pathStarts[nodePaths], pathLengths[nodePaths]
+		localIndexes = numpy.arange(len(x)) - starts
+		prev = starts + (localIndexes - 1) % numpy.maximum(lengths, 1)
+		next = starts + (localIndexes + 1) % numpy.maximum(lengths, 1)
+		isOffcurve, isCurve = types == OFFCURVE, types == CURVE
+		isOpenStart = ~pathClosed[nodePaths] & (localIndexes == 0)  # no segment ends here
+
+		def flag(checkName, mask):
+			flaggedNodes[checkName] = numpy.flatnonzero(mask).tolist()
+
+		# handles (off-curves) and their on-curves (before, or else after):
+		handleOncurves = numpy.where(isOffcurve[prev], next, prev)
+		handleDx, handleDy = x[handleOncurves] - x, y[handleOncurves] - y
+
+		# curve segments ending in on-curve A, with handles B (next to A) and C, and starting in D:
+		b = prev
+		c = prev[b]
+		d = prev[c]
+
+		if "zeroHandles" in checks:
+			flag("zeroHandles", isOffcurve & (((x == x[prev]) & (y == y[prev])) | ((x == x[next]) & (y == y[next]))))
+
+		if "outwardHandles" in checks:
+			positionB, deviation = relativePosition(x, y, x[d], y[d], x[b], y[b])
+			positionC, deviation = relativePosition(x, y, x[d], y[d], x[c], y[c])
+			flag("outwardHandles", isCurve & ((positionB < 0) | (positionB > 1) | (positionC < 0) | (positionC > 1)))
+
+		if "cuspingHandles" in checks:
+			cusping = isOffcurve & isOffcurve[next]
+			nextNext = next[next]
+			cusping &= numpy.hypot(x[next] - x[prev], y[next] - y[prev]) < numpy.hypot(x - x[prev], y - y[prev])
+			cusping &= numpy.hypot(x[nextNext] - x, y[nextNext] - y) < numpy.hypot(x[nextNext] - x[next], y[nextNext] - y[next])
+			flag("cuspingHandles", cusping | cusping[prev])
+
+		if "largeHandles" in checks:
+			# intersection of the handle lines A-B and C-D:
+			rx, ry, sx, sy = x[b] - x, y[b] - y, x[d] - x[c], y[d] - y[c]
+			denominator = rx * sy - ry * sx
+			intersecting = isCurve & (denominator != 0)
+			factor = numpy.divide((x[c] - x) * sy - (y[c] - y) * sx, denominator, out=numpy.zeros_like(denominator), where=intersecting)
+			intersectionX, intersectionY = x + rx * factor, y + ry * factor
+			firstTooLong = numpy.hypot(rx, ry) > numpy.hypot(intersectionX - x, intersectionY - y)
+			secondTooLong = numpy.hypot(sx, sy) > numpy.hypot(intersectionX - x[d], intersectionY - y[d])
+			flag("largeHandles", intersecting & (firstTooLong | secondTooLong))
+
+		if "shortHandles" in checks:
+			handleLengths = numpy.hypot(handleDx, handleDy)
+			flag("shortHandles", isOffcurve & (handleLengths > 0) & (handleLengths < float(checks["shortHandles"])))
+
+		if "angledHandles" in checks:
+			maxAngle = float(checks["angledHandles"])
+			angles = numpy.abs(numpy.fmod(numpy.degrees(numpy.arctan2(handleDy, handleDx)), 90.0))
+			flag("angledHandles", isOffcurve & (handleDx != 0) & (handleDy != 0) & ((angles < maxAngle) | (angles > 90 - maxAngle)))
+
+		if "shallowCurveBBox" in checks:
+			threshold = float(checks["shallowCurveBBox"])
+			minX, maxX = numpy.minimum(x, x[d]), numpy.maximum(x, x[d])
+			minY, maxY = numpy.minimum(y, y[d]), numpy.maximum(y, y[d])
+			small = (maxX - minX < threshold) | (maxY - minY < threshold)
+			horizontallyWithin = (minX - 1 < numpy.minimum(x[b], x[c])) & (maxX + 1 > numpy.maximum(x[b], x[c]))
+			verticallyWithin = (minY - 1 < numpy.minimum(y[b], y[c])) & (maxY + 1 > numpy.maximum(y[b], y[c]))
+			flag("shallowCurveBBox", isCurve & small & horizontallyWithin & verticallyWithin)
+
+		if "shallowCurve" in checks:
+			threshold = float(checks["shallowCurve"])
+			shallow = numpy.zeros(len(x), dtype=bool)
+			for point in (c, d):
+				position, deviation = relativePosition(x, y, x[b], y[b], x[point], y[point])
+				shallow |= (position > 0) & (position < 1) & (deviation < threshold)
+			flag("shallowCurve", isCurve & shallow)
+
+		if "almostOrthogonalLines" in checks:
+			threshold, minLength = checks["almostOrthogonalLines"]
+			xDiff, yDiff = numpy.abs(x - x[prev]), numpy.abs(y - y[prev])
+			almostOrthogonal = ((0.1 < xDiff) & (xDiff < float(threshold))) | ((0.1 < yDiff) & (yDiff < float(threshold)))
+			if minLength is not None:
+				almostOrthogonal &= numpy.hypot(xDiff, yDiff) >= float(minLength)
+			flag("almostOrthogonalLines", (types == LINE) & ~isOpenStart & almostOrthogonal)
+
+		if "decimalCoordinates" in checks:
+			flag("decimalCoordinates", (x % 1.0 != 0.0) | (y % 1.0 != 0.0))
+
+		if "quadraticCurves" in checks:
+			flag("quadraticCurves", types == QUADRATIC)
+
+		if "shortSegment" in checks or "badOutlineOrder" in checks:
+			# segments: every on-curve with the previous on-curve of its path (itself if it is the only one):
+			oncurves = numpy.flatnonzero(~isOffcurve & ~isOpenStart)
+			allOncurves = numpy.flatnonzero(~isOffcurve)
+			oncurvePaths = nodePaths[allOncurves]
+			firstOfPath = numpy.ones(len(allOncurves), dtype=bool)
+			firstOfPath[1:] = oncurvePaths[1:] != oncurvePaths[:-1]
+			lastOfPath = numpy.ones(len(allOncurves), dtype=bool)
+			lastOfPath[:-1] = oncurvePaths[1:] != oncurvePaths[:-1]
+			previousOncurves = numpy.empty(len(allOncurves), dtype=int)
+			previousOncurves[1:] = allOncurves[:-1]
+			previousOncurves[firstOfPath] = allOncurves[lastOfPath]
+			segmentStarts = numpy.empty(len(x), dtype=int)
+			segmentStarts[allOncurves] = previousOncurves
+			segmentStarts = segmentStarts[oncurves]
+			offcurveCounts = (oncurves - segmentStarts) % lengths[oncurves]
+			offcurveCounts = numpy.where(offcurveCounts == 0, lengths[oncurves], offcurveCounts) - 1
+			cubics = oncurves[offcurveCounts == 2]
+			cubicStarts = segmentStarts[offcurveCounts == 2]
+			cubicPoints = (x[cubicStarts], y[cubicStarts], x[next[cubicStarts]], y[next[cubicStarts]], x[prev[cubics]], y[prev[cubics]], x[cubics], y[cubics])
+
+		if "shortSegment" in checks:
+			threshold = float(checks["shortSegment"])
+			lines = offcurveCounts == 0
+			segmentLengths = numpy.zeros(len(oncurves))
+			segmentLengths[lines] = numpy.hypot(x[oncurves[lines]] - x[segmentStarts[lines]], y[oncurves[lines]] - y[segmentStarts[lines]])
+			x0, y0, x1, y1, x2, y2, x3, y3 = cubicPoints
+			cubicLengths = numpy.zeros(len(cubics))
+			for t, weight in _quadrature:
+				factor1, factor2, factor3 = 3 * (1 - t)**2, 6 * t * (1 - t), 3 * t**2
+				cubicLengths += weight * numpy.hypot(
+					factor1 * (x1 - x0) + factor2 * (x2 - x1) + factor3 * (x3 - x2),
+					factor1 * (y1 - y0) + factor2 * (y2 - y1) + factor3 * (y3 - y2),
+				)
+			segmentLengths[offcurveCounts == 2] = cubicLengths
+			for i in numpy.flatnonzero(~lines & (offcurveCounts != 2)):
+				# other curves (TrueType): length of the control polygon
+				segmentLengths[i] = self._polygonLength(offcurveCounts[i] + 1, prev, oncurves[i])
+			short = numpy.zeros(len(x), dtype=bool)
+			short[oncurves[segmentLengths < threshold]] = True
+			flag("shortSegment", short)
+
+		if "badOutlineOrder" in checks:
+			# signed areas: control polygon, plus the bulges of cubic curves:
+			edgeAreas = (x[prev] * y - x * y[prev]) * 0.5
+			edgeAreas[cubics] += cubicAreaCorrection(*cubicPoints)
+			pathAreas = numpy.bincount(nodePaths, weights=edgeAreas, minlength=len(pathStarts))
+			flaggedPaths["badOutlineOrder"] = self._badOutlineOrderPaths(pathAreas)
+
+		if "offcurveAsStartPoint" in checks:
+			candidates = pathLengths >= 2
+			first, second, last = pathStarts[candidates], pathStarts[candidates] + 1, pathStarts[candidates] + pathLengths[candidates] - 1
+			offcurveStart = (isOffcurve[first] & ~isOffcurve[second]) | (isCurve[first] & isOffcurve[last])
+			flaggedPaths["offcurveAsStartPoint"] = numpy.flatnonzero(candidates)[offcurveStart].tolist()
+
+		if "twoPointOutlines" in checks:
+			oncurveCounts = numpy.bincount(nodePaths, weights=~isOffcurve, minlength=len(pathStarts))
+			flaggedPaths["twoPointOutlines"] = numpy.flatnonzero(oncurveCounts < 3).tolist()
+
+		for checkName, mask in (("strayPoints", pathLengths == 1), ("emptyPaths", pathLengths == 0), ("openPaths", ~pathClosed)):
+			if checkName in checks:
+				flaggedPaths[checkName] = numpy.flatnonzero(mask).tolist()
+
+		return flaggedNodes, flaggedPaths
+
+	def _polygonLength(self, edgeCount, prev, endIndex):
+		length = 0.0
+		index = endIndex
+		for i in range(edgeCount):
+			previousIndex = int(prev[index])
+			length += math.hypot(self.xs[index] - self.xs[previousIndex], self.ys[index] - self.ys[previousIndex])
+			index = previousIndex
+		return length
+
+	def _pythonChecks(self, checks):
+		# the same as _numpyChecks, one path at a time:
+		flaggedNodes = dict((checkName, []) for checkName in checks)
+		flaggedPaths = dict((checkName, []) for checkName in checks)
+		xs, ys, types = self.xs, self.ys, self.types
+		pathAreas = []
+		for pathIndex, (start, length, closed) in enumerate(zip(self.pathStarts, self.pathLengths, self.pathClosed)):
+			area = 0.0
+			if length == 0 and "emptyPaths" in checks:
+				flaggedPaths["emptyPaths"].append(pathIndex)
+			if length == 1 and "strayPoints" in checks:
+				flaggedPaths["strayPoints"].append(pathIndex)
+			if not closed and "openPaths" in checks:
+				flaggedPaths["openPaths"].append(pathIndex)
+			if "twoPointOutlines" in checks and sum(1 for i in range(start, start + length) if types[i] != OFFCURVE) < 3:
+				flaggedPaths["twoPointOutlines"].append(pathIndex)
+			if "offcurveAsStartPoint" in checks and length >= 2:
+				first, second, last = types[start], types[start + 1], types[start + length - 1]
+				if (first == OFFCURVE and second != OFFCURVE) or (first == CURVE and last == OFFCURVE):
+					flaggedPaths["offcurveAsStartPoint"].append(pathIndex)
+
+			def neighbour(i, offset):
+				return start + (i - start + offset) % length
+
+			for i in range(start, start + length):
+				nodeType, x, y = types[i], xs[i], ys[i]
+				prev, next = neighbour(i, -1), neighbour(i, 1)
+				isOpenStart = not closed and i == start
+				area += (xs[prev] * y - x * ys[prev]) * 0.5
+				if "decimalCoordinates" in checks and (x % 1.0 != 0.0 or y % 1.0 != 0.0):
+					flaggedNodes["decimalCoordinates"].append(i)
+
+				if nodeType == OFFCURVE:
+					if "zeroHandles" in checks and ((x, y) == (xs[prev], ys[prev]) or (x, y) == (xs[next], ys[next])):
+						flaggedNodes["zeroHandles"].append(i)
+					oncurve = next if types[prev] == OFFCURVE else prev
+					handleDx, handleDy = xs[oncurve] - x, ys[oncurve] - y
+					if "shortHandles" in checks and 0.0 < math.hypot(handleDx, handleDy) < float(checks["shortHandles"]):
+						flaggedNodes["shortHandles"].append(i)
+					if "angledHandles" in checks and handleDx != 0 and handleDy != 0:
+						maxAngle = float(checks["angledHandles"])
+						angle = math.fabs(math.fmod(math.degrees(math.atan2(handleDy, handleDx)), 90.0))
+						if angle < maxAngle or angle > 90 - maxAngle:
+							flaggedNodes["angledHandles"].append(i)
+					if "cuspingHandles" in checks and types[next] == OFFCURVE:
+						nextNext = neighbour(i, 2)
+						distAC = math.hypot(xs[next] - xs[prev], ys[next] - ys[prev])
+						distAB = math.hypot(x - xs[prev], y - ys[prev])
+						distBD = math.hypot(xs[nextNext] - x, ys[nextNext] - y)
+						distCD = math.hypot(xs[nextNext] - xs[next], ys[nextNext] - ys[next])
+						if distAC < distAB and distBD < distCD:
+							flaggedNodes["cuspingHandles"].extend((i, next))
+					continue
+
+				if nodeType == QUADRATIC and "quadraticCurves" in checks:
+					flaggedNodes["quadraticCurves"].append(i)
+				if nodeType == LINE and not isOpenStart and "almostOrthogonalLines" in checks:
+					threshold, minLength = checks["almostOrthogonalLines"]
+					xDiff, yDiff = abs(x - xs[prev]), abs(y - ys[prev])
+					if minLength is None or math.hypot(xDiff, yDiff) >= float(minLength):
+						if (0.1 < xDiff < float(threshold)) or (0.1 < yDiff < float(threshold)):
+							flaggedNodes["almostOrthogonalLines"].append(i)
+
+				b = prev
+				c = neighbour(i, -2)
+				d = neighbour(i, -3)
+				if nodeType == CURVE:
+					if "outwardHandles" in checks:
+						for handle in (b, c):
+							position, deviation = relativePosition(x, y, xs[d], ys[d], xs[handle], ys[handle])
+							if position < 0 or position > 1:
+								flaggedNodes["outwardHandles"].append(i)
+								break
+					if "largeHandles" in checks:
+						rx, ry, sx, sy = xs[b] - x, ys[b] - y, xs[d] - xs[c], ys[d] - ys[c]
+						denominator = rx * sy - ry * sx
+						if denominator != 0:
+							factor = ((xs[c] - x) * sy - (ys[c] - y) * sx) / denominator
+							intersectionX, intersectionY = x + rx * factor, y + ry * factor
+							firstTooLong = math.hypot(rx, ry) > math.hypot(intersectionX - x, intersectionY - y)
+							secondTooLong = math.hypot(sx, sy) > math.hypot(intersectionX - xs[d], intersectionY - ys[d])
+							if firstTooLong or secondTooLong:
+								flaggedNodes["largeHandles"].append(i)
+					if "shallowCurveBBox" in checks:
+						threshold = float(checks["shallowCurveBBox"])
+						minX, maxX = sorted((x, xs[d]))
+						minY, maxY = sorted((y, ys[d]))
+						if maxX - minX < threshold or maxY - minY < threshold:
+							horizontallyWithin = minX - 1 < min(xs[b], xs[c]) and maxX + 1 > max(xs[b], xs[c])
+							verticallyWithin = minY - 1 < min(ys[b], ys[c]) and maxY + 1 > max(ys[b], ys[c])
+							if horizontallyWithin and verticallyWithin:
+								flaggedNodes["shallowCurveBBox"].append(i)
+					if "shallowCurve" in checks:
+						for point in (c, d):
+							position, deviation = relativePosition(x, y, xs[b], ys[b], xs[point], ys[point])
+							if 0.0 < position < 1.0 and deviation < float(checks["shallowCurve"]):
+								flaggedNodes["shallowCurve"].append(i)
+								break
+
+				if isOpenStart or not ("shortSegment" in checks or "badOutlineOrder" in checks):
+					continue
+				# segment from the previous on-curve:
+				offcurveCount = 0
+				while offcurveCount < length - 1 and types[neighbour(i, -offcurveCount - 1)] == OFFCURVE:
+					offcurveCount += 1
+				segmentStart = neighbour(i, -offcurveCount - 1)
+				if offcurveCount == 2:
+					cubicPoints = (xs[segmentStart], ys[segmentStart], xs[c], ys[c], xs[b], ys[b], x, y)
+					area += cubicAreaCorrection(*cubicPoints)
+				if "shortSegment" in checks:
+					if offcurveCount == 0:
+						segmentLength = math.hypot(x - xs[segmentStart], y - ys[segmentStart])
+					elif offcurveCount == 2:
+						segmentLength = cubicLength(*cubicPoints)
+					else:
+						segmentLength = sum(math.hypot(xs[neighbour(i, -k)] - xs[neighbour(i, -k - 1)], ys[neighbour(i, -k)] - ys[neighbour(i, -k - 1)]) for k in range(offcurveCount + 1))
+					if segmentLength < float(checks["shortSegment"]):
+						flaggedNodes["shortSegment"].append(i)
+
+			pathAreas.append(area)
+
+		if "badOutlineOrder" in checks:
+			flaggedPaths["badOutlineOrder"] = self._badOutlineOrderPaths(pathAreas)
+		return flaggedNodes, flaggedPaths
+
+
+def decodeResults(results):
+	"""OutlineBatch.run() results back from JSON, where layer indexes became strings and locations lists."""
+	return dict(
+		(checkName, dict((int(layerIndex), [tuple(location) for location in locations]) for layerIndex, locations in layerLocations.items()))
+		for checkName, layerLocations in results.items()
+	)
+
+
+def pythonExecutable():
+	"""
+	Python interpreter for worker processes, or None if there is none. Inside Glyphs, sys.executable
+	is the app itself, so look for the interpreter of the Python installation Glyphs runs on.
+	"""
+	candidates = []
+	if os.path.basename(sys.executable or "").lower().startswith("python"):
+		candidates.append(sys.executable)
+	for prefix in (sys.prefix, sys.base_prefix):
+		candidates.append(os.path.join(prefix, "bin", "python%i.%i" % sys.version_info[:2]))
+		candidates.append(os.path.join(prefix, "bin", "python3"))
+	for candidate in candidates:
+		if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+			return candidate
+	return None
+
+
+class CheckPool(object):
+	"""
+	Checks OutlineBatches in up to workerCount worker processes (default: one per processor core).
+	The workers run this module with --worker, because Python inside Glyphs cannot fork itself or start
+	a multiprocessing pool of the app. Each worker stays up and checks batch after batch until close().
+	submit() returns a Future with the results of OutlineBatch.run(), so results can be collected in the
+	order the batches were read. With a workerCount of 1, or without a Python interpreter for the workers,
+	batches are checked right away in this process; so are batches whose worker fails (see fallbackCount).
+	"""
+
+	def __init__(self, checks, workerCount=None, python=None):
+		self.checks = checks
+		self.workerCount = workerCount or os.cpu_count() or 1
+		self.python = python or pythonExecutable()
+		self.fallbackCount = 0
+		self.executor = None
+		self.workers = []
+		self.threadWorker = threading.local()
+		if self.python and self.workerCount > 1:
+			self.executor = ThreadPoolExecutor(self.workerCount)  # each thread talks to one worker process
+
+	@property
+	def usesWorkers(self):
+		return self.executor is not None
+
+	def submit(self, batch):
+		if self.executor:
+			return self.executor.submit(self._runInWorker, batch)
+		future = Future()
+		future.set_result(batch.run(self.checks))
+		return future
+
+	def close(self):
+		if self.executor:
+			self.executor.shutdown()
+			self.executor = None
+		for worker in self.workers:
+			worker.stdin.close()
+			worker.wait()
+		self.workers = []
+
+	def _worker(self):
+		worker = getattr(self.threadWorker, "process", None)
+		if worker is None or worker.poll() is not None:
+			worker = subprocess.Popen(
+				(self.python, os.path.abspath(__file__), "--worker"),
+				stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.DEVNULL,
+			)
+			self.threadWorker.process = worker
+			self.workers.append(worker)
+		return worker
+
+	def _runInWorker(self, batch):
+		try:
+			worker = self._worker()
+			worker.stdin.write(json.dumps({"checks": self.checks, "geometry": batch.geometry()}).encode("utf-8") + b"\n")
+			worker.stdin.flush()
+			response = worker.stdout.readline()
+			if not response:
+				raise OSError("worker process ended")
+			return decodeResults(json.loads(response))
+		except (OSError, ValueError):
+			self.fallbackCount += 1
+			return batch.run(self.checks)
+
+
+def outlineFingerprint(paths):
+	"""Hash of paths as returned by layerPaths(), everything the outline checks look at."""
+	return hashlib.sha1(repr(paths).encode("utf-8")).hexdigest()
+
+
+class WorkUnit(object):
+	"""
+	Layers of a chunk of glyphs, in reading order: the ones to check in an OutlineBatch, and the ones
+	with results from elsewhere (a ResultCache). Layer indexes count all layers of the unit.
+	"""
+
+	def __init__(self):
+		self.batch = OutlineBatch()
+		self.batchIndexes = []  # unit layer index of every batch layer
+		self.layerResults = []  # {check name: locations} of every layer, None for batch layers until checked
+		self.cachedIndexes = set()
+		self.future = None
+
+	@property
+	def layerCount(self):
+		return len(self.layerResults)
+
+	def addPaths(self, paths):
+		"""Adds a layer to be checked (see OutlineBatch.addPaths()), returns its layer index."""
+		self.batch.addPaths(paths)
+		self.batchIndexes.append(self.layerCount)
+		self.layerResults.append({})
+		return self.layerCount - 1
+
+	def addCachedResults(self, layerResults):
+		"""Adds a layer with known results ({check name: locations}), returns its layer index."""
+		self.cachedIndexes.add(self.layerCount)
+		self.layerResults.append(dict(layerResults))
+		return self.layerCount - 1
+
+	def addResult(self, layerIndex, checkName, locations):
+		"""Result of a check outside the batch (e.g., bad path directions), for a layer to be checked."""
+		self.layerResults[layerIndex][checkName] = locations
+
+	def submit(self, pool):
+		if self.batch.layerCount:
+			self.future = pool.submit(self.batch)
+
+	def checkedLayerResults(self):
+		"""{layer index: {check name: locations}} of all layers, waits for the pool if necessary."""
+		if self.future is not None:
+			for checkName, layerLocations in self.future.result().items():
+				for batchIndex, locations in layerLocations.items():
+					self.layerResults[self.batchIndexes[batchIndex]][checkName] = locations
+			self.future = None
+		return dict(enumerate(self.layerResults))
+
+	def results(self):
+		"""{check name: {layer index: locations}} of all layers, like OutlineBatch.run()."""
+		results = {}
+		for layerIndex, layerResults in self.checkedLayerResults().items():
+			for checkName, locations in layerResults.items():
+				results.setdefault(checkName, {})[layerIndex] = locations
+		return results
+
+
+class ResultCache(object):
+	"""
+	Check results of the layers of a font, stored in a JSON file (next to the font file), per glyph
+	name and layer ID with the outline fingerprint of the layer. The file is only used with the
+	same checks and parameters (settings); if any of them changes, all layers are checked again.
+	lookup() returns the stored results of a layer if its fingerprint is unchanged, store() adds
+	the new results, and save() writes the file, replacing the glyphs seen in this run.
+	"""
+
+	def __init__(self, filePath, settings):
+		self.filePath = filePath
+		self.settings = json.dumps([resultCacheFormat, settings], sort_keys=True)
+		self.glyphs = {}
+		self.newGlyphs = {}
+		self.reused = 0
+		self.analyzed = 0
+		try:
+			with open(filePath, encoding="utf-8") as cacheFile:
+				stored = json.load(cacheFile)
+			if stored.get("settings") == self.settings:
+				self.glyphs = stored["glyphs"]
+		except (OSError, ValueError, KeyError, AttributeError):
+			pass  # no usable file, check all layers
+
+	@classmethod
+	def forFontFile(cls, fontFilePath, settings):
+		"""Cache in a .pathproblems.json file next to the font file (.glyphs or .glyphspackage)."""
+		return cls(os.path.splitext(fontFilePath)[0] + ".pathproblems.json", settings)
+
+	def lookup(self, glyphName, layerID, fingerprint):
+		entry = self.glyphs.get(glyphName, {}).get(layerID)
+		if entry is None or entry[0] != fingerprint:
+			self.analyzed += 1
+			return None
+		self.reused += 1
+		self.newGlyphs.setdefault(glyphName, {})[layerID] = entry
+		return dict((checkName, [tuple(location) for location in locations]) for checkName, locations in entry[1].items())
+
+	def store(self, glyphName, layerID, fingerprint, layerResults):
+		self.newGlyphs.setdefault(glyphName, {})[layerID] = [fingerprint, dict(layerResults)]
+
+	def save(self, glyphNames):
+		"""Writes the file, keeping stored glyphs not seen in this run if their names are in glyphNames."""
+		glyphNames = set(glyphNames)
+		glyphs = dict((glyphName, layers) for glyphName, layers in self.glyphs.items() if glyphName in glyphNames and glyphName not in self.newGlyphs)
+		glyphs.update(self.newGlyphs)
+		temporaryPath = self.filePath + ".tmp"
+		with open(temporaryPath, "w", encoding="utf-8") as cacheFile:
+			json.dump({"settings": self.settings, "glyphs": glyphs}, cacheFile)
+		os.replace(temporaryPath, self.filePath)
+		self.glyphs, self.newGlyphs = glyphs, {}
+
+	def report(self):
+		return "Reused results of %i layer%s, analyzed %i." % (self.reused, "" if self.reused == 1 else "s", self.analyzed)
+
+
+def fontGeometry(font):
+	"""Paths of the master and special layers of all glyphs of a GSFont, for a geometry file (see readGeometryFile())."""
+	glyphs = []
+	for glyph in font.glyphs:
+		layers = []
+		for layer in glyph.layers:
+			if layer.isMasterLayer or layer.isSpecialLayer:
+				paths = [
+					{"closed": closed, "nodes": [[x, y, typeNames[typeCode]] for x, y, typeCode in nodes]}
+					for closed, nodes in layerPaths(layer)
+				]
+				layers.append({"name": layer.name, "paths": paths})
+		glyphs.append({"name": glyph.name, "export": bool(glyph.export), "layers": layers})
+	return {"familyName": font.familyName, "filepath": font.filepath, "glyphs": glyphs}
+
+
+def readGeometryFile(filePath):
+	"""
+	Geometry file (JSON) as written by Paths > Export Outline Geometry:
+	{"familyName": …, "filepath": …, "glyphs": [{"name": …, "export": …, "layers": [{"name": …, "paths": [{"closed": …, "nodes": [[x, y, type], …]}]}]}]}
+	with node types as in Glyphs (line, curve, offcurve, qcurve).
+	"""
+	with open(filePath, encoding="utf-8") as geometryFile:
+		return json.load(geometryFile)
+
+
+def geometryBatches(geometry, includeNonExporting=False, excludedParticles=()):
+	"""
+	Glyph count and work units of a geometry file: (OutlineBatch, [(glyph name, layer name), …]) per chunk
+	of glyphs with up to batchLayerCount layers, in glyph order.
+	"""
+	glyphs = [
+		glyph for glyph in geometry["glyphs"]
+		if (includeNonExporting or glyph.get("export", True)) and not any(particle in glyph["name"] for particle in excludedParticles)
+	]
+	units = []
+	batch, batchLayers = OutlineBatch(), []
+	for i, glyph in enumerate(glyphs):
+		for layer in glyph["layers"]:
+			batch.addPaths([(path["closed"], [(x, y, typeCodes.get(typeName, LINE)) for x, y, typeName in path["nodes"]]) for path in layer["paths"]])
+			batchLayers.append((glyph["name"], layer["name"]))
+		if batch.layerCount >= batchLayerCount or i == len(glyphs) - 1:
+			units.append((batch, batchLayers))
+			batch, batchLayers = OutlineBatch(), []
+	return len(glyphs), units
+
+
+def worker():
+	"""
+	Worker process of a CheckPool: reads one request per line from stdin (checks and batch geometry
+	as JSON), writes one line with the results as JSON to stdout.
+	"""
+	for request in sys.stdin:
+		request = json.loads(request)
+		batch = OutlineBatch.fromGeometry(request["geometry"])
+		sys.stdout.write(json.dumps(batch.run(request["checks"])) + "\n")
+		sys.stdout.flush()
+
+
+def parseCheck(text):
+	"""Command line check: name, or name=value (almostOrthogonalLines=threshold,minimum length)."""
+	checkName, _, value = text.partition("=")
+	if checkName not in checkParameters:
+		raise argparse.ArgumentTypeError("unknown check %s, choose from: %s" % (checkName, ", ".join(checkParameters)))
+	if not value:
+		return checkName, defaultParameters.get(checkName)
+	if checkParameters[checkName] is None:
+		raise argparse.ArgumentTypeError("%s takes no value" % checkName)
+	try:
+		if checkName == "almostOrthogonalLines":
+			threshold, _, minLength = value.partition(",")
+			return checkName, (float(threshold), float(minLength) if minLength else None)
+		return checkName, float(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError("%s expects %s, not %s" % (checkName, checkParameters[checkName], value))
+
+
+def main(arguments=None):
+	"""Headless Path Problem Finder on geometry files, returns the exit status (1 if problems were found)."""
+	parser = argparse.ArgumentParser(
+		description="Runs the Path Problem Finder checks on outline geometry files exported from Glyphs (Paths > Export Outline Geometry).",
+	)
+	parser.add_argument("files", nargs="+", help="geometry files (.outlines.json)")
+	parser.add_argument(
+		"--check", dest="checks", action="append", type=parseCheck, metavar="NAME[=VALUE]",
+		help="check to run, repeat for more checks (default: the default checks of Path Problem Finder). Checks: %s" % ", ".join(checkParameters),
+	)
+	parser.add_argument("--all-checks", action="store_true", help="run all checks, with default values")
+	parser.add_argument("--include-non-exporting", action="store_true", help="also check glyphs that are set to not export")
+	parser.add_argument("--exclude", default="notdef, apple, .ornm, .00", help="skip glyphs containing any of these comma-separated name particles")
+	parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per processor core, 1: none)")
+	parser.add_argument("--verbose", action="store_true", help="list every problem location")
+	options = parser.parse_args(arguments)
+
+	if options.all_checks:
+		checks = dict((checkName, defaultParameters.get(checkName)) for checkName in checkParameters)
+	elif options.checks:
+		checks = dict(options.checks)
+	else:
+		checks = dict((checkName, defaultParameters.get(checkName)) for checkName in defaultChecks)
+	excludedParticles = [particle.strip().replace(" ", "") for particle in options.exclude.split(",") if particle.strip()]
+
+	# read all files and hand all work units to the pool first, then report in order:
+	pool = CheckPool(checks, workerCount=options.workers)
+	fontJobs = []
+	try:
+		for filePath in options.files:
+			geometry = readGeometryFile(filePath)
+			glyphCount, units = geometryBatches(geometry, options.include_non_exporting, excludedParticles)
+			fontJobs.append((filePath, geometry, glyphCount, [(pool.submit(batch), batchLayers) for batch, batchLayers in units]))
+
+		problemCount = 0
+		for filePath, geometry, glyphCount, units in fontJobs:
+			print(f"\n🪐 Path Problem Finder Report for {geometry.get('familyName')}")
+			print(geometry.get("filepath") or filePath)
+			print(f"\nProcessing {glyphCount} glyphs:")
+			layersForCheck = dict((checkName, []) for checkName, reportTitle, verboseTitle in checkReports)
+			for future, batchLayers in units:
+				results = future.result()
+				for checkName, reportTitle, verboseTitle in checkReports:
+					for layerIndex, locations in sorted(results.get(checkName, {}).items()):
+						glyphName, layerName = batchLayers[layerIndex]
+						if checkName == "openPaths" and any(nameStart in glyphName for nameStart in canHaveOpenOutlines):
+							continue
+						layersForCheck[checkName].append(glyphName)
+						if options.verbose:
+							print(f"  ❌ {verboseTitle} in {glyphName}, layer {layerName}: {describeLocations(locations)}")
+			for checkName, reportTitle, verboseTitle in checkReports:
+				glyphNames = layersForCheck[checkName]
+				if glyphNames:
+					problemCount += len(glyphNames)
+					print(f"\n🔠 {reportTitle}:\n/" + "/".join(dict.fromkeys(glyphNames)))
+	finally:
+		pool.close()
+
+	if pool.fallbackCount:
+		print(f"\n⚠️ {pool.fallbackCount} batch(es) checked without worker process.")
+	if problemCount:
+		print(f"\n❌ Found {problemCount} issue{'s' if problemCount != 1 else ''} in {len(fontJobs)} file{'s' if len(fontJobs) != 1 else ''}.")
+		return 1
+	print(f"\n✅ No issues found in {len(fontJobs)} file{'s' if len(fontJobs) != 1 else ''}.")
+	return 0
+
+
+if __name__ == "__main__":
+	if sys.argv[1:] == ["--worker"]:
+		worker()
+	else:
+		sys.exit(main())